@@ -1,7 +1,6 @@
-import hashlib
 import os
+import threading
 import time
-import boto3
 
 from datetime import datetime
 from dotenv import load_dotenv
@@ -12,8 +11,21 @@ from botocore.exceptions import NoCredentialsError
 import psutil
 import sentry_sdk
 
+from processing_pipeline.audio_utils import get_encoder_output_options, get_encoding_profile
+from processing_pipeline.r2_utils import R2Uploader, create_r2_client
 from processing_pipeline.supabase_utils import SupabaseClient
 from radiostations import RadioStation, Khot, Kisf, Krgt, Wado, Waqi, Wkaq
+from radiostations.stream_resolver import StreamResolver
+from recorder import (
+    AudioFileBatchWriter,
+    RecordingRegistrar,
+    RecordingSpool,
+    SegmentTracker,
+    StreamHealth,
+    UploadWorker,
+)
+from recorder.registration import get_url_hash
+from recorder.segments import SEGMENT_TIMESTAMP_PATTERN, get_segment_output_options, get_segment_start_time
 from utils import optional_flow, optional_task
 
 load_dotenv()
@@ -21,47 +33,179 @@ load_dotenv()
 # Setup Sentry
 sentry_sdk.init(dsn=os.getenv("SENTRY_DSN"))
 
-# Setup S3 Client
-R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
+# Setup S3 Client (one pooled client shared by every upload of this process)
 R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
-s3_client = boto3.client(
-    "s3", endpoint_url=R2_ENDPOINT_URL, aws_access_key_id=R2_ACCESS_KEY_ID, aws_secret_access_key=R2_SECRET_ACCESS_KEY
-)
+s3_client = create_r2_client()
 
 # Setup Supabase client
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 supabase_client = SupabaseClient(SUPABASE_URL, SUPABASE_KEY)
 
+# Maximum number of finished segments waiting for upload in segmented mode
+UPLOAD_QUEUE_SIZE = int(os.getenv("RECORDING_UPLOAD_QUEUE_SIZE", "4"))
+
+# Windows quieter than this count as dead air. Fully silent recordings are moved to the
+# quarantine directory when it's set and deleted otherwise.
+SILENCE_THRESHOLD_DBFS = float(os.getenv("RECORDING_SILENCE_THRESHOLD_DBFS", "-50"))
+RECORDING_QUARANTINE_DIR = os.getenv("RECORDING_QUARANTINE_DIR")
+
+# How often a running capture checks that the station is still playing (and not only silence)
+DROPOUT_CHECK_INTERVAL_SECONDS = 5
+
+# Record the stream behind the station page with plain ffmpeg, the browser is only a fallback
+DIRECT_STREAM_ENABLED = os.getenv("RECORDING_DIRECT_STREAM", "true").lower() == "true"
+
+# While recording through the browser, the stream is resolved again after this many captures
+DIRECT_STREAM_RETRY_CAPTURES = int(os.getenv("RECORDING_DIRECT_STREAM_RETRY_CAPTURES", "3"))
+
+# How long a direct capture waits for data before treating the stream as stalled
+STALLED_STREAM_TIMEOUT_MICROSECONDS = 30_000_000
+
+# Codec and container of the recordings, see ENCODING_PROFILES (e.g. "opus_speech" for 24 kbps mono Opus)
+ENCODING_PROFILE = get_encoding_profile(os.getenv("RECORDING_ENCODING_PROFILE", "mp3"))
+
+# Recordings that could not be uploaded or registered are kept here and retried in the background
+RECORDING_SPOOL_DIR = os.getenv("RECORDING_SPOOL_DIR", "spool")
+
+# audio_files rows of the station are inserted in batches, in the background
+AUDIO_FILE_BATCH_SIZE = int(os.getenv("AUDIO_FILE_BATCH_SIZE", "50"))
+AUDIO_FILE_FLUSH_SECONDS = float(os.getenv("AUDIO_FILE_FLUSH_SECONDS", "5"))
+
+registrar = RecordingRegistrar(
+    supabase_client,
+    RecordingSpool(RECORDING_SPOOL_DIR),
+    AudioFileBatchWriter(
+        # Looked up on every batch, the task is defined below
+        lambda audio_files: insert_recorded_audio_files_into_database(audio_files),
+        max_batch_size=AUDIO_FILE_BATCH_SIZE,
+        flush_interval_seconds=AUDIO_FILE_FLUSH_SECONDS,
+    ),
+    # Looked up on every upload as well
+    upload=lambda url, file_path: upload_to_r2_and_clean_up(url, file_path),
+    silence_threshold_dbfs=SILENCE_THRESHOLD_DBFS,
+    quarantine_dir=RECORDING_QUARANTINE_DIR,
+)
+upload_and_register_recording = registrar.upload_and_register
+
+
+def get_capture_input(station, stream_url, **options):
+    """The ffmpeg input of a capture: the resolved stream itself, or the virtual microphone of the browser."""
+    if stream_url:
+        return stream_url, {"rw_timeout": STALLED_STREAM_TIMEOUT_MICROSECONDS, **options}
+    return station.source_name, {"f": "pulse", **options}
+
+
+def check_playback(station, stream_url):
+    if stream_url:
+        print(f"Capturing {station.code} directly from {stream_url}")
+    elif station.is_audio_playing():
+        print(f"Audio is properly set up and playing for {station.code}")
+    else:
+        raise Exception(f"Sink is not in RUNNING state for {station.code}")
+
 
 @optional_task(log_prints=True)
-def capture_audio_stream(station, duration_seconds, audio_birate, audio_channels):
+def capture_audio_stream(station, duration_seconds, audio_birate, audio_channels, stream_url=None):
     try:
-        if station.is_audio_playing():
-            print(f"Audio is properly set up and playing for {station.code}")
-        else:
-            raise Exception(f"Sink is not in RUNNING state for {station.code}")
+        check_playback(station, stream_url)
 
         # Create the output filename using the timestamp and hash
         start_time = time.time()
         timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(start_time))
-        output_file = f"radio_{get_url_hash(station.url)}_{timestamp}.mp3"
+        output_file = f"radio_{get_url_hash(station.url)}_{timestamp}.{ENCODING_PROFILE['extension']}"
 
         print(f"Start capturing audio from ${station.url} for {duration_seconds} seconds")
-        FFmpeg().option("y").input(station.source_name, f="pulse", t=duration_seconds).output(
-            output_file, ab=audio_birate, ac=audio_channels, acodec="libmp3lame"
-        ).execute()
+        capture_input, input_options = get_capture_input(station, stream_url, t=duration_seconds)
+        ffmpeg = FFmpeg().option("y").input(capture_input, **input_options).output(
+            output_file, **get_encoder_output_options(ENCODING_PROFILE, audio_birate, audio_channels)
+        )
+        # A direct stream has no browser playback to watch, ffmpeg notices a stalled stream itself
+        finished = threading.Event() if stream_url else start_dropout_watcher(station, ffmpeg)
+        try:
+            ffmpeg.execute()
+        finally:
+            finished.set()
 
         return get_metadata(output_file, station, start_time)
 
     except Exception as e:
         print(f"Failed to capture audio stream ${station.url}: {e}")
-        # TODO: Sleep for 30 seconds before returning
         return None
 
 
+@optional_task(log_prints=True)
+def capture_audio_stream_in_segments(
+    station, duration_seconds, segment_seconds, audio_birate, audio_channels, on_segment, stream_url=None
+):
+    tracker = SegmentTracker(on_segment)
+
+    try:
+        check_playback(station, stream_url)
+
+        # ffmpeg expands the timestamp of each segment into its file name
+        extension = ENCODING_PROFILE["extension"]
+        output_pattern = f"radio_{get_url_hash(station.url)}_{SEGMENT_TIMESTAMP_PATTERN}.{extension}"
+        capture_input, input_options = get_capture_input(
+            station, stream_url, **({"t": duration_seconds} if duration_seconds else {})
+        )
+
+        print(f"Start capturing audio from ${station.url} in {segment_seconds}-second segments")
+        ffmpeg = (
+            FFmpeg()
+            .option("y")
+            .input(capture_input, **input_options)
+            .output(
+                output_pattern,
+                **get_encoder_output_options(ENCODING_PROFILE, audio_birate, audio_channels),
+                **get_segment_output_options(segment_seconds),
+            )
+        )
+        ffmpeg.on("stderr", tracker.handle_log_line)
+        finished = threading.Event() if stream_url else start_dropout_watcher(station, ffmpeg)
+        try:
+            ffmpeg.execute()
+        finally:
+            finished.set()
+        return True
+
+    except Exception as e:
+        print(f"Failed to capture audio stream ${station.url}: {e}")
+        return False
+
+    finally:
+        # Hand over the last (possibly partial) segment as well
+        tracker.finish()
+        print(f"Captured {tracker.closed_segments} segment(s) from ${station.url}")
+
+
+def start_dropout_watcher(station, ffmpeg):
+    """Stop `ffmpeg` as soon as the station stops playing, instead of recording dead air until the capture ends.
+
+    A browser using a critical amount of memory also ends the capture early, so that it can be
+    recycled right away. Returns the event that the caller must set once ffmpeg exited.
+    """
+    finished = threading.Event()
+    # Without the PulseAudio monitor, every playback check would shell out to pactl
+    check_playback = station.is_monitored()
+
+    def watch():
+        while not finished.wait(DROPOUT_CHECK_INTERVAL_SECONDS):
+            if check_playback and (not station.is_audio_playing() or station.is_playing_silence()):
+                print(f"Playback of {station.code} dropped out, stopping the capture early")
+                ffmpeg.terminate()
+                return
+
+            recycle_reason = station.get_browser_recycle_reason(urgent=True)
+            if recycle_reason:
+                print(f"Stopping the capture early to recycle the browser of {station.code}: {recycle_reason}")
+                ffmpeg.terminate()
+                return
+
+    threading.Thread(target=watch, name=f"dropout-watcher-{station.code}", daemon=True).start()
+    return finished
+
+
 @optional_task(log_prints=True)
 def get_metadata(file, station, start_time):
     file_size = os.path.getsize(file)
@@ -83,7 +227,8 @@ def upload_to_r2_and_clean_up(url, file_path):
     try:
         url_hash = get_url_hash(url)
         destination_path = f"radio_{url_hash}/{object_name}"
-        s3_client.upload_file(file_path, R2_BUCKET_NAME, destination_path)
+        # The file is only deleted after R2 confirmed that it stores the same content
+        R2Uploader(s3_client, R2_BUCKET_NAME).upload(file_path, destination_path)
         print(f"File {file_path} uploaded to R2 as {destination_path}")
         os.remove(file_path)
         return destination_path
@@ -93,16 +238,16 @@ def upload_to_r2_and_clean_up(url, file_path):
 
 
 @optional_task(log_prints=True, retries=3)
-def insert_recorded_audio_file_into_database(metadata, uploaded_path):
-    supabase_client.insert_audio_file(
-        radio_station_name=metadata["radio_station_name"],
-        radio_station_code=metadata["radio_station_code"],
-        location_state=metadata["location_state"],
-        recorded_at=metadata["recorded_at"],
-        recording_day_of_week=metadata["recording_day_of_week"],
-        file_path=uploaded_path,
-        file_size=metadata["file_size"],
+def insert_recorded_audio_files_into_database(audio_files):
+    return supabase_client.insert_audio_files(audio_files)
+
+
+def start_spool_drainer(station):
+    # Recordings left behind by a previous run, before ffmpeg starts writing a new one
+    registrar.spool_orphaned_recordings(
+        station.url, lambda file_name, start_time: get_metadata(file_name, station, start_time)
     )
+    return registrar.start_spool_drainer([station.url])
 
 
 @optional_flow(
@@ -110,7 +255,9 @@ def insert_recorded_audio_file_into_database(metadata, uploaded_path):
     log_prints=True,
     task_runner=ConcurrentTaskRunner,
 )
-def generic_audio_processing_pipeline(station_code, duration_seconds, audio_birate, audio_channels, repeat):
+def generic_audio_processing_pipeline(
+    station_code, duration_seconds, audio_birate, audio_channels, repeat, segment_seconds=None
+):
     RADIO_STATIONS: dict[str, type[RadioStation]] = {
         Khot.code: Khot,
         Kisf.code: Kisf,
@@ -127,11 +274,54 @@ def generic_audio_processing_pipeline(station_code, duration_seconds, audio_bira
 
     station = station_class()
 
+    def upload_and_register_segment(file_name):
+        metadata = get_metadata(file_name, station, get_segment_start_time(file_name))
+        upload_and_register_recording(station.url, metadata)
+
+    def spool_failed_segment(error, file_name):
+        registrar.spool_failed(station.url, get_metadata(file_name, station, get_segment_start_time(file_name)))
+
+    spool_drainer = start_spool_drainer(station)
+    registrar.audio_file_writer.start()
+
+    # The station plays in a browser, there is no stream URL that could be probed
+    stream_health = StreamHealth(station.url, probe=None)
+
+    # Segments are uploaded on a background worker while ffmpeg keeps recording
+    upload_worker = None
+    if segment_seconds:
+        upload_worker = UploadWorker(
+            upload_and_register_segment, max_queue_size=UPLOAD_QUEUE_SIZE, on_failed=spool_failed_segment
+        )
+        upload_worker.start()
+
+    # Without a resolvable stream the station is played in a browser and recorded from its sink
+    resolver = StreamResolver(station.url) if DIRECT_STREAM_ENABLED else None
+    stream_url = resolver.get_stream_url() if resolver else None
+
+    # Captures through the browser since the last attempt to go back to the direct stream
+    browser_captures = 0
+
     try:
-        station.setup_virtual_audio()
-        station.start_browser()
+        if not stream_url:
+            start_browser_playback(station)
 
         while True:
+            if stream_url:
+                succeeded = capture_station(
+                    station, duration_seconds, segment_seconds, audio_birate, audio_channels, upload_worker, stream_url
+                )
+                if not record_capture_result(stream_health, succeeded, repeat):
+                    break
+
+                # Resolve a fresh stream URL right away after a failure, its token may have expired
+                stream_url = resolver.get_stream_url(force_refresh=not succeeded)
+                if not stream_url:
+                    print(f"Falling back to recording {station.code} through the browser")
+                    start_browser_playback(station)
+                    browser_captures = 0
+                continue
+
             # Check current memory usage
             memory_usage = psutil.virtual_memory().percent
             print(f"Current memory usage: {memory_usage}%")
@@ -144,31 +334,88 @@ def generic_audio_processing_pipeline(station_code, duration_seconds, audio_bira
                 station.start_browser()
                 print(f"Current memory usage: {psutil.virtual_memory().percent}%")
 
-            if not station.is_audio_playing():
-                print("Playback stopped playing for some reason. Restarting browser...")
+            # Recycle a leaking browser between captures, long before the host runs out of memory
+            recycle_reason = station.get_browser_recycle_reason()
+            if recycle_reason:
+                print(f"Recycling the browser: {recycle_reason}")
                 station.stop(unload_modules=False)
                 time.sleep(5)  # Wait for browser to fully close
                 station.start_browser()
 
-            output = capture_audio_stream(station, duration_seconds, audio_birate, audio_channels)
-
-            if output and output["file_name"]:
-                uploaded_path = upload_to_r2_and_clean_up(station.url, output["file_name"])
-                if uploaded_path:
-                    insert_recorded_audio_file_into_database(output, uploaded_path)
+            if not station.is_audio_playing() or station.is_playing_silence():
+                print("Playback stopped playing (or only plays silence) for some reason. Restarting browser...")
+                station.stop(unload_modules=False)
+                time.sleep(5)  # Wait for browser to fully close
+                station.start_browser()
 
-            # Stop the flow if it should not be repeated
-            if not repeat:
+            succeeded = capture_station(
+                station, duration_seconds, segment_seconds, audio_birate, audio_channels, upload_worker
+            )
+            # Playback is checked (and the browser restarted) before the next capture anyway
+            if not record_capture_result(stream_health, succeeded, repeat):
                 break
+
+            # The direct stream may be back (e.g. the resolver failed on a temporary outage)
+            browser_captures += 1
+            if resolver and browser_captures >= DIRECT_STREAM_RETRY_CAPTURES:
+                browser_captures = 0
+                stream_url = resolver.get_stream_url(force_refresh=True)
+                if stream_url:
+                    print(f"Going back to recording {station.code} directly from {stream_url}")
+                    station.stop()
     finally:
+        if upload_worker:
+            print(f"Waiting for {upload_worker.pending()} pending upload(s) to finish")
+            upload_worker.stop()
+        # The drainer queues rows too, stop it before the last flush
+        spool_drainer.stop()
+        registrar.audio_file_writer.flush()
+
         print("Stopping the radio station and cleaning up...")
         station.stop()
         print("Cleanup finished")
 
 
-def get_url_hash(url):
-    # Hash the URL and get the last 6 characters
-    return hashlib.sha256(url.encode()).hexdigest()[-6:]
+def start_browser_playback(station):
+    station.setup_virtual_audio()
+    station.start_browser()
+
+
+def capture_station(
+    station, duration_seconds, segment_seconds, audio_birate, audio_channels, upload_worker, stream_url=None
+):
+    if segment_seconds:
+        return capture_audio_stream_in_segments(
+            station,
+            duration_seconds,
+            segment_seconds,
+            audio_birate,
+            audio_channels,
+            upload_worker.submit_nowait,
+            stream_url=stream_url,
+        )
+
+    output = capture_audio_stream(station, duration_seconds, audio_birate, audio_channels, stream_url=stream_url)
+    succeeded = bool(output and output["file_name"])
+    if succeeded:
+        upload_and_register_recording(station.url, output)
+    return succeeded
+
+
+def record_capture_result(stream_health, succeeded, repeat):
+    """Returns whether the flow should go on with the next capture, after backing off from a failure."""
+    if succeeded:
+        stream_health.record_success()
+    else:
+        stream_health.record_failure("Capture failed")
+
+    # Stop the flow if it should not be repeated
+    if not repeat:
+        return False
+
+    if not succeeded:
+        stream_health.wait_until_healthy()
+    return True
 
 
 if __name__ == "__main__":
@@ -194,6 +441,8 @@ if __name__ == "__main__":
     duration_seconds = 1800  # Default to 30 minutes
     audio_birate = 64000  # Default to 64kbps bitrate
     audio_channels = 1  # Default to single channel (mono audio)
+    # Optional rolling capture: ffmpeg writes fixed-length chunks that are uploaded as they close
+    segment_seconds = int(os.getenv("RECORDING_SEGMENT_SECONDS", "0")) or None
 
     deployment = generic_audio_processing_pipeline.to_deployment(
         name=station.code,
@@ -205,6 +454,7 @@ if __name__ == "__main__":
             repeat=True,
             audio_birate=audio_birate,
             audio_channels=audio_channels,
+            segment_seconds=segment_seconds,
         ),
     )
     serve(deployment)
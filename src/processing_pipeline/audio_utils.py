@@ -0,0 +1,232 @@
+import glob
+import os
+import tempfile
+
+import numpy as np
+from ffmpeg import FFmpeg
+
+# Speech and music analysis doesn't need more than telephone quality
+PCM_SAMPLE_RATE = 8000
+
+# Level reported for windows of digital silence, where the RMS is 0
+SILENCE_FLOOR_DBFS = -100.0
+
+# Bitrate of the speech profile, Opus stays intelligible for transcription down to ~16 kbps
+OPUS_SPEECH_BITRATE = int(os.getenv("OPUS_SPEECH_BITRATE", "24000"))
+
+# How recordings (and the clips cut from them) are encoded. The profile of a file is told by its extension.
+ENCODING_PROFILES = {
+    "mp3": {
+        "extension": "mp3",
+        "mime_type": "audio/mp3",
+        "codec": "libmp3lame",
+        "export_options": {"format": "mp3"},
+    },
+    # Mono 16 kHz Opus in an Ogg container, tuned for speech
+    "opus_speech": {
+        "extension": "ogg",
+        "mime_type": "audio/ogg",
+        "codec": "libopus",
+        "bitrate": OPUS_SPEECH_BITRATE,
+        "channels": 1,
+        "sample_rate": 16000,
+        "export_options": {
+            "format": "ogg",
+            "codec": "libopus",
+            "bitrate": f"{OPUS_SPEECH_BITRATE // 1000}k",
+            "parameters": ["-ac", "1", "-ar", "16000", "-application", "voip"],
+        },
+    },
+}
+
+
+def decode_pcm(file_path, sample_rate=PCM_SAMPLE_RATE):
+    """Decode an audio file into mono 16-bit PCM samples."""
+    pcm = FFmpeg().input(file_path).output("pipe:1", f="s16le", ac=1, ar=sample_rate).execute()
+    return np.frombuffer(pcm, dtype=np.int16)
+
+
+def compute_rms_dbfs(samples, sample_rate=PCM_SAMPLE_RATE, window_seconds=1.0):
+    """RMS level of every full `window_seconds` window of `samples`, in dBFS (0 is full scale).
+
+    A trailing window shorter than `window_seconds` is ignored.
+    """
+    window_size = int(sample_rate * window_seconds)
+    window_count = len(samples) // window_size
+    if window_count == 0:
+        return np.empty(0, dtype=np.float32)
+
+    windows = samples[: window_count * window_size].reshape(window_count, window_size).astype(np.float32) / 32768
+    rms = np.sqrt(np.mean(np.square(windows), axis=1))
+    with np.errstate(divide="ignore"):
+        dbfs = 20 * np.log10(rms)
+    return np.maximum(dbfs, SILENCE_FLOOR_DBFS)
+
+
+def analyze_audio_levels(file_path, silence_threshold_dbfs=-50.0, window_seconds=1.0, samples=None):
+    """Loudness summary of an audio file, used to detect dead air.
+
+    `silence_ratio` is the share of windows quieter than `silence_threshold_dbfs`. A file
+    without a single full window counts as fully silent. Pass the `samples` of the file if
+    they are already decoded.
+    """
+    if samples is None:
+        samples = decode_pcm(file_path)
+    dbfs = compute_rms_dbfs(samples, window_seconds=window_seconds)
+    if len(dbfs) == 0:
+        return {"duration_seconds": 0, "silence_ratio": 1.0, "mean_dbfs": SILENCE_FLOOR_DBFS, "max_dbfs": SILENCE_FLOOR_DBFS}
+
+    return {
+        "duration_seconds": len(dbfs) * window_seconds,
+        "silence_ratio": round(float(np.mean(dbfs < silence_threshold_dbfs)), 4),
+        "mean_dbfs": round(float(np.mean(dbfs)), 2),
+        "max_dbfs": round(float(np.max(dbfs)), 2),
+    }
+
+
+# Layer III bitrates (kbps) by bitrate index, for MPEG-1 and for MPEG-2/2.5
+MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# Sample rates by version bits of the frame header (0 is MPEG-2.5, 2 is MPEG-2, 3 is MPEG-1)
+MP3_SAMPLE_RATES = {0: [11025, 12000, 8000], 2: [22050, 24000, 16000], 3: [44100, 48000, 32000]}
+
+
+def parse_mp3_frame_header(data, offset):
+    """Length in bytes and duration in seconds of the MPEG Layer III frame at `offset`, or None."""
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+
+    version = (data[offset + 1] >> 3) & 0x03
+    layer = (data[offset + 1] >> 1) & 0x03
+    bitrate_index = data[offset + 2] >> 4
+    sample_rate_index = (data[offset + 2] >> 2) & 0x03
+    padding = (data[offset + 2] >> 1) & 0x01
+    # Reserved version, not Layer III, free format or invalid bitrate, reserved sample rate
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    is_mpeg_1 = version == 3
+    bitrate = MP3_BITRATES[1 if is_mpeg_1 else 2][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    samples_per_frame = 1152 if is_mpeg_1 else 576
+    length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    return length, samples_per_frame / sample_rate
+
+
+def split_mp3_frames(data, segment_seconds, segment_starts=None):
+    """Cut an MP3 stream in segments of `segment_seconds` on frame boundaries, without decoding it.
+
+    Segments start at multiples of `segment_seconds`, or at `segment_starts` (in seconds) when
+    given, to the next frame, so they don't drift from their timestamps. ID3 tags, the Xing/Info frame and bytes that
+    are not part of a frame are dropped. Returns the segments as bytes, an empty list if `data`
+    holds no MP3 frames.
+    """
+    offset = 0
+    # ID3v2 tag: 10-byte header, then a syncsafe size (plus a 10-byte footer if flagged)
+    if data[:3] == b"ID3" and len(data) >= 10:
+        offset = 10 + ((data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9])
+        if data[5] & 0x10:
+            offset += 10
+
+    segments = []
+    frames = []
+    elapsed = 0.0
+    cuts = list(segment_starts[1:]) if segment_starts is not None else None
+    is_first_frame = True
+    is_synced = False
+    while offset < len(data):
+        header = parse_mp3_frame_header(data, offset)
+        # A header found while resyncing must be followed by another frame (or the end of the data)
+        if header and not is_synced and offset + header[0] < len(data):
+            header = header if parse_mp3_frame_header(data, offset + header[0]) else None
+        if not header or offset + header[0] > len(data):
+            is_synced = False
+            offset += 1
+            continue
+
+        is_synced = True
+        length, duration = header
+        frame = data[offset : offset + length]
+        offset += length
+
+        if is_first_frame:
+            is_first_frame = False
+            # The VBR header frame is silent and describes the whole file, not a segment
+            if b"Xing" in frame[:64] or b"Info" in frame[:64] or b"VBRI" in frame[:64]:
+                continue
+
+        if cuts is None:
+            next_cut = (len(segments) + 1) * segment_seconds
+        else:
+            next_cut = cuts[len(segments)] if len(segments) < len(cuts) else None
+        if frames and next_cut is not None and elapsed >= next_cut:
+            segments.append(b"".join(frames))
+            frames = []
+        frames.append(frame)
+        elapsed += duration
+
+    if frames:
+        segments.append(b"".join(frames))
+    return segments
+
+
+def split_audio_stream_copy(file_path, segment_seconds, segment_starts=None):
+    """Cut an audio file in segments of about `segment_seconds` with ffmpeg, without re-encoding it.
+
+    With `segment_starts` (in seconds), segments are cut at those times instead. Segments are
+    cut on packet boundaries and returned as bytes, in the container of `file_path`.
+    """
+    extension = get_encoding_profile_of_file(file_path)["extension"]
+    if segment_starts is not None and len(segment_starts) > 1:
+        cut_options = {"segment_times": ",".join(str(start) for start in segment_starts[1:])}
+    elif segment_starts is not None:
+        # A single segment, longer than any recording
+        cut_options = {"segment_time": 86400}
+    else:
+        cut_options = {"segment_time": segment_seconds}
+
+    with tempfile.TemporaryDirectory() as directory:
+        FFmpeg().option("y").input(file_path).output(
+            os.path.join(directory, f"segment_%05d.{extension}"),
+            f="segment",
+            reset_timestamps=1,
+            c="copy",
+            **cut_options,
+        ).execute()
+
+        segments = []
+        for segment_path in sorted(glob.glob(os.path.join(directory, f"segment_*.{extension}"))):
+            with open(segment_path, "rb") as f:
+                segments.append(f.read())
+        return segments
+
+
+def get_encoding_profile(name):
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown encoding profile {name}, expected one of {list(ENCODING_PROFILES)}")
+    return ENCODING_PROFILES[name]
+
+
+def get_encoding_profile_of_file(file_path):
+    """The encoding profile of a recording or clip, MP3 for unknown extensions."""
+    extension = os.path.splitext(file_path)[1].lstrip(".").lower()
+    for profile in ENCODING_PROFILES.values():
+        if profile["extension"] == extension:
+            return profile
+    return ENCODING_PROFILES["mp3"]
+
+
+def get_encoder_output_options(profile, audio_birate, audio_channels):
+    """ffmpeg output options of a capture. Profiles with a fixed bitrate or layout override the requested ones."""
+    options = {
+        "ab": profile.get("bitrate", audio_birate),
+        "ac": profile.get("channels", audio_channels),
+        "acodec": profile["codec"],
+    }
+    if "sample_rate" in profile:
+        options["ar"] = profile["sample_rate"]
+    if profile["codec"] == "libopus":
+        options["application"] = "voip"
+    return options
@@ -1,4 +1,5 @@
 import json
+import os
 from enum import StrEnum
 
 
@@ -6,6 +7,10 @@ CONFIDENCE_THRESHOLD = 95
 KB_SEARCH_MATCH_THRESHOLD = 0.3
 KB_DEDUP_SIMILARITY_THRESHOLD = 0.92
 
+# Rows the serial stage loops reserve with one round-trip. Rows reserved but not started stay in Processing
+# if the worker is killed (OOM, container stop), so only raise this for workers that don't get killed.
+RESERVATION_BATCH_SIZE = int(os.getenv("RESERVATION_BATCH_SIZE", "1"))
+
 
 class GeminiModel(StrEnum):
     GEMINI_1_5_PRO = "gemini-1.5-pro-002"
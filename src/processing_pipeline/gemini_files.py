@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import os
+import threading
+import time
+
+from google import genai
+
+from processing_pipeline.audio_utils import get_encoding_profile_of_file
+
+# Gemini deletes uploaded files after 48 hours, handles are uploaded again a bit earlier
+GEMINI_FILE_TTL_SECONDS = int(os.getenv("GEMINI_FILE_TTL_SECONDS", str(47 * 3600)))
+# Uploads that are still PROCESSING after this long are given up
+GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS = int(os.getenv("GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS", "300"))
+
+
+class GeminiFileManager:
+    """Uploads of local audio files to the Gemini Files API, shared by every phase that sends them.
+
+    A file is uploaded once, in the background as soon as `upload` is called, and its handle is
+    reused by every `get` (task retries included) until it's released or its TTL is over.
+    In Stage 1 only the initial transcription sends whole recordings: the timestamped
+    transcription sends inline segments and the redo flows send transcripts.
+    Uploads are polled with exponential backoff until Gemini has processed them. `release`
+    deletes the remote file once the audio file is processed, `close` deletes all of them.
+    """
+
+    def __init__(
+        self,
+        gemini_client: genai.Client,
+        ttl_seconds=GEMINI_FILE_TTL_SECONDS,
+        processing_timeout_seconds=GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS,
+        max_poll_interval_seconds=8,
+        max_concurrent_uploads=4,
+    ):
+        self.gemini_client = gemini_client
+        self.ttl_seconds = ttl_seconds
+        self.processing_timeout_seconds = processing_timeout_seconds
+        self.max_poll_interval_seconds = max_poll_interval_seconds
+
+        self.uploads = {}  # local file path -> {"future", "uploaded_at"}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent_uploads, thread_name_prefix="gemini-upload")
+
+    def upload(self, file_path: str):
+        """Start uploading `file_path` unless a live upload of it exists, returns right away."""
+        with self.lock:
+            upload = self.uploads.get(file_path)
+            if upload and not self.__is_expired(upload) and not self.__has_failed(upload):
+                return
+            self.uploads[file_path] = {
+                "future": self.executor.submit(contextvars.copy_context().run, self.__upload, file_path),
+                "uploaded_at": time.monotonic(),
+            }
+
+    def get(self, file_path: str):
+        """The processed Gemini file of `file_path`, uploaded if needed."""
+        self.upload(file_path)
+        with self.lock:
+            future = self.uploads[file_path]["future"]
+        return future.result()
+
+    def release(self, file_path: str):
+        """Delete the Gemini file of `file_path`, waiting for its upload to finish first."""
+        with self.lock:
+            upload = self.uploads.pop(file_path, None)
+        if not upload:
+            return
+
+        try:
+            uploaded_file = upload["future"].result()
+        except Exception:
+            # Nothing was uploaded, or the upload was given up and is deleted already
+            return
+
+        try:
+            self.gemini_client.files.delete(name=uploaded_file.name)
+        except Exception as e:
+            print(f"Failed to delete the Gemini file {uploaded_file.name} of {file_path}: {e}")
+
+    def close(self):
+        with self.lock:
+            file_paths = list(self.uploads)
+        for file_path in file_paths:
+            self.release(file_path)
+        self.executor.shutdown(wait=True)
+
+    def __is_expired(self, upload):
+        return time.monotonic() - upload["uploaded_at"] >= self.ttl_seconds
+
+    def __has_failed(self, upload):
+        return upload["future"].done() and upload["future"].exception() is not None
+
+    def __upload(self, file_path):
+        # Opus recordings have no extension that could be mapped to a MIME type
+        uploaded_file = self.gemini_client.files.upload(
+            file=file_path, config={"mime_type": get_encoding_profile_of_file(file_path)["mime_type"]}
+        )
+        print(f"Uploaded {file_path} to Gemini as {uploaded_file.name}")
+
+        started_at = time.monotonic()
+        poll_interval = 1
+        try:
+            while uploaded_file.state.name == "PROCESSING":
+                if time.monotonic() - started_at >= self.processing_timeout_seconds:
+                    raise TimeoutError(f"Gemini is still processing {uploaded_file.name} of {file_path}")
+                time.sleep(poll_interval)
+                poll_interval = min(poll_interval * 2, self.max_poll_interval_seconds)
+                uploaded_file = self.gemini_client.files.get(name=uploaded_file.name)
+
+            if uploaded_file.state.name == "FAILED":
+                raise ValueError(f"Gemini failed to process {uploaded_file.name} of {file_path}")
+        except Exception:
+            try:
+                self.gemini_client.files.delete(name=uploaded_file.name)
+            except Exception as e:
+                print(f"Failed to delete the Gemini file {uploaded_file.name} of {file_path}: {e}")
+            raise
+
+        return uploaded_file
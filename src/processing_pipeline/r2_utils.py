@@ -0,0 +1,89 @@
+import hashlib
+import os
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+MB = 1024 * 1024
+
+# Part size and parallel parts per upload. R2 (like S3) requires parts of at least 5 MB.
+R2_UPLOAD_PART_SIZE = int(os.getenv("R2_UPLOAD_PART_SIZE_MB", "8")) * MB
+R2_UPLOAD_MAX_CONCURRENCY = int(os.getenv("R2_UPLOAD_MAX_CONCURRENCY", "8"))
+
+# Connections kept open by a client, shared by every upload/download made through it
+R2_MAX_POOL_CONNECTIONS = int(os.getenv("R2_MAX_POOL_CONNECTIONS", "50"))
+
+
+class UploadVerificationError(Exception):
+    pass
+
+
+def create_r2_client():
+    """A boto3 S3 client for R2 with a connection pool large enough for parallel multipart uploads."""
+    return boto3.client(
+        "s3",
+        endpoint_url=os.getenv("R2_ENDPOINT_URL"),
+        aws_access_key_id=os.getenv("R2_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("R2_SECRET_ACCESS_KEY"),
+        config=Config(
+            max_pool_connections=R2_MAX_POOL_CONNECTIONS,
+            retries={"max_attempts": 5, "mode": "adaptive"},
+        ),
+    )
+
+
+def compute_etag(file_path, part_size):
+    """The ETag R2 reports for `file_path` when it is uploaded in parts of `part_size` bytes.
+
+    Single-part uploads get the MD5 of the content. Multipart uploads get the MD5 of the
+    concatenated part MD5s, followed by "-<number of parts>".
+    """
+    part_digests = []
+    with open(file_path, "rb") as f:
+        while part := f.read(part_size):
+            part_digests.append(hashlib.md5(part).digest())
+
+    # boto3 only switches to a multipart upload from `multipart_threshold` (= part_size) onwards
+    if os.path.getsize(file_path) < part_size:
+        return part_digests[0].hex() if part_digests else hashlib.md5(b"").hexdigest()
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+class R2Uploader:
+    """Uploads files to R2 in parallel parts and verifies the stored object against the local file.
+
+    Files smaller than `part_size` are sent in a single request. After the upload, the
+    object's size and ETag are compared with the local file, so callers can safely delete
+    the file once `upload` returns.
+    """
+
+    def __init__(self, s3_client, bucket_name, part_size=R2_UPLOAD_PART_SIZE, max_concurrency=R2_UPLOAD_MAX_CONCURRENCY):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.part_size = part_size
+        self.transfer_config = TransferConfig(
+            multipart_threshold=part_size,
+            multipart_chunksize=part_size,
+            max_concurrency=max_concurrency,
+            use_threads=True,
+        )
+
+    def upload(self, file_path, destination_path):
+        expected_etag = compute_etag(file_path, self.part_size)
+        file_size = os.path.getsize(file_path)
+
+        self.s3_client.upload_file(file_path, self.bucket_name, destination_path, Config=self.transfer_config)
+        self.verify(destination_path, file_size, expected_etag)
+        return destination_path
+
+    def verify(self, destination_path, file_size, expected_etag):
+        head = self.s3_client.head_object(Bucket=self.bucket_name, Key=destination_path)
+
+        etag = head["ETag"].strip('"')
+        if head["ContentLength"] != file_size or etag != expected_etag:
+            raise UploadVerificationError(
+                f"Uploaded object {destination_path} does not match the local file: "
+                f"expected {file_size} bytes with ETag {expected_etag}, "
+                f"got {head['ContentLength']} bytes with ETag {etag}"
+            )
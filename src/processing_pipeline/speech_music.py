@@ -0,0 +1,127 @@
+import numpy as np
+
+from processing_pipeline.audio_utils import PCM_SAMPLE_RATE, SILENCE_FLOOR_DBFS, decode_pcm
+
+SPEECH = "speech"
+MUSIC = "music"
+SILENCE = "silence"
+
+# 32 ms frames at 8 kHz
+FRAME_SIZE = 256
+# Segments quieter than this on average are silence
+SILENCE_THRESHOLD_DBFS = -50.0
+# Quiet frames in a row that make a pause (~160 ms) for segmentation
+PAUSE_FRAMES = 5
+# Speech modulates its loudness at the syllable rate, faster than the beat of most music
+SYLLABLE_RATE_HZ = (3.0, 6.0)
+
+# Logistic model of the speech probability over (low-energy ratio, ZCR variation, syllabic modulation).
+# The weights are hand-tuned: speech pauses between words, alternates voiced and
+# unvoiced sounds and pulses at the syllable rate, while music keeps a steady level and timbre.
+SPEECH_MODEL_WEIGHTS = np.array([6.0, 1.5, 4.0])
+SPEECH_MODEL_BIAS = -4.0
+# Segments are only called music below this speech probability, talk over a music bed stays speech
+MUSIC_MAX_SPEECH_PROBABILITY = 0.2
+
+
+def compute_speech_features(samples, sample_rate=PCM_SAMPLE_RATE):
+    """Features of mono 16-bit `samples` that tell speech from music, in the order of SPEECH_MODEL_WEIGHTS.
+
+    Returns None if `samples` is shorter than 8 frames.
+    """
+    frame_count = len(samples) // FRAME_SIZE
+    if frame_count < 8:
+        return None
+
+    frames = samples[: frame_count * FRAME_SIZE].reshape(frame_count, FRAME_SIZE).astype(np.float32) / 32768
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+
+    # Share of the frames much quieter than the average, the pauses of speech
+    low_energy_ratio = float(np.mean(rms < 0.5 * np.mean(rms)))
+
+    # Coefficient of variation of the zero-crossing rate, high when voiced and unvoiced sounds alternate
+    zcr = np.mean(np.abs(np.diff(np.signbit(frames), axis=1)), axis=1)
+    zcr_variation = float(np.std(zcr) / (np.mean(zcr) + 1e-6))
+
+    # Share of the loudness modulation at syllable rates
+    envelope = rms - np.mean(rms)
+    modulation = np.abs(np.fft.rfft(envelope)) ** 2
+    rates = np.fft.rfftfreq(frame_count, d=FRAME_SIZE / sample_rate)
+    syllabic = (rates >= SYLLABLE_RATE_HZ[0]) & (rates <= SYLLABLE_RATE_HZ[1])
+    syllabic_modulation = float(np.sum(modulation[syllabic]) / (np.sum(modulation[1:]) + 1e-12))
+
+    return np.array([low_energy_ratio, min(zcr_variation, 2.0), syllabic_modulation])
+
+
+def get_speech_probability(features):
+    return float(1 / (1 + np.exp(-(SPEECH_MODEL_BIAS + np.dot(SPEECH_MODEL_WEIGHTS, features)))))
+
+
+def classify_samples(samples, sample_rate=PCM_SAMPLE_RATE):
+    """SPEECH, MUSIC or SILENCE for mono 16-bit `samples`."""
+    if len(samples) == 0:
+        return SILENCE
+
+    rms = np.sqrt(np.mean(np.square(samples.astype(np.float32) / 32768)))
+    dbfs = 20 * np.log10(rms) if rms > 0 else SILENCE_FLOOR_DBFS
+    if dbfs < SILENCE_THRESHOLD_DBFS:
+        return SILENCE
+
+    features = compute_speech_features(samples, sample_rate)
+    # Too short to tell, let the transcription decide
+    if features is None:
+        return SPEECH
+    return MUSIC if get_speech_probability(features) < MUSIC_MAX_SPEECH_PROBABILITY else SPEECH
+
+
+def find_segment_starts(samples, max_segment_seconds, min_segment_seconds, sample_rate=PCM_SAMPLE_RATE):
+    """Start (in seconds) of segments of at most `max_segment_seconds`, cut at pauses.
+
+    Every segment ends at the quietest moment between `min_segment_seconds` and
+    `max_segment_seconds` after its start, so words aren't cut in half.
+    """
+    if len(samples) == 0:
+        return []
+    frame_count = len(samples) // FRAME_SIZE
+
+    frame_seconds = FRAME_SIZE / sample_rate
+    max_frames = int(max_segment_seconds / frame_seconds)
+    min_frames = int(min_segment_seconds / frame_seconds)
+
+    frames = samples[: frame_count * FRAME_SIZE].reshape(frame_count, FRAME_SIZE).astype(np.float32) / 32768
+    energy = np.mean(np.square(frames), axis=1)
+    # Pauses between words and sentences last a few frames, single quiet frames within words don't count
+    kernel = np.ones(PAUSE_FRAMES) / PAUSE_FRAMES
+    smoothed = np.convolve(energy, kernel, mode="same")
+
+    starts = [0.0]
+    start = 0
+    while len(samples) / sample_rate - start * frame_seconds > max_segment_seconds:
+        window = smoothed[start + min_frames : start + max_frames + 1]
+        if len(window) == 0:
+            break
+        start += min_frames + int(np.argmin(window))
+        starts.append(round(start * frame_seconds, 3))
+    return starts
+
+
+def classify_segments(samples, segment_starts, sample_rate=PCM_SAMPLE_RATE):
+    """Label the segments of mono 16-bit `samples` that start at `segment_starts` (in seconds)."""
+    bounds = [int(start * sample_rate) for start in segment_starts] + [len(samples)]
+    return [classify_samples(samples[start:end], sample_rate) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def segment_audio_file(file_path, max_segment_seconds, min_segment_seconds=None):
+    """Segments of an audio file, as dicts with their `start` (in seconds) and `label`.
+
+    With `min_segment_seconds`, segments are cut at pauses, otherwise every `max_segment_seconds`.
+    """
+    samples = decode_pcm(file_path)
+    if min_segment_seconds is None:
+        duration = len(samples) / PCM_SAMPLE_RATE
+        segment_starts = [float(start) for start in np.arange(0, duration, max_segment_seconds)]
+    else:
+        segment_starts = find_segment_starts(samples, max_segment_seconds, min_segment_seconds)
+
+    labels = classify_segments(samples, segment_starts)
+    return [{"start": start, "label": label} for start, label in zip(segment_starts, labels)]
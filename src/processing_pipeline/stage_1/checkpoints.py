@@ -0,0 +1,54 @@
+"""Checkpoints of the timestamped transcription, so a retry only transcribes the missing batches."""
+
+from processing_pipeline.supabase_utils import SupabaseClient
+
+
+class TimestampedTranscriptionCheckpoints:
+    """Transcripts of the finished batches of one audio file, for one prompt version and segment length.
+
+    Checkpoints are a cache: failing to load or save them never fails the transcription, the
+    batches are then transcribed again.
+    """
+
+    def __init__(
+        self,
+        supabase_client: SupabaseClient,
+        audio_file_id: str,
+        prompt_version_id: str,
+        segment_length: int,
+    ):
+        self.supabase_client = supabase_client
+        self.audio_file_id = audio_file_id
+        self.prompt_version_id = prompt_version_id
+        self.segment_length = segment_length
+
+    def load(self) -> dict:
+        """The checkpointed transcripts by absolute (1-based) segment number."""
+        try:
+            checkpoints = self.supabase_client.get_timestamped_transcription_checkpoints(
+                self.audio_file_id, self.prompt_version_id, self.segment_length
+            )
+        except Exception as e:
+            print(f"[Checkpoints] Failed to load the checkpoints of {self.audio_file_id}: {e}")
+            return {}
+
+        transcripts = {}
+        for checkpoint in checkpoints:
+            for i, transcript in enumerate(checkpoint["transcripts"]):
+                transcripts[checkpoint["segment_start"] + i + 1] = transcript
+        if transcripts:
+            print(f"[Checkpoints] Resuming {self.audio_file_id} with {len(transcripts)} transcribed segments")
+        return transcripts
+
+    def save(self, batch_start: int, transcripts: dict):
+        """Store the transcripts of a batch, given by absolute segment number."""
+        try:
+            self.supabase_client.upsert_timestamped_transcription_checkpoint(
+                self.audio_file_id,
+                self.prompt_version_id,
+                self.segment_length,
+                batch_start,
+                [transcripts[segment_num] for segment_num in sorted(transcripts)],
+            )
+        except Exception as e:
+            print(f"[Checkpoints] Failed to save segments {batch_start + 1}-{batch_start + len(transcripts)}: {e}")
@@ -1,8 +1,55 @@
+import json
+import os
 from enum import StrEnum
 
 KB_STAGE1_CHUNK_SIZE = 2000
 KB_STAGE1_MATCH_COUNT_PER_CHUNK = 5
 
+# Audio files processed at the same time by one flow run, Stage 1 mostly waits on LLM calls
+STAGE_1_CONCURRENCY = int(os.getenv("STAGE_1_CONCURRENCY", "4"))
+
+# Batches of segments of one audio file that are transcribed at the same time
+TIMESTAMPED_TRANSCRIPTION_CONCURRENCY = int(os.getenv("TIMESTAMPED_TRANSCRIPTION_CONCURRENCY", "4"))
+
+# Length of the segments of the timestamped transcription, in seconds
+TIMESTAMPED_TRANSCRIPTION_SEGMENT_LENGTH = 20
+
+# A batch size learned from split batches doubles again after this many batches of that size went through,
+# so that one unusually dense hour doesn't shrink the batches of a station for good
+TIMESTAMPED_TRANSCRIPTION_BATCH_SIZE_RECOVERY = 10
+
+# Audio sent to Gemini in one batch of the timestamped transcription, in seconds (30 segments of 20 seconds)
+TIMESTAMPED_TRANSCRIPTION_MAX_BATCH_SECONDS = 600
+
+# Segments are cut at pauses instead, between these lengths (in seconds), so words aren't cut in half
+VAD_SEGMENTATION = os.getenv("STAGE_1_VAD_SEGMENTATION", "false").lower() == "true"
+VAD_MIN_SEGMENT_LENGTH = 10
+VAD_MAX_SEGMENT_LENGTH = 30
+
+# Segments classified as music or silence are not sent to Gemini, the transcript only notes them.
+# Off by default: the speech/music classifier has hand-set weights and isn't checked on labelled airchecks yet.
+SKIP_NON_SPEECH_SEGMENTS = os.getenv("STAGE_1_SKIP_NON_SPEECH_SEGMENTS", "false").lower() == "true"
+
+
+# Local Whisper model (faster-whisper, int8 on CPU) of the local transcriptor
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "small")
+LOCAL_WHISPER_CPU_THREADS = int(os.getenv("LOCAL_WHISPER_CPU_THREADS", "4"))
+
+
+class TimestampedTranscriptor(StrEnum):
+    GEMINI = "gemini"
+    LOCAL_WHISPER = "local_whisper"
+
+
+# Transcriptor of the timestamped transcription, by default and per radio station code (JSON object)
+TIMESTAMPED_TRANSCRIPTOR = TimestampedTranscriptor(os.getenv("TIMESTAMPED_TRANSCRIPTOR", "gemini"))
+TIMESTAMPED_TRANSCRIPTOR_BY_STATION = {
+    station: TimestampedTranscriptor(transcriptor)
+    for station, transcriptor in json.loads(os.getenv("TIMESTAMPED_TRANSCRIPTOR_BY_STATION", "{}")).items()
+}
+# Transcriptor used when Gemini is rate-limited, none by default
+TIMESTAMPED_TRANSCRIPTOR_FALLBACK = os.getenv("TIMESTAMPED_TRANSCRIPTOR_FALLBACK") or None
+
 
 class Stage1SubStage(StrEnum):
     INITIAL_TRANSCRIPTION = "initial_transcription"
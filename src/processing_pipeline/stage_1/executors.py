@@ -1,7 +1,7 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import json
-import os
-import pathlib
-import time
+import threading
 
 from google import genai
 from google.genai.types import (
@@ -11,10 +11,19 @@ from google.genai.types import (
     ThinkingConfig,
 )
 from prefect.tasks import exponential_backoff
-from pydub import AudioSegment
 
+from processing_pipeline.audio_utils import get_encoding_profile_of_file, split_audio_stream_copy, split_mp3_frames
 from processing_pipeline.constants import GeminiModel
+from processing_pipeline.gemini_files import GeminiFileManager
 from processing_pipeline.processing_utils import get_safety_settings
+from processing_pipeline.speech_music import MUSIC, SILENCE
+from processing_pipeline.stage_1.checkpoints import TimestampedTranscriptionCheckpoints
+from processing_pipeline.stage_1.constants import (
+    LOCAL_WHISPER_CPU_THREADS,
+    LOCAL_WHISPER_MODEL,
+    TIMESTAMPED_TRANSCRIPTION_BATCH_SIZE_RECOVERY,
+    TIMESTAMPED_TRANSCRIPTION_CONCURRENCY,
+)
 from utils import optional_task
 
 
@@ -27,14 +36,13 @@ class Stage1PreprocessTranscriptionExecutor:
         audio_file: str,
         model_name: GeminiModel,
         prompt_version: dict,
+        gemini_files: GeminiFileManager | None = None,
     ):
-        # Upload the audio file and wait for it to finish processing
-        uploaded_file = gemini_client.files.upload(file=audio_file)
-
-        while uploaded_file.state.name == "PROCESSING":
-            print("Processing the uploaded audio file...")
-            time.sleep(1)
-            uploaded_file = gemini_client.files.get(name=uploaded_file.name)
+        # The upload is shared with the retries of this phase when it's managed by the flow run
+        owns_upload = gemini_files is None
+        if owns_upload:
+            gemini_files = GeminiFileManager(gemini_client, max_concurrent_uploads=1)
+        uploaded_file = gemini_files.get(audio_file)
 
         try:
             result = gemini_client.models.generate_content(
@@ -58,7 +66,8 @@ class Stage1PreprocessTranscriptionExecutor:
 
             return result.parsed
         finally:
-            gemini_client.files.delete(name=uploaded_file.name)
+            if owns_upload:
+                gemini_files.close()
 
 
 class Stage1PreprocessDetectionExecutor:
@@ -144,7 +153,31 @@ class Stage1Executor:
         return result.parsed
 
 
+# What the timestamped transcription says for segments that weren't transcribed
+NON_SPEECH_NOTES = {MUSIC: "[Music]", SILENCE: "[Silence]"}
+
+
+class BatchTooLargeError(ValueError):
+    """Gemini couldn't transcribe every segment of a batch, a smaller batch may succeed."""
+
+
+def retry_unless_batch_too_large(task, task_run, state) -> bool:
+    # A truncated batch fails the same way when it's retried as is, it's split instead
+    try:
+        state.result()
+    except BatchTooLargeError:
+        return False
+    except Exception:
+        return True
+    return True
+
+
 class GeminiTimestampTranscriptionGenerator:
+    # Batch size that worked for each key (e.g. a radio station), learned from split batches,
+    # and the batches of that size that went through since it was learned or last grown
+    batch_sizes = {}
+    batch_size_successes = {}
+    batch_sizes_lock = threading.Lock()
 
     @classmethod
     def run(
@@ -155,74 +188,228 @@ class GeminiTimestampTranscriptionGenerator:
         prompt_version: dict,
         segment_length: int = 20,
         batch_size: int = 30,
+        concurrency: int = TIMESTAMPED_TRANSCRIPTION_CONCURRENCY,
+        batch_size_key: str | None = None,
+        checkpoints: TimestampedTranscriptionCheckpoints | None = None,
+        audio_segments: list | None = None,
     ) -> str:
-        # Split audio into segments
-        segment_paths = cls.split_audio_into_segments(audio_file, segment_length * 1000)
-        total_segments = len(segment_paths)
-        print(f"Split audio into {total_segments} segments of {segment_length}s each")
-
-        all_transcripts = {}  # segment_number -> transcript
-
-        try:
-            for batch_start in range(0, total_segments, batch_size):
-                batch_end = min(batch_start + batch_size, total_segments)
-                batch_paths = segment_paths[batch_start:batch_end]
-
-                print(f"Processing batch: segments {batch_start + 1}-{batch_end} of {total_segments}")
-
-                result = cls.transcribe_batch(
+        """Timestamped transcription of an audio file.
+
+        The audio is cut every `segment_length` seconds, or at the `start` of the given
+        `audio_segments`, whose `label` tells which segments have no speech to transcribe.
+        """
+        batch_size = cls.get_batch_size(batch_size_key, batch_size)
+
+        # Split audio into segments, kept in memory
+        segment_starts = [audio_segment["start"] for audio_segment in audio_segments] if audio_segments else None
+        segments = cls.split_audio_into_segments(audio_file, segment_length * 1000, segment_starts)
+        total_segments = len(segments)
+        print(f"Split audio into {total_segments} segments of up to {segment_length}s each, {batch_size} per batch")
+
+        # segment_number -> transcript, starting from the batches of a previous attempt
+        all_transcripts = {
+            segment_num: transcript
+            for segment_num, transcript in (checkpoints.load() if checkpoints else {}).items()
+            if segment_num <= total_segments
+        }
+
+        # Music and silence aren't transcribed, they're only noted so that the timestamps stay aligned
+        skipped = 0
+        for i, audio_segment in enumerate((audio_segments or [])[:total_segments]):
+            if audio_segment["label"] in NON_SPEECH_NOTES and (i + 1) not in all_transcripts:
+                all_transcripts[i + 1] = NON_SPEECH_NOTES[audio_segment["label"]]
+                skipped += 1
+        if skipped:
+            print(f"Skipping {skipped} segments without speech")
+
+        # Batches are independent, a bounded pool caps the number of concurrent Gemini calls
+        batches = cls.get_missing_batches(total_segments, batch_size, all_transcripts)
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    cls.transcribe_segments,
                     gemini_client,
-                    batch_paths,
+                    segments[batch_start:batch_end],
+                    batch_start,
+                    total_segments,
                     model_name,
                     prompt_version,
+                    batch_size_key,
+                    checkpoints,
                 )
+                for batch_start, batch_end in batches
+            ]
+
+            try:
+                for future in futures:
+                    all_transcripts.update(future.result())
+            except BaseException:
+                # The audio file failed, don't start the batches that are still waiting
+                for future in futures:
+                    future.cancel()
+                raise
+
+        return cls.format_final_transcription(
+            all_transcripts, segment_length, {i + 1: segment["start"] for i, segment in enumerate(segments)}
+        )
 
-                # Validate segment count
-                returned_segments = result.get("segments", [])
-                expected_count = len(batch_paths)
-                actual_count = len(returned_segments)
-                if actual_count != expected_count:
-                    raise ValueError(
-                        f"Segment count mismatch: expected {expected_count} segments, "
-                        f"got {actual_count} (batch_start={batch_start})"
+    @classmethod
+    def get_missing_batches(cls, total_segments: int, batch_size: int, transcripts: dict) -> list:
+        """(start, end) indexes of the batches covering the segments without transcript.
+
+        Every run of consecutive missing segments is split in batches of `batch_size`.
+        """
+        batches = []
+        batch_start = None
+        for i in range(total_segments + 1):
+            is_missing = i < total_segments and (i + 1) not in transcripts
+            if is_missing and batch_start is None:
+                batch_start = i
+            if batch_start is not None and (not is_missing or i - batch_start == batch_size):
+                batches.append((batch_start, i))
+                batch_start = i if is_missing else None
+        return batches
+
+    @classmethod
+    def transcribe_segments(
+        cls,
+        gemini_client: genai.Client,
+        segments: list,
+        batch_start: int,
+        total_segments: int,
+        model_name: GeminiModel,
+        prompt_version: dict,
+        batch_size_key: str | None = None,
+        checkpoints: TimestampedTranscriptionCheckpoints | None = None,
+    ) -> dict:
+        """Transcribe one batch of segments, returns the transcripts by absolute segment number.
+
+        A batch that comes back truncated or with missing segments is split in half, and the
+        halves are transcribed on their own (recursively). The size that worked is remembered
+        for `batch_size_key`, and grows back once batches of that size keep going through.
+        Every transcribed batch is saved to `checkpoints`.
+        """
+        batch_end = batch_start + len(segments)
+        print(f"Processing batch: segments {batch_start + 1}-{batch_end} of {total_segments}")
+
+        try:
+            result = cls.transcribe_batch(
+                gemini_client,
+                segments,
+                model_name,
+                prompt_version,
+            )
+            transcripts = cls.get_transcripts_of_batch(result, len(segments), batch_start)
+        except BatchTooLargeError as e:
+            if len(segments) == 1:
+                raise
+
+            half = (len(segments) + 1) // 2
+            print(f"Splitting segments {batch_start + 1}-{batch_end} in batches of {half}: {e}")
+            cls.set_batch_size(batch_size_key, half)
+
+            transcripts = {}
+            for start in range(0, len(segments), half):
+                transcripts.update(
+                    cls.transcribe_segments(
+                        gemini_client,
+                        segments[start : start + half],
+                        batch_start + start,
+                        total_segments,
+                        model_name,
+                        prompt_version,
+                        batch_size_key,
+                        checkpoints,
                     )
+                )
+            return transcripts
 
-                for segment in returned_segments:
-                    segment_num = segment["segment_number"]
-                    if segment_num < 1 or segment_num > expected_count:
-                        raise ValueError(
-                            f"Invalid segment_number {segment_num}: expected range 1-{expected_count} "
-                            f"(batch_start={batch_start})"
-                        )
-                    absolute_segment_num = batch_start + segment_num
-                    all_transcripts[absolute_segment_num] = segment["transcript"]
+        if checkpoints:
+            checkpoints.save(batch_start, transcripts)
+        cls.record_batch_success(batch_size_key, len(segments))
 
-                print(f"Batch complete: transcribed {actual_count} segments")
-                time.sleep(2)
+        print(f"Batch complete: transcribed {len(transcripts)} segments ({batch_start + 1}-{batch_end})")
+        return transcripts
 
-        finally:
-            for segment_path in segment_paths:
-                if os.path.exists(segment_path):
-                    os.remove(segment_path)
+    @classmethod
+    def get_transcripts_of_batch(cls, result: dict, expected_count: int, batch_start: int) -> dict:
+        # Validate segment count
+        returned_segments = result.get("segments", [])
+        actual_count = len(returned_segments)
+        if actual_count != expected_count:
+            raise BatchTooLargeError(
+                f"Segment count mismatch: expected {expected_count} segments, "
+                f"got {actual_count} (batch_start={batch_start})"
+            )
 
-        return cls.format_final_transcription(all_transcripts, segment_length)
+        transcripts = {}
+        for segment in returned_segments:
+            segment_num = segment["segment_number"]
+            if segment_num < 1 or segment_num > expected_count:
+                raise ValueError(
+                    f"Invalid segment_number {segment_num}: expected range 1-{expected_count} "
+                    f"(batch_start={batch_start})"
+                )
+            absolute_segment_num = batch_start + segment_num
+            transcripts[absolute_segment_num] = segment["transcript"]
+        return transcripts
+
+    @classmethod
+    def get_batch_size(cls, key: str | None, default: int) -> int:
+        with cls.batch_sizes_lock:
+            return min(cls.batch_sizes.get(key, default), default) if key else default
 
     @classmethod
-    @optional_task(log_prints=True, retries=3, retry_delay_seconds=exponential_backoff(backoff_factor=2))
+    def set_batch_size(cls, key: str | None, batch_size: int):
+        if not key:
+            return
+        with cls.batch_sizes_lock:
+            if batch_size < cls.batch_sizes.get(key, batch_size + 1):
+                print(f"Transcribing {key} in batches of {batch_size} segments from now on")
+                cls.batch_sizes[key] = batch_size
+                cls.batch_size_successes[key] = 0
+
+    @classmethod
+    def record_batch_success(cls, key: str | None, batch_length: int):
+        """Double the learned batch size of `key` after enough batches of that size went through."""
+        if not key:
+            return
+        with cls.batch_sizes_lock:
+            batch_size = cls.batch_sizes.get(key)
+            # Smaller batches (e.g. the last one of a file) don't tell whether the size can grow
+            if batch_size is None or batch_length < batch_size:
+                return
+            cls.batch_size_successes[key] = cls.batch_size_successes.get(key, 0) + 1
+            if cls.batch_size_successes[key] >= TIMESTAMPED_TRANSCRIPTION_BATCH_SIZE_RECOVERY:
+                # get_batch_size caps it at the default, batches larger than the default never count
+                print(f"Transcribing {key} in batches of up to {batch_size * 2} segments from now on")
+                cls.batch_sizes[key] = batch_size * 2
+                cls.batch_size_successes[key] = 0
+
+    @classmethod
+    @optional_task(
+        log_prints=True,
+        retries=3,
+        retry_delay_seconds=exponential_backoff(backoff_factor=2),
+        retry_condition_fn=retry_unless_batch_too_large,
+    )
     def transcribe_batch(
         cls,
         gemini_client: genai.Client,
-        segment_paths: list,
+        segments: list,
         model_name: GeminiModel,
         prompt_version: dict,
     ):
-        segments = []
-        for i, segment_path in enumerate(segment_paths):
+        # Segments are sent inline rather than as clips of the uploaded recording: the prompt numbers
+        # every segment as its own part, and Gemini only clips uploaded files that are video
+        contents = []
+        for i, segment in enumerate(segments):
             segment_num = i + 1
-            segments.extend(
+            contents.extend(
                 [
                     f"\n<Segment {segment_num}>\n",
-                    Part.from_bytes(data=pathlib.Path(segment_path).read_bytes(), mime_type="audio/mp3"),
+                    Part.from_bytes(data=segment["data"], mime_type=segment["mime_type"]),
                     f"\n</Segment {segment_num}>\n\n",
                 ]
             )
@@ -231,7 +418,7 @@ class GeminiTimestampTranscriptionGenerator:
 
         result = gemini_client.models.generate_content(
             model=model_name,
-            contents=[prompt_version["user_prompt"]] + segments,
+            contents=[prompt_version["user_prompt"]] + contents,
             config=GenerateContentConfig(
                 response_mime_type="application/json",
                 response_schema=prompt_version["output_schema"],
@@ -245,19 +432,25 @@ class GeminiTimestampTranscriptionGenerator:
         if not result.parsed:
             finish_reason = result.candidates[0].finish_reason if result.candidates else None
             if finish_reason == FinishReason.MAX_TOKENS:
-                raise ValueError("The response from Gemini was too long and was cut off.")
+                raise BatchTooLargeError("The response from Gemini was too long and was cut off.")
             raise ValueError(f"No response from Gemini. Finish reason: {finish_reason}.")
 
         return result.parsed
 
     @classmethod
-    def format_final_transcription(cls, transcripts: dict, segment_length: int) -> str:
+    def format_final_transcription(
+        cls, transcripts: dict, segment_length: int, segment_starts: dict | None = None
+    ) -> str:
         result = ""
 
         for segment_num in sorted(transcripts.keys()):
             transcript = transcripts[segment_num]
 
-            total_seconds = (segment_num - 1) * segment_length
+            # Segments cut at pauses start at their own offset, fixed ones every segment_length
+            if segment_starts and segment_num in segment_starts:
+                total_seconds = int(segment_starts[segment_num])
+            else:
+                total_seconds = (segment_num - 1) * segment_length
             minutes = total_seconds // 60
             seconds = total_seconds % 60
 
@@ -266,22 +459,125 @@ class GeminiTimestampTranscriptionGenerator:
         return result
 
     @classmethod
-    def split_audio_into_segments(cls, audio_file: str, segment_length_ms: int) -> list:
-        audio = AudioSegment.from_mp3(audio_file)
-        segments = []
+    def split_audio_into_segments(
+        cls, audio_file: str, segment_length_ms: int, segment_starts: list | None = None
+    ) -> list:
+        """Cut the recording in segments without decoding or re-encoding it.
+
+        Segments are cut every `segment_length_ms`, or at `segment_starts` (in seconds) when given.
+        They keep the encoding of the recording (e.g. low-bitrate Opus) and are returned in memory,
+        as dicts with the `data`, `mime_type` and `start` (in seconds) of each segment. MP3 is cut
+        frame by frame in Python, other containers with an ffmpeg stream copy.
+        """
+        profile = get_encoding_profile_of_file(audio_file)
+        segment_seconds = segment_length_ms / 1000
+
+        chunks = []
+        if profile["extension"] == "mp3":
+            with open(audio_file, "rb") as f:
+                chunks = split_mp3_frames(f.read(), segment_seconds, segment_starts)
+        if not chunks:
+            chunks = split_audio_stream_copy(audio_file, segment_seconds, segment_starts)
+
+        return [
+            {
+                "data": chunk,
+                "mime_type": profile["mime_type"],
+                "start": segment_starts[i] if segment_starts and i < len(segment_starts) else i * segment_seconds,
+            }
+            for i, chunk in enumerate(chunks)
+        ]
+
+
+class LocalWhisperTimestampTranscriptionGenerator:
+    """Timestamped transcription on the CPU, with faster-whisper (CTranslate2) and int8 weights.
+
+    It produces the same transcription as GeminiTimestampTranscriptionGenerator, without any
+    API call, e.g. for stations with a lot of recordings or when Gemini is rate-limited.
+    """
+
+    # Loaded models by size, shared by every audio file of the process
+    models = {}
+    models_lock = threading.Lock()
 
-        audio_length_ms = len(audio)
-        print(f"Audio duration: {audio_length_ms / 1000:.1f} seconds")
+    @classmethod
+    def get_name(cls, model_size: str = LOCAL_WHISPER_MODEL) -> str:
+        return f"faster-whisper-{model_size}-int8"
 
-        for i in range(0, audio_length_ms, segment_length_ms):
-            # Slice the audio segment
-            subclip = audio[i : min(i + segment_length_ms, audio_length_ms)]
+    @classmethod
+    def get_model(cls, model_size: str):
+        with cls.models_lock:
+            if model_size not in cls.models:
+                try:
+                    from faster_whisper import WhisperModel
+                except ImportError as e:
+                    raise ValueError(
+                        "The local transcriptor needs faster-whisper: pip install -r requirements-local-transcriptor.txt"
+                    ) from e
 
-            # Export the subclip
-            output_file = f"{audio_file}_segment_{(i // segment_length_ms) + 1}.mp3"
-            subclip.export(output_file, format="mp3")
+                print(f"Loading the {model_size} Whisper model (int8, CPU)")
+                cls.models[model_size] = WhisperModel(
+                    model_size, device="cpu", compute_type="int8", cpu_threads=LOCAL_WHISPER_CPU_THREADS
+                )
+            return cls.models[model_size]
 
-            segments.append(output_file)
+    @classmethod
+    def run(
+        cls,
+        audio_file: str,
+        segment_length: int = 20,
+        audio_segments: list | None = None,
+        model_size: str = LOCAL_WHISPER_MODEL,
+    ) -> str:
+        """Timestamped transcription of an audio file.
+
+        With `audio_segments`, only the speech segments are decoded and the others are noted,
+        each line of the transcription being one of the segments. Otherwise Whisper's own VAD
+        skips the pauses and each line is one of the phrases it found.
+        """
+        transcripts = {}
+        segment_starts = {}
+
+        if audio_segments:
+            speech_segments = [
+                i for i, audio_segment in enumerate(audio_segments) if audio_segment["label"] not in NON_SPEECH_NOTES
+            ]
+            for i, audio_segment in enumerate(audio_segments):
+                segment_starts[i + 1] = audio_segment["start"]
+                if audio_segment["label"] in NON_SPEECH_NOTES:
+                    transcripts[i + 1] = NON_SPEECH_NOTES[audio_segment["label"]]
+
+            # Start and end (in seconds) of every speech segment, the last one runs to the end of the file
+            clip_timestamps = []
+            for i in speech_segments:
+                clip_timestamps.append(audio_segments[i]["start"])
+                if i + 1 < len(audio_segments):
+                    clip_timestamps.append(audio_segments[i + 1]["start"])
+            print(f"Transcribing {len(speech_segments)} of {len(audio_segments)} segments locally")
+
+            if speech_segments:
+                phrases = cls.transcribe(audio_file, model_size, clip_timestamps=clip_timestamps)
+                bounds = [audio_segment["start"] for audio_segment in audio_segments[1:]]
+                for phrase in phrases:
+                    # The phrase goes to the segment it starts in
+                    segment_num = 1 + sum(1 for bound in bounds if phrase["start"] >= bound)
+                    if segment_num - 1 in speech_segments:
+                        transcripts[segment_num] = f"{transcripts.get(segment_num, '')} {phrase['text']}".strip()
+        else:
+            for i, phrase in enumerate(cls.transcribe(audio_file, model_size, vad_filter=True)):
+                transcripts[i + 1] = phrase["text"]
+                segment_starts[i + 1] = phrase["start"]
+
+        return GeminiTimestampTranscriptionGenerator.format_final_transcription(
+            transcripts, segment_length, segment_starts
+        )
 
-        del audio
-        return segments
+    @classmethod
+    def transcribe(cls, audio_file: str, model_size: str, **options) -> list:
+        """Phrases of the audio file, as dicts with their `start` (in seconds) and `text`."""
+        model = cls.get_model(model_size)
+        segments, info = model.transcribe(audio_file, beam_size=1, condition_on_previous_text=False, **options)
+        print(f"Detected language {info.language} ({info.language_probability:.2f}) of {audio_file}")
+
+        # Segments are decoded lazily, as they're iterated
+        return [{"start": segment.start, "text": segment.text.strip()} for segment in segments if segment.text.strip()]
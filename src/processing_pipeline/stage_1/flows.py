@@ -1,6 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 from datetime import datetime
 import json
 import os
+import threading
 import time
 
 import boto3
@@ -11,22 +14,25 @@ from prefect.client.schemas import FlowRun, State
 from prefect.task_runners import ConcurrentTaskRunner
 
 from processing_pipeline.constants import GeminiModel, ProcessingStatus, PromptStage
-from processing_pipeline.stage_1.constants import Stage1SubStage
+from processing_pipeline.gemini_files import GeminiFileManager
+from processing_pipeline.stage_1.constants import STAGE_1_CONCURRENCY, Stage1SubStage
 from processing_pipeline.stage_1.tasks import (
     delete_stage_1_llm_responses,
+    delete_timestamped_transcription_checkpoints,
     disinformation_detection_with_gemini,
     download_audio_file_from_s3,
-    fetch_a_new_audio_file_from_supabase,
+    fetch_new_audio_files_from_supabase,
     fetch_audio_file_by_id,
     fetch_kb_context,
     fetch_stage_1_llm_response_by_id,
     get_audio_file_metadata,
+    plan_audio_segments,
     process_audio_file,
     reset_status_of_audio_files,
     reset_status_of_stage_1_llm_response,
     set_audio_file_status,
     set_status_of_stage_1_llm_response,
-    transcribe_audio_file_with_timestamp_with_gemini,
+    transcribe_audio_file_with_timestamp,
     update_stage_1_llm_response_detection_result,
     update_stage_1_llm_response_timestamped_transcription,
 )
@@ -53,7 +59,7 @@ def reset_audio_file_status_hook(flow: Flow, flow_run: FlowRun, state: State):
     on_crashed=[reset_audio_file_status_hook],
     on_cancellation=[reset_audio_file_status_hook],
 )
-def initial_disinformation_detection(audio_file_id, limit):
+def initial_disinformation_detection(audio_file_id, limit, concurrency=STAGE_1_CONCURRENCY):
     # Setup S3 Client
     s3_client = boto3.client(
         "s3",
@@ -72,22 +78,30 @@ def initial_disinformation_detection(audio_file_id, limit):
     openai_client = _create_openai_client()
 
     # Load prompt versions
-    initial_transcription_prompt_version = supabase_client.get_active_prompt(PromptStage.STAGE_1, Stage1SubStage.INITIAL_TRANSCRIPTION)
-    initial_detection_prompt_version = supabase_client.get_active_prompt(PromptStage.STAGE_1, Stage1SubStage.INITIAL_DETECTION)
-    transcription_prompt_version = supabase_client.get_active_prompt(PromptStage.STAGE_1, Stage1SubStage.TIMESTAMPED_TRANSCRIPTION)
-    detection_prompt_version = supabase_client.get_active_prompt(PromptStage.STAGE_1, Stage1SubStage.DISINFORMATION_DETECTION)
+    prompt_versions = dict(
+        initial_transcription_prompt_version=supabase_client.get_active_prompt(
+            PromptStage.STAGE_1, Stage1SubStage.INITIAL_TRANSCRIPTION
+        ),
+        initial_detection_prompt_version=supabase_client.get_active_prompt(
+            PromptStage.STAGE_1, Stage1SubStage.INITIAL_DETECTION
+        ),
+        transcription_prompt_version=supabase_client.get_active_prompt(
+            PromptStage.STAGE_1, Stage1SubStage.TIMESTAMPED_TRANSCRIPTION
+        ),
+        detection_prompt_version=supabase_client.get_active_prompt(
+            PromptStage.STAGE_1, Stage1SubStage.DISINFORMATION_DETECTION
+        ),
+    )
 
-    # Track the number of audio files processed
-    processed_audio_files = 0
+    # Every recording is uploaded to Gemini once, for all the phases that send it
+    gemini_files = GeminiFileManager(gemini_client, max_concurrent_uploads=max(1, concurrency)) if gemini_client else None
 
-    while True:
-        if audio_file_id:
-            audio_file = fetch_audio_file_by_id(supabase_client, audio_file_id)
-        else:
-            audio_file = fetch_a_new_audio_file_from_supabase(supabase_client)  # TODO: Retry failed audio files (Error)
+    def download_and_process(audio_file):
+        local_file = download_audio_file_from_s3(s3_client, audio_file["file_path"])
 
-        if audio_file:
-            local_file = download_audio_file_from_s3(s3_client, audio_file["file_path"])
+        try:
+            if gemini_files:
+                gemini_files.upload(local_file)
 
             # Process the audio file
             process_audio_file(
@@ -96,30 +110,95 @@ def initial_disinformation_detection(audio_file_id, limit):
                 openai_client=openai_client,
                 audio_file=audio_file,
                 local_file=local_file,
-                initial_transcription_prompt_version=initial_transcription_prompt_version,
-                initial_detection_prompt_version=initial_detection_prompt_version,
-                transcription_prompt_version=transcription_prompt_version,
-                detection_prompt_version=detection_prompt_version,
+                gemini_files=gemini_files,
+                **prompt_versions,
             )
-            processed_audio_files += 1
-            print(f"Processed {processed_audio_files}/{limit} audio files")
-
-            print(f"Delete the downloaded audio file: {local_file}")
-            os.remove(local_file)
-
-        # Break the loop if:
-        # 1. We're processing a specific audio file (audio_file_id was provided), or
-        # 2. We've reached the limit of audio files to process
-        if audio_file_id or processed_audio_files >= limit:
-            break
-
-        if audio_file:
-            sleep_time = 2
-        else:
-            sleep_time = 60
+        finally:
+            if gemini_files:
+                gemini_files.release(local_file)
+
+            # Also when processing failed, otherwise the downloads of failed files pile up on disk
+            if os.path.exists(local_file):
+                print(f"Delete the downloaded audio file: {local_file}")
+                os.remove(local_file)
+
+    # We're processing a specific audio file
+    if audio_file_id:
+        try:
+            audio_file = fetch_audio_file_by_id(supabase_client, audio_file_id)
+            if audio_file:
+                download_and_process(audio_file)
+        finally:
+            if gemini_files:
+                gemini_files.close()
+        return
 
-        print(f"Sleep for {sleep_time} seconds before the next iteration")
-        time.sleep(sleep_time)
+    # The workers download and process audio files on their own, the clients are shared.
+    # Audio files are reserved in batches for the idle workers, never more than the limit allows.
+    reserved = {"audio_files": [], "count": 0, "busy": 0, "processed": 0}
+    reserved_lock = threading.Lock()
+
+    def next_audio_file():
+        """The next reserved audio file, None if there is none right now, or False once the limit is reached."""
+        with reserved_lock:
+            if not reserved["audio_files"]:
+                remaining = limit - reserved["count"]
+                if remaining <= 0:
+                    return False
+                # TODO: Retry failed audio files (Error)
+                idle_workers = concurrency - reserved["busy"]
+                audio_files = fetch_new_audio_files_from_supabase(supabase_client, min(idle_workers, remaining))
+                reserved["audio_files"].extend(audio_files)
+                reserved["count"] += len(audio_files)
+            if not reserved["audio_files"]:
+                return None
+            reserved["busy"] += 1
+            return reserved["audio_files"].pop(0)
+
+    def run_worker(worker):
+        while (audio_file := next_audio_file()) is not False:
+            if not audio_file:
+                print(f"[Worker {worker}] Sleep for 60 seconds before the next iteration")
+                time.sleep(60)
+                continue
+
+            try:
+                download_and_process(audio_file)
+            except Exception as e:
+                # Don't leave the audio file reserved, nor stop the other workers
+                print(f"[Worker {worker}] Failed to process audio file {audio_file['id']}: {e}")
+                try:
+                    set_audio_file_status(supabase_client, audio_file["id"], ProcessingStatus.ERROR, str(e))
+                except Exception as status_error:
+                    print(f"[Worker {worker}] Failed to mark audio file {audio_file['id']} as failed: {status_error}")
+            finally:
+                # The worker is idle again whatever happened, so the next reservation counts it
+                with reserved_lock:
+                    reserved["busy"] -= 1
+                    reserved["processed"] += 1
+                    print(f"Processed {reserved['processed']}/{limit} audio files")
+
+            time.sleep(2)
+
+    concurrency = max(1, min(concurrency, limit))
+    print(f"Processing up to {limit} audio files with {concurrency} worker(s)")
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="stage-1-worker") as executor:
+        # The workers run the tasks within the flow run
+        futures = [
+            executor.submit(contextvars.copy_context().run, run_worker, worker) for worker in range(concurrency)
+        ]
+        try:
+            for future in futures:
+                future.result()
+        finally:
+            # Audio files that were reserved but not started go back to the queue
+            with reserved_lock:
+                unprocessed = [audio_file["id"] for audio_file in reserved["audio_files"]]
+                reserved["audio_files"] = []
+            if unprocessed:
+                reset_status_of_audio_files(supabase_client, unprocessed)
+            if gemini_files:
+                gemini_files.close()
 
 
 @optional_flow(name="Stage 1: Undo Disinformation Detection", log_prints=True, task_runner=ConcurrentTaskRunner)
@@ -248,16 +327,19 @@ def regenerate_timestamped_transcript(stage_1_llm_response_ids):
                 print("No flagged snippets found during the initial detection phase.")
             else:
                 # Timestamped transcription
-                transcriptor = GeminiModel.GEMINI_2_5_FLASH
-                timestamped_transcription = transcribe_audio_file_with_timestamp_with_gemini(
+                transcriptor, timestamped_transcription = transcribe_audio_file_with_timestamp(
                     gemini_client=gemini_client,
                     audio_file=local_file,
                     prompt_version=transcription_prompt_version,
-                    model_name=transcriptor,
+                    radio_station_code=audio_file["radio_station_code"],
+                    supabase_client=supabase_client,
+                    audio_file_id=audio_file["id"],
+                    audio_segments=plan_audio_segments(local_file),
                 )
                 update_stage_1_llm_response_timestamped_transcription(
                     supabase_client, id, timestamped_transcription, transcriptor
                 )
+                delete_timestamped_transcription_checkpoints(supabase_client, audio_file["id"])
 
                 # Fetch KB context using the initial transcription
                 initial_transcription = stage_1_llm_response.get("initial_transcription", "")
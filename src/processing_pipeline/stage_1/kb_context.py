@@ -27,25 +27,17 @@ def retrieve_kb_context(
     response = openai_client.embeddings.create(model="text-embedding-3-large", input=chunks)
     embeddings = [normalize_embedding(item.embedding) for item in response.data]
 
-    # Search KB for each chunk and deduplicate by entry ID
-    seen = {}
-    for embedding in embeddings:
-        results = supabase_client.search_kb_entries(
-            query_embedding=embedding,
-            match_threshold=KB_SEARCH_MATCH_THRESHOLD,
-            match_count=KB_STAGE1_MATCH_COUNT_PER_CHUNK,
-        )
-        for entry in results:
-            entry_id = entry["id"]
-            if entry_id not in seen or entry["similarity"] > seen[entry_id]["similarity"]:
-                seen[entry_id] = entry
+    # Search KB for all chunks in a single RPC, deduplicated by entry ID (sorted by similarity descending)
+    entries = supabase_client.search_kb_entries_batch(
+        query_embeddings=embeddings,
+        match_threshold=KB_SEARCH_MATCH_THRESHOLD,
+        match_count=KB_STAGE1_MATCH_COUNT_PER_CHUNK,
+    )
 
-    if not seen:
+    if not entries:
         print("[KB Context] No matching KB entries found")
         return None
 
-    # Sort by similarity descending
-    entries = sorted(seen.values(), key=lambda e: e["similarity"], reverse=True)
     print(f"[KB Context] Found {len(entries)} unique KB entries")
     return _format_kb_entries(entries)
 
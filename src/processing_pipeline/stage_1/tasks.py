@@ -1,14 +1,33 @@
+from collections import Counter
 from datetime import datetime
+from http import HTTPStatus
 import json
 import os
 import uuid
 
 from google import genai
+from google.genai import errors
 from openai import OpenAI
 
 from processing_pipeline.constants import GeminiModel, ProcessingStatus
+from processing_pipeline.gemini_files import GeminiFileManager
+from processing_pipeline.speech_music import SPEECH, segment_audio_file
+from processing_pipeline.stage_1.checkpoints import TimestampedTranscriptionCheckpoints
+from processing_pipeline.stage_1.constants import (
+    SKIP_NON_SPEECH_SEGMENTS,
+    TIMESTAMPED_TRANSCRIPTION_MAX_BATCH_SECONDS,
+    TIMESTAMPED_TRANSCRIPTION_SEGMENT_LENGTH,
+    TIMESTAMPED_TRANSCRIPTOR,
+    TIMESTAMPED_TRANSCRIPTOR_BY_STATION,
+    TIMESTAMPED_TRANSCRIPTOR_FALLBACK,
+    VAD_MAX_SEGMENT_LENGTH,
+    VAD_MIN_SEGMENT_LENGTH,
+    VAD_SEGMENTATION,
+    TimestampedTranscriptor,
+)
 from processing_pipeline.stage_1.executors import (
     GeminiTimestampTranscriptionGenerator,
+    LocalWhisperTimestampTranscriptionGenerator,
     Stage1Executor,
     Stage1PreprocessDetectionExecutor,
     Stage1PreprocessTranscriptionExecutor,
@@ -29,6 +48,16 @@ def fetch_a_new_audio_file_from_supabase(supabase_client):
         return None
 
 
+@optional_task(log_prints=True, retries=3)
+def fetch_new_audio_files_from_supabase(supabase_client, max_count):
+    audio_files = supabase_client.get_new_audio_files_and_reserve_them(max_count)
+    if audio_files:
+        print(f"Reserved {len(audio_files)} new audio file(s): {[audio_file['id'] for audio_file in audio_files]}")
+    else:
+        print("No new audio files found")
+    return audio_files
+
+
 @optional_task(log_prints=True, retries=3)
 def fetch_audio_file_by_id(supabase_client, audio_file_id):
     response = supabase_client.get_audio_file_by_id(audio_file_id)
@@ -59,7 +88,7 @@ def get_audio_file_metadata(audio_file):
 def fetch_stage_1_llm_response_by_id(supabase_client, stage_1_llm_response_id):
     response = supabase_client.get_stage_1_llm_response_by_id(
         id=stage_1_llm_response_id,
-        select="*, audio_file(radio_station_name, radio_station_code, location_state, location_city, recorded_at, recording_day_of_week, file_path)",
+        select="*, audio_file(id, radio_station_name, radio_station_code, location_state, location_city, recorded_at, recording_day_of_week, file_path)",
     )
     if response:
         return response
@@ -129,6 +158,7 @@ def initial_transcription_with_gemini(
     gemini_client: genai.Client | None,
     audio_file: str,
     prompt_version: dict,
+    gemini_files: GeminiFileManager | None = None,
 ) -> str:
     print(f"Initial transcription for audio file {audio_file} using Gemini")
     if not gemini_client:
@@ -139,6 +169,7 @@ def initial_transcription_with_gemini(
         audio_file=audio_file,
         model_name=GeminiModel.GEMINI_2_5_FLASH,
         prompt_version=prompt_version,
+        gemini_files=gemini_files,
     )
     return response["transcription"]
 
@@ -176,28 +207,138 @@ def initial_disinformation_detection_with_gemini(
     return response
 
 
+@optional_task(log_prints=True)
+def plan_audio_segments(audio_file: str):
+    """Start (in seconds) and label (speech, music or silence) of the segments of the timestamped transcription.
+
+    None if the audio file is to be cut every 20 seconds and fully transcribed.
+    """
+    if not VAD_SEGMENTATION and not SKIP_NON_SPEECH_SEGMENTS:
+        return None
+
+    try:
+        if VAD_SEGMENTATION:
+            audio_segments = segment_audio_file(audio_file, VAD_MAX_SEGMENT_LENGTH, VAD_MIN_SEGMENT_LENGTH)
+        else:
+            audio_segments = segment_audio_file(audio_file, TIMESTAMPED_TRANSCRIPTION_SEGMENT_LENGTH)
+    except Exception as e:
+        # Without a plan the audio file is cut every 20 seconds, and every segment is transcribed
+        print(f"Failed to segment {audio_file}: {e}")
+        return None
+
+    if not SKIP_NON_SPEECH_SEGMENTS:
+        for audio_segment in audio_segments:
+            audio_segment["label"] = SPEECH
+
+    labels = Counter(audio_segment["label"] for audio_segment in audio_segments)
+    print(f"Split {audio_file} in {len(audio_segments)} segments: {dict(labels)}")
+    return audio_segments
+
+
 @optional_task(log_prints=True, retries=3)
 def transcribe_audio_file_with_timestamp_with_gemini(
     gemini_client: genai.Client | None,
     audio_file: str,
     prompt_version: dict,
     model_name: GeminiModel,
+    radio_station_code: str | None = None,
+    supabase_client: SupabaseClient | None = None,
+    audio_file_id: str | None = None,
+    audio_segments: list | None = None,
 ):
     print(f"Transcribing the audio file {audio_file} using {model_name}")
     if not gemini_client:
         raise ValueError("Gemini client is not provided")
 
+    # Also keeps apart the checkpoints of segments cut at pauses and every 20 seconds
+    if audio_segments and VAD_SEGMENTATION:
+        segment_length = VAD_MAX_SEGMENT_LENGTH
+    else:
+        segment_length = TIMESTAMPED_TRANSCRIPTION_SEGMENT_LENGTH
+    # Batches transcribed by a failed attempt (including the retries of this task) aren't transcribed again
+    checkpoints = None
+    if supabase_client and audio_file_id:
+        checkpoints = TimestampedTranscriptionCheckpoints(
+            supabase_client, audio_file_id, prompt_version["id"], segment_length
+        )
+
     timestamped_transcription = GeminiTimestampTranscriptionGenerator.run(
         gemini_client=gemini_client,
         audio_file=audio_file,
         model_name=model_name,
         prompt_version=prompt_version,
-        segment_length=20,
-        batch_size=30,
+        segment_length=segment_length,
+        # Longer segments make smaller batches, so a batch never holds more audio than Gemini can transcribe
+        batch_size=max(1, TIMESTAMPED_TRANSCRIPTION_MAX_BATCH_SECONDS // segment_length),
+        # Talk-heavy stations need smaller batches to fit in the output tokens
+        batch_size_key=radio_station_code,
+        checkpoints=checkpoints,
+        audio_segments=audio_segments,
     )
     return {"timestamped_transcription": timestamped_transcription}
 
 
+@optional_task(log_prints=True, retries=1)
+def transcribe_audio_file_with_timestamp_with_local_whisper(audio_file: str, audio_segments: list | None = None):
+    print(f"Transcribing the audio file {audio_file} using {LocalWhisperTimestampTranscriptionGenerator.get_name()}")
+    timestamped_transcription = LocalWhisperTimestampTranscriptionGenerator.run(
+        audio_file=audio_file,
+        segment_length=TIMESTAMPED_TRANSCRIPTION_SEGMENT_LENGTH,
+        audio_segments=audio_segments,
+    )
+    return {"timestamped_transcription": timestamped_transcription}
+
+
+def get_timestamped_transcriptor(radio_station_code: str | None) -> TimestampedTranscriptor:
+    return TIMESTAMPED_TRANSCRIPTOR_BY_STATION.get(radio_station_code, TIMESTAMPED_TRANSCRIPTOR)
+
+
+def transcribe_audio_file_with_timestamp(
+    gemini_client: genai.Client | None,
+    audio_file: str,
+    prompt_version: dict,
+    radio_station_code: str | None = None,
+    supabase_client: SupabaseClient | None = None,
+    audio_file_id: str | None = None,
+    audio_segments: list | None = None,
+):
+    """Timestamped transcription with the transcriptor of the radio station.
+
+    Returns the name of the model that transcribed the audio file, and the transcription.
+    """
+    if get_timestamped_transcriptor(radio_station_code) == TimestampedTranscriptor.LOCAL_WHISPER:
+        return (
+            LocalWhisperTimestampTranscriptionGenerator.get_name(),
+            transcribe_audio_file_with_timestamp_with_local_whisper(audio_file, audio_segments),
+        )
+
+    try:
+        return (
+            GeminiModel.GEMINI_2_5_FLASH,
+            transcribe_audio_file_with_timestamp_with_gemini(
+                gemini_client=gemini_client,
+                audio_file=audio_file,
+                prompt_version=prompt_version,
+                model_name=GeminiModel.GEMINI_2_5_FLASH,
+                radio_station_code=radio_station_code,
+                supabase_client=supabase_client,
+                audio_file_id=audio_file_id,
+                audio_segments=audio_segments,
+            ),
+        )
+    except errors.ClientError as e:
+        if e.code != HTTPStatus.TOO_MANY_REQUESTS:
+            raise
+        if TIMESTAMPED_TRANSCRIPTOR_FALLBACK != TimestampedTranscriptor.LOCAL_WHISPER:
+            raise
+
+        print(f"Gemini is rate-limited (code {e.code}): {e.message} Falling back to the local transcriptor")
+        return (
+            LocalWhisperTimestampTranscriptionGenerator.get_name(),
+            transcribe_audio_file_with_timestamp_with_local_whisper(audio_file, audio_segments),
+        )
+
+
 @optional_task(log_prints=True, retries=3)
 def disinformation_detection_with_gemini(
     gemini_client: genai.Client | None,
@@ -254,6 +395,15 @@ def insert_stage_1_llm_response(
     )
 
 
+@optional_task(log_prints=True)
+def delete_timestamped_transcription_checkpoints(supabase_client, audio_file_id):
+    # Leftover checkpoints only take up space, they must not fail an audio file that was processed
+    try:
+        supabase_client.delete_timestamped_transcription_checkpoints(audio_file_id)
+    except Exception as e:
+        print(f"Failed to delete the transcription checkpoints of {audio_file_id}: {e}")
+
+
 @optional_task(log_prints=True, retries=3)
 def set_audio_file_status(supabase_client, audio_file_id, status: ProcessingStatus, error_message=None):
     supabase_client.set_audio_file_status(audio_file_id, status, error_message)
@@ -270,16 +420,42 @@ def process_audio_file(
     initial_detection_prompt_version: dict,
     transcription_prompt_version: dict,
     detection_prompt_version: dict,
+    gemini_files: GeminiFileManager | None = None,
 ):
     metadata = get_audio_file_metadata(audio_file)
     print(f"Metadata of the audio file:\n{json.dumps(metadata, indent=2)}\n")
 
     try:
+        # Music-only stations air long spans without speech, those aren't sent to Gemini
+        audio_segments = plan_audio_segments(local_file)
+        if audio_segments is not None and all(segment["label"] != SPEECH for segment in audio_segments):
+            # The classifier isn't validated on labelled airchecks yet, these files are recorded for review
+            labels = dict(Counter(segment["label"] for segment in audio_segments))
+            print(
+                f"WARNING: No speech found in audio file {audio_file['id']} ({labels}). "
+                "Skipping transcription and detection."
+            )
+            insert_stage_1_llm_response(
+                supabase_client=supabase_client,
+                audio_file_id=audio_file["id"],
+                initial_transcription="",
+                initial_detection_result={"flagged_snippets": [], "skipped_as_non_speech": labels},
+                transcriptor=None,
+                timestamped_transcription=None,
+                detection_result=None,
+                status="Processed",
+                detection_prompt_version_id=None,
+                transcription_prompt_version_id=None,
+            )
+            set_audio_file_status(supabase_client, audio_file["id"], ProcessingStatus.PROCESSED)
+            return
+
         # Initial transcription
         initial_transcription = initial_transcription_with_gemini(
             gemini_client=gemini_client,
             audio_file=local_file,
             prompt_version=initial_transcription_prompt_version,
+            gemini_files=gemini_files,
         )
 
         # Fetch KB context based on the transcription
@@ -313,12 +489,14 @@ def process_audio_file(
             )
         else:
             # Timestamped transcription
-            transcriptor = GeminiModel.GEMINI_2_5_FLASH
-            timestamped_transcription = transcribe_audio_file_with_timestamp_with_gemini(
+            transcriptor, timestamped_transcription = transcribe_audio_file_with_timestamp(
                 gemini_client=gemini_client,
                 audio_file=local_file,
                 prompt_version=transcription_prompt_version,
-                model_name=transcriptor,
+                radio_station_code=audio_file["radio_station_code"],
+                supabase_client=supabase_client,
+                audio_file_id=audio_file["id"],
+                audio_segments=audio_segments,
             )
 
             # Main detection
@@ -363,6 +541,9 @@ def process_audio_file(
                     transcription_prompt_version_id=transcription_prompt_version["id"],
                 )
 
+            # The timestamped transcription is saved, a later regeneration must start over
+            delete_timestamped_transcription_checkpoints(supabase_client, audio_file["id"])
+
         print(f"Processing completed for {local_file}")
         set_audio_file_status(supabase_client, audio_file["id"], ProcessingStatus.PROCESSED)
 
@@ -1,5 +1,6 @@
 from .tasks import (
     fetch_a_new_stage_1_llm_response_from_supabase,
+    fetch_new_stage_1_llm_responses_from_supabase,
     download_audio_file_from_s3,
     upload_to_r2_and_clean_up,
     extract_snippet_clip,
@@ -26,6 +27,7 @@ __all__ = [
     "ensure_correct_timestamps",
     "extract_snippet_clip",
     "fetch_a_new_stage_1_llm_response_from_supabase",
+    "fetch_new_stage_1_llm_responses_from_supabase",
     "fetch_snippets_from_supabase",
     "fetch_stage_1_llm_response_from_supabase",
     "insert_new_snippet_to_snippets_table_in_supabase",
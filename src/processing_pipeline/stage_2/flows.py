@@ -1,12 +1,13 @@
 import os
 import time
-import boto3
 from prefect.task_runners import ConcurrentTaskRunner
+from processing_pipeline.constants import RESERVATION_BATCH_SIZE
+from processing_pipeline.r2_utils import create_r2_client
 from processing_pipeline.supabase_utils import SupabaseClient
 from utils import optional_flow
 
 from processing_pipeline.stage_2.tasks import (
-    fetch_a_new_stage_1_llm_response_from_supabase,
+    fetch_new_stage_1_llm_responses_from_supabase,
     download_audio_file_from_s3,
     process_llm_response,
     fetch_stage_1_llm_response_from_supabase,
@@ -21,34 +22,37 @@ from processing_pipeline.stage_2.tasks import (
 def audio_clipping(context_before_seconds, context_after_seconds, repeat):
     # Setup S3 Client
     R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
-    s3_client = boto3.client(
-        "s3",
-        endpoint_url=os.getenv("R2_ENDPOINT_URL"),
-        aws_access_key_id=os.getenv("R2_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("R2_SECRET_ACCESS_KEY"),
-    )
+    s3_client = create_r2_client()
 
     # Setup Supabase client
     supabase_client = SupabaseClient(supabase_url=os.getenv("SUPABASE_URL"), supabase_key=os.getenv("SUPABASE_KEY"))
 
     while True:
-        llm_response = fetch_a_new_stage_1_llm_response_from_supabase(
-            supabase_client
+        llm_responses = fetch_new_stage_1_llm_responses_from_supabase(
+            supabase_client, RESERVATION_BATCH_SIZE
         )  # TODO: Retry failed llm responses (Error)
 
-        if llm_response:
-            local_file = download_audio_file_from_s3(s3_client, R2_BUCKET_NAME, llm_response["audio_file"]["file_path"])
-
-            # Process the stage-1 LLM response
-            process_llm_response(
-                supabase_client,
-                llm_response,
-                local_file,
-                s3_client,
-                R2_BUCKET_NAME,
-                context_before_seconds,
-                context_after_seconds,
-            )
+        for index, llm_response in enumerate(llm_responses):
+            try:
+                local_file = download_audio_file_from_s3(
+                    s3_client, R2_BUCKET_NAME, llm_response["audio_file"]["file_path"]
+                )
+
+                # Process the stage-1 LLM response
+                process_llm_response(
+                    supabase_client,
+                    llm_response,
+                    local_file,
+                    s3_client,
+                    R2_BUCKET_NAME,
+                    context_before_seconds,
+                    context_after_seconds,
+                )
+            except BaseException:
+                # Hand the reserved LLM responses that weren't started back to the queue
+                for unprocessed in llm_responses[index + 1 :]:
+                    reset_status_of_stage_1_llm_response(supabase_client, unprocessed["id"])
+                raise
 
             print(f"Delete the downloaded audio file: {local_file}")
             os.remove(local_file)
@@ -57,7 +61,7 @@ def audio_clipping(context_before_seconds, context_after_seconds, repeat):
         if not repeat:
             break
 
-        if llm_response:
+        if llm_responses:
             sleep_time = 2
         else:
             sleep_time = 60
@@ -70,12 +74,7 @@ def audio_clipping(context_before_seconds, context_after_seconds, repeat):
 def undo_audio_clipping(stage_1_llm_response_ids):
     # Setup S3 Client
     R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
-    s3_client = boto3.client(
-        "s3",
-        endpoint_url=os.getenv("R2_ENDPOINT_URL"),
-        aws_access_key_id=os.getenv("R2_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("R2_SECRET_ACCESS_KEY"),
-    )
+    s3_client = create_r2_client()
 
     # Setup Supabase client
     supabase_client = SupabaseClient(supabase_url=os.getenv("SUPABASE_URL"), supabase_key=os.getenv("SUPABASE_KEY"))
@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
 import os
 from pydub import AudioSegment
+from processing_pipeline.audio_utils import get_encoding_profile_of_file
+from processing_pipeline.r2_utils import R2Uploader
 from utils import optional_task
 
 
@@ -15,6 +17,16 @@ def fetch_a_new_stage_1_llm_response_from_supabase(supabase_client):
         return None
 
 
+@optional_task(log_prints=True, retries=3)
+def fetch_new_stage_1_llm_responses_from_supabase(supabase_client, max_count):
+    llm_responses = supabase_client.get_new_stage_1_llm_responses_and_reserve_them(max_count)
+    if llm_responses:
+        print(f"Reserved {len(llm_responses)} new stage-1 LLM response(s): {[r['id'] for r in llm_responses]}")
+    else:
+        print("No new stage-1 LLM responses found")
+    return llm_responses
+
+
 @optional_task(log_prints=True, retries=3)
 def download_audio_file_from_s3(s3_client, r2_bucket_name, file_path):
     return __download_audio_file_from_s3(s3_client, r2_bucket_name, file_path)
@@ -33,7 +45,7 @@ def upload_to_r2_and_clean_up(s3_client, r2_bucket_name, folder_name, file_path)
 
     file_name = os.path.basename(file_path)
     destination_path = f"{folder_name}/snippets/{file_name}"
-    s3_client.upload_file(file_path, r2_bucket_name, destination_path)
+    R2Uploader(s3_client, r2_bucket_name).upload(file_path, destination_path)
     print(f"File {file_path} uploaded to R2 as {destination_path}")
     os.remove(file_path)
     return destination_path
@@ -84,8 +96,8 @@ def extract_snippet_clip(
     # Slice the audio segment
     subclip = audio[(new_start_time * 1000) : (new_end_time * 1000)]
 
-    # Export the subclip
-    subclip.export(output_file, format="mp3")
+    # Export the subclip, in the encoding profile told by its extension
+    subclip.export(output_file, **get_encoding_profile_of_file(output_file)["export_options"])
     print(f"Snippet clip is extracted successfully: {output_file}")
 
     # Calculate the duration of the snippet clip (in seconds)
@@ -184,7 +196,7 @@ def process_llm_response(
             raise FileNotFoundError(f"Audio file {local_file} does not exist.")
 
         print("Loading the audio file into the memory")
-        audio = AudioSegment.from_mp3(local_file)
+        audio = AudioSegment.from_file(local_file)
         flagged_snippets = (llm_response["detection_result"] or {}).get("flagged_snippets", [])
         ensure_correct_timestamps(audio, flagged_snippets)
 
@@ -192,7 +204,8 @@ def process_llm_response(
             uuid = snippet["uuid"]
             start_time = snippet["start_time"]
             end_time = snippet["end_time"]
-            output_file = f"snippet_{uuid}.mp3"
+            # Snippets are encoded like the recording they are cut from
+            output_file = f"snippet_{uuid}.{get_encoding_profile_of_file(local_file)['extension']}"
             parts = local_file.split("_")
             folder_name = f"{parts[0]}_{parts[1]}"
 
@@ -5,6 +5,7 @@ from .tasks import (
     download_audio_file_from_s3,
     fetch_a_new_snippet_from_supabase,
     fetch_a_specific_snippet_from_supabase,
+    fetch_new_snippets_from_supabase,
     get_metadata,
     process_snippet,
     update_snippet_in_supabase,
@@ -16,6 +17,7 @@ __all__ = [
     "download_audio_file_from_s3",
     "fetch_a_new_snippet_from_supabase",
     "fetch_a_specific_snippet_from_supabase",
+    "fetch_new_snippets_from_supabase",
     "get_metadata",
     "in_depth_analysis",
     "process_snippet",
@@ -7,11 +7,11 @@ from prefect.flows import Flow
 from prefect.client.schemas import FlowRun, State
 from prefect.task_runners import ConcurrentTaskRunner
 
-from processing_pipeline.constants import ProcessingStatus, PromptStage
+from processing_pipeline.constants import RESERVATION_BATCH_SIZE, ProcessingStatus, PromptStage
 from processing_pipeline.stage_3.tasks import (
     download_audio_file_from_s3,
-    fetch_a_new_snippet_from_supabase,
     fetch_a_specific_snippet_from_supabase,
+    fetch_new_snippets_from_supabase,
     process_snippet,
 )
 from processing_pipeline.supabase_utils import SupabaseClient
@@ -82,20 +82,28 @@ async def in_depth_analysis(snippet_ids, skip_review, repeat):
                 os.remove(local_file)
     else:
         while True:
-            snippet = fetch_a_new_snippet_from_supabase(supabase_client)  # TODO: Retry failed snippets (status: Error)
-
-            if snippet:
-                local_file = download_audio_file_from_s3(s3_client, R2_BUCKET_NAME, snippet["file_path"])
-
-                # Process the snippet
-                await process_snippet(
-                    supabase_client=supabase_client,
-                    gemini_client=gemini_client,
-                    snippet=snippet,
-                    local_file=local_file,
-                    skip_review=skip_review,
-                    prompt_version=prompt_version,
-                )
+            snippets = fetch_new_snippets_from_supabase(
+                supabase_client, RESERVATION_BATCH_SIZE
+            )  # TODO: Retry failed snippets (status: Error)
+
+            for index, snippet in enumerate(snippets):
+                try:
+                    local_file = download_audio_file_from_s3(s3_client, R2_BUCKET_NAME, snippet["file_path"])
+
+                    # Process the snippet
+                    await process_snippet(
+                        supabase_client=supabase_client,
+                        gemini_client=gemini_client,
+                        snippet=snippet,
+                        local_file=local_file,
+                        skip_review=skip_review,
+                        prompt_version=prompt_version,
+                    )
+                except BaseException:
+                    # Hand the reserved snippets that weren't started back to the queue
+                    for unprocessed in snippets[index + 1 :]:
+                        supabase_client.set_snippet_status(unprocessed["id"], ProcessingStatus.NEW)
+                    raise
 
                 print(f"Delete the downloaded snippet clip: {local_file}")
                 os.remove(local_file)
@@ -104,7 +112,7 @@ async def in_depth_analysis(snippet_ids, skip_review, repeat):
             if not repeat:
                 break
 
-            if snippet:
+            if snippets:
                 sleep_time = 2
             else:
                 sleep_time = 60
@@ -45,6 +45,16 @@ def __fetch_a_new_snippet_from_supabase(supabase_client):
         return None
 
 
+@optional_task(log_prints=True, retries=3)
+def fetch_new_snippets_from_supabase(supabase_client, max_count):
+    snippets = supabase_client.get_new_snippets_and_reserve_them(max_count)
+    if snippets:
+        print(f"Reserved {len(snippets)} new snippet(s): {[snippet['id'] for snippet in snippets]}")
+    else:
+        print("No new snippets found")
+    return snippets
+
+
 @optional_task(log_prints=True, retries=3)
 def download_audio_file_from_s3(s3_client, r2_bucket_name, file_path):
     return __download_audio_file_from_s3(s3_client, r2_bucket_name, file_path)
@@ -3,11 +3,11 @@ import os
 
 from prefect.task_runners import ConcurrentTaskRunner
 
-from processing_pipeline.constants import PromptStage
+from processing_pipeline.constants import RESERVATION_BATCH_SIZE, ProcessingStatus, PromptStage
 from processing_pipeline.stage_4.constants import Stage4SubStage
 from processing_pipeline.stage_4.tasks import (
-    fetch_a_ready_for_review_snippet_from_supabase,
     fetch_a_specific_snippet_from_supabase,
+    fetch_ready_for_review_snippets_from_supabase,
     process_snippet,
 )
 from processing_pipeline.supabase_utils import SupabaseClient
@@ -44,15 +44,21 @@ async def analysis_review(snippet_ids, repeat):
                 await process_snippet(supabase_client, snippet, prompt_versions)
     else:
         while True:
-            snippet = fetch_a_ready_for_review_snippet_from_supabase(supabase_client)
+            snippets = fetch_ready_for_review_snippets_from_supabase(supabase_client, RESERVATION_BATCH_SIZE)
 
-            if snippet:
-                await process_snippet(supabase_client, snippet, prompt_versions)
+            for index, snippet in enumerate(snippets):
+                try:
+                    await process_snippet(supabase_client, snippet, prompt_versions)
+                except BaseException:
+                    # Hand the reserved snippets that weren't started back to the queue
+                    for unprocessed in snippets[index + 1 :]:
+                        supabase_client.set_snippet_status(unprocessed["id"], ProcessingStatus.READY_FOR_REVIEW)
+                    raise
 
             if not repeat:
                 break
 
-            if snippet:
+            if snippets:
                 sleep_time = 2
             else:
                 sleep_time = 60
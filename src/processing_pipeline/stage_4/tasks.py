@@ -19,6 +19,16 @@ def fetch_a_ready_for_review_snippet_from_supabase(supabase_client):
         return None
 
 
+@optional_task(log_prints=True, retries=3)
+def fetch_ready_for_review_snippets_from_supabase(supabase_client, max_count):
+    snippets = supabase_client.get_ready_for_review_snippets_and_reserve_them(max_count)
+    if snippets:
+        print(f"Reserved {len(snippets)} ready-for-review snippet(s): {[snippet['id'] for snippet in snippets]}")
+    else:
+        print("No ready-for-review snippets found")
+    return snippets
+
+
 @optional_task(log_prints=True, retries=3)
 def fetch_a_specific_snippet_from_supabase(supabase_client, snippet_id):
     response = supabase_client.get_snippet_by_id(id=snippet_id)
@@ -2,6 +2,7 @@ from .executors import Stage5Executor
 from .flows import embedding
 from .tasks import (
     fetch_a_snippet_that_has_no_embedding,
+    fetch_snippets_that_have_no_embedding,
     upsert_snippet_embedding_to_supabase,
     generate_snippet_document,
     generate_snippet_embedding,
@@ -11,6 +12,7 @@ __all__ = [
     "Stage5Executor",
     "embedding",
     "fetch_a_snippet_that_has_no_embedding",
+    "fetch_snippets_that_have_no_embedding",
     "generate_snippet_document",
     "generate_snippet_embedding",
     "upsert_snippet_embedding_to_supabase",
@@ -4,9 +4,10 @@ import time
 from openai import OpenAI
 from prefect.task_runners import ConcurrentTaskRunner
 
+from processing_pipeline.constants import RESERVATION_BATCH_SIZE
 from processing_pipeline.supabase_utils import SupabaseClient
 from processing_pipeline.stage_5.tasks import (
-    fetch_a_snippet_that_has_no_embedding,
+    fetch_snippets_that_have_no_embedding,
     generate_snippet_document,
     generate_snippet_embedding,
 )
@@ -25,9 +26,13 @@ def embedding(repeat):
     supabase_client = SupabaseClient(supabase_url=os.getenv("SUPABASE_URL"), supabase_key=os.getenv("SUPABASE_KEY"))
 
     while True:
-        snippet = fetch_a_snippet_that_has_no_embedding(supabase_client)  # TODO: Retry failed snippets (status: Error)
+        # Unlike the other queues these snippets aren't reserved: concurrent workers may embed the same
+        # snippet twice, which costs an extra embedding but keeps a single row (upsert_snippet_embedding)
+        snippets = fetch_snippets_that_have_no_embedding(
+            supabase_client, RESERVATION_BATCH_SIZE
+        )  # TODO: Retry failed snippets (status: Error)
 
-        if snippet:
+        for snippet in snippets:
             document = generate_snippet_document(snippet)
             generate_snippet_embedding(openai_client, supabase_client, snippet["id"], document)
 
@@ -35,7 +40,7 @@ def embedding(repeat):
         if not repeat:
             break
 
-        if snippet:
+        if snippets:
             sleep_time = 2
         else:
             sleep_time = 60
@@ -15,6 +15,16 @@ def fetch_a_snippet_that_has_no_embedding(supabase_client):
         return None
 
 
+@optional_task(log_prints=True, retries=3)
+def fetch_snippets_that_have_no_embedding(supabase_client, max_count):
+    snippets = supabase_client.get_snippets_that_have_no_embedding(max_count)
+    if snippets:
+        print(f"Found {len(snippets)} snippet(s) without embedding: {[snippet['id'] for snippet in snippets]}")
+    else:
+        print("No new snippets found")
+    return snippets
+
+
 @optional_task(log_prints=True, retries=3)
 def upsert_snippet_embedding_to_supabase(
     supabase_client,
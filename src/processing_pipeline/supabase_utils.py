@@ -28,6 +28,26 @@ class SupabaseClient:
         response = self.client.rpc("fetch_a_ready_for_review_snippet_and_reserve_it").execute()
         return response.data if response.data else None
 
+    def get_new_audio_files_and_reserve_them(self, max_count):
+        response = self.client.rpc("fetch_new_audio_files_and_reserve_them", {"max_count": max_count}).execute()
+        return response.data or []
+
+    def get_new_stage_1_llm_responses_and_reserve_them(self, max_count):
+        response = self.client.rpc(
+            "fetch_new_stage_1_llm_responses_and_reserve_them", {"max_count": max_count}
+        ).execute()
+        return response.data or []
+
+    def get_new_snippets_and_reserve_them(self, max_count):
+        response = self.client.rpc("fetch_new_snippets_and_reserve_them", {"max_count": max_count}).execute()
+        return response.data or []
+
+    def get_ready_for_review_snippets_and_reserve_them(self, max_count):
+        response = self.client.rpc(
+            "fetch_ready_for_review_snippets_and_reserve_them", {"max_count": max_count}
+        ).execute()
+        return response.data or []
+
     def get_snippet_by_id(self, id, select="*"):
         response = self.client.table("snippets").select(select).eq("id", id).execute()
         return response.data[0] if response.data else None
@@ -89,24 +109,105 @@ class SupabaseClient:
         recording_day_of_week,
         file_path,
         file_size,
+        silence_ratio=None,
+        is_mostly_silent=False,
+    ):
+        audio_file = self.build_audio_file(
+            radio_station_name=radio_station_name,
+            radio_station_code=radio_station_code,
+            location_state=location_state,
+            recorded_at=recorded_at,
+            recording_day_of_week=recording_day_of_week,
+            file_path=file_path,
+            file_size=file_size,
+            silence_ratio=silence_ratio,
+            is_mostly_silent=is_mostly_silent,
+        )
+        response = self.client.table("audio_files").insert(audio_file).execute()
+        return response.data[0]
+
+    def insert_audio_files(self, audio_files):
+        """Insert rows made by `build_audio_file` with a single request, returns the inserted rows."""
+        if not audio_files:
+            return []
+        # A multi-row insert needs the same columns in every row
+        audio_files = [
+            {"silence_ratio": None, "is_mostly_silent": False, "simulcast_check_pending": False, **audio_file}
+            for audio_file in audio_files
+        ]
+        response = self.client.table("audio_files").insert(audio_files).execute()
+        return response.data
+
+    @staticmethod
+    def build_audio_file(
+        radio_station_name,
+        radio_station_code,
+        location_state,
+        recorded_at,
+        recording_day_of_week,
+        file_path,
+        file_size,
+        silence_ratio=None,
+        is_mostly_silent=False,
+        simulcast_check_pending=False,
+    ):
+        audio_file = {
+            "radio_station_name": radio_station_name,
+            "radio_station_code": radio_station_code,
+            "location_state": location_state,
+            "recorded_at": recorded_at,
+            "recording_day_of_week": recording_day_of_week,
+            "file_path": file_path,
+            "file_size": file_size,
+        }
+        # Only recordings whose audio levels were analyzed carry a silence ratio
+        if silence_ratio is not None:
+            audio_file["silence_ratio"] = silence_ratio
+            audio_file["is_mostly_silent"] = is_mostly_silent
+        # Stage 1 waits for link_simulcast before picking up a recording that has a fingerprint
+        if simulcast_check_pending:
+            audio_file["simulcast_check_pending"] = True
+        return audio_file
+
+    def insert_audio_fingerprint(
+        self, audio_file_id, radio_station_code, recorded_at, duration_seconds, hashes, offsets
     ):
         response = (
-            self.client.table("audio_files")
+            self.client.table("audio_fingerprints")
             .insert(
                 {
-                    "radio_station_name": radio_station_name,
+                    "audio_file_id": audio_file_id,
                     "radio_station_code": radio_station_code,
-                    "location_state": location_state,
                     "recorded_at": recorded_at,
-                    "recording_day_of_week": recording_day_of_week,
-                    "file_path": file_path,
-                    "file_size": file_size,
+                    "duration_seconds": duration_seconds,
+                    "hashes": hashes,
+                    "offsets": offsets,
                 }
             )
             .execute()
         )
         return response.data[0]
 
+    def get_concurrent_audio_fingerprints(self, radio_station_code, start, end):
+        """Fingerprints of the recordings of other stations that started between `start` and `end`."""
+        response = (
+            self.client.table("audio_fingerprints")
+            .select("*")
+            .neq("radio_station_code", radio_station_code)
+            .gte("recorded_at", start)
+            .lte("recorded_at", end)
+            .execute()
+        )
+        return response.data
+
+    def link_simulcast(self, audio_file_id, matching_audio_file_ids):
+        """Link a recording to the original of the recordings it matches, returns the original's id or None."""
+        response = self.client.rpc(
+            "link_simulcast",
+            {"audio_file_id": audio_file_id, "matching_audio_file_ids": matching_audio_file_ids},
+        ).execute()
+        return response.data
+
     def get_active_prompt(self, stage: PromptStage, sub_stage: StrEnum | None = None):
         query = (
             self.client.table("prompt_versions")
@@ -421,10 +522,50 @@ class SupabaseClient:
         response = self.client.table("stage_1_llm_responses").delete().in_("audio_file", audio_file_ids).execute()
         return response.data
 
+    def get_timestamped_transcription_checkpoints(self, audio_file_id, prompt_version_id, segment_length):
+        response = (
+            self.client.table("timestamped_transcription_checkpoints")
+            .select("segment_start, segment_count, transcripts")
+            .eq("audio_file", audio_file_id)
+            .eq("prompt_version", prompt_version_id)
+            .eq("segment_length", segment_length)
+            .execute()
+        )
+        return response.data
+
+    def upsert_timestamped_transcription_checkpoint(
+        self, audio_file_id, prompt_version_id, segment_length, segment_start, transcripts
+    ):
+        response = (
+            self.client.table("timestamped_transcription_checkpoints")
+            .upsert(
+                {
+                    "audio_file": audio_file_id,
+                    "prompt_version": prompt_version_id,
+                    "segment_length": segment_length,
+                    "segment_start": segment_start,
+                    "segment_count": len(transcripts),
+                    "transcripts": transcripts,
+                }
+            )
+            .execute()
+        )
+        return response.data[0]
+
+    def delete_timestamped_transcription_checkpoints(self, audio_file_id):
+        response = (
+            self.client.table("timestamped_transcription_checkpoints").delete().eq("audio_file", audio_file_id).execute()
+        )
+        return response.data
+
     def get_a_snippet_that_has_no_embedding(self):
         response = self.client.rpc("fetch_a_snippet_that_has_no_embedding").execute()
         return response.data if response.data else None
 
+    def get_snippets_that_have_no_embedding(self, max_count):
+        response = self.client.rpc("fetch_snippets_that_have_no_embedding", {"max_count": max_count}).execute()
+        return response.data or []
+
     def upsert_snippet_embedding(self, snippet_id, snippet_document, document_token_count, embedding, model_name, status, error_message):
         # Check if the embedding of the snippet already exists
         existing_embedding = self.client.table("snippet_embeddings").select("id").eq("snippet", snippet_id).execute()
@@ -480,6 +621,32 @@ class SupabaseClient:
         response = self.client.rpc("search_kb_entries", params).execute()
         return response.data if response.data else []
 
+    def search_kb_entries_batch(
+        self,
+        query_embeddings: list[list[float]],
+        match_threshold=0.75,
+        match_count=10,
+        candidate_multiplier=8,
+        filter_categories: list[str] | None = None,
+        reference_date: str | None = None,
+    ):
+        """Top `match_count` KB entries of every query in one RPC, deduplicated with their best similarity."""
+        if not query_embeddings:
+            return []
+
+        params = {
+            "query_embeddings": query_embeddings,
+            "match_threshold": match_threshold,
+            "match_count": match_count,
+            "candidate_multiplier": candidate_multiplier,
+        }
+        if filter_categories:
+            params["filter_categories"] = filter_categories
+        if reference_date:
+            params["reference_date"] = reference_date
+        response = self.client.rpc("search_kb_entries_batch", params).execute()
+        return response.data if response.data else []
+
     def find_duplicate_kb_entries(self, query_embedding, similarity_threshold=0.92, max_results=5):
         response = self.client.rpc("find_duplicate_kb_entries", {
             "query_embedding": query_embedding,
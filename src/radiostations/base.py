@@ -8,6 +8,8 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from webdriver_manager.chrome import ChromeDriverManager
+from radiostations.browser_watchdog import BrowserMemoryWatchdog
+from radiostations.pulse_monitor import PulseAudioMonitor
 from utils import optional_task
 
 
@@ -23,6 +25,8 @@ class RadioStation:
         self.driver = None
         self.sink_module = None
         self.source_module = None
+        self.pulse_monitor = PulseAudioMonitor(sink_name)
+        self.browser_watchdog = BrowserMemoryWatchdog(self.get_browser_pid)
 
         self.play_button_selector = play_button_selector
         self.video_element_selector = video_element_selector
@@ -73,6 +77,19 @@ class RadioStation:
             print(f"Error setting up virtual audio: {e}")
             raise e
 
+        self.start_pulse_monitor()
+
+    def start_pulse_monitor(self):
+        if self.pulse_monitor.is_running():
+            return
+
+        try:
+            self.pulse_monitor.start()
+        except Exception as e:
+            # is_audio_playing falls back to polling pactl
+            print(f"Failed to start the PulseAudio monitor for {self.sink_name}: {e}")
+            self.pulse_monitor.stop()
+
     # TODO: Before retry, must kill browser process
     @optional_task(log_prints=True, retries=3000)
     def start_browser(self):
@@ -101,6 +118,13 @@ class RadioStation:
             self.driver = None
             raise e
 
+        # The new playback gets the full silence timeout before being considered dead air
+        self.pulse_monitor.reset_silence_timer()
+
+        # Measure the memory of the new browser from scratch
+        self.browser_watchdog.reset()
+        self.browser_watchdog.start()
+
         print("PulseAudio sinks:")
         self.execute_command(["pactl", "list", "short", "sinks"])
         print("PulseAudio sources:")
@@ -155,6 +179,10 @@ class RadioStation:
             print(str(e))
 
     def is_audio_playing(self):
+        # The monitor keeps the sink state in memory, no need to shell out
+        if self.pulse_monitor.is_running():
+            return self.pulse_monitor.is_playing()
+
         try:
             result = subprocess.run(["pactl", "list", "sinks"], capture_output=True, text=True, check=True)
 
@@ -176,39 +204,63 @@ class RadioStation:
             print(f"Error checking audio status: {e}")
             return False
 
+    def get_browser_pid(self):
+        """The pid of chromedriver, whose descendants are the Chrome processes of this station."""
+        try:
+            return self.driver.service.process.pid
+        except AttributeError:
+            return None
+
+    def get_browser_recycle_reason(self, urgent=False):
+        return self.browser_watchdog.get_recycle_reason(urgent=urgent)
+
+    def is_monitored(self):
+        return self.pulse_monitor.is_running()
+
+    def is_playing_silence(self):
+        """Whether the sink has only carried silence for a while, even though something is playing."""
+        return self.pulse_monitor.is_silent()
+
     @optional_task(log_prints=True)
     def stop(self, unload_modules=True):
         if self.driver:
             self.driver.quit()
+            self.driver = None
 
-        if self.sink_module and unload_modules:
-            try:
-                # Check if the sink module exists before unloading
-                result = subprocess.run(
-                    ["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True
-                )
-                if self.sink_module in result.stdout:
-                    subprocess.run(["pactl", "unload-module", self.sink_module], check=True)
-                    print(f"Unloaded sink module {self.sink_module}")
-                else:
-                    print(f"Sink module {self.sink_module} not found, possibly already unloaded")
+        if not unload_modules:
+            return
 
-            except subprocess.CalledProcessError as e:
-                print(f"Error checking or unloading sink module {self.sink_module}: {e}")
+        self.browser_watchdog.stop()
+        self.pulse_monitor.stop()
+
+        modules = [("Sink", self.sink_module), ("Source", self.source_module)]
+        if not any(module for _, module in modules):
+            return
 
-        if self.source_module and unload_modules:
+        try:
+            # Check which modules still exist before unloading them
+            loaded_modules = subprocess.run(
+                ["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True
+            ).stdout
+        except subprocess.CalledProcessError as e:
+            print(f"Error listing PulseAudio modules: {e}")
+            return
+
+        for kind, module in modules:
+            if not module:
+                continue
             try:
-                # Check if the source module exists before unloading
-                result = subprocess.run(
-                    ["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True
-                )
-                if self.source_module in result.stdout:
-                    subprocess.run(["pactl", "unload-module", self.source_module], check=True)
-                    print(f"Unloaded source module {self.source_module}")
+                if module in loaded_modules:
+                    subprocess.run(["pactl", "unload-module", module], check=True)
+                    print(f"Unloaded {kind.lower()} module {module}")
                 else:
-                    print(f"Source module {self.source_module} not found, possibly already unloaded")
+                    print(f"{kind} module {module} not found, possibly already unloaded")
             except subprocess.CalledProcessError as e:
-                print(f"Error checking or unloading source module {self.source_module}: {e}")
+                print(f"Error unloading {kind.lower()} module {module}: {e}")
+
+        # A later setup_virtual_audio loads them again
+        self.sink_module = None
+        self.source_module = None
 
     def ensure_pulseaudio_running(self):
         try:
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+
+import numpy as np
+import psutil
+
+MB = 1024 * 1024
+
+# Recycle the browser at the next capture boundary above this RSS (Chrome + chromedriver)
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "1200"))
+# Above this RSS the browser is recycled right away, cutting the running capture short
+BROWSER_CRITICAL_RSS_MB = int(os.getenv("BROWSER_CRITICAL_RSS_MB", "2000"))
+# Steady growth above this rate is treated as a leak, even while the RSS is still low
+BROWSER_MAX_LEAK_MB_PER_HOUR = int(os.getenv("BROWSER_MAX_LEAK_MB_PER_HOUR", "300"))
+BROWSER_WATCHDOG_INTERVAL_SECONDS = int(os.getenv("BROWSER_WATCHDOG_INTERVAL_SECONDS", "30"))
+
+
+class BrowserMemoryWatchdog:
+    """Measures the memory of one browser process tree on its own timer.
+
+    `get_root_pid` returns the pid of chromedriver (or None while there is no browser); the
+    RSS of all its descendants is summed every `interval_seconds`. The leak rate is the slope
+    of a linear fit over the samples of the last `leak_window_seconds`, and is only judged
+    once at least half of that window has been observed.
+    """
+
+    def __init__(
+        self,
+        get_root_pid,
+        max_rss_mb=BROWSER_MAX_RSS_MB,
+        critical_rss_mb=BROWSER_CRITICAL_RSS_MB,
+        max_leak_mb_per_hour=BROWSER_MAX_LEAK_MB_PER_HOUR,
+        interval_seconds=BROWSER_WATCHDOG_INTERVAL_SECONDS,
+        leak_window_seconds=1800,
+    ):
+        self.get_root_pid = get_root_pid
+        self.max_rss_mb = max_rss_mb
+        self.critical_rss_mb = critical_rss_mb
+        self.max_leak_mb_per_hour = max_leak_mb_per_hour
+        self.interval_seconds = interval_seconds
+        self.leak_window_seconds = leak_window_seconds
+
+        self.samples = []  # (monotonic time, RSS in MB)
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.__run, name="browser-memory-watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.thread:
+            return
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+
+    def reset(self):
+        """Forget the samples of the previous browser, e.g. after it was recycled."""
+        with self.lock:
+            self.samples = []
+
+    def get_rss_mb(self):
+        pid = self.get_root_pid()
+        if not pid:
+            return None
+
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+
+        rss = 0
+        for process in processes:
+            try:
+                rss += process.memory_info().rss
+            except psutil.Error:
+                # Renderers come and go, skip the ones that exited in the meantime
+                continue
+        return rss / MB
+
+    def check(self):
+        rss_mb = self.get_rss_mb()
+        if rss_mb is None:
+            return
+
+        now = time.monotonic()
+        with self.lock:
+            self.samples.append((now, rss_mb))
+            self.samples = [sample for sample in self.samples if now - sample[0] <= self.leak_window_seconds]
+
+    def get_leak_mb_per_hour(self):
+        with self.lock:
+            samples = list(self.samples)
+
+        if len(samples) < 3 or samples[-1][0] - samples[0][0] < self.leak_window_seconds / 2:
+            return None
+
+        times, rss = np.array(samples).T
+        slope_mb_per_second = np.polyfit(times - times[0], rss, 1)[0]
+        return float(slope_mb_per_second * 3600)
+
+    def get_recycle_reason(self, urgent=False):
+        """Why the browser should be recycled, or None.
+
+        With `urgent`, only a browser above the critical RSS is reported: that one can't wait
+        for the running capture to end.
+        """
+        with self.lock:
+            if not self.samples:
+                return None
+            rss_mb = self.samples[-1][1]
+
+        if rss_mb >= self.critical_rss_mb:
+            return f"RSS of {rss_mb:.0f} MB is above the critical {self.critical_rss_mb} MB"
+        if urgent:
+            return None
+
+        if rss_mb >= self.max_rss_mb:
+            return f"RSS of {rss_mb:.0f} MB is above {self.max_rss_mb} MB"
+
+        leak_mb_per_hour = self.get_leak_mb_per_hour()
+        if leak_mb_per_hour is not None and leak_mb_per_hour >= self.max_leak_mb_per_hour:
+            return f"RSS grows by {leak_mb_per_hour:.0f} MB/hour (at {rss_mb:.0f} MB)"
+        return None
+
+    def __run(self):
+        while not self.stopping.wait(self.interval_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Failed to measure the browser memory: {e}")
@@ -0,0 +1,173 @@
+import re
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from processing_pipeline.audio_utils import PCM_SAMPLE_RATE, compute_rms_dbfs
+
+SUBSCRIBE_EVENT_REGEX = re.compile(r"Event '(?P<event>\w+)' on (?P<facility>[\w-]+) #(?P<index>\d+)")
+
+
+class PulseAudioMonitor:
+    """Keeps the state of one PulseAudio sink in memory instead of polling `pactl list sinks`.
+
+    A long-running `pactl subscribe` reports every change to sinks and sink inputs, and the
+    state is only re-read when our sink or one of its sink inputs changes, or a new sink input
+    appears (it may play into our sink). A `parec` process records the sink's monitor
+    source at a low sample rate and measures its level every second, so a stream that is
+    "playing" but silent is noticed within `silence_timeout_seconds`.
+    """
+
+    def __init__(self, sink_name, silence_threshold_dbfs=-60.0, silence_timeout_seconds=30):
+        self.sink_name = sink_name
+        self.silence_threshold_dbfs = silence_threshold_dbfs
+        self.silence_timeout_seconds = silence_timeout_seconds
+
+        self.sink_index = None
+        self.sink_state = None
+        self.sink_input_count = 0
+        self.sink_input_indices = set()
+        self.level_dbfs = None
+        self.last_signal_at = None
+
+        self.subscribe_process = None
+        self.level_process = None
+        self.events_thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.refresh()
+        self.reset_silence_timer()
+
+        self.subscribe_process = subprocess.Popen(
+            ["pactl", "subscribe"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        self.level_process = subprocess.Popen(
+            [
+                "parec",
+                f"--device={self.sink_name}.monitor",
+                "--format=s16le",
+                "--channels=1",
+                f"--rate={PCM_SAMPLE_RATE}",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.events_thread = threading.Thread(
+            target=self.__read_events, name=f"pulse-events-{self.sink_name}", daemon=True
+        )
+        self.events_thread.start()
+        threading.Thread(target=self.__read_levels, name=f"pulse-levels-{self.sink_name}", daemon=True).start()
+        print(f"Monitoring PulseAudio sink {self.sink_name}: {self.get_status()}")
+
+    def stop(self):
+        for process in (self.subscribe_process, self.level_process):
+            if process and process.poll() is None:
+                process.terminate()
+        self.subscribe_process = None
+        self.level_process = None
+
+    def is_running(self):
+        """Whether the sink state is still kept up to date, i.e. events are still being read."""
+        return (
+            self.subscribe_process is not None
+            and self.subscribe_process.poll() is None
+            and self.events_thread is not None
+            and self.events_thread.is_alive()
+        )
+
+    def is_playing(self):
+        with self.lock:
+            return self.sink_state == "RUNNING" and self.sink_input_count > 0
+
+    def is_silent(self):
+        """Whether the monitor source has been below the silence threshold for too long."""
+        # Without a running level meter there is nothing to judge by
+        if not self.level_process or self.level_process.poll() is not None:
+            return False
+        return time.monotonic() - self.last_signal_at > self.silence_timeout_seconds
+
+    def reset_silence_timer(self):
+        """Start counting silence from now on, e.g. after (re)starting the playback."""
+        self.last_signal_at = time.monotonic()
+
+    def get_status(self):
+        with self.lock:
+            return {
+                "sink_state": self.sink_state,
+                "sink_inputs": self.sink_input_count,
+                "level_dbfs": self.level_dbfs,
+            }
+
+    def refresh(self):
+        """Re-read the sink state and the number of streams playing into the sink."""
+        sinks = subprocess.run(["pactl", "list", "short", "sinks"], capture_output=True, text=True, check=True)
+        sink_inputs = subprocess.run(
+            ["pactl", "list", "short", "sink-inputs"], capture_output=True, text=True, check=True
+        )
+
+        sink_index, sink_state = None, None
+        for line in sinks.stdout.splitlines():
+            # index, name, driver, sample spec, state
+            columns = line.split("\t")
+            if len(columns) >= 5 and columns[1] == self.sink_name:
+                sink_index, sink_state = columns[0], columns[4]
+
+        # index, sink index, client, driver, sample spec
+        sink_input_indices = {
+            columns[0]
+            for columns in (line.split("\t") for line in sink_inputs.stdout.splitlines())
+            if sink_index and columns[1:2] == [sink_index]
+        }
+
+        with self.lock:
+            self.sink_index = sink_index
+            self.sink_state = sink_state
+            self.sink_input_count = len(sink_input_indices)
+            self.sink_input_indices = sink_input_indices
+
+    def handle_event(self, line):
+        match = SUBSCRIBE_EVENT_REGEX.search(line)
+        if not match:
+            return
+
+        # Every station's browser plays into its own sink, only changes of ours are worth two pactl calls
+        facility, index = match.group("facility"), match.group("index")
+        if facility == "sink-input":
+            if match.group("event") == "new" or index in self.sink_input_indices:
+                self.refresh()
+        elif facility == "sink" and (self.sink_index is None or index == self.sink_index):
+            self.refresh()
+
+    def handle_levels(self, dbfs):
+        if len(dbfs) == 0:
+            return
+        with self.lock:
+            self.level_dbfs = round(float(dbfs[-1]), 2)
+        if np.any(dbfs >= self.silence_threshold_dbfs):
+            self.last_signal_at = time.monotonic()
+
+    def __read_events(self):
+        process = self.subscribe_process
+        try:
+            for line in process.stdout:
+                try:
+                    self.handle_event(line)
+                except Exception as e:
+                    # The next event refreshes the state again
+                    print(f"Failed to refresh the state of PulseAudio sink {self.sink_name}: {e}")
+        except Exception as e:
+            print(f"Stopped reading PulseAudio events: {e}")
+
+    def __read_levels(self):
+        process = self.level_process
+        # One second of 16-bit mono samples per read
+        chunk_size = PCM_SAMPLE_RATE * 2
+        try:
+            while chunk := process.stdout.read(chunk_size):
+                samples = np.frombuffer(chunk[: len(chunk) // 2 * 2], dtype=np.int16)
+                self.handle_levels(compute_rms_dbfs(samples))
+        except Exception as e:
+            print(f"Stopped measuring the level of {self.sink_name}.monitor: {e}")
@@ -0,0 +1,107 @@
+import os
+import re
+import time
+
+import requests
+
+from recorder.stream_health import probe_stream
+
+# Resolved stream URLs carry expiring tokens, resolve them again at the next capture after this long
+STREAM_REFRESH_SECONDS = int(os.getenv("DIRECT_STREAM_REFRESH_SECONDS", "3600"))
+
+IHEART_PAGE_REGEX = re.compile(r"iheart\.com/live/(?:[\w-]+-)?(?P<station_id>\d+)/?$")
+IHEART_STATION_API_URL = "https://api.iheart.com/api/v2/content/liveStations/{station_id}"
+IHEART_HLS_URL = "https://stream.revma.ihrhls.com/zc{station_id}/hls.m3u8"
+# Stream types of the iHeart API that ffmpeg can read, from the most to the least preferred
+IHEART_STREAM_TYPES = ["secure_hls_stream", "hls_stream", "secure_shoutcast_stream", "shoutcast_stream"]
+
+# Stream URLs embedded in a page, possibly JSON-escaped (`https:\/\/...`)
+PAGE_STREAM_REGEX = re.compile(r"https?:(?:\\?/){2}[^\s\"'<>]+?\.(?:m3u8|aac|mp3)(?:\?[^\s\"'<>]*)?")
+
+USER_AGENT = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_7 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.6 Mobile/15E148 Safari/604.1"
+)
+
+
+class StreamResolver:
+    """Finds the HLS/AAC stream behind a station page, so it can be recorded without a browser.
+
+    Candidates come from the iHeart station API (for iHeart pages), the well-known iHeart HLS
+    URL and finally the stream URLs found in the page itself. The first candidate that answers
+    is used and cached for `refresh_seconds`.
+    """
+
+    def __init__(self, page_url, refresh_seconds=STREAM_REFRESH_SECONDS, timeout_seconds=10, probe=probe_stream):
+        self.page_url = page_url
+        self.refresh_seconds = refresh_seconds
+        self.timeout_seconds = timeout_seconds
+        self.probe = probe
+
+        self.stream_url = None
+        self.resolved_at = None
+
+    def get_stream_url(self, force_refresh=False):
+        """The cached stream URL, resolved again when it's stale or `force_refresh` is set.
+
+        Returns None if no stream could be found, the station must then be recorded through the browser.
+        """
+        is_stale = self.resolved_at is None or time.monotonic() - self.resolved_at >= self.refresh_seconds
+        if self.stream_url and not is_stale and not force_refresh:
+            return self.stream_url
+
+        try:
+            self.stream_url = self.resolve()
+            print(f"Resolved the stream of {self.page_url}: {self.stream_url}")
+        except Exception as e:
+            print(f"Failed to resolve the stream of {self.page_url}: {e}")
+            self.stream_url = None
+
+        self.resolved_at = time.monotonic()
+        return self.stream_url
+
+    def resolve(self):
+        for candidate in self.get_candidates():
+            if self.probe(candidate):
+                return candidate
+        raise ValueError("None of the stream candidates answered")
+
+    def get_candidates(self):
+        candidates = []
+
+        match = IHEART_PAGE_REGEX.search(self.page_url)
+        if match:
+            station_id = match.group("station_id")
+            try:
+                candidates.extend(self.get_iheart_streams(station_id))
+            except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+                print(f"Failed to look up iHeart station {station_id}: {e}")
+            candidates.append(IHEART_HLS_URL.format(station_id=station_id))
+
+        try:
+            candidates.extend(self.get_page_streams())
+        except requests.RequestException as e:
+            print(f"Failed to fetch {self.page_url}: {e}")
+
+        # Keep the order, but try every URL only once
+        return list(dict.fromkeys(candidates))
+
+    def get_iheart_streams(self, station_id):
+        response = requests.get(
+            IHEART_STATION_API_URL.format(station_id=station_id),
+            timeout=self.timeout_seconds,
+            headers={"User-Agent": USER_AGENT},
+        )
+        response.raise_for_status()
+        streams = response.json()["hits"][0]["streams"]
+        return [streams[stream_type] for stream_type in IHEART_STREAM_TYPES if streams.get(stream_type)]
+
+    def get_page_streams(self):
+        response = requests.get(self.page_url, timeout=self.timeout_seconds, headers={"User-Agent": USER_AGENT})
+        response.raise_for_status()
+
+        streams = []
+        for url in PAGE_STREAM_REGEX.findall(response.text):
+            streams.append(url.replace("\\/", "/").replace("\\u0026", "&").replace("&amp;", "&"))
+        # Playlists first, they survive reconnects better than progressive streams
+        return sorted(streams, key=lambda url: ".m3u8" not in url)
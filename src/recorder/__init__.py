@@ -0,0 +1,20 @@
+from .segments import SegmentTracker
+from .sharding import ConsistentHashRing
+from .registration import RecordingRegistrar
+from .spool import RecordingSpool, SpoolDrainer
+from .stream_health import StreamHealth
+from .supervisor import RecorderSupervisor
+from .upload_worker import UploadWorker
+from .write_behind import AudioFileBatchWriter
+
+__all__ = [
+    "AudioFileBatchWriter",
+    "ConsistentHashRing",
+    "RecorderSupervisor",
+    "RecordingRegistrar",
+    "RecordingSpool",
+    "SegmentTracker",
+    "SpoolDrainer",
+    "StreamHealth",
+    "UploadWorker",
+]
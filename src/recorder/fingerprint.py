@@ -0,0 +1,193 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from processing_pipeline.audio_utils import PCM_SAMPLE_RATE, decode_pcm
+
+# 64 ms frames every 32 ms at 8 kHz
+FRAME_SIZE = 512
+HOP_SIZE = 256
+# Spectral peaks are picked per band, between 300 Hz and 3.5 kHz where broadcasts keep most energy
+BAND_EDGES_HZ = [300, 500, 800, 1200, 1800, 2500, 3500]
+# A peak must be the loudest point of its band within this many frames before and after it
+PEAK_NEIGHBORHOOD_FRAMES = 8
+# Every peak is paired with the next few peaks up to ~1 second later
+FAN_OUT = 3
+MAX_PAIR_FRAMES = 31
+# Only one hash out of this many is kept, chosen by value so every station keeps the same ones
+HASH_SAMPLING = 8
+
+# Aligned hashes needed (in total, and as share of the hashes in the overlap) to call two recordings the same
+MIN_MATCHING_HASHES = 20
+MIN_MATCH_RATIO = 0.05
+# How far apart two stations may air the same program (CDN and encoder latency)
+MAX_SIMULCAST_DELAY_SECONDS = 120
+# Recordings of other stations that started up to this long before a recording may overlap it
+MAX_RECORDING_SECONDS = 3600
+
+
+def compute_fingerprint(samples, sample_rate=PCM_SAMPLE_RATE):
+    """Spectral-peak pair hashes of mono 16-bit `samples`.
+
+    Returns the hashes (as int64) and the offset of each hash from the start of the samples,
+    in seconds. Hashes only depend on the frequencies of two peaks and the time between them,
+    so they survive different bitrates, gains and start times.
+    """
+    frame_count = 1 + (len(samples) - FRAME_SIZE) // HOP_SIZE
+    if frame_count < 2 * PEAK_NEIGHBORHOOD_FRAMES:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    band_bins = np.round(np.array(BAND_EDGES_HZ) * FRAME_SIZE / sample_rate).astype(int)
+    window = np.hanning(FRAME_SIZE).astype(np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE][:frame_count]
+
+    # Loudest bin (and its level) of every band in every frame, in chunks to bound memory
+    peak_bins = np.empty((frame_count, len(band_bins) - 1), dtype=np.int64)
+    peak_levels = np.empty((frame_count, len(band_bins) - 1), dtype=np.float32)
+    for start in range(0, frame_count, 4096):
+        chunk = frames[start : start + 4096].astype(np.float32) * window
+        spectrum = np.log10(np.abs(np.fft.rfft(chunk, axis=1)) + 1e-6)
+        for band, (low, high) in enumerate(zip(band_bins[:-1], band_bins[1:])):
+            band_spectrum = spectrum[:, low:high]
+            peak_bins[start : start + 4096, band] = low + np.argmax(band_spectrum, axis=1)
+            peak_levels[start : start + 4096, band] = np.max(band_spectrum, axis=1)
+
+    # A peak dominates its neighborhood in time and stands out from the typical level of its band
+    padded = np.pad(
+        peak_levels, ((PEAK_NEIGHBORHOOD_FRAMES, PEAK_NEIGHBORHOOD_FRAMES), (0, 0)), constant_values=-np.inf
+    )
+    neighborhood_max = np.lib.stride_tricks.sliding_window_view(
+        padded, 2 * PEAK_NEIGHBORHOOD_FRAMES + 1, axis=0
+    ).max(axis=-1)
+    is_peak = (peak_levels == neighborhood_max) & (peak_levels > np.median(peak_levels, axis=0))
+
+    peak_frames, peak_bands = np.nonzero(is_peak)
+    peak_frequencies = peak_bins[peak_frames, peak_bands]
+
+    hashes, offsets = [], []
+    for i in range(len(peak_frames)):
+        pairs = 0
+        for j in range(i + 1, len(peak_frames)):
+            dt = peak_frames[j] - peak_frames[i]
+            if dt == 0:
+                continue
+            if dt > MAX_PAIR_FRAMES or pairs == FAN_OUT:
+                break
+            # 9 bits per frequency bin, then the time delta in steps of two frames to absorb jitter
+            hashes.append((int(peak_frequencies[i]) << 16) | (int(peak_frequencies[j]) << 7) | int(dt) // 2)
+            offsets.append(peak_frames[i] * HOP_SIZE / sample_rate)
+            pairs += 1
+
+    hashes = np.array(hashes, dtype=np.int64)
+    offsets = np.array(offsets, dtype=np.float32)
+
+    # Knuth's multiplicative hash: its high bits depend on every bit of the hash (the low ones only on
+    # the low bits, i.e. the time delta), so keeping a range of them spreads over frequencies and deltas
+    keep = ((hashes * 2654435761) & 0xFFFFFFFF) < 2**32 // HASH_SAMPLING
+    return hashes[keep], offsets[keep]
+
+
+def fingerprint_recording(file_name, samples=None):
+    if samples is None:
+        samples = decode_pcm(file_name)
+    hashes, offsets = compute_fingerprint(samples)
+    return {
+        "duration_seconds": round(len(samples) / PCM_SAMPLE_RATE, 2),
+        "hashes": hashes.tolist(),
+        "offsets": [round(float(offset), 3) for offset in offsets],
+    }
+
+
+def match_fingerprints(fingerprint, start, other, other_start):
+    """Compare two fingerprints whose recordings started at the `start` timestamps (in seconds).
+
+    Returns the number of hashes aligned at the same delay, their share of the hashes in the
+    overlap of both recordings, and the delay in seconds (positive if `fingerprint` airs later).
+    """
+    times_by_hash = defaultdict(list)
+    for value, offset in zip(other["hashes"], other["offsets"]):
+        times_by_hash[value].append(other_start + offset)
+
+    delays = []
+    in_overlap = 0
+    other_end = other_start + other["duration_seconds"]
+    for value, offset in zip(fingerprint["hashes"], fingerprint["offsets"]):
+        time = start + offset
+        if other_start - MAX_SIMULCAST_DELAY_SECONDS <= time <= other_end + MAX_SIMULCAST_DELAY_SECONDS:
+            in_overlap += 1
+        for other_time in times_by_hash.get(value, ()):
+            if abs(time - other_time) <= MAX_SIMULCAST_DELAY_SECONDS:
+                delays.append(time - other_time)
+
+    if not delays:
+        return {"matching_hashes": 0, "match_ratio": 0.0, "delay_seconds": None}
+
+    # Same content at a constant delay piles up in one (or two adjacent) 1-second bins
+    delays = np.array(delays)
+    bins = np.floor(delays).astype(int)
+    values, counts = np.unique(bins, return_counts=True)
+    count_by_bin = dict(zip(values.tolist(), counts.tolist()))
+    best_bin = max(count_by_bin, key=lambda b: count_by_bin[b] + count_by_bin.get(b + 1, 0))
+    aligned = (bins == best_bin) | (bins == best_bin + 1)
+
+    return {
+        "matching_hashes": int(np.sum(aligned)),
+        "match_ratio": round(int(np.sum(aligned)) / max(in_overlap, 1), 4),
+        "delay_seconds": round(float(np.mean(delays[aligned])), 2),
+    }
+
+
+def is_simulcast(match):
+    return match["matching_hashes"] >= MIN_MATCHING_HASHES and match["match_ratio"] >= MIN_MATCH_RATIO
+
+
+def find_simulcasts(fingerprint, recorded_at, candidates):
+    """The candidates (rows of `audio_fingerprints`) that match `fingerprint` with their match, best match first."""
+    start = datetime.fromisoformat(recorded_at).timestamp()
+
+    simulcasts = []
+    for candidate in candidates:
+        candidate_start = datetime.fromisoformat(candidate["recorded_at"]).timestamp()
+        match = match_fingerprints(fingerprint, start, candidate, candidate_start)
+        if is_simulcast(match):
+            simulcasts.append((candidate, match))
+    return sorted(simulcasts, key=lambda simulcast: simulcast[1]["matching_hashes"], reverse=True)
+
+
+def detect_simulcast(supabase_client, audio_file, fingerprint):
+    """Store the fingerprint of a registered recording and link it to the same program on another station.
+
+    The link is decided by the `link_simulcast` RPC in one transaction: of the recording and the ones
+    it matches, the one whose fingerprint was stored first stays the one to analyze and the others
+    point to it through `audio_files.simulcast_of` (a linked copy is marked as Processed). Every recorder reaches the same decision, so two
+    copies checked at the same time never link to each other. Returns the id of the original, or None.
+    """
+    supabase_client.insert_audio_fingerprint(
+        audio_file_id=audio_file["id"],
+        radio_station_code=audio_file["radio_station_code"],
+        recorded_at=audio_file["recorded_at"],
+        duration_seconds=fingerprint["duration_seconds"],
+        hashes=fingerprint["hashes"],
+        offsets=fingerprint["offsets"],
+    )
+
+    recorded_at = datetime.fromisoformat(audio_file["recorded_at"])
+    candidates = supabase_client.get_concurrent_audio_fingerprints(
+        audio_file["radio_station_code"],
+        (recorded_at - timedelta(seconds=MAX_RECORDING_SECONDS)).isoformat(),
+        (recorded_at + timedelta(seconds=fingerprint["duration_seconds"])).isoformat(),
+    )
+    simulcasts = find_simulcasts(fingerprint, audio_file["recorded_at"], candidates)
+
+    # Also run without matches: it's what makes the recording available to Stage 1
+    simulcast_of = supabase_client.link_simulcast(
+        audio_file["id"], [candidate["audio_file_id"] for candidate, _ in simulcasts]
+    )
+    if simulcast_of:
+        candidate, match = simulcasts[0]
+        print(
+            f"Recording {audio_file['id']} is a simulcast of {simulcast_of} "
+            f"({candidate['radio_station_code']}: {match})"
+        )
+    return simulcast_of
@@ -0,0 +1,164 @@
+import glob
+import hashlib
+import os
+
+from processing_pipeline.audio_utils import ENCODING_PROFILES, decode_pcm
+from processing_pipeline.supabase_utils import SupabaseClient
+from recorder.fingerprint import detect_simulcast, fingerprint_recording
+from recorder.segments import get_segment_start_time
+from recorder.silence import detect_dead_air, quarantine_recording
+from recorder.spool import SpoolDrainer
+
+
+class RecordingRegistrar:
+    """Takes the finished recordings of a recorder process from disk to `audio_files`.
+
+    Every recording is decoded once for both checks: fully silent recordings are quarantined,
+    the others are fingerprinted (before `upload` deletes them), uploaded and registered
+    through the write-behind `audio_file_writer`. Whatever could not be uploaded or
+    registered goes to the `spool` and is retried by a `SpoolDrainer`. `upload(url, file_name)` must return the uploaded path, or None if the
+    recording can't be uploaded at all.
+    """
+
+    def __init__(
+        self,
+        supabase_client,
+        spool,
+        audio_file_writer,
+        upload,
+        silence_threshold_dbfs=-50.0,
+        quarantine_dir=None,
+    ):
+        self.supabase_client = supabase_client
+        self.spool = spool
+        self.audio_file_writer = audio_file_writer
+        self.upload = upload
+        self.silence_threshold_dbfs = silence_threshold_dbfs
+        self.quarantine_dir = quarantine_dir
+
+    def upload_and_register(self, url, metadata):
+        fingerprint = None
+        samples = self.decode(metadata)
+        if samples is not None:
+            if not self.check_for_dead_air(metadata, samples):
+                print(f"Skipping the upload of {metadata['file_name']}: the recording is silent")
+                quarantine_recording(metadata["file_name"], self.quarantine_dir)
+                return
+
+            # The file is gone once it's uploaded
+            fingerprint = self.compute_fingerprint(metadata, samples)
+
+        try:
+            uploaded_path = self.upload(url, metadata["file_name"])
+        except Exception as e:
+            # Keep the recording instead of losing it, the spool drainer retries it later
+            print(f"Failed to upload {metadata['file_name']}: {e}")
+            self.spool.add(url, metadata)
+            return
+
+        if uploaded_path:
+            self.queue(url, metadata, uploaded_path, fingerprint)
+
+    def spool_failed(self, url, metadata):
+        """Spool a recording whose upload or registration failed unexpectedly, unless its file is gone."""
+        if not os.path.exists(metadata["file_name"]):
+            print(f"Not spooling {metadata['file_name']}: the file no longer exists")
+            return
+        self.spool.add(url, metadata)
+
+    def queue(self, url, metadata, uploaded_path, fingerprint=None):
+        """Register an uploaded recording through the write-behind queue, spooling it if its batch fails."""
+
+        def on_inserted(audio_file):
+            if fingerprint and audio_file:
+                self.register_fingerprint(audio_file, fingerprint)
+
+        def on_failed(error):
+            # The file is already in R2, the spool drainer only retries the insert
+            self.spool.add(url, metadata, uploaded_path)
+
+        audio_file = SupabaseClient.build_audio_file(
+            radio_station_name=metadata["radio_station_name"],
+            radio_station_code=metadata["radio_station_code"],
+            location_state=metadata["location_state"],
+            recorded_at=metadata["recorded_at"],
+            recording_day_of_week=metadata["recording_day_of_week"],
+            file_path=uploaded_path,
+            file_size=metadata["file_size"],
+            silence_ratio=metadata.get("silence_ratio"),
+            is_mostly_silent=metadata.get("is_mostly_silent", False),
+            simulcast_check_pending=bool(fingerprint),
+        )
+        self.audio_file_writer.submit(audio_file, on_inserted=on_inserted, on_failed=on_failed)
+
+    def decode(self, metadata):
+        """PCM samples of the recording, None if it could not be decoded (then it's registered unchecked)."""
+        try:
+            return decode_pcm(metadata["file_name"])
+        except Exception as e:
+            # Analysis is best effort, never lose a recording because of it
+            print(f"Failed to decode {metadata['file_name']}: {e}")
+            return None
+
+    def check_for_dead_air(self, metadata, samples=None):
+        """Add the silence ratio of the recording to its metadata, returns False if it's fully silent."""
+        try:
+            levels = detect_dead_air(metadata["file_name"], self.silence_threshold_dbfs, samples=samples)
+        except Exception as e:
+            # Analysis is best effort, never lose a recording because of it
+            print(f"Failed to analyze the audio levels of {metadata['file_name']}: {e}")
+            return True
+
+        print(f"Audio levels of {metadata['file_name']}: {levels}")
+        metadata["silence_ratio"] = levels["silence_ratio"]
+        metadata["is_mostly_silent"] = levels["is_mostly_silent"]
+        return not levels["is_silent"]
+
+    def compute_fingerprint(self, metadata, samples=None):
+        """Fingerprint of the recording for simulcast detection, None if it could not be computed."""
+        try:
+            return fingerprint_recording(metadata["file_name"], samples=samples)
+        except Exception as e:
+            print(f"Failed to fingerprint {metadata['file_name']}: {e}")
+            return None
+
+    def register_fingerprint(self, audio_file, fingerprint):
+        try:
+            detect_simulcast(self.supabase_client, audio_file, fingerprint)
+        except Exception as e:
+            # The recording is simply analyzed like any other one
+            print(f"Failed to register the fingerprint of {audio_file['id']}: {e}")
+
+    def spool_orphaned_recordings(self, url, get_metadata):
+        """Spool the recordings of `url` left behind in the working directory by a previous run.
+
+        `get_metadata(file_name, start_time)` builds the metadata of a recording. Must be called
+        before the station starts recording, otherwise the file that ffmpeg is currently writing
+        would be spooled too.
+        """
+        for file_name in get_recording_files(url):
+            if os.path.getsize(file_name) == 0:
+                os.remove(file_name)
+                continue
+            self.spool.add(url, get_metadata(file_name, get_segment_start_time(file_name)))
+
+    def start_spool_drainer(self, urls):
+        """Retry the spooled recordings of `urls` in the background, registered like live recordings."""
+        drainer = SpoolDrainer(
+            self.spool, urls, upload=self.upload, register=self.queue, fingerprint=self.compute_fingerprint
+        )
+        drainer.start()
+        return drainer
+
+
+def get_recording_files(url):
+    """Recordings of `url` in the working directory, in any encoding profile (the profile may have changed)."""
+    file_names = []
+    for profile in ENCODING_PROFILES.values():
+        file_names.extend(glob.glob(f"radio_{get_url_hash(url)}_*.{profile['extension']}"))
+    return sorted(file_names)
+
+
+def get_url_hash(url):
+    # Hash the URL and get the last 6 characters
+    return hashlib.sha256(url.encode()).hexdigest()[-6:]
@@ -0,0 +1,69 @@
+import os
+import re
+import time
+
+# Segment file names embed the local start time of each segment (expanded by ffmpeg's `-strftime`)
+SEGMENT_TIMESTAMP_PATTERN = "%Y%m%d_%H%M%S"
+
+# The segment muxer logs this line every time it opens the next segment file
+SEGMENT_OPENING_REGEX = re.compile(r"Opening '(?P<file_name>[^']+)' for writing")
+SEGMENT_TIMESTAMP_REGEX = re.compile(r"_(?P<timestamp>\d{8}_\d{6})\.\w+$")
+
+
+def get_segment_output_options(segment_seconds):
+    """Output options that make ffmpeg write fixed-length, individually playable chunks."""
+    return {
+        "f": "segment",
+        "segment_time": segment_seconds,
+        "reset_timestamps": 1,
+        "strftime": 1,
+    }
+
+
+def get_segment_start_time(file_name):
+    """Parse the epoch start time that ffmpeg embedded into a segment file name."""
+    match = SEGMENT_TIMESTAMP_REGEX.search(os.path.basename(file_name))
+    if not match:
+        raise ValueError(f"No segment timestamp found in file name: {file_name}")
+    return time.mktime(time.strptime(match.group("timestamp"), SEGMENT_TIMESTAMP_PATTERN))
+
+
+class SegmentTracker:
+    """Turns ffmpeg segment muxer log lines into "segment closed" callbacks.
+
+    The muxer opens segment N+1 right after closing segment N, so seeing a new file being
+    opened means the previous one is complete. The last segment is reported by `finish`,
+    which must be called once ffmpeg exits (whether it succeeded or not).
+    """
+
+    def __init__(self, on_segment_closed):
+        self.on_segment_closed = on_segment_closed
+        self.current_segment = None
+        self.closed_segments = 0
+
+    def handle_log_line(self, line):
+        match = SEGMENT_OPENING_REGEX.search(line)
+        if not match:
+            return
+
+        file_name = match.group("file_name")
+        if file_name == self.current_segment:
+            return
+
+        previous_segment = self.current_segment
+        self.current_segment = file_name
+        if previous_segment:
+            self.__close(previous_segment)
+
+    def finish(self):
+        segment = self.current_segment
+        self.current_segment = None
+
+        # A partially written segment is still playable audio, keep it unless it's empty
+        if segment and os.path.exists(segment) and os.path.getsize(segment) > 0:
+            self.__close(segment)
+
+    def __close(self, file_name):
+        self.closed_segments += 1
+        print(f"Segment closed: {file_name}")
+        self.on_segment_closed(file_name)
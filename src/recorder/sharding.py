@@ -0,0 +1,69 @@
+import bisect
+import hashlib
+
+
+def parse_recorder_nodes(value):
+    """Parse "node_a:3,node_b:1" (weights optional, default 1) into {"node_a": 3, "node_b": 1}."""
+    nodes = {}
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, weight = entry.partition(":")
+        nodes[name.strip()] = int(weight) if weight else 1
+
+    if not nodes:
+        raise ValueError(f"No recorder nodes found in: {value!r}")
+    return nodes
+
+
+class ConsistentHashRing:
+    """Assigns keys to nodes so that adding or removing a node only moves the keys it owns.
+
+    Each node is placed on the ring `virtual_nodes * weight` times, so a node with weight 2
+    receives roughly twice as many keys as a node with weight 1.
+    """
+
+    def __init__(self, nodes=None, virtual_nodes=100):
+        self.virtual_nodes = virtual_nodes
+        self.weights = {}
+        self.ring = []  # Sorted list of (position, node)
+
+        for node, weight in (nodes or {}).items():
+            self.add_node(node, weight)
+
+    def add_node(self, node, weight=1):
+        if node in self.weights:
+            raise ValueError(f"Node already exists: {node}")
+        if weight < 1:
+            raise ValueError(f"Weight of node {node} must be at least 1")
+
+        self.weights[node] = weight
+        for replica in range(self.virtual_nodes * weight):
+            bisect.insort(self.ring, (self.__hash(f"{node}#{replica}"), node))
+
+    def remove_node(self, node):
+        if node not in self.weights:
+            raise ValueError(f"Node does not exist: {node}")
+
+        del self.weights[node]
+        self.ring = [(position, owner) for position, owner in self.ring if owner != node]
+
+    def get_node(self, key):
+        if not self.ring:
+            raise ValueError("The hash ring has no nodes")
+
+        # The first virtual node clockwise from the key owns it
+        index = bisect.bisect(self.ring, (self.__hash(key), ""))
+        return self.ring[index % len(self.ring)][1]
+
+    def assign(self, items, get_key):
+        """Group `items` by the node that owns `get_key(item)`. Every node gets an entry."""
+        assignment = {node: [] for node in self.weights}
+        for item in items:
+            assignment[self.get_node(get_key(item))].append(item)
+        return assignment
+
+    @staticmethod
+    def __hash(value):
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
@@ -0,0 +1,35 @@
+import os
+import shutil
+
+from processing_pipeline.audio_utils import analyze_audio_levels
+
+# Share of silent windows from which a recording is flagged, or not uploaded at all
+MOSTLY_SILENT_RATIO = 0.5
+FULLY_SILENT_RATIO = 0.98
+
+
+def detect_dead_air(file_name, silence_threshold_dbfs=-50.0, samples=None):
+    """Measure how much of a recording is dead air.
+
+    Returns the audio levels of the file plus `is_mostly_silent` (should be flagged in
+    `audio_files`) and `is_silent` (not worth uploading or transcribing). `samples` are
+    the decoded PCM of the file, if already at hand.
+    """
+    levels = analyze_audio_levels(file_name, silence_threshold_dbfs=silence_threshold_dbfs, samples=samples)
+    levels["is_mostly_silent"] = levels["silence_ratio"] >= MOSTLY_SILENT_RATIO
+    levels["is_silent"] = levels["silence_ratio"] >= FULLY_SILENT_RATIO
+    return levels
+
+
+def quarantine_recording(file_name, quarantine_dir=None):
+    """Move a silent recording out of the way, or delete it if there is no quarantine directory."""
+    if not quarantine_dir:
+        os.remove(file_name)
+        print(f"Deleted silent recording {file_name}")
+        return None
+
+    os.makedirs(quarantine_dir, exist_ok=True)
+    quarantined_file_name = os.path.join(quarantine_dir, os.path.basename(file_name))
+    shutil.move(file_name, quarantined_file_name)
+    print(f"Quarantined silent recording {file_name} as {quarantined_file_name}")
+    return quarantined_file_name
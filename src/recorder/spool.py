@@ -0,0 +1,265 @@
+import contextvars
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+JOURNAL_FILE_NAME = "journal.sqlite3"
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+
+
+class RecordingSpool:
+    """On-disk spool of recordings whose upload or database insert has not succeeded yet.
+
+    Spooled files are moved into `spool_dir` and tracked in a small SQLite journal next to
+    them, so they survive a restart of the recorder and can be retried later by `SpoolDrainer`.
+    Every entry remembers the R2 path once the upload succeeded, so a retry after a failed
+    database insert does not upload the file again.
+    """
+
+    def __init__(self, spool_dir):
+        self.spool_dir = spool_dir
+        self.journal_path = os.path.join(spool_dir, JOURNAL_FILE_NAME)
+        self.lock = threading.Lock()
+        self.initialized = False
+
+    def add(self, url, metadata, uploaded_path=None):
+        metadata = dict(metadata)
+        file_name = metadata["file_name"]
+
+        with self.lock, self.__connect() as connection:
+            # The file is already gone once it has been uploaded
+            if not uploaded_path and os.path.exists(file_name):
+                spooled_file_name = os.path.join(self.spool_dir, os.path.basename(file_name))
+                if os.path.abspath(file_name) != os.path.abspath(spooled_file_name):
+                    shutil.move(file_name, spooled_file_name)
+                metadata["file_name"] = spooled_file_name
+
+            cursor = connection.execute(
+                """
+                INSERT INTO spooled_recordings (url, metadata, uploaded_path, status, attempts, next_attempt_at, created_at)
+                VALUES (?, ?, ?, ?, 0, ?, ?)
+                """,
+                (url, json.dumps(metadata), uploaded_path, PENDING, time.time(), time.time()),
+            )
+            print(f"Spooled {file_name} for a later retry")
+            return cursor.lastrowid
+
+    def claim_due(self, urls, limit=10):
+        """Mark up to `limit` entries of the given stations that are due for a retry as in flight."""
+        placeholders = ", ".join("?" for _ in urls)
+        with self.lock, self.__connect() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT id, url, metadata, uploaded_path, attempts FROM spooled_recordings
+                WHERE status = ? AND next_attempt_at <= ? AND url IN ({placeholders})
+                ORDER BY created_at
+                LIMIT ?
+                """,
+                (PENDING, time.time(), *urls, limit),
+            ).fetchall()
+
+            connection.executemany(
+                "UPDATE spooled_recordings SET status = ? WHERE id = ?",
+                [(IN_FLIGHT, row[0]) for row in rows],
+            )
+
+        return [
+            {
+                "id": row[0],
+                "url": row[1],
+                "metadata": json.loads(row[2]),
+                "uploaded_path": row[3],
+                "attempts": row[4],
+            }
+            for row in rows
+        ]
+
+    def release_in_flight(self, urls):
+        """Make entries that were in flight when the recorder stopped eligible for a retry again."""
+        placeholders = ", ".join("?" for _ in urls)
+        with self.lock, self.__connect() as connection:
+            connection.execute(
+                f"UPDATE spooled_recordings SET status = ? WHERE status = ? AND url IN ({placeholders})",
+                (PENDING, IN_FLIGHT, *urls),
+            )
+
+    def mark_uploaded(self, entry_id, uploaded_path):
+        with self.lock, self.__connect() as connection:
+            connection.execute(
+                "UPDATE spooled_recordings SET uploaded_path = ? WHERE id = ?",
+                (uploaded_path, entry_id),
+            )
+
+    def mark_failed(self, entry_id, error, retry_in_seconds):
+        with self.lock, self.__connect() as connection:
+            connection.execute(
+                """
+                UPDATE spooled_recordings
+                SET status = ?, attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+                """,
+                (PENDING, time.time() + retry_in_seconds, str(error), entry_id),
+            )
+
+    def remove(self, entry_id):
+        with self.lock, self.__connect() as connection:
+            connection.execute("DELETE FROM spooled_recordings WHERE id = ?", (entry_id,))
+
+    def pending_count(self, urls):
+        placeholders = ", ".join("?" for _ in urls)
+        with self.lock, self.__connect() as connection:
+            return connection.execute(
+                f"SELECT COUNT(*) FROM spooled_recordings WHERE url IN ({placeholders})", tuple(urls)
+            ).fetchone()[0]
+
+    def __connect(self):
+        if not self.initialized:
+            os.makedirs(self.spool_dir, exist_ok=True)
+
+        # Several flow runs may share the journal, wait for their writes instead of failing
+        connection = sqlite3.connect(self.journal_path, timeout=30)
+        if not self.initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS spooled_recordings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    uploaded_path TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self.initialized = True
+        return _ClosingConnection(connection)
+
+
+class _ClosingConnection:
+    """Commits (or rolls back) and closes the connection when leaving the `with` block."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type:
+                self.connection.rollback()
+            else:
+                self.connection.commit()
+        finally:
+            self.connection.close()
+
+
+class SpoolDrainer:
+    """Retries the spooled recordings of some stations on a background thread.
+
+    `upload(url, file_name)` must return the uploaded path and
+    `register(url, metadata, uploaded_path, fingerprint)` registers the recording. The optional
+    `fingerprint(metadata)` runs before the upload deletes the file, recordings that were already
+    uploaded are registered without one. Failed entries are retried with exponential backoff,
+    starting at `min_backoff_seconds` and capped at `max_backoff_seconds`.
+    """
+
+    def __init__(
+        self,
+        spool,
+        urls,
+        upload,
+        register,
+        fingerprint=None,
+        poll_seconds=60,
+        min_backoff_seconds=60,
+        max_backoff_seconds=3600,
+        name="spool-drainer",
+    ):
+        self.spool = spool
+        self.urls = list(urls)
+        self.upload = upload
+        self.register = register
+        self.fingerprint = fingerprint
+        self.poll_seconds = poll_seconds
+        self.min_backoff_seconds = min_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.name = name
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        # Entries left in flight by a previous (crashed) run belong to these stations only
+        self.spool.release_in_flight(self.urls)
+
+        pending = self.spool.pending_count(self.urls)
+        if pending:
+            print(f"[{self.name}] Resuming {pending} spooled recording(s)")
+
+        self.stopping.clear()
+        context = contextvars.copy_context()
+        self.thread = threading.Thread(target=context.run, args=(self.__run,), name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        if not self.thread:
+            return
+        self.stopping.set()
+        self.thread.join(timeout)
+        self.thread = None
+
+    def drain(self):
+        """Retry every entry that is currently due, returns the number of entries that succeeded."""
+        succeeded = 0
+        for entry in self.spool.claim_due(self.urls):
+            if self.stopping.is_set():
+                self.spool.release_in_flight(self.urls)
+                break
+
+            file_name = entry["metadata"]["file_name"]
+            if not entry["uploaded_path"] and not os.path.exists(file_name):
+                print(f"[{self.name}] Dropping spooled recording {file_name}: the file no longer exists")
+                self.spool.remove(entry["id"])
+                continue
+
+            try:
+                fingerprint = None
+                uploaded_path = entry["uploaded_path"]
+                if not uploaded_path:
+                    if self.fingerprint:
+                        fingerprint = self.fingerprint(entry["metadata"])
+                    uploaded_path = self.upload(entry["url"], file_name)
+                    self.spool.mark_uploaded(entry["id"], uploaded_path)
+
+                self.register(entry["url"], entry["metadata"], uploaded_path, fingerprint)
+                self.spool.remove(entry["id"])
+                succeeded += 1
+            except Exception as e:
+                retry_in_seconds = self.get_backoff_seconds(entry["attempts"] + 1)
+                print(
+                    f"[{self.name}] Failed to drain {file_name}: {e}. "
+                    f"Retrying in {retry_in_seconds} seconds"
+                )
+                self.spool.mark_failed(entry["id"], e, retry_in_seconds)
+
+        return succeeded
+
+    def get_backoff_seconds(self, attempts):
+        return min(self.min_backoff_seconds * 2 ** max(attempts - 1, 0), self.max_backoff_seconds)
+
+    def __run(self):
+        while not self.stopping.is_set():
+            try:
+                self.drain()
+            except Exception as e:
+                print(f"[{self.name}] Failed to read the spool: {e}")
+            self.stopping.wait(self.poll_seconds)
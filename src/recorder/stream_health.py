@@ -0,0 +1,109 @@
+import random
+import time
+
+import requests
+
+# Circuit breaker states
+CLOSED = "closed"  # The stream works, captures run normally
+OPEN = "open"  # The stream keeps failing, only cheap probes are made (at the maximum backoff)
+HALF_OPEN = "half_open"  # A probe succeeded after the circuit opened, the next capture decides
+
+
+def probe_stream(url, timeout_seconds=10):
+    """Cheap check that a stream answers and starts sending data, without starting ffmpeg."""
+    try:
+        with requests.get(url, stream=True, timeout=timeout_seconds, headers={"Icy-MetaData": "0"}) as response:
+            if response.status_code >= 400:
+                print(f"Probe of {url} failed with HTTP {response.status_code}")
+                return False
+
+            # The first chunk is enough, whether it's audio or an HLS playlist
+            for chunk in response.iter_content(chunk_size=1024):
+                if chunk:
+                    return True
+
+            print(f"Probe of {url} failed: the stream returned no data")
+            return False
+
+    except requests.RequestException as e:
+        print(f"Probe of {url} failed: {e}")
+        return False
+
+
+class StreamHealth:
+    """Failure bookkeeping of one station, deciding when its next capture should start.
+
+    After a failed capture, `wait_until_healthy` probes the stream with a jittered exponential
+    backoff and returns as soon as the stream answers again. After `failure_threshold`
+    consecutive failures the circuit opens: the station is only probed every
+    `max_backoff_seconds` until a probe succeeds. A capture that fails right after the circuit
+    half-opened opens it again immediately.
+    """
+
+    def __init__(
+        self,
+        url,
+        probe=probe_stream,
+        min_backoff_seconds=5,
+        max_backoff_seconds=300,
+        failure_threshold=5,
+    ):
+        self.url = url
+        self.probe = probe
+        self.min_backoff_seconds = min_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.failure_threshold = failure_threshold
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.last_error = None
+
+    def record_success(self):
+        if self.state != CLOSED:
+            print(f"Stream {self.url} recovered after {self.consecutive_failures} failure(s)")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.last_error = None
+
+    def record_failure(self, error=None):
+        self.consecutive_failures += 1
+        self.last_error = error
+
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                print(f"Circuit opened for {self.url} after {self.consecutive_failures} consecutive failure(s)")
+            self.state = OPEN
+
+    def get_backoff_seconds(self):
+        if self.state == OPEN:
+            backoff = self.max_backoff_seconds
+        else:
+            backoff = self.min_backoff_seconds * 2 ** max(self.consecutive_failures - 1, 0)
+            backoff = min(backoff, self.max_backoff_seconds)
+        # Jitter so that stations on the same CDN don't retry in lockstep
+        return random.uniform(backoff / 2, backoff)
+
+    def wait_until_healthy(self):
+        """Block until the stream looks healthy enough to start the next capture."""
+        while True:
+            backoff_seconds = self.get_backoff_seconds()
+            print(f"Probing {self.url} ({self.state}) in {backoff_seconds:.0f} seconds")
+            time.sleep(backoff_seconds)
+
+            if self.probe is None or self.probe(self.url):
+                self.allow_next_capture()
+                return
+
+            self.record_failure("Probe failed")
+
+    def allow_next_capture(self):
+        """The backoff passed (and the stream answered, if probed): let the next capture decide."""
+        if self.state == OPEN:
+            self.state = HALF_OPEN
+
+    def summary(self):
+        return {
+            "url": self.url,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
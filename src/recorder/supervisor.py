@@ -0,0 +1,175 @@
+import asyncio
+import time
+
+from recorder.segments import SegmentTracker
+from recorder.stream_health import StreamHealth
+
+
+class StationRecorderState:
+    """Restart bookkeeping for one station managed by the supervisor, its backoff is kept by `health`."""
+
+    def __init__(self, station, health):
+        self.station = station
+        self.health = health
+        self.ffmpeg = None
+        self.status = "starting"
+        self.restarts = 0
+        self.segments_captured = 0
+        self.started_at = None
+        self.next_start_at = None
+        self.last_error = None
+
+    def summary(self):
+        return {
+            "code": self.station["code"],
+            "status": self.status,
+            "restarts": self.restarts,
+            "consecutive_failures": self.health.consecutive_failures,
+            "circuit": self.health.state,
+            "segments_captured": self.segments_captured,
+            "last_error": self.last_error,
+        }
+
+
+class RecorderSupervisor:
+    """Records many stations from a single asyncio event loop.
+
+    Every station gets one long-lived segmented ffmpeg subprocess. When it exits, the station
+    is restarted after the backoff of its `StreamHealth`, whose failures reset once a run has
+    been stable for `stable_run_seconds`. Restarting ffmpeg is the probe, the stream is not
+    probed separately. Closed segments are handed to `on_segment(station, file_name)`
+    on a worker thread so that slow uploads never block the event loop, and one aggregated
+    heartbeat is printed every `heartbeat_seconds` instead of one flow run per station.
+    """
+
+    def __init__(
+        self,
+        stations,
+        create_ffmpeg,
+        on_segment,
+        min_backoff_seconds=5,
+        max_backoff_seconds=300,
+        stable_run_seconds=60,
+        heartbeat_seconds=60,
+    ):
+        self.states = [
+            StationRecorderState(
+                station,
+                StreamHealth(
+                    station["url"],
+                    probe=None,
+                    min_backoff_seconds=min_backoff_seconds,
+                    max_backoff_seconds=max_backoff_seconds,
+                ),
+            )
+            for station in stations
+        ]
+        self.create_ffmpeg = create_ffmpeg
+        self.on_segment = on_segment
+        self.stable_run_seconds = stable_run_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stopping = asyncio.Event()
+        self.closed_segments = asyncio.Queue()
+
+    async def run(self):
+        """Supervise all stations until `stop` is called."""
+        station_tasks = [asyncio.create_task(self.__supervise(state)) for state in self.states]
+        dispatcher = asyncio.create_task(self.__dispatch_segments())
+        heartbeat = asyncio.create_task(self.__heartbeat())
+
+        try:
+            await self.stopping.wait()
+        finally:
+            self.stopping.set()
+            for state in self.states:
+                self.__terminate(state)
+            await asyncio.gather(*station_tasks, return_exceptions=True)
+
+            # Let the segments that were already closed reach the upload worker
+            await self.closed_segments.join()
+            dispatcher.cancel()
+            heartbeat.cancel()
+            print(f"Recorder supervisor stopped: {self.get_heartbeat()}")
+
+    def stop(self):
+        self.stopping.set()
+
+    def get_heartbeat(self):
+        statuses = {}
+        for state in self.states:
+            statuses[state.status] = statuses.get(state.status, 0) + 1
+
+        return {
+            "stations": len(self.states),
+            "statuses": statuses,
+            "segments_captured": sum(state.segments_captured for state in self.states),
+            "restarts": sum(state.restarts for state in self.states),
+            "failing_stations": [state.summary() for state in self.states if state.health.consecutive_failures > 0],
+        }
+
+    async def __supervise(self, state):
+        while not self.stopping.is_set():
+            tracker = SegmentTracker(lambda file_name: self.__segment_closed(state, file_name))
+            state.ffmpeg = self.create_ffmpeg(state.station)
+            state.ffmpeg.on("stderr", tracker.handle_log_line)
+            state.status = "recording"
+            state.started_at = time.monotonic()
+
+            try:
+                await state.ffmpeg.execute()
+                state.last_error = None
+            except Exception as e:
+                state.last_error = str(e)
+            finally:
+                state.ffmpeg = None
+                tracker.finish()
+
+            if self.stopping.is_set():
+                break
+
+            # Without a duration, ffmpeg only exits when the stream drops
+            if time.monotonic() - state.started_at >= self.stable_run_seconds:
+                state.health.record_success()
+            state.health.record_failure(state.last_error or "stream ended")
+            state.restarts += 1
+
+            backoff_seconds = state.health.get_backoff_seconds()
+            state.status = "backoff"
+            state.next_start_at = time.time() + backoff_seconds
+            print(
+                f"Recording of {state.station['code']} stopped ({state.last_error or 'stream ended'}). "
+                f"Restarting in {backoff_seconds:.0f} seconds"
+            )
+
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=backoff_seconds)
+            except asyncio.TimeoutError:
+                state.health.allow_next_capture()
+
+        state.status = "stopped"
+
+    def __segment_closed(self, state, file_name):
+        state.segments_captured += 1
+        self.closed_segments.put_nowait((state.station, file_name))
+
+    async def __dispatch_segments(self):
+        while True:
+            station, file_name = await self.closed_segments.get()
+            try:
+                await asyncio.to_thread(self.on_segment, station, file_name)
+            except Exception as e:
+                print(f"Failed to hand over segment {file_name}: {e}")
+            finally:
+                self.closed_segments.task_done()
+
+    async def __heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            print(f"Recorder supervisor heartbeat: {self.get_heartbeat()}")
+
+    def __terminate(self, state):
+        if state.ffmpeg:
+            try:
+                state.ffmpeg.terminate()
+            except Exception as e:
+                print(f"Failed to terminate ffmpeg for {state.station['code']}: {e}")
@@ -0,0 +1,78 @@
+import contextvars
+import queue
+import threading
+
+_STOP = object()
+
+
+class UploadWorker:
+    """Runs upload/registration of finished recordings on a background thread.
+
+    The capture loop hands each finished recording to `submit` and immediately starts
+    the next capture. The queue is bounded, so if uploads fall behind (e.g. R2 is slow),
+    `submit` blocks instead of letting recordings pile up in memory. Callers that must never
+    block (e.g. ffmpeg's event handlers in segmented mode) use `submit_nowait`, which hands a
+    recording that doesn't fit in the queue to `on_failed` right away. When the handler raises,
+    `on_failed(error, *args)` gets the submitted arguments, which is where the recording must be
+    made durable (e.g. spooled).
+    """
+
+    def __init__(self, handler, max_queue_size=4, name="upload-worker", on_failed=None):
+        self.handler = handler
+        self.on_failed = on_failed
+        self.name = name
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.thread = None
+
+    def start(self):
+        # Run the worker inside a copy of the caller's context so that Prefect tasks
+        # called by the handler are attached to the current flow run
+        context = contextvars.copy_context()
+        self.thread = threading.Thread(target=context.run, args=(self.__run,), name=self.name, daemon=True)
+        self.thread.start()
+
+    def submit(self, *args):
+        if not self.thread or not self.thread.is_alive():
+            raise RuntimeError(f"{self.name} is not running")
+        self.queue.put(args)
+
+    def submit_nowait(self, *args):
+        if not self.thread or not self.thread.is_alive():
+            raise RuntimeError(f"{self.name} is not running")
+        try:
+            self.queue.put_nowait(args)
+        except queue.Full:
+            print(f"[{self.name}] Upload queue is full, handing back {args}")
+            self.__hand_back(RuntimeError(f"{self.name} queue is full"), args)
+
+    def pending(self):
+        return self.queue.unfinished_tasks
+
+    def stop(self, timeout=None):
+        """Wait for the queued recordings to be handled, then stop the worker thread."""
+        if not self.thread:
+            return
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def __run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self.handler(*item)
+            except Exception as e:
+                print(f"[{self.name}] Failed to handle {item}: {e}")
+                self.__hand_back(e, item)
+            finally:
+                self.queue.task_done()
+
+    def __hand_back(self, error, item):
+        if not self.on_failed:
+            return
+        try:
+            self.on_failed(error, *item)
+        except Exception as e:
+            print(f"[{self.name}] Failed to hand back {item}: {e}")
@@ -0,0 +1,103 @@
+import contextvars
+import threading
+
+
+class AudioFileBatchWriter:
+    """Write-behind queue for `audio_files` rows, shared by every station recorded in the same flow run.
+
+    Rows are inserted by a background thread with one multi-row insert as soon as
+    `max_batch_size` rows are pending or `flush_interval_seconds` passed, so registering a
+    recording never waits for Supabase. `insert_batch(rows)` must return the inserted rows.
+    Every row may come with an `on_inserted(audio_file)` callback and an `on_failed(error)`
+    callback, which is where a failed batch must be made durable (e.g. spooled).
+    """
+
+    def __init__(self, insert_batch, max_batch_size=50, flush_interval_seconds=5.0, name="audio-file-writer"):
+        self.insert_batch = insert_batch
+        self.max_batch_size = max_batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.name = name
+
+        self.pending = []
+        self.condition = threading.Condition()
+        # Batches are inserted one at a time, whether by the thread or by an explicit flush
+        self.flush_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.condition:
+            if self.thread and self.thread.is_alive():
+                return
+            self.stopping.clear()
+            context = contextvars.copy_context()
+            self.thread = threading.Thread(target=context.run, args=(self.__run,), name=self.name, daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=None):
+        if self.thread:
+            self.stopping.set()
+            with self.condition:
+                self.condition.notify_all()
+            self.thread.join(timeout)
+            self.thread = None
+        # Nothing that was submitted is left behind
+        self.flush()
+
+    def submit(self, row, on_inserted=None, on_failed=None):
+        with self.condition:
+            self.pending.append({"row": row, "on_inserted": on_inserted, "on_failed": on_failed})
+            if len(self.pending) >= self.max_batch_size:
+                self.condition.notify_all()
+
+    def pending_count(self):
+        with self.condition:
+            return len(self.pending)
+
+    def flush(self):
+        """Insert all pending rows in batches of `max_batch_size`, returns the number of inserted rows."""
+        inserted = 0
+        with self.flush_lock:
+            while True:
+                with self.condition:
+                    batch = self.pending[: self.max_batch_size]
+                    del self.pending[: len(batch)]
+                if not batch:
+                    return inserted
+                inserted += self.__insert(batch)
+
+    def __insert(self, batch):
+        try:
+            audio_files = self.insert_batch([entry["row"] for entry in batch])
+        except Exception as e:
+            print(f"[{self.name}] Failed to insert {len(batch)} audio file(s): {e}")
+            for entry in batch:
+                self.__call(entry["on_failed"], e)
+            return 0
+
+        print(f"[{self.name}] Inserted {len(batch)} audio file(s)")
+        # Every recording has its own R2 path, which identifies its row in the response
+        audio_files_by_path = {audio_file["file_path"]: audio_file for audio_file in audio_files or []}
+        for entry in batch:
+            self.__call(entry["on_inserted"], audio_files_by_path.get(entry["row"]["file_path"]))
+        return len(batch)
+
+    def __call(self, callback, argument):
+        if not callback:
+            return
+        try:
+            callback(argument)
+        except Exception as e:
+            print(f"[{self.name}] Audio file callback failed: {e}")
+
+    def __run(self):
+        while not self.stopping.is_set():
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.stopping.is_set() or len(self.pending) >= self.max_batch_size,
+                    timeout=self.flush_interval_seconds,
+                )
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[{self.name}] Failed to flush audio files: {e}")
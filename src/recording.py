@@ -1,16 +1,30 @@
 from datetime import datetime
 import os
 import time
-import hashlib
-import boto3
 from prefect import serve
 from prefect.task_runners import ConcurrentTaskRunner
 
 from ffmpeg import FFmpeg
+from ffmpeg.asyncio import FFmpeg as AsyncFFmpeg
 from dotenv import load_dotenv
 import sentry_sdk
 
+from processing_pipeline.audio_utils import get_encoder_output_options, get_encoding_profile
+from processing_pipeline.r2_utils import R2Uploader, create_r2_client
 from processing_pipeline.supabase_utils import SupabaseClient
+from recorder import (
+    ConsistentHashRing,
+    RecorderSupervisor,
+    AudioFileBatchWriter,
+    RecordingRegistrar,
+    RecordingSpool,
+    SegmentTracker,
+    StreamHealth,
+    UploadWorker,
+)
+from recorder.registration import get_url_hash
+from recorder.sharding import parse_recorder_nodes
+from recorder.segments import SEGMENT_TIMESTAMP_PATTERN, get_segment_output_options, get_segment_start_time
 from utils import fetch_radio_stations, optional_flow, optional_task
 
 load_dotenv()
@@ -18,20 +32,56 @@ load_dotenv()
 # Setup Sentry
 sentry_sdk.init(dsn=os.getenv("SENTRY_DSN"))
 
-# Setup S3 Client
-R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
+# Setup S3 Client (one pooled client shared by every upload of this process)
 R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
-s3_client = boto3.client(
-    "s3", endpoint_url=R2_ENDPOINT_URL, aws_access_key_id=R2_ACCESS_KEY_ID, aws_secret_access_key=R2_SECRET_ACCESS_KEY
-)
+s3_client = create_r2_client()
 
 # Setup Supabase client
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 supabase_client = SupabaseClient(SUPABASE_URL, SUPABASE_KEY)
 
+# Maximum number of finished recordings waiting for upload in pipelined mode
+UPLOAD_QUEUE_SIZE = int(os.getenv("RECORDING_UPLOAD_QUEUE_SIZE", "4"))
+
+# Windows quieter than this count as dead air. Fully silent recordings are moved to the
+# quarantine directory when it's set and deleted otherwise.
+SILENCE_THRESHOLD_DBFS = float(os.getenv("RECORDING_SILENCE_THRESHOLD_DBFS", "-50"))
+RECORDING_QUARANTINE_DIR = os.getenv("RECORDING_QUARANTINE_DIR")
+
+# Codec and container of the recordings, see ENCODING_PROFILES (e.g. "opus_speech" for 24 kbps mono Opus)
+ENCODING_PROFILE = get_encoding_profile(os.getenv("RECORDING_ENCODING_PROFILE", "mp3"))
+
+# Recordings that could not be uploaded or registered are kept here and retried in the background
+RECORDING_SPOOL_DIR = os.getenv("RECORDING_SPOOL_DIR", "spool")
+
+# audio_files rows are inserted in batches, in the background. Only the supervisor records several
+# stations in one flow run and batches their rows together, the other flows batch their own station's.
+AUDIO_FILE_BATCH_SIZE = int(os.getenv("AUDIO_FILE_BATCH_SIZE", "50"))
+AUDIO_FILE_FLUSH_SECONDS = float(os.getenv("AUDIO_FILE_FLUSH_SECONDS", "5"))
+
+registrar = RecordingRegistrar(
+    supabase_client,
+    RecordingSpool(RECORDING_SPOOL_DIR),
+    AudioFileBatchWriter(
+        # Looked up on every batch, the task is defined below
+        lambda audio_files: insert_recorded_audio_files_into_database(audio_files),
+        max_batch_size=AUDIO_FILE_BATCH_SIZE,
+        flush_interval_seconds=AUDIO_FILE_FLUSH_SECONDS,
+    ),
+    # Looked up on every upload as well
+    upload=lambda url, file_path: upload_to_r2_and_clean_up(url, file_path),
+    silence_threshold_dbfs=SILENCE_THRESHOLD_DBFS,
+    quarantine_dir=RECORDING_QUARANTINE_DIR,
+)
+upload_and_register_recording = registrar.upload_and_register
+
+# Recorder machines (with relative capacity) that the stations are sharded across
+RECORDER_NODES = os.getenv("RECORDER_NODES", "max_recorder:3,lite_recorder:1")
+
+# How long a segmented capture waits for data before treating the stream as stalled
+STALLED_STREAM_TIMEOUT_MICROSECONDS = 30_000_000
+
 
 @optional_task(log_prints=True)
 def capture_audio_stream(station, duration_seconds, audio_birate, audio_channels):
@@ -41,29 +91,72 @@ def capture_audio_stream(station, duration_seconds, audio_birate, audio_channels
         # Create the output filename using the timestamp and hash
         start_time = time.time()
         timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(start_time))
-        output_file = f"radio_{get_url_hash(url)}_{timestamp}.mp3"
+        output_file = f"radio_{get_url_hash(url)}_{timestamp}.{ENCODING_PROFILE['extension']}"
 
         # Use ffmpeg to capture audio
         print(f"Start capturing audio from ${url} for {duration_seconds} seconds")
         FFmpeg().option("y").input(url, t=duration_seconds).output(
-            output_file, ab=audio_birate, ac=audio_channels, acodec="libmp3lame"
+            output_file, **get_encoder_output_options(ENCODING_PROFILE, audio_birate, audio_channels)
         ).execute()
 
         return get_metadata(output_file, station, start_time)
 
     except Exception as e:
         print(f"Failed to capture audio stream ${url}: {e}")
-        print("Sleep for 300 seconds before returning")
-        time.sleep(300)
         return None
 
 
+def build_segmented_capture(ffmpeg, url, duration_seconds, segment_seconds, audio_birate, audio_channels):
+    # ffmpeg expands the timestamp of each segment into its file name
+    output_pattern = f"radio_{get_url_hash(url)}_{SEGMENT_TIMESTAMP_PATTERN}.{ENCODING_PROFILE['extension']}"
+
+    # Without a duration ffmpeg runs until the stream drops, so give up on a stalled stream
+    input_options = {"rw_timeout": STALLED_STREAM_TIMEOUT_MICROSECONDS}
+    if duration_seconds:
+        input_options["t"] = duration_seconds
+
+    return (
+        ffmpeg.option("y")
+        .input(url, **input_options)
+        .output(
+            output_pattern,
+            **get_encoder_output_options(ENCODING_PROFILE, audio_birate, audio_channels),
+            **get_segment_output_options(segment_seconds),
+        )
+    )
+
+
+@optional_task(log_prints=True)
+def capture_audio_stream_in_segments(
+    station, duration_seconds, segment_seconds, audio_birate, audio_channels, on_segment
+):
+    url = station["url"]
+    tracker = SegmentTracker(on_segment)
+
+    try:
+        print(f"Start capturing audio from ${url} in {segment_seconds}-second segments")
+        ffmpeg = build_segmented_capture(FFmpeg(), url, duration_seconds, segment_seconds, audio_birate, audio_channels)
+        ffmpeg.on("stderr", tracker.handle_log_line)
+        ffmpeg.execute()
+        succeeded = True
+
+    except Exception as e:
+        print(f"Failed to capture audio stream ${url}: {e}")
+        succeeded = False
+
+    # Hand over the last (possibly partial) segment as well
+    tracker.finish()
+    print(f"Captured {tracker.closed_segments} segment(s) from ${url}")
+    return succeeded
+
+
 @optional_task(log_prints=True, retries=3)
 def upload_to_r2_and_clean_up(url, file_path):
     object_name = os.path.basename(file_path)
     url_hash = get_url_hash(url)
     destination_path = f"radio_{url_hash}/{object_name}"
-    s3_client.upload_file(file_path, R2_BUCKET_NAME, destination_path)
+    # The file is only deleted after R2 confirmed that it stores the same content
+    R2Uploader(s3_client, R2_BUCKET_NAME).upload(file_path, destination_path)
     print(f"File {file_path} uploaded to R2 as {destination_path}")
     os.remove(file_path)
     return destination_path
@@ -84,44 +177,161 @@ def get_metadata(file, station, start_time):
 
 
 @optional_task(log_prints=True, retries=3)
-def insert_recorded_audio_file_into_database(metadata, uploaded_path):
-    supabase_client.insert_audio_file(
-        radio_station_name=metadata["radio_station_name"],
-        radio_station_code=metadata["radio_station_code"],
-        location_state=metadata["location_state"],
-        recorded_at=metadata["recorded_at"],
-        recording_day_of_week=metadata["recording_day_of_week"],
-        file_path=uploaded_path,
-        file_size=metadata["file_size"],
+def insert_recorded_audio_files_into_database(audio_files):
+    return supabase_client.insert_audio_files(audio_files)
+
+
+def spool_orphaned_recordings(station):
+    registrar.spool_orphaned_recordings(
+        station["url"], lambda file_name, start_time: get_metadata(file_name, station, start_time)
     )
 
 
+def start_spool_drainer(stations):
+    for station in stations:
+        spool_orphaned_recordings(station)
+
+    return registrar.start_spool_drainer([station["url"] for station in stations])
+
+
 @optional_flow(name="Audio Recording: Max Recorder", log_prints=True, task_runner=ConcurrentTaskRunner)
-def audio_processing_pipeline_max_recorder(url, duration_seconds, audio_birate, audio_channels, repeat):
-    __start_recording_flow(url, duration_seconds, audio_birate, audio_channels, repeat)
+def audio_processing_pipeline_max_recorder(
+    url, duration_seconds, audio_birate, audio_channels, repeat, pipelined=False, segment_seconds=None
+):
+    __start_recording_flow(url, duration_seconds, audio_birate, audio_channels, repeat, pipelined, segment_seconds)
 
 
 @optional_flow(name="Audio Recording: Lite Recorder", log_prints=True, task_runner=ConcurrentTaskRunner)
-def audio_processing_pipeline_lite_recorder(url, duration_seconds, audio_birate, audio_channels, repeat):
-    __start_recording_flow(url, duration_seconds, audio_birate, audio_channels, repeat)
+def audio_processing_pipeline_lite_recorder(
+    url, duration_seconds, audio_birate, audio_channels, repeat, pipelined=False, segment_seconds=None
+):
+    __start_recording_flow(url, duration_seconds, audio_birate, audio_channels, repeat, pipelined, segment_seconds)
 
 
-def __start_recording_flow(url, duration_seconds, audio_birate, audio_channels, repeat):
+def __start_recording_flow(
+    url, duration_seconds, audio_birate, audio_channels, repeat, pipelined=False, segment_seconds=None
+):
     # Reconstruct the radio station from the URL
     station = reconstruct_radio_station(url)
     if not station:
         raise ValueError(f"Radio station not found for URL: {url}")
 
-    while True:
-        output = capture_audio_stream(station, duration_seconds, audio_birate, audio_channels)
+    def upload_and_register_segment(file_name):
+        metadata = get_metadata(file_name, station, get_segment_start_time(file_name))
+        upload_and_register_recording(station["url"], metadata)
+
+    def spool_failed_segment(error, file_name):
+        registrar.spool_failed(station["url"], get_metadata(file_name, station, get_segment_start_time(file_name)))
 
-        if output and output["file_name"]:
-            uploaded_path = upload_to_r2_and_clean_up(station["url"], output["file_name"])
-            insert_recorded_audio_file_into_database(output, uploaded_path)
+    spool_drainer = start_spool_drainer([station])
+    registrar.audio_file_writer.start()
+
+    # In pipelined mode, uploads and database inserts run on a background worker
+    # so that the next capture starts right after the previous one ends.
+    # Segmented mode always needs the worker: segments are uploaded while ffmpeg keeps recording.
+    upload_worker = None
+    if segment_seconds:
+        upload_worker = UploadWorker(
+            upload_and_register_segment, max_queue_size=UPLOAD_QUEUE_SIZE, on_failed=spool_failed_segment
+        )
+        upload_worker.start()
+    elif pipelined:
+        upload_worker = UploadWorker(
+            upload_and_register_recording,
+            max_queue_size=UPLOAD_QUEUE_SIZE,
+            on_failed=lambda error, url, metadata: registrar.spool_failed(url, metadata),
+        )
+        upload_worker.start()
+
+    stream_health = StreamHealth(station["url"])
+
+    try:
+        while True:
+            if segment_seconds:
+                # Segments are handed over from ffmpeg's event handlers, which must never block
+                succeeded = capture_audio_stream_in_segments(
+                    station,
+                    duration_seconds,
+                    segment_seconds,
+                    audio_birate,
+                    audio_channels,
+                    upload_worker.submit_nowait,
+                )
+            else:
+                output = capture_audio_stream(station, duration_seconds, audio_birate, audio_channels)
+                succeeded = bool(output and output["file_name"])
+
+                if succeeded:
+                    if upload_worker:
+                        upload_worker.submit(station["url"], output)
+                    else:
+                        upload_and_register_recording(station["url"], output)
+
+            if succeeded:
+                stream_health.record_success()
+            else:
+                stream_health.record_failure("Capture failed")
+
+            # Stop the flow if it should not be repeated
+            if not repeat:
+                break
+
+            # Back off until the stream answers again instead of retrying a dead stream right away
+            if not succeeded:
+                stream_health.wait_until_healthy()
+    finally:
+        if upload_worker:
+            print(f"Waiting for {upload_worker.pending()} pending upload(s) to finish")
+            upload_worker.stop()
+        # The drainer queues rows too, stop it before the last flush
+        spool_drainer.stop()
+        registrar.audio_file_writer.flush()
+
+
+@optional_flow(name="Audio Recording: Supervisor", log_prints=True, task_runner=ConcurrentTaskRunner)
+async def audio_recording_supervisor(urls, segment_seconds, audio_birate, audio_channels, heartbeat_seconds=60):
+    stations = []
+    for url in urls:
+        station = reconstruct_radio_station(url)
+        if not station:
+            raise ValueError(f"Radio station not found for URL: {url}")
+        stations.append(station)
+
+    def upload_and_register_segment(station, file_name):
+        metadata = get_metadata(file_name, station, get_segment_start_time(file_name))
+        upload_and_register_recording(station["url"], metadata)
+
+    def spool_failed_segment(error, station, file_name):
+        registrar.spool_failed(station["url"], get_metadata(file_name, station, get_segment_start_time(file_name)))
+
+    spool_drainer = start_spool_drainer(stations)
+    registrar.audio_file_writer.start()
+    upload_worker = UploadWorker(
+        upload_and_register_segment,
+        max_queue_size=UPLOAD_QUEUE_SIZE * len(stations),
+        on_failed=spool_failed_segment,
+    )
+    upload_worker.start()
+
+    supervisor = RecorderSupervisor(
+        stations,
+        create_ffmpeg=lambda station: build_segmented_capture(
+            AsyncFFmpeg(), station["url"], None, segment_seconds, audio_birate, audio_channels
+        ),
+        on_segment=upload_worker.submit_nowait,
+        heartbeat_seconds=heartbeat_seconds,
+    )
+    print(f"Supervising {len(stations)} stations in {segment_seconds}-second segments")
+
+    try:
+        await supervisor.run()
+    finally:
+        print(f"Waiting for {upload_worker.pending()} pending upload(s) to finish")
+        upload_worker.stop()
+        # The drainer queues rows too, stop it before the last flush
+        spool_drainer.stop()
+        registrar.audio_file_writer.flush()
 
-        # Stop the flow if it should not be repeated
-        if not repeat:
-            break
 
 def reconstruct_radio_station(url):
     radio_stations = fetch_radio_stations()
@@ -131,14 +341,24 @@ def reconstruct_radio_station(url):
     return None
 
 
-def get_url_hash(url):
-    # Hash the URL and get the last 6 characters
-    return hashlib.sha256(url.encode()).hexdigest()[-6:]
+def get_stations_for_recorder_node(radio_stations, node):
+    """Stations that `node` should record, by consistent hashing of each station's URL hash.
+
+    Adding or removing a node in RECORDER_NODES only moves the stations owned by that node.
+    """
+    ring = ConsistentHashRing(parse_recorder_nodes(RECORDER_NODES))
+    if node not in ring.weights:
+        raise ValueError(f"Recorder node {node} is not in RECORDER_NODES: {RECORDER_NODES}")
+
+    return ring.assign(radio_stations, lambda station: get_url_hash(station["url"]))[node]
+
 
 def serve_deployments(radio_stations, flow_function):
     duration_seconds = 1800  # Default to 30 minutes
     audio_birate = 64000  # Default to 64kbps bitrate
     audio_channels = 1  # Default to single channel (mono audio)
+    # Optional rolling capture: one long-lived ffmpeg process writing fixed-length chunks
+    segment_seconds = int(os.getenv("RECORDING_SEGMENT_SECONDS", "0")) or None
     concurrency_limit = 100
     all_deployments = []
 
@@ -148,30 +368,57 @@ def serve_deployments(radio_stations, flow_function):
             tags=[station["state"], get_url_hash(station["url"])],
             parameters=dict(
                 url=station["url"],
-                duration_seconds=duration_seconds,
+                # Segmented captures keep a single ffmpeg process running until the stream drops
+                duration_seconds=None if segment_seconds else duration_seconds,
                 repeat=True,
                 audio_birate=audio_birate,
                 audio_channels=audio_channels,
+                pipelined=True,
+                segment_seconds=segment_seconds,
             ),
         )
         all_deployments.append(deployment)
     serve(*all_deployments, limit=concurrency_limit)
 
 
+def serve_supervisor_deployment(name, radio_stations):
+    segment_seconds = int(os.getenv("RECORDING_SEGMENT_SECONDS", "0")) or 300  # Default to 5-minute segments
+    audio_birate = 64000  # Default to 64kbps bitrate
+    audio_channels = 1  # Default to single channel (mono audio)
+
+    deployment = audio_recording_supervisor.to_deployment(
+        name=name,
+        tags=["Supervisor"],
+        parameters=dict(
+            urls=[station["url"] for station in radio_stations],
+            segment_seconds=segment_seconds,
+            audio_birate=audio_birate,
+            audio_channels=audio_channels,
+        ),
+    )
+    serve(deployment)
+
+
 if __name__ == "__main__":
     radio_stations = fetch_radio_stations()
 
-    # Divide the stations into two groups:
-    # Max recorder stations: the first 39 stations
-    # Lite recorder stations: the rest of the stations (which is currently 14 stations)
-    max_recorder_stations = radio_stations[:39]
-    lite_recorder_stations = radio_stations[39:]
-
+    # The recorder node defaults to the Fly process group (max_recorder or lite_recorder)
     process_group = os.environ.get("FLY_PROCESS_GROUP")
-    match process_group:
-        case "max_recorder":
-            serve_deployments(max_recorder_stations, audio_processing_pipeline_max_recorder)
+    recorder_node = os.environ.get("RECORDER_NODE_ID", process_group)
+    if not recorder_node:
+        raise ValueError(f"Invalid process group: {process_group}")
+
+    stations = get_stations_for_recorder_node(radio_stations, recorder_node)
+    print(f"Recorder node {recorder_node} owns {len(stations)} of {len(radio_stations)} stations")
+
+    match recorder_node:
         case "lite_recorder":
-            serve_deployments(lite_recorder_stations, audio_processing_pipeline_lite_recorder)
+            flow_function = audio_processing_pipeline_lite_recorder
         case _:
-            raise ValueError(f"Invalid process group: {process_group}")
+            flow_function = audio_processing_pipeline_max_recorder
+
+    # RECORDER_MODE=supervisor records all stations of the machine from a single flow run
+    if os.environ.get("RECORDER_MODE") == "supervisor":
+        serve_supervisor_deployment(recorder_node, stations)
+    else:
+        serve_deployments(stations, flow_function)
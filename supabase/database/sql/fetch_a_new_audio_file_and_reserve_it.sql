@@ -8,7 +8,8 @@ BEGIN
     WHERE id = (
         SELECT id
         FROM public.audio_files
-        WHERE status = 'New'
+        WHERE status = 'New' AND simulcast_of IS NULL
+          AND (NOT simulcast_check_pending OR created_at < now() - interval '15 minutes')
         ORDER BY recorded_at DESC
         LIMIT 1
         FOR UPDATE SKIP LOCKED
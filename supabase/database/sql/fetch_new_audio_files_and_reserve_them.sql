@@ -0,0 +1,26 @@
+CREATE
+OR REPLACE FUNCTION fetch_new_audio_files_and_reserve_them (max_count INTEGER) RETURNS jsonb SECURITY INVOKER AS $$
+DECLARE
+    audio_file_records jsonb;
+BEGIN
+    WITH reserved AS (
+        UPDATE public.audio_files
+        SET status = 'Processing'
+        WHERE id IN (
+            SELECT id
+            FROM public.audio_files
+            WHERE status = 'New' AND simulcast_of IS NULL
+              AND (NOT simulcast_check_pending OR created_at < now() - interval '15 minutes')
+            ORDER BY recorded_at DESC
+            LIMIT max_count
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING public.audio_files.*
+    )
+    SELECT COALESCE(jsonb_agg(row_to_json(reserved.*)::jsonb ORDER BY reserved.recorded_at DESC), '[]'::jsonb)
+    INTO audio_file_records
+    FROM reserved;
+
+    RETURN audio_file_records;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,53 @@
+CREATE
+OR REPLACE FUNCTION fetch_new_snippets_and_reserve_them (max_count INTEGER) RETURNS jsonb SECURITY INVOKER AS $$
+DECLARE
+    snippet_records jsonb;
+BEGIN
+    WITH reserved AS (
+        UPDATE public.snippets
+        SET status = 'Processing'
+        WHERE id IN (
+            SELECT id
+            FROM public.snippets
+            WHERE status = 'New'
+            ORDER BY recorded_at DESC
+            LIMIT max_count
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING public.snippets.*
+    )
+    SELECT COALESCE(
+        jsonb_agg(
+            (
+                row_to_json(reserved.*)::jsonb - 'audio_file'::text - 'stage_1_llm_response'::text
+            ) || jsonb_build_object(
+                'audio_file', (
+                    SELECT jsonb_build_object(
+                        'radio_station_name', af.radio_station_name,
+                        'radio_station_code', af.radio_station_code,
+                        'location_state', af.location_state,
+                        'location_city', af.location_city,
+                        'recorded_at', af.recorded_at,
+                        'recording_day_of_week', af.recording_day_of_week
+                    )
+                    FROM public.audio_files af
+                    WHERE af.id = reserved.audio_file
+                ),
+                'stage_1_llm_response', (
+                    SELECT jsonb_build_object(
+                        'detection_result', s1lr.detection_result
+                    )
+                    FROM public.stage_1_llm_responses s1lr
+                    WHERE s1lr.id = reserved.stage_1_llm_response
+                )
+            )
+            ORDER BY reserved.recorded_at DESC
+        ),
+        '[]'::jsonb
+    )
+    INTO snippet_records
+    FROM reserved;
+
+    RETURN snippet_records;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,41 @@
+CREATE
+OR REPLACE FUNCTION fetch_new_stage_1_llm_responses_and_reserve_them (max_count INTEGER) RETURNS jsonb SECURITY INVOKER AS $$
+DECLARE
+    stage_1_llm_response_records jsonb;
+BEGIN
+    WITH reserved AS (
+        UPDATE public.stage_1_llm_responses
+        SET status = 'Processing'
+        WHERE id IN (
+            SELECT id
+            FROM public.stage_1_llm_responses
+            WHERE status = 'New'
+            ORDER BY created_at DESC
+            LIMIT max_count
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING public.stage_1_llm_responses.*
+    )
+    SELECT COALESCE(
+        jsonb_agg(
+            (row_to_json(reserved.*)::jsonb - 'audio_file'::text) || jsonb_build_object(
+                'audio_file', (
+                    SELECT jsonb_build_object(
+                        'id', af.id,
+                        'file_path', af.file_path,
+                        'recorded_at', af.recorded_at
+                    )
+                    FROM public.audio_files af
+                    WHERE af.id = reserved.audio_file
+                )
+            )
+            ORDER BY reserved.created_at DESC
+        ),
+        '[]'::jsonb
+    )
+    INTO stage_1_llm_response_records
+    FROM reserved;
+
+    RETURN stage_1_llm_response_records;
+END;
+$$ LANGUAGE plpgsql;
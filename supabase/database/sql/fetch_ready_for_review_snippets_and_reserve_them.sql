@@ -0,0 +1,25 @@
+CREATE
+OR REPLACE FUNCTION fetch_ready_for_review_snippets_and_reserve_them (max_count INTEGER) RETURNS jsonb SECURITY INVOKER AS $$
+DECLARE
+    snippet_records jsonb;
+BEGIN
+    WITH reserved AS (
+        UPDATE public.snippets
+        SET status = 'Reviewing'
+        WHERE id IN (
+            SELECT id
+            FROM public.snippets
+            WHERE status = 'Ready for review'
+            ORDER BY recorded_at DESC
+            LIMIT max_count
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING public.snippets.*
+    )
+    SELECT COALESCE(jsonb_agg(row_to_json(reserved.*)::jsonb ORDER BY reserved.recorded_at DESC), '[]'::jsonb)
+    INTO snippet_records
+    FROM reserved;
+
+    RETURN snippet_records;
+END;
+$$ LANGUAGE plpgsql;
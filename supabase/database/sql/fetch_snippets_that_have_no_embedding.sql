@@ -0,0 +1,28 @@
+CREATE
+OR REPLACE FUNCTION fetch_snippets_that_have_no_embedding(max_count INTEGER) RETURNS jsonb SECURITY INVOKER AS $$
+BEGIN
+    -- Return up to max_count snippets that:
+    -- 1. Have status 'Processed'
+    -- 2. Have no corresponding embedding
+    -- 3. Are the most recently recorded
+    RETURN (
+        WITH unembedded_snippets AS (
+            SELECT s.*
+            FROM public.snippets s
+            WHERE s.status = 'Processed'
+            AND NOT EXISTS (
+                SELECT 1
+                FROM public.snippet_embeddings se
+                WHERE se.snippet = s.id
+            )
+            ORDER BY s.recorded_at DESC
+            LIMIT max_count
+        )
+        SELECT COALESCE(
+            jsonb_agg(row_to_json(unembedded_snippets.*)::jsonb ORDER BY unembedded_snippets.recorded_at DESC),
+            '[]'::jsonb
+        )
+        FROM unembedded_snippets
+    );
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,55 @@
+CREATE
+OR REPLACE FUNCTION link_simulcast (audio_file_id uuid, matching_audio_file_ids uuid[]) RETURNS uuid SECURITY INVOKER AS $$
+DECLARE
+    original_id uuid;
+BEGIN
+    -- Concurrent checks of recordings that match each other run one after the other
+    PERFORM 1
+    FROM public.audio_files af
+    WHERE af.id = link_simulcast.audio_file_id OR af.id = ANY(matching_audio_file_ids)
+    ORDER BY af.id
+    FOR UPDATE;
+
+    -- The recording whose fingerprint was stored first is the original, whichever recorder decides
+    SELECT fp.audio_file_id INTO original_id
+    FROM public.audio_fingerprints fp
+    WHERE fp.audio_file_id = link_simulcast.audio_file_id OR fp.audio_file_id = ANY(matching_audio_file_ids)
+    ORDER BY fp.created_at, fp.audio_file_id
+    LIMIT 1;
+
+    -- Copies of a copy point to the original
+    SELECT COALESCE(af.simulcast_of, af.id) INTO original_id
+    FROM public.audio_files af
+    WHERE af.id = original_id;
+
+    IF original_id = link_simulcast.audio_file_id THEN
+        original_id := NULL;
+    END IF;
+
+    -- A linked copy is never analyzed: take it out of the queue, unless Stage 1 already picked it up
+    UPDATE public.audio_files af
+    SET simulcast_of = original_id,
+        simulcast_check_pending = false,
+        status = CASE
+            WHEN original_id IS NOT NULL AND af.status = 'New' THEN 'Processed'::processing_status
+            ELSE af.status
+        END,
+        error_message = CASE
+            WHEN original_id IS NOT NULL AND af.status = 'New' THEN 'Simulcast of ' || original_id
+            ELSE af.error_message
+        END
+    WHERE af.id = link_simulcast.audio_file_id;
+
+    IF original_id IS NOT NULL THEN
+        UPDATE public.audio_files
+        SET simulcast_of = original_id,
+            error_message = CASE
+                WHEN error_message = 'Simulcast of ' || link_simulcast.audio_file_id THEN 'Simulcast of ' || original_id
+                ELSE error_message
+            END
+        WHERE simulcast_of = link_simulcast.audio_file_id;
+    END IF;
+
+    RETURN original_id;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,112 @@
+-- search_kb_entries_batch: search_kb_entries for many query embeddings in one round-trip.
+-- Each query keeps the two-stage sub-vector search of search_kb_entries and gets its own top match_count,
+-- then entries matched by several queries are returned once, with their best similarity.
+-- query_embeddings is a JSON array of 3072-dim embeddings.
+CREATE OR REPLACE FUNCTION search_kb_entries_batch(
+    query_embeddings jsonb,
+    match_threshold FLOAT DEFAULT 0.3,
+    match_count INT DEFAULT 10,
+    candidate_multiplier INT DEFAULT 8,
+    filter_categories TEXT[] DEFAULT NULL,
+    reference_date TIMESTAMPTZ DEFAULT now()
+)
+RETURNS jsonb
+SECURITY DEFINER AS $$
+DECLARE
+    result jsonb;
+BEGIN
+    WITH
+    queries AS (
+        SELECT
+            q.query_embedding,
+            sub_vector(q.query_embedding, 512)::vector(512) AS query_sub_embedding
+        FROM (
+            SELECT (e.value::text)::vector(3072) AS query_embedding
+            FROM jsonb_array_elements(query_embeddings) AS e
+        ) q
+    ),
+    -- Top match_count entries of every query
+    matches AS (
+        SELECT m.entry_id, m.similarity
+        FROM queries q
+        CROSS JOIN LATERAL (
+            SELECT
+                c.entry_id,
+                -(c.embedding <#> q.query_embedding) AS similarity
+            FROM (
+                -- Stage 1: Approximate search using sub-vector HNSW index
+                SELECT
+                    ke.id AS entry_id,
+                    kee.embedding
+                FROM kb_entry_embeddings kee
+                JOIN kb_entries ke ON ke.id = kee.kb_entry
+                WHERE
+                    ke.status = 'active'
+                    AND kee.status = 'Processed'
+                    -- Optional category filter
+                    AND (filter_categories IS NULL
+                         OR ke.disinformation_categories && filter_categories)
+                    -- Temporal relevance: exclude entries outside their valid range
+                    AND (ke.valid_from IS NULL OR ke.valid_from <= reference_date)
+                    AND (ke.valid_until IS NULL OR ke.valid_until >= reference_date)
+                ORDER BY
+                    sub_vector(kee.embedding, 512)::vector(512) <#> q.query_sub_embedding ASC
+                LIMIT match_count * candidate_multiplier
+            ) c
+            -- Stage 2: Re-rank using full 3072-dim inner product
+            WHERE -(c.embedding <#> q.query_embedding) > match_threshold
+            ORDER BY c.embedding <#> q.query_embedding ASC
+            LIMIT match_count
+        ) m
+    ),
+    -- Deduplicate entries matched by several queries, keeping their best similarity
+    ranked AS (
+        SELECT entry_id, MAX(similarity) AS similarity
+        FROM matches
+        GROUP BY entry_id
+    ),
+    -- Aggregate sources per entry
+    source_agg AS (
+        SELECT
+            ks.kb_entry,
+            jsonb_agg(
+                jsonb_build_object(
+                    'url', ks.url,
+                    'source_name', ks.source_name,
+                    'source_type', ks.source_type,
+                    'title', ks.title,
+                    'relevant_excerpt', ks.relevant_excerpt,
+                    'publication_date', ks.publication_date,
+                    'relevance_to_claim', ks.relevance_to_claim
+                )
+            ) AS sources
+        FROM kb_entry_sources ks
+        WHERE ks.kb_entry IN (SELECT entry_id FROM ranked)
+        GROUP BY ks.kb_entry
+    )
+    SELECT jsonb_agg(
+        jsonb_build_object(
+            'id', ke.id,
+            'fact', ke.fact,
+            'related_claim', ke.related_claim,
+            'confidence_score', ke.confidence_score,
+            'valid_from', ke.valid_from,
+            'valid_until', ke.valid_until,
+            'is_time_sensitive', ke.is_time_sensitive,
+            'disinformation_categories', ke.disinformation_categories,
+            'keywords', ke.keywords,
+            'version', ke.version,
+            'created_at', ke.created_at,
+            'similarity', r.similarity,
+            'sources', COALESCE(sa.sources, '[]'::jsonb)
+        )
+        ORDER BY r.similarity DESC
+    )
+    INTO result
+    FROM ranked r
+    JOIN kb_entries ke ON ke.id = r.entry_id
+    LEFT JOIN source_agg sa ON sa.kb_entry = ke.id;
+
+    RETURN COALESCE(result, '[]'::jsonb);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,11 @@
+-- Dead-air detection at record time
+-- The recorders measure the share of silent 1-second windows of every recording before uploading it.
+-- Fully silent recordings are never uploaded; mostly silent ones are flagged here.
+ALTER TABLE public.audio_files
+ADD COLUMN IF NOT EXISTS silence_ratio real,
+ADD COLUMN IF NOT EXISTS is_mostly_silent boolean NOT NULL DEFAULT false;
+
+-- Partial index for reviewing stations that frequently broadcast dead air
+CREATE INDEX IF NOT EXISTS idx_audio_files_mostly_silent
+ON public.audio_files(radio_station_code, recorded_at)
+WHERE is_mostly_silent;
@@ -0,0 +1,48 @@
+-- Simulcast detection
+-- The recorders store a spectral-peak fingerprint of every recording. A recording whose
+-- fingerprint matches the concurrent recording of another station (same network feed) links to
+-- that recording through simulcast_of, and only the original is analyzed by Stage 1.
+CREATE TABLE IF NOT EXISTS public.audio_fingerprints (
+    audio_file_id uuid PRIMARY KEY REFERENCES public.audio_files(id) ON DELETE CASCADE,
+    radio_station_code text NOT NULL,
+    recorded_at timestamp with time zone NOT NULL,
+    duration_seconds real NOT NULL,
+    hashes integer[] NOT NULL,
+    offsets real[] NOT NULL,
+    created_at timestamp with time zone NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.audio_fingerprints ENABLE ROW LEVEL SECURITY;
+
+-- Candidates are looked up by the time window of the new recording
+CREATE INDEX IF NOT EXISTS idx_audio_fingerprints_recorded_at
+ON public.audio_fingerprints(recorded_at);
+
+ALTER TABLE public.audio_files
+ADD COLUMN IF NOT EXISTS simulcast_of uuid REFERENCES public.audio_files(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_audio_files_simulcast_of
+ON public.audio_files(simulcast_of)
+WHERE simulcast_of IS NOT NULL;
+
+-- Stage 1 skips simulcasts, their analysis is the one of the recording they link to
+CREATE
+OR REPLACE FUNCTION fetch_a_new_audio_file_and_reserve_it () RETURNS jsonb SECURITY INVOKER AS $$
+DECLARE
+    audio_file_record jsonb;
+BEGIN
+    UPDATE public.audio_files
+    SET status = 'Processing'
+    WHERE id = (
+        SELECT id
+        FROM public.audio_files
+        WHERE status = 'New' AND simulcast_of IS NULL
+        ORDER BY recorded_at DESC
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING row_to_json(public.audio_files.*) INTO audio_file_record;
+
+    RETURN audio_file_record;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,179 @@
+-- Bulk reservation
+-- The stage loops reserve up to max_count rows with one round-trip instead of one row at a time.
+-- Rows are locked with FOR UPDATE SKIP LOCKED, so concurrent workers never reserve the same row.
+CREATE
+OR REPLACE FUNCTION fetch_new_audio_files_and_reserve_them (max_count INTEGER) RETURNS jsonb SECURITY INVOKER AS $$
+DECLARE
+    audio_file_records jsonb;
+BEGIN
+    WITH reserved AS (
+        UPDATE public.audio_files
+        SET status = 'Processing'
+        WHERE id IN (
+            SELECT id
+            FROM public.audio_files
+            WHERE status = 'New' AND simulcast_of IS NULL
+            ORDER BY recorded_at DESC
+            LIMIT max_count
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING public.audio_files.*
+    )
+    SELECT COALESCE(jsonb_agg(row_to_json(reserved.*)::jsonb ORDER BY reserved.recorded_at DESC), '[]'::jsonb)
+    INTO audio_file_records
+    FROM reserved;
+
+    RETURN audio_file_records;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE
+OR REPLACE FUNCTION fetch_new_stage_1_llm_responses_and_reserve_them (max_count INTEGER) RETURNS jsonb SECURITY INVOKER AS $$
+DECLARE
+    stage_1_llm_response_records jsonb;
+BEGIN
+    WITH reserved AS (
+        UPDATE public.stage_1_llm_responses
+        SET status = 'Processing'
+        WHERE id IN (
+            SELECT id
+            FROM public.stage_1_llm_responses
+            WHERE status = 'New'
+            ORDER BY created_at DESC
+            LIMIT max_count
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING public.stage_1_llm_responses.*
+    )
+    SELECT COALESCE(
+        jsonb_agg(
+            (row_to_json(reserved.*)::jsonb - 'audio_file'::text) || jsonb_build_object(
+                'audio_file', (
+                    SELECT jsonb_build_object(
+                        'id', af.id,
+                        'file_path', af.file_path,
+                        'recorded_at', af.recorded_at
+                    )
+                    FROM public.audio_files af
+                    WHERE af.id = reserved.audio_file
+                )
+            )
+            ORDER BY reserved.created_at DESC
+        ),
+        '[]'::jsonb
+    )
+    INTO stage_1_llm_response_records
+    FROM reserved;
+
+    RETURN stage_1_llm_response_records;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE
+OR REPLACE FUNCTION fetch_new_snippets_and_reserve_them (max_count INTEGER) RETURNS jsonb SECURITY INVOKER AS $$
+DECLARE
+    snippet_records jsonb;
+BEGIN
+    WITH reserved AS (
+        UPDATE public.snippets
+        SET status = 'Processing'
+        WHERE id IN (
+            SELECT id
+            FROM public.snippets
+            WHERE status = 'New'
+            ORDER BY recorded_at DESC
+            LIMIT max_count
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING public.snippets.*
+    )
+    SELECT COALESCE(
+        jsonb_agg(
+            (
+                row_to_json(reserved.*)::jsonb - 'audio_file'::text - 'stage_1_llm_response'::text
+            ) || jsonb_build_object(
+                'audio_file', (
+                    SELECT jsonb_build_object(
+                        'radio_station_name', af.radio_station_name,
+                        'radio_station_code', af.radio_station_code,
+                        'location_state', af.location_state,
+                        'location_city', af.location_city,
+                        'recorded_at', af.recorded_at,
+                        'recording_day_of_week', af.recording_day_of_week
+                    )
+                    FROM public.audio_files af
+                    WHERE af.id = reserved.audio_file
+                ),
+                'stage_1_llm_response', (
+                    SELECT jsonb_build_object(
+                        'detection_result', s1lr.detection_result
+                    )
+                    FROM public.stage_1_llm_responses s1lr
+                    WHERE s1lr.id = reserved.stage_1_llm_response
+                )
+            )
+            ORDER BY reserved.recorded_at DESC
+        ),
+        '[]'::jsonb
+    )
+    INTO snippet_records
+    FROM reserved;
+
+    RETURN snippet_records;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE
+OR REPLACE FUNCTION fetch_ready_for_review_snippets_and_reserve_them (max_count INTEGER) RETURNS jsonb SECURITY INVOKER AS $$
+DECLARE
+    snippet_records jsonb;
+BEGIN
+    WITH reserved AS (
+        UPDATE public.snippets
+        SET status = 'Reviewing'
+        WHERE id IN (
+            SELECT id
+            FROM public.snippets
+            WHERE status = 'Ready for review'
+            ORDER BY recorded_at DESC
+            LIMIT max_count
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING public.snippets.*
+    )
+    SELECT COALESCE(jsonb_agg(row_to_json(reserved.*)::jsonb ORDER BY reserved.recorded_at DESC), '[]'::jsonb)
+    INTO snippet_records
+    FROM reserved;
+
+    RETURN snippet_records;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE
+OR REPLACE FUNCTION fetch_snippets_that_have_no_embedding(max_count INTEGER) RETURNS jsonb SECURITY INVOKER AS $$
+BEGIN
+    -- Return up to max_count snippets that:
+    -- 1. Have status 'Processed'
+    -- 2. Have no corresponding embedding
+    -- 3. Are the most recently recorded
+    RETURN (
+        WITH unembedded_snippets AS (
+            SELECT s.*
+            FROM public.snippets s
+            WHERE s.status = 'Processed'
+            AND NOT EXISTS (
+                SELECT 1
+                FROM public.snippet_embeddings se
+                WHERE se.snippet = s.id
+            )
+            ORDER BY s.recorded_at DESC
+            LIMIT max_count
+        )
+        SELECT COALESCE(
+            jsonb_agg(row_to_json(unembedded_snippets.*)::jsonb ORDER BY unembedded_snippets.recorded_at DESC),
+            '[]'::jsonb
+        )
+        FROM unembedded_snippets
+    );
+END;
+$$ LANGUAGE plpgsql;
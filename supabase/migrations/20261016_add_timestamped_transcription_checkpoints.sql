@@ -0,0 +1,17 @@
+-- Checkpoints of the timestamped transcription
+-- Stage 1 stores the transcripts of every batch of segments as soon as Gemini returns them, so a
+-- retry or a regeneration only transcribes the batches that are missing. The checkpoints of an
+-- audio file are deleted once its timestamped transcription is saved.
+CREATE TABLE IF NOT EXISTS public.timestamped_transcription_checkpoints (
+    audio_file uuid NOT NULL REFERENCES public.audio_files(id) ON DELETE CASCADE,
+    prompt_version uuid NOT NULL,
+    segment_length integer NOT NULL,
+    -- Range of the batch, as 0-based index of its first segment and number of segments
+    segment_start integer NOT NULL,
+    segment_count integer NOT NULL,
+    transcripts jsonb NOT NULL,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    PRIMARY KEY (audio_file, prompt_version, segment_length, segment_start)
+);
+
+ALTER TABLE public.timestamped_transcription_checkpoints ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,101 @@
+-- Race-free simulcast detection
+-- Recordings with a fingerprint are inserted with simulcast_check_pending and Stage 1 only picks them
+-- up once link_simulcast has run, so a copy is never analyzed before it's linked to its original.
+-- A recording whose check never completes (e.g. its recorder lost the connection) is picked up after
+-- 15 minutes like any other one.
+-- link_simulcast decides the link in one transaction: of a recording and the ones it matches, the
+-- one whose fingerprint was stored first is the original. Every recorder reaches the same decision,
+-- so two concurrent copies can no longer link to each other.
+ALTER TABLE public.audio_files
+ADD COLUMN IF NOT EXISTS simulcast_check_pending boolean NOT NULL DEFAULT false;
+
+CREATE
+OR REPLACE FUNCTION link_simulcast (audio_file_id uuid, matching_audio_file_ids uuid[]) RETURNS uuid SECURITY INVOKER AS $$
+DECLARE
+    original_id uuid;
+BEGIN
+    -- Concurrent checks of recordings that match each other run one after the other
+    PERFORM 1
+    FROM public.audio_files af
+    WHERE af.id = link_simulcast.audio_file_id OR af.id = ANY(matching_audio_file_ids)
+    ORDER BY af.id
+    FOR UPDATE;
+
+    -- The recording whose fingerprint was stored first is the original, whichever recorder decides
+    SELECT fp.audio_file_id INTO original_id
+    FROM public.audio_fingerprints fp
+    WHERE fp.audio_file_id = link_simulcast.audio_file_id OR fp.audio_file_id = ANY(matching_audio_file_ids)
+    ORDER BY fp.created_at, fp.audio_file_id
+    LIMIT 1;
+
+    -- Copies of a copy point to the original
+    SELECT COALESCE(af.simulcast_of, af.id) INTO original_id
+    FROM public.audio_files af
+    WHERE af.id = original_id;
+
+    IF original_id = link_simulcast.audio_file_id THEN
+        original_id := NULL;
+    END IF;
+
+    UPDATE public.audio_files
+    SET simulcast_of = original_id, simulcast_check_pending = false
+    WHERE id = link_simulcast.audio_file_id;
+
+    IF original_id IS NOT NULL THEN
+        UPDATE public.audio_files
+        SET simulcast_of = original_id
+        WHERE simulcast_of = link_simulcast.audio_file_id;
+    END IF;
+
+    RETURN original_id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE
+OR REPLACE FUNCTION fetch_a_new_audio_file_and_reserve_it () RETURNS jsonb SECURITY INVOKER AS $$
+DECLARE
+    audio_file_record jsonb;
+BEGIN
+    UPDATE public.audio_files
+    SET status = 'Processing'
+    WHERE id = (
+        SELECT id
+        FROM public.audio_files
+        WHERE status = 'New' AND simulcast_of IS NULL
+          AND (NOT simulcast_check_pending OR created_at < now() - interval '15 minutes')
+        ORDER BY recorded_at DESC
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING row_to_json(public.audio_files.*) INTO audio_file_record;
+
+    RETURN audio_file_record;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE
+OR REPLACE FUNCTION fetch_new_audio_files_and_reserve_them (max_count INTEGER) RETURNS jsonb SECURITY INVOKER AS $$
+DECLARE
+    audio_file_records jsonb;
+BEGIN
+    WITH reserved AS (
+        UPDATE public.audio_files
+        SET status = 'Processing'
+        WHERE id IN (
+            SELECT id
+            FROM public.audio_files
+            WHERE status = 'New' AND simulcast_of IS NULL
+              AND (NOT simulcast_check_pending OR created_at < now() - interval '15 minutes')
+            ORDER BY recorded_at DESC
+            LIMIT max_count
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING public.audio_files.*
+    )
+    SELECT COALESCE(jsonb_agg(row_to_json(reserved.*)::jsonb ORDER BY reserved.recorded_at DESC), '[]'::jsonb)
+    INTO audio_file_records
+    FROM reserved;
+
+    RETURN audio_file_records;
+END;
+$$ LANGUAGE plpgsql;
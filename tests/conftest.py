@@ -1,5 +1,6 @@
 import os
 import sys
+import tempfile
 import pytest
 
 # Add src directory to Python path
@@ -17,6 +18,7 @@ os.environ['R2_SECRET_ACCESS_KEY'] = 'test-secret-key'
 os.environ['R2_BUCKET_NAME'] = 'test-bucket'
 os.environ['SENTRY_DSN'] = 'https://test@test.ingest.sentry.io/123456'
 os.environ['ENABLE_PREFECT_DECORATOR'] = 'false'
+os.environ['RECORDING_SPOOL_DIR'] = tempfile.mkdtemp(prefix='recording-spool-')
 
 @pytest.fixture
 def test_data_dir():
@@ -0,0 +1,169 @@
+from unittest.mock import patch
+import numpy as np
+import pytest
+from processing_pipeline.audio_utils import (
+    ENCODING_PROFILES,
+    SILENCE_FLOOR_DBFS,
+    analyze_audio_levels,
+    compute_rms_dbfs,
+    decode_pcm,
+    get_encoder_output_options,
+    get_encoding_profile,
+    get_encoding_profile_of_file,
+    parse_mp3_frame_header,
+    split_audio_stream_copy,
+    split_mp3_frames,
+)
+
+
+def sine(seconds, amplitude, sample_rate=8000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (np.sin(2 * np.pi * 440 * t) * amplitude * 32767).astype(np.int16)
+
+
+def mp3_frame(marker=b"\x00"):
+    """An MPEG-1 Layer III frame at 128 kbps and 44.1 kHz: 417 bytes and 1152 samples (~26 ms)."""
+    return b"\xff\xfb\x90\x00" + marker * 413
+
+
+class TestAudioUtils:
+    def test_decode_pcm(self):
+        """Test decoding into mono 16-bit samples"""
+        samples = np.array([0, 1000, -1000], dtype=np.int16)
+        with patch('processing_pipeline.audio_utils.FFmpeg') as mock_ffmpeg:
+            mock_ffmpeg.return_value.input.return_value.output.return_value.execute.return_value = samples.tobytes()
+            result = decode_pcm("test.mp3")
+
+        mock_ffmpeg.return_value.input.assert_called_once_with("test.mp3")
+        mock_ffmpeg.return_value.input.return_value.output.assert_called_once_with("pipe:1", f="s16le", ac=1, ar=8000)
+        assert np.array_equal(result, samples)
+
+    def test_compute_rms_dbfs(self):
+        """Test the level of full-scale, half-scale and silent windows"""
+        samples = np.concatenate([sine(1, 1.0), sine(1, 0.5), np.zeros(8000, dtype=np.int16)])
+
+        dbfs = compute_rms_dbfs(samples)
+
+        assert len(dbfs) == 3
+        # A full-scale sine has an RMS of -3 dBFS, halving the amplitude loses 6 dB
+        assert dbfs[0] == pytest.approx(-3.01, abs=0.1)
+        assert dbfs[1] == pytest.approx(-9.03, abs=0.1)
+        assert dbfs[2] == SILENCE_FLOOR_DBFS
+
+    def test_compute_rms_dbfs_ignores_partial_windows(self):
+        """Test that a trailing partial window is dropped"""
+        assert len(compute_rms_dbfs(sine(2.5, 0.5))) == 2
+        assert len(compute_rms_dbfs(sine(0.5, 0.5))) == 0
+
+    def test_analyze_audio_levels(self):
+        """Test the silence ratio of a recording with dead air"""
+        samples = np.concatenate([sine(3, 0.5), np.zeros(8000, dtype=np.int16), sine(1, 0.001)])
+        with patch('processing_pipeline.audio_utils.decode_pcm', return_value=samples):
+            levels = analyze_audio_levels("test.mp3", silence_threshold_dbfs=-50)
+
+        assert levels["duration_seconds"] == 5
+        assert levels["silence_ratio"] == 0.4
+        assert levels["max_dbfs"] == pytest.approx(-9.03, abs=0.1)
+
+    def test_analyze_audio_levels_empty_file(self):
+        """Test that a recording without audio counts as silent"""
+        with patch('processing_pipeline.audio_utils.decode_pcm', return_value=np.empty(0, dtype=np.int16)):
+            levels = analyze_audio_levels("test.mp3")
+
+        assert levels["silence_ratio"] == 1.0
+        assert levels["duration_seconds"] == 0
+
+    def test_get_encoding_profile(self):
+        """Test looking up encoding profiles by name"""
+        assert get_encoding_profile("opus_speech") is ENCODING_PROFILES["opus_speech"]
+        with pytest.raises(ValueError):
+            get_encoding_profile("flac")
+
+    def test_get_encoding_profile_of_file(self):
+        """Test that the profile of a file is told by its extension"""
+        assert get_encoding_profile_of_file("radio_abc123/radio_abc123_20240101_000000.ogg")["mime_type"] == "audio/ogg"
+        assert get_encoding_profile_of_file("snippet_1.MP3")["mime_type"] == "audio/mp3"
+        assert get_encoding_profile_of_file("unknown.wav")["mime_type"] == "audio/mp3"
+
+    def test_get_encoder_output_options(self):
+        """Test that MP3 keeps the requested bitrate and layout while the speech profile fixes its own"""
+        assert get_encoder_output_options(ENCODING_PROFILES["mp3"], 64000, 2) == {
+            "ab": 64000,
+            "ac": 2,
+            "acodec": "libmp3lame",
+        }
+        assert get_encoder_output_options(ENCODING_PROFILES["opus_speech"], 64000, 2) == {
+            "ab": 24000,
+            "ac": 1,
+            "acodec": "libopus",
+            "ar": 16000,
+            "application": "voip",
+        }
+
+    def test_parse_mp3_frame_header(self):
+        """Test the length and duration of MPEG-1 and MPEG-2 frames, and rejecting what isn't one"""
+        assert parse_mp3_frame_header(mp3_frame(), 0) == (417, pytest.approx(1152 / 44100))
+        # MPEG-2 at 64 kbps, 22.05 kHz, padded
+        assert parse_mp3_frame_header(b"\xff\xf3\x82\x00", 0) == (72 * 64000 // 22050 + 1, pytest.approx(576 / 22050))
+        assert parse_mp3_frame_header(b"ID3\x04", 0) is None
+        # Free format bitrate
+        assert parse_mp3_frame_header(b"\xff\xfb\x00\x00", 0) is None
+
+    def test_split_mp3_frames(self):
+        """Test that segments are cut on frame boundaries, at multiples of the segment length"""
+        data = b"".join(mp3_frame(bytes([i % 256])) for i in range(100))
+
+        segments = split_mp3_frames(data, 1.0)
+
+        # 39 frames reach 1 s, 77 frames reach 2 s
+        assert [len(segment) // 417 for segment in segments] == [39, 38, 23]
+        assert b"".join(segments) == data
+
+    def test_split_mp3_frames_at_segment_starts(self):
+        """Test cutting at given times instead of every segment length"""
+        data = b"".join(mp3_frame(bytes([i % 256])) for i in range(100))
+
+        segments = split_mp3_frames(data, 30.0, segment_starts=[0.0, 0.5, 2.0])
+
+        # 20 frames reach 0.5 s, 77 frames reach 2 s
+        assert [len(segment) // 417 for segment in segments] == [20, 57, 23]
+        assert b"".join(segments) == data
+
+    def test_split_mp3_frames_drops_tags_and_vbr_header(self):
+        """Test that the ID3 tag, the Xing frame and garbage between frames are not part of a segment"""
+        id3_tag = b"ID3\x04\x00\x00\x00\x00\x00\x05" + b"tags!"
+        xing_frame = b"\xff\xfb\x90\x00" + b"\x00" * 32 + b"Xing" + b"\x00" * 377
+        frames = [mp3_frame(b"\x01"), mp3_frame(b"\x02"), mp3_frame(b"\x03")]
+        data = id3_tag + xing_frame + frames[0] + b"garbage" + frames[1] + frames[2]
+
+        assert split_mp3_frames(data, 20.0) == [b"".join(frames)]
+
+    def test_split_mp3_frames_without_frames(self):
+        """Test that data without MP3 frames yields no segments"""
+        assert split_mp3_frames(b"OggS" + b"\x00" * 1000, 20.0) == []
+
+    def test_split_audio_stream_copy(self):
+        """Test cutting a file with an ffmpeg stream copy, read back in order"""
+
+        def execute():
+            output_pattern = mock_ffmpeg.return_value.option.return_value.input.return_value.output.call_args[0][0]
+            for i in (2, 1):
+                with open(output_pattern % i, "wb") as f:
+                    f.write(f"segment {i}".encode())
+
+        with patch('processing_pipeline.audio_utils.FFmpeg') as mock_ffmpeg:
+            mock_ffmpeg.return_value.option.return_value.input.return_value.output.return_value.execute.side_effect = execute
+            segments = split_audio_stream_copy("recording.ogg", 20)
+
+        output = mock_ffmpeg.return_value.option.return_value.input.return_value.output
+        assert output.call_args[0][0].endswith("segment_%05d.ogg")
+        assert output.call_args[1] == {"f": "segment", "segment_time": 20, "reset_timestamps": 1, "c": "copy"}
+        assert segments == [b"segment 1", b"segment 2"]
+
+    def test_split_audio_stream_copy_at_segment_starts(self):
+        """Test that ffmpeg cuts at the given times"""
+        with patch('processing_pipeline.audio_utils.FFmpeg') as mock_ffmpeg:
+            split_audio_stream_copy("recording.ogg", 30, segment_starts=[0.0, 17.5, 41.0])
+
+        output = mock_ffmpeg.return_value.option.return_value.input.return_value.output
+        assert output.call_args[1] == {"f": "segment", "segment_times": "17.5,41.0", "reset_timestamps": 1, "c": "copy"}
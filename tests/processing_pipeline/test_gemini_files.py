@@ -0,0 +1,86 @@
+from unittest.mock import Mock, patch
+import pytest
+from processing_pipeline.gemini_files import GeminiFileManager
+
+
+def gemini_file(state, name="files/abc"):
+    uploaded_file = Mock()
+    uploaded_file.name = name
+    uploaded_file.state.name = state
+    return uploaded_file
+
+
+@pytest.fixture
+def gemini_client():
+    client = Mock()
+    client.files.upload.return_value = gemini_file("ACTIVE")
+    return client
+
+
+class TestGeminiFileManager:
+    def test_get_uploads_once(self, gemini_client):
+        """Test that every phase (and retry) gets the same upload"""
+        gemini_files = GeminiFileManager(gemini_client)
+
+        gemini_files.upload("recording.mp3")
+        first = gemini_files.get("recording.mp3")
+        second = gemini_files.get("recording.mp3")
+
+        assert first is second
+        gemini_client.files.upload.assert_called_once_with(file="recording.mp3", config={"mime_type": "audio/mp3"})
+
+    def test_get_polls_with_backoff(self, gemini_client):
+        """Test that a processing upload is polled with growing intervals until it's active"""
+        gemini_client.files.upload.return_value = gemini_file("PROCESSING")
+        gemini_client.files.get.side_effect = [gemini_file("PROCESSING")] * 4 + [gemini_file("ACTIVE")]
+        gemini_files = GeminiFileManager(gemini_client, max_poll_interval_seconds=4)
+
+        with patch("processing_pipeline.gemini_files.time.sleep") as mock_sleep:
+            uploaded_file = gemini_files.get("recording.ogg")
+
+        assert uploaded_file.state.name == "ACTIVE"
+        assert [args[0] for args, _ in mock_sleep.call_args_list] == [1, 2, 4, 4, 4]
+        gemini_client.files.upload.assert_called_once_with(file="recording.ogg", config={"mime_type": "audio/ogg"})
+
+    def test_failed_upload_is_deleted_and_retried(self, gemini_client):
+        """Test that an upload Gemini failed to process is deleted, and uploaded again by the next get"""
+        gemini_client.files.upload.side_effect = [gemini_file("FAILED"), gemini_file("ACTIVE", name="files/def")]
+        gemini_files = GeminiFileManager(gemini_client)
+
+        with pytest.raises(ValueError, match="failed to process"):
+            gemini_files.get("recording.mp3")
+        gemini_client.files.delete.assert_called_once_with(name="files/abc")
+
+        assert gemini_files.get("recording.mp3").name == "files/def"
+
+    def test_expired_upload_is_uploaded_again(self, gemini_client):
+        """Test that a handle is not reused past its TTL"""
+        gemini_files = GeminiFileManager(gemini_client, ttl_seconds=0)
+
+        gemini_files.get("recording.mp3")
+        gemini_files.get("recording.mp3")
+
+        assert gemini_client.files.upload.call_count == 2
+
+    def test_release_deletes_the_upload(self, gemini_client):
+        """Test that releasing a file deletes it from Gemini, and that it's uploaded again if needed"""
+        gemini_files = GeminiFileManager(gemini_client)
+        gemini_files.get("recording.mp3")
+
+        gemini_files.release("recording.mp3")
+        gemini_files.release("recording.mp3")
+
+        gemini_client.files.delete.assert_called_once_with(name="files/abc")
+        gemini_files.get("recording.mp3")
+        assert gemini_client.files.upload.call_count == 2
+
+    def test_close_deletes_every_upload(self, gemini_client):
+        """Test that closing the manager deletes the files it still holds"""
+        gemini_client.files.upload.side_effect = [gemini_file("ACTIVE", name="files/1"), gemini_file("ACTIVE", name="files/2")]
+        gemini_files = GeminiFileManager(gemini_client)
+        gemini_files.get("one.mp3")
+        gemini_files.get("two.mp3")
+
+        gemini_files.close()
+
+        assert sorted(kwargs["name"] for _, kwargs in gemini_client.files.delete.call_args_list) == ["files/1", "files/2"]
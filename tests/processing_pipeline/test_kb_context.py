@@ -0,0 +1,48 @@
+from unittest.mock import Mock
+from processing_pipeline.constants import KB_SEARCH_MATCH_THRESHOLD
+from processing_pipeline.stage_1.constants import KB_STAGE1_CHUNK_SIZE, KB_STAGE1_MATCH_COUNT_PER_CHUNK
+from processing_pipeline.stage_1.kb_context import retrieve_kb_context
+
+
+def openai_client_with_embeddings(embeddings):
+    client = Mock()
+    client.embeddings.create.return_value.data = [Mock(embedding=embedding) for embedding in embeddings]
+    return client
+
+
+class TestRetrieveKbContext:
+    def test_searches_every_chunk_in_one_rpc(self):
+        """Test that the embeddings of all chunks are searched with a single batched RPC"""
+        transcription = "a" * KB_STAGE1_CHUNK_SIZE + "b"
+        openai_client = openai_client_with_embeddings([[3.0, 4.0], [0.0, 2.0]])
+        supabase_client = Mock()
+        supabase_client.search_kb_entries_batch.return_value = [
+            {"id": "kb-1", "fact": "First fact", "disinformation_categories": ["Health"], "confidence_score": 90},
+            {"id": "kb-2", "fact": "Second fact", "disinformation_categories": [], "confidence_score": 70},
+        ]
+
+        kb_context = retrieve_kb_context(supabase_client, openai_client, transcription)
+
+        supabase_client.search_kb_entries_batch.assert_called_once_with(
+            query_embeddings=[[0.6, 0.8], [0.0, 1.0]],
+            match_threshold=KB_SEARCH_MATCH_THRESHOLD,
+            match_count=KB_STAGE1_MATCH_COUNT_PER_CHUNK,
+        )
+        supabase_client.search_kb_entries.assert_not_called()
+        assert kb_context.index("First fact") < kb_context.index("Second fact")
+        assert "**Categories**: Health" in kb_context
+
+    def test_no_matching_entries(self):
+        """Test that no matches give no context"""
+        supabase_client = Mock()
+        supabase_client.search_kb_entries_batch.return_value = []
+
+        assert retrieve_kb_context(supabase_client, openai_client_with_embeddings([[1.0, 0.0]]), "text") is None
+
+    def test_empty_transcription(self):
+        """Test that an empty transcription isn't embedded nor searched"""
+        supabase_client = Mock()
+        openai_client = Mock()
+
+        assert retrieve_kb_context(supabase_client, openai_client, "") is None
+        openai_client.embeddings.create.assert_not_called()
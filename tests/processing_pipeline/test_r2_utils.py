@@ -0,0 +1,87 @@
+import hashlib
+from unittest.mock import Mock, patch
+import pytest
+from processing_pipeline.r2_utils import (
+    MB,
+    R2Uploader,
+    UploadVerificationError,
+    compute_etag,
+    create_r2_client,
+)
+
+
+class TestR2Utils:
+    @pytest.fixture
+    def audio_file(self, tmp_path):
+        file_path = tmp_path / "audio.mp3"
+        file_path.write_bytes(b"a" * (5 * MB) + b"b" * (5 * MB) + b"c")
+        return str(file_path)
+
+    def test_compute_etag_single_part(self, tmp_path):
+        """Test that small files get the plain MD5 of their content"""
+        file_path = tmp_path / "small.mp3"
+        file_path.write_bytes(b"audio")
+
+        assert compute_etag(str(file_path), 5 * MB) == hashlib.md5(b"audio").hexdigest()
+
+    def test_compute_etag_multipart(self, audio_file):
+        """Test the multipart ETag is the MD5 of the part MD5s with the part count"""
+        part_digests = [
+            hashlib.md5(b"a" * (5 * MB)).digest(),
+            hashlib.md5(b"b" * (5 * MB)).digest(),
+            hashlib.md5(b"c").digest(),
+        ]
+        expected = f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-3"
+
+        assert compute_etag(audio_file, 5 * MB) == expected
+
+    def test_compute_etag_file_of_exactly_one_part(self, tmp_path):
+        """Test that a file of exactly one part size is uploaded as a single-part multipart upload"""
+        file_path = tmp_path / "one_part.mp3"
+        file_path.write_bytes(b"a" * (5 * MB))
+        expected = f"{hashlib.md5(hashlib.md5(b'a' * (5 * MB)).digest()).hexdigest()}-1"
+
+        assert compute_etag(str(file_path), 5 * MB) == expected
+
+    def test_upload_verifies_the_object(self, audio_file):
+        """Test a successful, verified multipart upload"""
+        s3_client = Mock()
+        s3_client.head_object.return_value = {
+            "ETag": f'"{compute_etag(audio_file, 5 * MB)}"',
+            "ContentLength": 10 * MB + 1,
+        }
+        uploader = R2Uploader(s3_client, "test-bucket", part_size=5 * MB, max_concurrency=4)
+
+        assert uploader.upload(audio_file, "radio_123456/audio.mp3") == "radio_123456/audio.mp3"
+
+        args, kwargs = s3_client.upload_file.call_args
+        assert args == (audio_file, "test-bucket", "radio_123456/audio.mp3")
+        assert kwargs["Config"].multipart_chunksize == 5 * MB
+        assert kwargs["Config"].max_concurrency == 4
+        s3_client.head_object.assert_called_once_with(Bucket="test-bucket", Key="radio_123456/audio.mp3")
+
+    def test_upload_rejects_a_different_etag(self, audio_file):
+        """Test that a corrupted upload is reported"""
+        s3_client = Mock()
+        s3_client.head_object.return_value = {"ETag": '"0123456789abcdef-3"', "ContentLength": 10 * MB + 1}
+        uploader = R2Uploader(s3_client, "test-bucket", part_size=5 * MB)
+
+        with pytest.raises(UploadVerificationError, match="does not match the local file"):
+            uploader.upload(audio_file, "radio_123456/audio.mp3")
+
+    def test_upload_rejects_a_truncated_object(self, audio_file):
+        """Test that an object with a different size is reported"""
+        s3_client = Mock()
+        s3_client.head_object.return_value = {"ETag": f'"{compute_etag(audio_file, 5 * MB)}"', "ContentLength": 5 * MB}
+        uploader = R2Uploader(s3_client, "test-bucket", part_size=5 * MB)
+
+        with pytest.raises(UploadVerificationError):
+            uploader.upload(audio_file, "radio_123456/audio.mp3")
+
+    def test_create_r2_client_uses_a_connection_pool(self):
+        """Test the client is created with a pooled connection config"""
+        with patch("boto3.client") as mock_client:
+            create_r2_client()
+
+        config = mock_client.call_args.kwargs["config"]
+        assert config.max_pool_connections >= 10
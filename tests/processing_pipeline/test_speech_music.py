@@ -0,0 +1,100 @@
+from unittest.mock import patch
+import numpy as np
+from processing_pipeline.speech_music import (
+    MUSIC,
+    SILENCE,
+    SPEECH,
+    classify_samples,
+    classify_segments,
+    compute_speech_features,
+    find_segment_starts,
+    segment_audio_file,
+)
+
+SAMPLE_RATE = 8000
+
+
+def timeline(seconds):
+    return np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+
+
+def music(seconds):
+    """A sustained chord, at a steady level"""
+    t = timeline(seconds)
+    chord = 0.2 * np.sin(2 * np.pi * 220 * t) + 0.15 * np.sin(2 * np.pi * 277 * t) + 0.1 * np.sin(2 * np.pi * 330 * t)
+    return (chord * 32767 * 0.8).astype(np.int16)
+
+
+def speech(seconds):
+    """A voice pulsing at the syllable rate, with pauses between words and unvoiced sounds"""
+    t = timeline(seconds)
+    rng = np.random.default_rng(0)
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t + np.sin(2 * np.pi * 0.7 * t)), 0, None) ** 2
+    words = np.sin(2 * np.pi * 0.5 * t) > -0.3
+    phase = 2 * np.pi * np.cumsum(150 + 30 * np.sin(2 * np.pi * 0.3 * t)) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 15))
+    unvoiced = rng.normal(0, 0.5, len(t)) * (np.sin(2 * np.pi * 3 * t + 1) > 0.7)
+    return ((voiced * 0.3 + unvoiced * 0.3) * syllables * words * 32767 * 0.5).astype(np.int16)
+
+
+class TestSpeechMusic:
+    def test_compute_speech_features(self):
+        """Test that speech pauses and modulates more than music"""
+        speech_features = compute_speech_features(speech(20))
+        music_features = compute_speech_features(music(20))
+
+        assert speech_features[0] > music_features[0]
+        assert speech_features[1] > music_features[1]
+        assert speech_features[2] > music_features[2]
+
+    def test_compute_speech_features_too_short(self):
+        """Test that a few milliseconds of audio have no features"""
+        assert compute_speech_features(speech(0.1)) is None
+
+    def test_classify_samples(self):
+        """Test the label of speech, music and silence"""
+        assert classify_samples(speech(20)) == SPEECH
+        assert classify_samples(music(20)) == MUSIC
+        assert classify_samples(np.zeros(20 * SAMPLE_RATE, dtype=np.int16)) == SILENCE
+        assert classify_samples(np.empty(0, dtype=np.int16)) == SILENCE
+
+    def test_classify_samples_keeps_talk_over_music(self):
+        """Test that a voice over a music bed is still speech"""
+        assert classify_samples((music(20) * 0.3 + speech(20)).astype(np.int16)) == SPEECH
+
+    def test_classify_segments(self):
+        """Test labeling segments from their start, including a shorter last one"""
+        samples = np.concatenate([music(20), speech(20), np.zeros(5 * SAMPLE_RATE, dtype=np.int16)])
+
+        assert classify_segments(samples, [0, 20, 40]) == [MUSIC, SPEECH, SILENCE]
+
+    def test_find_segment_starts(self):
+        """Test that segments are cut in the pauses, within the allowed lengths"""
+        pause = np.zeros(SAMPLE_RATE // 2, dtype=np.int16)
+        samples = np.concatenate([music(14), pause, music(12), pause, music(10)])
+
+        starts = find_segment_starts(samples, max_segment_seconds=20, min_segment_seconds=10)
+
+        assert len(starts) == 3
+        assert starts[0] == 0.0
+        assert 14.0 <= starts[1] <= 14.5
+        assert 26.5 <= starts[2] <= 27.0
+
+    def test_find_segment_starts_of_short_audio(self):
+        """Test that audio shorter than a segment is a single segment"""
+        assert find_segment_starts(speech(5), 20, 10) == [0.0]
+        assert find_segment_starts(np.empty(0, dtype=np.int16), 20, 10) == []
+
+    def test_segment_audio_file(self):
+        """Test that audio files are decoded, cut every segment length or at pauses, and labeled"""
+        with patch("processing_pipeline.speech_music.decode_pcm", return_value=music(40)) as mock_decode:
+            assert segment_audio_file("test.mp3", 20) == [{"start": 0.0, "label": MUSIC}, {"start": 20.0, "label": MUSIC}]
+
+        mock_decode.assert_called_once_with("test.mp3")
+
+        samples = np.concatenate([music(14), np.zeros(SAMPLE_RATE // 2, dtype=np.int16), speech(12)])
+        with patch("processing_pipeline.speech_music.decode_pcm", return_value=samples):
+            audio_segments = segment_audio_file("test.mp3", 20, 10)
+
+        assert [audio_segment["label"] for audio_segment in audio_segments] == [MUSIC, SPEECH]
+        assert 14.0 <= audio_segments[1]["start"] <= 14.5
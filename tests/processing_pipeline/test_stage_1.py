@@ -1,11 +1,19 @@
 import json
 import os
+import threading
 from unittest.mock import Mock, patch, call
 import uuid
 import pytest
-from google.genai.types import HarmCategory, HarmBlockThreshold
+from google.genai import errors
+from google.genai.types import FinishReason, HarmCategory, HarmBlockThreshold
 from processing_pipeline.constants import GeminiModel
 from processing_pipeline.stage_1 import (
+    initial_disinformation_detection,
+    undo_disinformation_detection,
+    redo_main_detection,
+    regenerate_timestamped_transcript,
+)
+from processing_pipeline.stage_1.tasks import (
     fetch_a_new_audio_file_from_supabase,
     fetch_audio_file_by_id,
     fetch_stage_1_llm_response_by_id,
@@ -14,14 +22,17 @@ from processing_pipeline.stage_1 import (
     disinformation_detection_with_gemini,
     insert_stage_1_llm_response,
     process_audio_file,
-    initial_disinformation_detection,
-    undo_disinformation_detection,
-    redo_main_detection,
-    regenerate_timestamped_transcript,
-    Stage1Executor,
-    GeminiTimestampTranscriptionGenerator,
     transcribe_audio_file_with_open_ai_whisper_1,
 )
+from processing_pipeline.stage_1.checkpoints import TimestampedTranscriptionCheckpoints
+from processing_pipeline.stage_1.executors import (
+    BatchTooLargeError,
+    GeminiTimestampTranscriptionGenerator,
+    LocalWhisperTimestampTranscriptionGenerator,
+    Stage1Executor,
+    Stage1PreprocessTranscriptionExecutor,
+)
+from processing_pipeline.stage_1.tasks import transcribe_audio_file_with_timestamp
 
 
 @pytest.fixture
@@ -41,7 +52,7 @@ def mock_environment(monkeypatch):
 @pytest.fixture
 def mock_supabase_client():
     """Create a mock Supabase client"""
-    with patch("processing_pipeline.stage_1.SupabaseClient") as MockSupabaseClient:
+    with patch("processing_pipeline.stage_1.flows.SupabaseClient") as MockSupabaseClient:
         mock_client = Mock()
         mock_client.get_a_new_audio_file_and_reserve_it.return_value = None
         mock_client.get_audio_file_by_id.return_value = None
@@ -70,7 +81,7 @@ def mock_s3_client():
 @pytest.fixture
 def mock_genai():
     """Create a mock Gemini client"""
-    with patch("processing_pipeline.stage_1.genai") as mock:
+    with patch("processing_pipeline.stage_1.flows.genai") as mock:
         client = Mock()
         mock_flagged_snippets = {"flagged_snippets": []}
         client.models.generate_content.return_value.text = json.dumps(mock_flagged_snippets)
@@ -139,7 +150,7 @@ class TestS3Operations:
 class TestTranscriptionFunctions:
     def test_transcribe_with_timestamp_with_gemini_success(self, mock_environment):
         """Test successful transcription with timestamp using Gemini"""
-        with patch("processing_pipeline.stage_1.GeminiTimestampTranscriptionGenerator") as mock_generator:
+        with patch("processing_pipeline.stage_1.tasks.GeminiTimestampTranscriptionGenerator") as mock_generator:
             mock_generator.run.return_value = "Test timestamped transcription"
 
             # Call the function
@@ -156,11 +167,30 @@ class TestTranscriptionFunctions:
                 model_name=GeminiModel.GEMINI_FLASH_LATEST
             )
 
+    @pytest.mark.parametrize("vad_segmentation, segment_length, batch_size", [(False, 20, 30), (True, 30, 20)])
+    def test_transcribe_with_timestamp_with_gemini_caps_the_audio_of_a_batch(
+        self, vad_segmentation, segment_length, batch_size
+    ):
+        """Test that batches of longer segments hold fewer of them, at most ten minutes of audio"""
+        audio_segments = [{"start": 0.0, "label": "speech"}]
+        with patch("processing_pipeline.stage_1.tasks.VAD_SEGMENTATION", vad_segmentation), patch(
+            "processing_pipeline.stage_1.tasks.GeminiTimestampTranscriptionGenerator"
+        ) as mock_generator:
+            mock_generator.run.return_value = "[00:00] Hola"
+
+            transcribe_audio_file_with_timestamp_with_gemini(
+                Mock(), "test.mp3", {"id": "prompt-1"}, GeminiModel.GEMINI_2_5_FLASH, audio_segments=audio_segments
+            )
+
+        _, kwargs = mock_generator.run.call_args
+        assert kwargs["segment_length"] == segment_length
+        assert kwargs["batch_size"] == batch_size
+
 
 class TestDetectionFunctions:
     def test_disinformation_detection_success(self, mock_environment):
         """Test successful disinformation detection"""
-        with patch("processing_pipeline.stage_1.Stage1Executor") as mock_executor:
+        with patch("processing_pipeline.stage_1.tasks.Stage1Executor") as mock_executor:
             mock_executor.run.return_value = {"flagged_snippets": []}
 
             result = disinformation_detection_with_gemini("Test transcription", {"station": "test"})
@@ -198,12 +228,46 @@ class TestStage1Executor:
             Stage1Executor.run(None, GeminiModel.GEMINI_FLASH_LATEST, "test", {})
 
 
+class TestStage1PreprocessTranscriptionExecutor:
+    def test_run_shares_the_upload(self):
+        """Test that a managed upload is reused and left to its manager"""
+        gemini_client = Mock()
+        gemini_client.models.generate_content.return_value.parsed = {"transcription": "Test transcription"}
+        gemini_files = Mock()
+
+        result = Stage1PreprocessTranscriptionExecutor.run(
+            gemini_client, "test.mp3", GeminiModel.GEMINI_2_5_FLASH, {"user_prompt": "Transcribe", "output_schema": {}},
+            gemini_files=gemini_files,
+        )
+
+        assert result == {"transcription": "Test transcription"}
+        gemini_files.get.assert_called_once_with("test.mp3")
+        args, kwargs = gemini_client.models.generate_content.call_args
+        assert kwargs["contents"] == ["Transcribe", gemini_files.get.return_value]
+        gemini_client.files.upload.assert_not_called()
+        gemini_client.files.delete.assert_not_called()
+
+    def test_run_without_manager_deletes_its_upload(self):
+        """Test that the audio file is uploaded and deleted when no upload is shared"""
+        gemini_client = Mock()
+        gemini_client.files.upload.return_value.state.name = "ACTIVE"
+        gemini_client.files.upload.return_value.name = "files/abc"
+        gemini_client.models.generate_content.return_value.parsed = {"transcription": "Test transcription"}
+
+        Stage1PreprocessTranscriptionExecutor.run(
+            gemini_client, "test.mp3", GeminiModel.GEMINI_2_5_FLASH, {"user_prompt": "Transcribe", "output_schema": {}}
+        )
+
+        gemini_client.files.upload.assert_called_once()
+        gemini_client.files.delete.assert_called_once_with(name="files/abc")
+
+
 class TestGeminiTimestampTranscriptionGenerator:
 
     @pytest.fixture
     def mock_genai(self):
         """Setup mock Google Generative AI"""
-        with patch("processing_pipeline.stage_1.genai") as mock_genai:
+        with patch("processing_pipeline.stage_1.flows.genai") as mock_genai:
             # Mock Client
             mock_client = Mock()
             mock_genai.Client.return_value = mock_client
@@ -372,6 +436,463 @@ class TestGeminiTimestampTranscriptionGenerator:
         }
         assert categories_found == expected_categories
 
+    def test_split_audio_into_segments(self, tmp_path):
+        """Test that MP3 recordings are cut in memory, and other containers by an ffmpeg stream copy"""
+        recording = tmp_path / "recording.mp3"
+        recording.write_bytes(b"mp3 data")
+
+        with patch("processing_pipeline.stage_1.executors.split_mp3_frames", return_value=[b"one", b"two"]) as mock_split, \
+             patch("processing_pipeline.stage_1.executors.split_audio_stream_copy") as mock_stream_copy:
+            segments = GeminiTimestampTranscriptionGenerator.split_audio_into_segments(str(recording), 20000)
+
+        mock_split.assert_called_once_with(b"mp3 data", 20.0, None)
+        mock_stream_copy.assert_not_called()
+        assert segments == [
+            {"data": b"one", "mime_type": "audio/mp3", "start": 0.0},
+            {"data": b"two", "mime_type": "audio/mp3", "start": 20.0},
+        ]
+
+        with patch("processing_pipeline.stage_1.executors.split_audio_stream_copy", return_value=[b"one"]) as mock_stream_copy:
+            segments = GeminiTimestampTranscriptionGenerator.split_audio_into_segments("recording.ogg", 20000)
+
+        mock_stream_copy.assert_called_once_with("recording.ogg", 20.0, None)
+        assert segments == [{"data": b"one", "mime_type": "audio/ogg", "start": 0.0}]
+
+    def test_run_transcribes_batches_concurrently(self):
+        """Test that batches run at the same time and are merged by absolute segment number"""
+        segments = [{"data": f"segment {i}".encode(), "mime_type": "audio/mp3", "start": (i - 1) * 20} for i in range(1, 6)]
+        # Only passes once both batches are sent to Gemini at the same time
+        both_running = threading.Barrier(2, timeout=5)
+
+        def transcribe_batch(gemini_client, batch_segments, model_name, prompt_version):
+            both_running.wait()
+            return {
+                "segments": [
+                    {"segment_number": i + 1, "transcript": segment["data"].decode()} for i, segment in enumerate(batch_segments)
+                ]
+            }
+
+        with patch.object(GeminiTimestampTranscriptionGenerator, "split_audio_into_segments", return_value=segments), \
+             patch.object(GeminiTimestampTranscriptionGenerator, "transcribe_batch", side_effect=transcribe_batch):
+            result = GeminiTimestampTranscriptionGenerator.run(
+                Mock(), "test.mp3", GeminiModel.GEMINI_2_5_FLASH, {}, segment_length=20, batch_size=3, concurrency=2
+            )
+
+        assert result == (
+            "[00:00] segment 1\n"
+            "[00:20] segment 2\n"
+            "[00:40] segment 3\n"
+            "[01:00] segment 4\n"
+            "[01:20] segment 5\n"
+        )
+
+    def test_run_fails_when_a_batch_fails(self):
+        """Test that a failed batch fails the audio file, without starting the batches still waiting"""
+        segments = [{"data": f"segment {i}".encode(), "mime_type": "audio/mp3", "start": (i - 1) * 20} for i in range(1, 7)]
+
+        with patch.object(GeminiTimestampTranscriptionGenerator, "split_audio_into_segments", return_value=segments), \
+             patch.object(
+                 GeminiTimestampTranscriptionGenerator, "transcribe_batch", side_effect=ValueError("No response")
+             ) as mock_transcribe_batch:
+            with pytest.raises(ValueError, match="No response"):
+                GeminiTimestampTranscriptionGenerator.run(
+                    Mock(), "test.mp3", GeminiModel.GEMINI_2_5_FLASH, {}, batch_size=2, concurrency=1
+                )
+
+        # The worker may already have picked up the next batch, but not the last one
+        assert mock_transcribe_batch.call_count < 3
+
+    def test_run_splits_a_batch_that_is_too_large(self):
+        """Test that a response cut off at MAX_TOKENS splits the batch in half and the smaller size is remembered"""
+        segments = [{"data": f"segment {i}".encode(), "mime_type": "audio/mp3", "start": (i - 1) * 20} for i in range(1, 5)]
+        batch_lengths = []
+
+        def generate_content(model, contents, config):
+            # The prompt, then an opening tag, the audio and a closing tag per segment
+            batch_segments = [part for part in contents[1:] if not isinstance(part, str)]
+            batch_lengths.append(len(batch_segments))
+            result = Mock()
+            if len(batch_segments) > 2:
+                result.parsed = None
+                result.candidates = [Mock(finish_reason=FinishReason.MAX_TOKENS)]
+            else:
+                result.parsed = {
+                    "segments": [
+                        {"segment_number": i + 1, "transcript": part.inline_data.data.decode()}
+                        for i, part in enumerate(batch_segments)
+                    ]
+                }
+            return result
+
+        gemini_client = Mock()
+        gemini_client.models.generate_content.side_effect = generate_content
+        prompt_version = {"user_prompt": "Transcribe", "system_instruction": "", "output_schema": {}}
+
+        with patch.object(GeminiTimestampTranscriptionGenerator, "split_audio_into_segments", return_value=segments), \
+             patch.dict(GeminiTimestampTranscriptionGenerator.batch_sizes, clear=True), \
+             patch.dict(GeminiTimestampTranscriptionGenerator.batch_size_successes, clear=True):
+            result = GeminiTimestampTranscriptionGenerator.run(
+                gemini_client, "test.mp3", GeminiModel.GEMINI_2_5_FLASH, prompt_version, batch_size=4, batch_size_key="WXYZ"
+            )
+
+            assert GeminiTimestampTranscriptionGenerator.get_batch_size("WXYZ", 30) == 2
+            assert GeminiTimestampTranscriptionGenerator.get_batch_size("ABCD", 30) == 30
+
+        assert batch_lengths == [4, 2, 2]
+        assert result == (
+            "[00:00] segment 1\n"
+            "[00:20] segment 2\n"
+            "[00:40] segment 3\n"
+            "[01:00] segment 4\n"
+        )
+
+    def test_learned_batch_size_grows_back(self):
+        """Test that a batch size learned from one dense file doubles again after enough batches went through"""
+        with patch.dict(GeminiTimestampTranscriptionGenerator.batch_sizes, clear=True), \
+             patch.dict(GeminiTimestampTranscriptionGenerator.batch_size_successes, clear=True), \
+             patch("processing_pipeline.stage_1.executors.TIMESTAMPED_TRANSCRIPTION_BATCH_SIZE_RECOVERY", 3):
+            GeminiTimestampTranscriptionGenerator.set_batch_size("WXYZ", 8)
+            GeminiTimestampTranscriptionGenerator.record_batch_success("WXYZ", 8)
+            GeminiTimestampTranscriptionGenerator.record_batch_success("WXYZ", 8)
+            # The last batch of a file is smaller, it doesn't count
+            GeminiTimestampTranscriptionGenerator.record_batch_success("WXYZ", 5)
+            assert GeminiTimestampTranscriptionGenerator.get_batch_size("WXYZ", 30) == 8
+
+            GeminiTimestampTranscriptionGenerator.record_batch_success("WXYZ", 8)
+            assert GeminiTimestampTranscriptionGenerator.get_batch_size("WXYZ", 30) == 16
+
+            # A new split starts over from the smaller size
+            GeminiTimestampTranscriptionGenerator.record_batch_success("WXYZ", 16)
+            GeminiTimestampTranscriptionGenerator.set_batch_size("WXYZ", 8)
+            GeminiTimestampTranscriptionGenerator.record_batch_success("WXYZ", 8)
+            GeminiTimestampTranscriptionGenerator.record_batch_success("WXYZ", 8)
+            assert GeminiTimestampTranscriptionGenerator.get_batch_size("WXYZ", 30) == 8
+
+            # Never beyond the default
+            for _ in range(3):
+                GeminiTimestampTranscriptionGenerator.record_batch_success("WXYZ", 8)
+            assert GeminiTimestampTranscriptionGenerator.get_batch_size("WXYZ", 12) == 12
+
+    def test_transcribe_batch_raises_batch_too_large_when_cut_off(self):
+        """Test that a MAX_TOKENS finish is a BatchTooLargeError, so the batch is split rather than retried"""
+        gemini_client = Mock()
+        gemini_client.models.generate_content.return_value.parsed = None
+        gemini_client.models.generate_content.return_value.candidates = [Mock(finish_reason=FinishReason.MAX_TOKENS)]
+        segments = [{"data": b"segment 1", "mime_type": "audio/mp3", "start": 0}]
+        prompt_version = {"user_prompt": "Transcribe", "system_instruction": "", "output_schema": {}}
+
+        with pytest.raises(BatchTooLargeError, match="cut off"):
+            GeminiTimestampTranscriptionGenerator.transcribe_batch(
+                gemini_client, segments, GeminiModel.GEMINI_2_5_FLASH, prompt_version
+            )
+
+    def test_run_splits_a_batch_with_missing_segments(self):
+        """Test that a batch missing segments is split, down to a single segment"""
+        segments = [
+            {"data": b"segment 1", "mime_type": "audio/mp3", "start": 0},
+            {"data": b"segment 2", "mime_type": "audio/mp3", "start": 20},
+        ]
+
+        with patch.object(GeminiTimestampTranscriptionGenerator, "split_audio_into_segments", return_value=segments), \
+             patch.object(
+                 GeminiTimestampTranscriptionGenerator, "transcribe_batch", return_value={"segments": []}
+             ) as mock_transcribe_batch:
+            with pytest.raises(BatchTooLargeError, match="Segment count mismatch"):
+                GeminiTimestampTranscriptionGenerator.run(
+                    Mock(), "test.mp3", GeminiModel.GEMINI_2_5_FLASH, {}, batch_size=2
+                )
+
+        # The full batch, then its first half on its own
+        assert mock_transcribe_batch.call_count == 2
+
+    def test_run_resumes_from_checkpoints(self):
+        """Test that only the segments missing from the checkpoints are transcribed, and saved as they finish"""
+        segments = [{"data": f"segment {i}".encode(), "mime_type": "audio/mp3", "start": (i - 1) * 20} for i in range(1, 6)]
+        supabase_client = Mock()
+        supabase_client.get_timestamped_transcription_checkpoints.return_value = [
+            {"segment_start": 0, "segment_count": 2, "transcripts": ["one", "two"]},
+        ]
+        checkpoints = TimestampedTranscriptionCheckpoints(supabase_client, "audio-1", "prompt-1", 20)
+
+        def transcribe_batch(gemini_client, batch_segments, model_name, prompt_version):
+            return {
+                "segments": [
+                    {"segment_number": i + 1, "transcript": segment["data"].decode()} for i, segment in enumerate(batch_segments)
+                ]
+            }
+
+        with patch.object(GeminiTimestampTranscriptionGenerator, "split_audio_into_segments", return_value=segments), \
+             patch.object(
+                 GeminiTimestampTranscriptionGenerator, "transcribe_batch", side_effect=transcribe_batch
+             ) as mock_transcribe_batch:
+            result = GeminiTimestampTranscriptionGenerator.run(
+                Mock(), "test.mp3", GeminiModel.GEMINI_2_5_FLASH, {}, batch_size=2, checkpoints=checkpoints
+            )
+
+        assert sorted(len(args[1]) for args, _ in mock_transcribe_batch.call_args_list) == [1, 2]
+        supabase_client.get_timestamped_transcription_checkpoints.assert_called_once_with("audio-1", "prompt-1", 20)
+        supabase_client.upsert_timestamped_transcription_checkpoint.assert_has_calls(
+            [
+                call("audio-1", "prompt-1", 20, 2, ["segment 3", "segment 4"]),
+                call("audio-1", "prompt-1", 20, 4, ["segment 5"]),
+            ],
+            any_order=True,
+        )
+        assert result == (
+            "[00:00] one\n"
+            "[00:20] two\n"
+            "[00:40] segment 3\n"
+            "[01:00] segment 4\n"
+            "[01:20] segment 5\n"
+        )
+
+    def test_run_skips_segments_without_speech(self):
+        """Test that music and silence aren't sent to Gemini, but keep their place in the transcript"""
+        segments = [{"data": f"segment {i}".encode(), "mime_type": "audio/mp3", "start": (i - 1) * 20} for i in range(1, 5)]
+
+        def transcribe_batch(gemini_client, batch_segments, model_name, prompt_version):
+            return {
+                "segments": [
+                    {"segment_number": i + 1, "transcript": segment["data"].decode()} for i, segment in enumerate(batch_segments)
+                ]
+            }
+
+        with patch.object(GeminiTimestampTranscriptionGenerator, "split_audio_into_segments", return_value=segments), \
+             patch.object(
+                 GeminiTimestampTranscriptionGenerator, "transcribe_batch", side_effect=transcribe_batch
+             ) as mock_transcribe_batch:
+            result = GeminiTimestampTranscriptionGenerator.run(
+                Mock(),
+                "test.mp3",
+                GeminiModel.GEMINI_2_5_FLASH,
+                {},
+                audio_segments=[
+                    {"start": 0, "label": "music"},
+                    {"start": 20, "label": "speech"},
+                    {"start": 40, "label": "silence"},
+                    {"start": 60, "label": "speech"},
+                ],
+            )
+
+        assert [len(args[1]) for args, _ in mock_transcribe_batch.call_args_list] == [1, 1]
+        assert result == (
+            "[00:00] [Music]\n"
+            "[00:20] segment 2\n"
+            "[00:40] [Silence]\n"
+            "[01:00] segment 4\n"
+        )
+
+    def test_run_uses_the_offsets_of_segments_cut_at_pauses(self):
+        """Test that segments cut at pauses are timestamped with their own start"""
+        segments = [
+            {"data": b"segment 1", "mime_type": "audio/mp3", "start": 0.0},
+            {"data": b"segment 2", "mime_type": "audio/mp3", "start": 17.6},
+            {"data": b"segment 3", "mime_type": "audio/mp3", "start": 43.2},
+        ]
+        audio_segments = [{"start": segment["start"], "label": "speech"} for segment in segments]
+
+        with patch.object(
+            GeminiTimestampTranscriptionGenerator, "split_audio_into_segments", return_value=segments
+        ) as mock_split, patch.object(
+            GeminiTimestampTranscriptionGenerator,
+            "transcribe_batch",
+            return_value={"segments": [{"segment_number": i, "transcript": f"part {i}"} for i in (1, 2, 3)]},
+        ):
+            result = GeminiTimestampTranscriptionGenerator.run(
+                Mock(), "test.mp3", GeminiModel.GEMINI_2_5_FLASH, {}, segment_length=30, audio_segments=audio_segments
+            )
+
+        mock_split.assert_called_once_with("test.mp3", 30000, [0.0, 17.6, 43.2])
+        assert result == "[00:00] part 1\n[00:17] part 2\n[00:43] part 3\n"
+
+    def test_run_ignores_checkpoints_that_fail_to_load(self):
+        """Test that checkpoints are only a cache, a failing store transcribes everything"""
+        segments = [{"data": b"segment 1", "mime_type": "audio/mp3", "start": 0}]
+        supabase_client = Mock()
+        supabase_client.get_timestamped_transcription_checkpoints.side_effect = Exception("Connection error")
+        supabase_client.upsert_timestamped_transcription_checkpoint.side_effect = Exception("Connection error")
+        checkpoints = TimestampedTranscriptionCheckpoints(supabase_client, "audio-1", "prompt-1", 20)
+
+        with patch.object(GeminiTimestampTranscriptionGenerator, "split_audio_into_segments", return_value=segments), \
+             patch.object(
+                 GeminiTimestampTranscriptionGenerator,
+                 "transcribe_batch",
+                 return_value={"segments": [{"segment_number": 1, "transcript": "one"}]},
+             ):
+            result = GeminiTimestampTranscriptionGenerator.run(
+                Mock(), "test.mp3", GeminiModel.GEMINI_2_5_FLASH, {}, checkpoints=checkpoints
+            )
+
+        assert result == "[00:00] one\n"
+
+
+def whisper_segment(start, text):
+    segment = Mock()
+    segment.start = start
+    segment.text = text
+    return segment
+
+
+@pytest.fixture
+def mock_whisper_model():
+    model = Mock()
+    info = Mock(language="es", language_probability=0.98)
+    model.transcribe.return_value = (iter([]), info)
+    with patch.object(LocalWhisperTimestampTranscriptionGenerator, "get_model", return_value=model):
+        yield model
+
+
+class TestLocalWhisperTimestampTranscriptionGenerator:
+    def test_run_transcribes_the_speech_segments(self, mock_whisper_model):
+        """Test that only speech is decoded, and that phrases are grouped by the segment they start in"""
+        audio_segments = [
+            {"start": 0.0, "label": "music"},
+            {"start": 20.0, "label": "speech"},
+            {"start": 45.5, "label": "speech"},
+            {"start": 70.0, "label": "silence"},
+            {"start": 90.0, "label": "speech"},
+        ]
+        mock_whisper_model.transcribe.return_value = (
+            iter(
+                [
+                    whisper_segment(20.4, " Buenos días."),
+                    whisper_segment(31.0, " ¿Cómo están? "),
+                    whisper_segment(46.0, " Las noticias."),
+                    whisper_segment(92.0, " "),
+                    whisper_segment(95.0, " Hasta luego."),
+                ]
+            ),
+            mock_whisper_model.transcribe.return_value[1],
+        )
+
+        result = LocalWhisperTimestampTranscriptionGenerator.run("test.mp3", audio_segments=audio_segments)
+
+        _, kwargs = mock_whisper_model.transcribe.call_args
+        assert kwargs["clip_timestamps"] == [20.0, 45.5, 45.5, 70.0, 90.0]
+        assert "vad_filter" not in kwargs
+        assert result == (
+            "[00:00] [Music]\n"
+            "[00:20] Buenos días. ¿Cómo están?\n"
+            "[00:45] Las noticias.\n"
+            "[01:10] [Silence]\n"
+            "[01:30] Hasta luego.\n"
+        )
+
+    def test_run_without_speech_skips_the_model(self, mock_whisper_model):
+        """Test that audio without speech isn't decoded at all"""
+        audio_segments = [{"start": 0.0, "label": "music"}, {"start": 30.0, "label": "silence"}]
+
+        result = LocalWhisperTimestampTranscriptionGenerator.run("test.mp3", audio_segments=audio_segments)
+
+        mock_whisper_model.transcribe.assert_not_called()
+        assert result == "[00:00] [Music]\n[00:30] [Silence]\n"
+
+    def test_run_without_segments_uses_the_vad_of_whisper(self, mock_whisper_model):
+        """Test that without a plan, every phrase is a line at its own start"""
+        mock_whisper_model.transcribe.return_value = (
+            iter([whisper_segment(1.2, " Hola."), whisper_segment(65.9, " Adiós.")]),
+            mock_whisper_model.transcribe.return_value[1],
+        )
+
+        result = LocalWhisperTimestampTranscriptionGenerator.run("test.mp3")
+
+        _, kwargs = mock_whisper_model.transcribe.call_args
+        assert kwargs["vad_filter"] is True
+        assert result == "[00:01] Hola.\n[01:05] Adiós.\n"
+
+    def test_get_model_without_faster_whisper(self):
+        """Test that a missing faster-whisper fails with a hint"""
+        with patch.dict("sys.modules", {"faster_whisper": None}), patch.object(
+            LocalWhisperTimestampTranscriptionGenerator, "models", {}
+        ):
+            with pytest.raises(ValueError, match="requirements-local-transcriptor.txt"):
+                LocalWhisperTimestampTranscriptionGenerator.get_model("tiny")
+
+
+class TestTimestampedTranscriptor:
+    def test_station_uses_the_local_transcriptor(self):
+        """Test that stations can be transcribed locally"""
+        with patch.dict(
+            "processing_pipeline.stage_1.tasks.TIMESTAMPED_TRANSCRIPTOR_BY_STATION", {"WXYZ": "local_whisper"}
+        ), patch(
+            "processing_pipeline.stage_1.tasks.transcribe_audio_file_with_timestamp_with_local_whisper",
+            return_value={"timestamped_transcription": "[00:00] local"},
+        ) as mock_local, patch(
+            "processing_pipeline.stage_1.tasks.transcribe_audio_file_with_timestamp_with_gemini"
+        ) as mock_gemini:
+            transcriptor, result = transcribe_audio_file_with_timestamp(
+                Mock(), "test.mp3", {"id": "prompt-1"}, radio_station_code="WXYZ"
+            )
+
+        assert transcriptor == LocalWhisperTimestampTranscriptionGenerator.get_name()
+        assert result == {"timestamped_transcription": "[00:00] local"}
+        mock_local.assert_called_once_with("test.mp3", None)
+        mock_gemini.assert_not_called()
+
+    def test_falls_back_to_the_local_transcriptor_when_rate_limited(self):
+        """Test that a rate-limited Gemini falls back to the local transcriptor"""
+        rate_limited = errors.ClientError(429, {"error": {"code": 429, "message": "Resource exhausted"}})
+        with patch("processing_pipeline.stage_1.tasks.TIMESTAMPED_TRANSCRIPTOR_FALLBACK", "local_whisper"), patch(
+            "processing_pipeline.stage_1.tasks.transcribe_audio_file_with_timestamp_with_gemini",
+            side_effect=rate_limited,
+        ), patch(
+            "processing_pipeline.stage_1.tasks.transcribe_audio_file_with_timestamp_with_local_whisper",
+            return_value={"timestamped_transcription": "[00:00] local"},
+        ) as mock_local:
+            transcriptor, result = transcribe_audio_file_with_timestamp(
+                Mock(), "test.mp3", {"id": "prompt-1"}, radio_station_code="TEST-FM"
+            )
+
+        assert transcriptor == LocalWhisperTimestampTranscriptionGenerator.get_name()
+        assert result == {"timestamped_transcription": "[00:00] local"}
+        mock_local.assert_called_once_with("test.mp3", None)
+
+    def test_rate_limit_is_raised_without_fallback(self):
+        """Test that other errors, and rate limits without a fallback, are raised"""
+        rate_limited = errors.ClientError(429, {"error": {"code": 429, "message": "Resource exhausted"}})
+        with patch("processing_pipeline.stage_1.tasks.TIMESTAMPED_TRANSCRIPTOR_FALLBACK", None), patch(
+            "processing_pipeline.stage_1.tasks.transcribe_audio_file_with_timestamp_with_gemini",
+            side_effect=rate_limited,
+        ):
+            with pytest.raises(errors.ClientError):
+                transcribe_audio_file_with_timestamp(Mock(), "test.mp3", {"id": "prompt-1"})
+
+        bad_request = errors.ClientError(400, {"error": {"code": 400, "message": "Bad request"}})
+        with patch("processing_pipeline.stage_1.tasks.TIMESTAMPED_TRANSCRIPTOR_FALLBACK", "local_whisper"), patch(
+            "processing_pipeline.stage_1.tasks.transcribe_audio_file_with_timestamp_with_gemini",
+            side_effect=bad_request,
+        ):
+            with pytest.raises(errors.ClientError):
+                transcribe_audio_file_with_timestamp(Mock(), "test.mp3", {"id": "prompt-1"})
+
+
+class TestProcessAudioFile:
+    def test_audio_file_without_speech_is_recorded_as_skipped(self):
+        """Test that a file classified as all music or silence is skipped, and its labels are kept for review"""
+        supabase_client = Mock()
+        audio_file = {
+            "id": 1,
+            "radio_station_name": "Test Station",
+            "radio_station_code": "TEST-FM",
+            "location_state": "Test State",
+            "location_city": "Test City",
+            "recorded_at": "2024-01-01T00:00:00+00:00",
+            "recording_day_of_week": "Monday",
+        }
+        audio_segments = [{"start": 0.0, "label": "music"}, {"start": 30.0, "label": "music"}, {"start": 60.0, "label": "silence"}]
+
+        with patch("processing_pipeline.stage_1.tasks.plan_audio_segments", return_value=audio_segments), patch(
+            "processing_pipeline.stage_1.tasks.initial_transcription_with_gemini"
+        ) as mock_transcribe:
+            process_audio_file(supabase_client, Mock(), Mock(), audio_file, "test.mp3", {}, {}, {}, {})
+
+        mock_transcribe.assert_not_called()
+        _, kwargs = supabase_client.insert_stage_1_llm_response.call_args
+        assert kwargs["initial_detection_result"] == {
+            "flagged_snippets": [],
+            "skipped_as_non_speech": {"music": 2, "silence": 1},
+        }
+        supabase_client.set_audio_file_status.assert_called_once_with(1, "Processed", None)
 
 
 class TestMainFlows:
@@ -379,13 +900,98 @@ class TestMainFlows:
         """Test the main initial disinformation detection flow"""
         mock_supabase_client.get_a_new_audio_file_and_reserve_it.return_value = {"id": 1, "file_path": "test.mp3"}
 
-        with patch("os.remove"), patch("processing_pipeline.stage_1.process_audio_file") as mock_process:
+        with patch("os.remove"), patch("processing_pipeline.stage_1.flows.process_audio_file") as mock_process:
             initial_disinformation_detection(audio_file_id=None, limit=1)
 
             mock_supabase_client.get_a_new_audio_file_and_reserve_it.assert_called_once()
             mock_s3_client.download_file.assert_called_once()
             mock_process.assert_called_once()
 
+    def test_initial_disinformation_detection_with_workers(self, monkeypatch):
+        """Test that the workers share the limit and process audio files at the same time"""
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        audio_files = [{"id": i, "file_path": f"radio/{i}.mp3"} for i in range(3)]
+        # Only passes once two audio files are processed at the same time
+        both_running = threading.Barrier(2, timeout=5)
+
+        def process_audio_file(**kwargs):
+            both_running.wait()
+
+        with patch("processing_pipeline.stage_1.flows.boto3"), \
+             patch("processing_pipeline.stage_1.flows.SupabaseClient") as MockSupabaseClient, \
+             patch("processing_pipeline.stage_1.flows.OpenAI"), \
+             patch("processing_pipeline.stage_1.flows.download_audio_file_from_s3", side_effect=lambda _, path: path), \
+             patch("processing_pipeline.stage_1.flows.process_audio_file", side_effect=process_audio_file) as mock_process, \
+             patch("processing_pipeline.stage_1.flows.time.sleep"), \
+             patch("os.remove"):
+            supabase_client = MockSupabaseClient.return_value
+            supabase_client.get_new_audio_files_and_reserve_them.side_effect = lambda count: audio_files[:count]
+
+            initial_disinformation_detection(audio_file_id=None, limit=2, concurrency=4)
+
+        # Both files are reserved with one round-trip, the limit caps the reservation
+        supabase_client.get_new_audio_files_and_reserve_them.assert_called_once_with(2)
+        assert mock_process.call_count == 2
+        supabase_client.set_audio_file_status.assert_not_called()
+
+    def test_initial_disinformation_detection_worker_failure(self, monkeypatch):
+        """Test that a failing audio file is released with an error instead of stopping the flow"""
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        audio_file = {"id": 1, "file_path": "radio/1.mp3"}
+
+        with patch("processing_pipeline.stage_1.flows.boto3"), \
+             patch("processing_pipeline.stage_1.flows.SupabaseClient") as MockSupabaseClient, \
+             patch("processing_pipeline.stage_1.flows.OpenAI"), \
+             patch("processing_pipeline.stage_1.flows.download_audio_file_from_s3", side_effect=Exception("R2 is down")), \
+             patch("processing_pipeline.stage_1.flows.time.sleep"):
+            supabase_client = MockSupabaseClient.return_value
+            supabase_client.get_new_audio_files_and_reserve_them.return_value = [audio_file]
+
+            initial_disinformation_detection(audio_file_id=None, limit=1, concurrency=1)
+
+        supabase_client.set_audio_file_status.assert_called_once_with(1, "Error", "R2 is down")
+
+    def test_initial_disinformation_detection_deletes_failed_downloads(self, monkeypatch, tmp_path):
+        """Test that the download of an audio file whose processing failed is deleted too"""
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        local_file = tmp_path / "1.mp3"
+        local_file.write_bytes(b"audio")
+
+        with patch("processing_pipeline.stage_1.flows.boto3"), \
+             patch("processing_pipeline.stage_1.flows.SupabaseClient") as MockSupabaseClient, \
+             patch("processing_pipeline.stage_1.flows.OpenAI"), \
+             patch("processing_pipeline.stage_1.flows.download_audio_file_from_s3", return_value=str(local_file)), \
+             patch("processing_pipeline.stage_1.flows.process_audio_file", side_effect=Exception("Gemini is down")), \
+             patch("processing_pipeline.stage_1.flows.time.sleep"):
+            supabase_client = MockSupabaseClient.return_value
+            supabase_client.get_new_audio_files_and_reserve_them.return_value = [{"id": 1, "file_path": "radio/1.mp3"}]
+
+            initial_disinformation_detection(audio_file_id=None, limit=1, concurrency=1)
+
+        assert not local_file.exists()
+        supabase_client.set_audio_file_status.assert_called_once_with(1, "Error", "Gemini is down")
+
+    def test_initial_disinformation_detection_status_failure(self, monkeypatch):
+        """Test that a worker keeps going and is counted as idle again when the error status can't be set"""
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        audio_files = [{"id": 1, "file_path": "radio/1.mp3"}, {"id": 2, "file_path": "radio/2.mp3"}]
+
+        with patch("processing_pipeline.stage_1.flows.boto3"), \
+             patch("processing_pipeline.stage_1.flows.SupabaseClient") as MockSupabaseClient, \
+             patch("processing_pipeline.stage_1.flows.OpenAI"), \
+             patch("processing_pipeline.stage_1.flows.download_audio_file_from_s3", side_effect=lambda _, path: path), \
+             patch("processing_pipeline.stage_1.flows.process_audio_file", side_effect=[Exception("Bad file"), None]), \
+             patch("processing_pipeline.stage_1.flows.time.sleep"), \
+             patch("os.path.exists", return_value=False):
+            supabase_client = MockSupabaseClient.return_value
+            supabase_client.get_new_audio_files_and_reserve_them.side_effect = lambda count: [audio_files.pop(0)]
+            supabase_client.set_audio_file_status.side_effect = Exception("Supabase is down")
+
+            initial_disinformation_detection(audio_file_id=None, limit=2, concurrency=1)
+
+        # The second reservation still sees one idle worker
+        assert [c.args for c in supabase_client.get_new_audio_files_and_reserve_them.call_args_list] == [(1,), (1,)]
+
     def test_undo_disinformation_detection_flow(self, mock_supabase_client):
         """Test the undo disinformation detection flow"""
         audio_file_ids = [1, 2]
@@ -431,7 +1037,7 @@ class TestMainFlows:
         # Verify the calls
         mock_supabase_client.get_stage_1_llm_response_by_id.assert_called_once_with(
             id=1,
-            select="*, audio_file(radio_station_name, radio_station_code, location_state, location_city, recorded_at, recording_day_of_week, file_path)",
+            select="*, audio_file(id, radio_station_name, radio_station_code, location_state, location_city, recorded_at, recording_day_of_week, file_path)",
         )
 
     def test_regenerate_timestamped_transcript_flow(self, mock_supabase_client, mock_s3_client):
@@ -453,7 +1059,7 @@ class TestMainFlows:
         mock_supabase_client.get_stage_1_llm_response_by_id.return_value = stage_1_llm_response
 
         with patch("os.remove") as mock_remove, patch(
-            "processing_pipeline.stage_1.transcribe_audio_file_with_timestamp_with_gemini"
+            "processing_pipeline.stage_1.tasks.transcribe_audio_file_with_timestamp_with_gemini"
         ) as mock_transcribe:
             mock_transcribe.return_value = {"timestamped_transcription": "Test transcription"}
 
@@ -461,7 +1067,7 @@ class TestMainFlows:
 
             mock_supabase_client.get_stage_1_llm_response_by_id.assert_called_once_with(
                 id=1,
-                select="*, audio_file(radio_station_name, radio_station_code, location_state, location_city, recorded_at, recording_day_of_week, file_path)",
+                select="*, audio_file(id, radio_station_name, radio_station_code, location_state, location_city, recorded_at, recording_day_of_week, file_path)",
             )
 
 
@@ -480,8 +1086,8 @@ class TestHelperFunctions:
         }
 
         # Setup mocks
-        with patch("processing_pipeline.stage_1.transcribe_audio_file_with_timestamp_with_gemini") as mock_transcribe, patch(
-            "processing_pipeline.stage_1.disinformation_detection_with_gemini"
+        with patch("processing_pipeline.stage_1.tasks.transcribe_audio_file_with_timestamp_with_gemini") as mock_transcribe, patch(
+            "processing_pipeline.stage_1.tasks.disinformation_detection_with_gemini"
         ) as mock_detect:
 
             # Setup mock responses
@@ -531,7 +1137,7 @@ class TestHelperFunctions:
         }
 
         with patch(
-            "processing_pipeline.stage_1.transcribe_audio_file_with_timestamp_with_gemini",
+            "processing_pipeline.stage_1.tasks.transcribe_audio_file_with_timestamp_with_gemini",
             side_effect=Exception("Test error"),
         ):
             process_audio_file(mock_supabase_client, audio_file, "test.mp3")
@@ -558,7 +1164,7 @@ class TestHelperFunctions:
         mock_file = Mock()
         with patch("os.getenv", return_value="test-key"), patch(
             "builtins.open", return_value=mock_file
-        ) as mock_open, patch("processing_pipeline.stage_1.OpenAI") as mock_openai_class:
+        ) as mock_open, patch("processing_pipeline.stage_1.tasks.OpenAI") as mock_openai_class:
             mock_client = Mock()
             mock_openai_class.return_value = mock_client
             mock_response = Mock(
@@ -613,7 +1219,7 @@ class TestHelperFunctions:
         mock_supabase_client.get_a_new_audio_file_and_reserve_it.side_effect = [None, audio_file, None]
 
         with patch("os.remove"), patch("time.sleep") as mock_sleep, patch(
-            "processing_pipeline.stage_1.process_audio_file"
+            "processing_pipeline.stage_1.flows.process_audio_file"
         ) as mock_process:
 
             initial_disinformation_detection(audio_file_id=None, limit=1)
@@ -749,13 +1355,13 @@ class TestHelperFunctions:
         }
 
         with patch("os.remove"), patch(
-            "processing_pipeline.stage_1.transcribe_audio_file_with_timestamp_with_gemini"
+            "processing_pipeline.stage_1.tasks.transcribe_audio_file_with_timestamp_with_gemini"
         ) as mock_transcribe, patch(
-            "processing_pipeline.stage_1.fetch_stage_1_llm_response_by_id"
+            "processing_pipeline.stage_1.tasks.fetch_stage_1_llm_response_by_id"
         ) as mock_fetch, patch(
-            "processing_pipeline.stage_1.download_audio_file_from_s3"
+            "processing_pipeline.stage_1.tasks.download_audio_file_from_s3"
         ) as mock_download, patch(
-            "processing_pipeline.stage_1.genai"
+            "processing_pipeline.stage_1.flows.genai"
         ) as mock_genai_sdk:
 
             mock_transcribe.return_value = {"timestamped_transcription": "Test transcription"}
@@ -1,3 +1,4 @@
+import hashlib
 import os
 from unittest.mock import Mock, call, patch
 import pytest
@@ -91,6 +92,11 @@ class TestStage2:
         with open(test_file, "wb") as f:
             f.write(b"test content")
 
+        mock_s3_client.head_object.return_value = {
+            "ETag": f'"{hashlib.md5(b"test content").hexdigest()}"',
+            "ContentLength": len(b"test content"),
+        }
+
         try:
             result = upload_to_r2_and_clean_up(
                 mock_s3_client,
@@ -100,11 +106,13 @@ class TestStage2:
             )
 
             assert result == "test-folder/snippets/test.mp3"
-            mock_s3_client.upload_file.assert_called_once_with(
+            mock_s3_client.upload_file.assert_called_once()
+            assert mock_s3_client.upload_file.call_args.args == (
                 test_file,
                 os.environ['R2_BUCKET_NAME'],
                 "test-folder/snippets/test.mp3"
             )
+            assert not os.path.exists(test_file)
         finally:
             # Clean up
             if os.path.exists(test_file):
@@ -193,7 +201,7 @@ class TestStage2:
 
         try:
             with patch('os.path.isfile', return_value=True), \
-                patch('pydub.AudioSegment.from_mp3') as mock_audio:
+                patch('pydub.AudioSegment.from_file') as mock_audio:
 
                 mock_audio.return_value = AudioSegment.silent(duration=30000)
 
@@ -233,7 +241,7 @@ class TestStage2:
         }
 
         with patch('os.path.isfile', return_value=True), \
-            patch('pydub.AudioSegment.from_mp3', side_effect=Exception("Test error")):
+            patch('pydub.AudioSegment.from_file', side_effect=Exception("Test error")):
 
             process_llm_response(
                 supabase_client=mock_supabase_client,
@@ -273,9 +281,9 @@ class TestStage2:
     @patch('time.sleep')
     def test_audio_clipping_flow(self, mock_sleep, mock_supabase_client, mock_s3_client):
         """Test audio clipping flow"""
-        mock_supabase_client.get_a_new_stage_1_llm_response_and_reserve_it.side_effect = [
-            {"id": 1, "audio_file": {"file_path": "test/path.mp3"}},
-            None  # Second call returns None to end the loop
+        mock_supabase_client.get_new_stage_1_llm_responses_and_reserve_them.side_effect = [
+            [{"id": 1, "audio_file": {"file_path": "test/path.mp3"}}],
+            []  # Second call returns no responses to end the loop
         ]
 
         with patch('os.remove'), \
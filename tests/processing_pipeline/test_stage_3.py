@@ -11,7 +11,7 @@ from processing_pipeline.stage_3 import (
     in_depth_analysis,
     Stage3Executor,
 )
-from processing_pipeline.constants import GeminiModel
+from processing_pipeline.constants import RESERVATION_BATCH_SIZE, GeminiModel
 
 
 class TestStage3:
@@ -284,12 +284,12 @@ class TestStage3:
     @patch("time.sleep")
     def test_in_depth_analysis_flow(self, mock_sleep, mock_supabase_client, mock_s3_client, sample_snippet):
         """Test in-depth analysis flow"""
-        mock_supabase_client.get_a_new_snippet_and_reserve_it.return_value = sample_snippet
+        mock_supabase_client.get_new_snippets_and_reserve_them.return_value = [sample_snippet]
 
         with patch("os.remove"):
             in_depth_analysis(snippet_ids=None, repeat=False, skip_review=True)
 
-            mock_supabase_client.get_a_new_snippet_and_reserve_it.assert_called_once()
+            mock_supabase_client.get_new_snippets_and_reserve_them.assert_called_once_with(RESERVATION_BATCH_SIZE)
             mock_s3_client.download_file.assert_called_once()
 
     def test_in_depth_analysis_with_specific_snippets(self, mock_supabase_client, mock_s3_client, sample_snippet):
@@ -308,10 +308,10 @@ class TestStage3:
     def test_in_depth_analysis_with_repeat(self, mock_supabase_client, mock_s3_client, sample_snippet):
         """Test in-depth analysis with repeat enabled"""
         # Mock responses for consecutive calls
-        mock_supabase_client.get_a_new_snippet_and_reserve_it.side_effect = [
-            sample_snippet,
-            None,  # Second call returns None to end the loop
-            None,  # Add an extra None to prevent StopIteration
+        mock_supabase_client.get_new_snippets_and_reserve_them.side_effect = [
+            [sample_snippet],
+            [],  # Second call returns no snippets to end the loop
+            [],  # Add an extra batch to prevent StopIteration
         ]
 
         with patch("os.remove"), patch("time.sleep") as mock_sleep, patch(
@@ -323,7 +323,7 @@ class TestStage3:
             except StopIteration:
                 pass  # Ignore StopIteration as we expect it
 
-            assert mock_supabase_client.get_a_new_snippet_and_reserve_it.call_count >= 1
+            assert mock_supabase_client.get_new_snippets_and_reserve_them.call_count >= 1
             assert mock_sleep.call_count >= 1
             mock_sleep.assert_called_with(60)  # Should sleep when no new snippets found
 
@@ -471,9 +471,9 @@ class TestStage4:
 
     def test_analysis_review_flow(self, mock_sleep, mock_supabase_client, sample_snippet):
         """Test analysis review flow"""
-        mock_supabase_client.get_a_ready_for_review_snippet_and_reserve_it.side_effect = [
-            sample_snippet,
-            None,  # End the loop
+        mock_supabase_client.get_ready_for_review_snippets_and_reserve_them.side_effect = [
+            [sample_snippet],
+            [],  # End the loop
         ]
 
         mock_response = {
@@ -531,7 +531,7 @@ class TestStage4:
             analysis_review(snippet_ids=None, repeat=False)
 
             # Verify process_snippet was called with the correct snippet
-            mock_supabase_client.get_a_ready_for_review_snippet_and_reserve_it.assert_called_once()
+            mock_supabase_client.get_ready_for_review_snippets_and_reserve_them.assert_called_once()
             mock_supabase_client.submit_snippet_review.assert_called_once()
             mock_postprocess.assert_called_once_with(
                 mock_supabase_client, sample_snippet["id"], mock_response["disinformation_categories"]
@@ -705,7 +705,7 @@ class TestStage4:
             # Invalid or missing fields
         }
 
-        mock_supabase_client.get_a_ready_for_review_snippet_and_reserve_it.return_value = invalid_snippet
+        mock_supabase_client.get_ready_for_review_snippets_and_reserve_them.return_value = [invalid_snippet]
 
         analysis_review(snippet_ids=None, repeat=False)
 
@@ -194,9 +194,9 @@ class TestStage5:
         """Test embedding flow"""
         # Setup mock to return one snippet then None
         mock_supabase_client.return_value = mock_supabase_client
-        mock_supabase_client.get_a_snippet_that_has_no_embedding.side_effect = [
-            sample_snippet,
-            None
+        mock_supabase_client.get_snippets_that_have_no_embedding.side_effect = [
+            [sample_snippet],
+            []
         ]
 
         with patch('processing_pipeline.stage_5.generate_snippet_document') as mock_generate_document, \
@@ -226,16 +226,16 @@ class TestStage5:
 
         # Setup counter for side effect
         call_count = 0
-        def side_effect():
+        def side_effect(max_count):
             nonlocal call_count
             call_count += 1
             if call_count == 1:
-                return sample_snippet
+                return [sample_snippet]
             elif call_count == 2:
-                return None
+                return []
             raise Exception("Test complete")
 
-        mock_supabase_client.get_a_snippet_that_has_no_embedding.side_effect = side_effect
+        mock_supabase_client.get_snippets_that_have_no_embedding.side_effect = side_effect
 
         with patch('processing_pipeline.stage_5.generate_snippet_document') as mock_generate_document, \
              patch('processing_pipeline.stage_5.generate_snippet_embedding') as mock_generate_embedding, \
@@ -55,9 +55,12 @@ class TestRadioStation:
     def test_setup_virtual_audio_success(self, radio_station, mock_subprocess):
         """Test successful virtual audio setup"""
         # Mock ensure_pulseaudio_running to avoid actual system calls
-        with patch.object(radio_station, "ensure_pulseaudio_running"):
+        with patch.object(radio_station, "ensure_pulseaudio_running"), \
+             patch.object(radio_station, "start_pulse_monitor") as mock_start_pulse_monitor:
             radio_station.setup_virtual_audio()
 
+            mock_start_pulse_monitor.assert_called_once()
+
             # Verify all the subprocess.run calls with exact command format
             assert mock_subprocess["run"].call_args_list == [
                 # First call: load sink module
@@ -124,7 +127,9 @@ class TestRadioStation:
         mock_wait.return_value = mock_wait_instance
         mock_wait_instance.until.return_value = mock_element
 
-        radio_station.start_browser()
+        with patch.object(radio_station.browser_watchdog, "start") as mock_watchdog_start:
+            radio_station.start_browser()
+        mock_watchdog_start.assert_called_once()
 
         # Verify driver setup
         assert radio_station.driver == mock_webdriver["driver"]
@@ -189,7 +194,7 @@ class TestRadioStation:
 
     def test_stop(self, radio_station, mock_subprocess):
         """Test radio station stop"""
-        radio_station.driver = Mock()
+        driver = radio_station.driver = Mock()
         radio_station.sink_module = "123"
         radio_station.source_module = "456"
 
@@ -198,8 +203,67 @@ class TestRadioStation:
 
         radio_station.stop()
 
-        assert radio_station.driver.quit.called
-        assert mock_subprocess["run"].call_count >= 2
+        assert driver.quit.called
+        assert radio_station.driver is None
+        # setup_virtual_audio loads new modules the next time
+        assert radio_station.sink_module is None and radio_station.source_module is None
+        # The loaded modules are listed once for both modules
+        assert mock_subprocess["run"].call_args_list == [
+            call(["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True),
+            call(["pactl", "unload-module", "123"], check=True),
+            call(["pactl", "unload-module", "456"], check=True),
+        ]
+
+    def test_stop_without_unloading_modules(self, radio_station, mock_subprocess):
+        """Test that restarting the browser keeps the virtual audio and its monitor"""
+        driver = radio_station.driver = Mock()
+        radio_station.sink_module = "123"
+
+        with patch.object(radio_station.pulse_monitor, "stop") as mock_monitor_stop:
+            radio_station.stop(unload_modules=False)
+
+        assert driver.quit.called
+        mock_monitor_stop.assert_not_called()
+        mock_subprocess["run"].assert_not_called()
+
+    def test_is_audio_playing_uses_the_pulse_monitor(self, radio_station, mock_subprocess):
+        """Test that a running monitor answers without calling pactl"""
+        with patch.object(radio_station.pulse_monitor, "is_running", return_value=True), \
+             patch.object(radio_station.pulse_monitor, "is_playing", return_value=True):
+            assert radio_station.is_audio_playing() is True
+
+        mock_subprocess["run"].assert_not_called()
+
+    def test_get_browser_pid(self, radio_station):
+        """Test that the watchdog measures the chromedriver process tree"""
+        assert radio_station.get_browser_pid() is None
+
+        radio_station.driver = Mock()
+        radio_station.driver.service.process.pid = 4321
+        assert radio_station.get_browser_pid() == 4321
+
+    def test_get_browser_recycle_reason(self, radio_station):
+        """Test that the recycle decision is delegated to the watchdog"""
+        with patch.object(radio_station.browser_watchdog, "get_recycle_reason", return_value="too big") as mock_reason:
+            assert radio_station.get_browser_recycle_reason(urgent=True) == "too big"
+        mock_reason.assert_called_once_with(urgent=True)
+
+    def test_stop_stops_the_browser_watchdog(self, radio_station, mock_subprocess):
+        """Test that the watchdog outlives browser restarts but not the station"""
+        with patch.object(radio_station.browser_watchdog, "stop") as mock_watchdog_stop:
+            radio_station.stop(unload_modules=False)
+            mock_watchdog_stop.assert_not_called()
+
+            radio_station.stop()
+            mock_watchdog_stop.assert_called_once()
+
+    def test_start_pulse_monitor_failure(self, radio_station):
+        """Test that a monitor that fails to start is stopped again"""
+        with patch.object(radio_station.pulse_monitor, "start", side_effect=FileNotFoundError("pactl")), \
+             patch.object(radio_station.pulse_monitor, "stop") as mock_monitor_stop:
+            radio_station.start_pulse_monitor()
+
+        mock_monitor_stop.assert_called_once()
 
     def test_ensure_pulseaudio_running_already_running(self, radio_station, mock_subprocess):
         """Test PulseAudio check when already running"""
@@ -317,7 +381,7 @@ class TestRadioStation:
 
     def test_stop_with_driver(self, radio_station, mock_subprocess):
         """Test stop with driver"""
-        radio_station.driver = Mock()
+        driver = radio_station.driver = Mock()
         radio_station.sink_module = "123"
         radio_station.source_module = "456"
 
@@ -327,14 +391,13 @@ class TestRadioStation:
         radio_station.stop()
 
         # Verify driver quit was called
-        radio_station.driver.quit.assert_called_once()
+        driver.quit.assert_called_once()
 
         # Verify all subprocess calls in order
         mock_subprocess["run"].assert_has_calls(
             [
                 call(["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True),
                 call(["pactl", "unload-module", "123"], check=True),
-                call(["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True),
                 call(["pactl", "unload-module", "456"], check=True),
             ]
         )
@@ -355,7 +418,6 @@ class TestRadioStation:
             [
                 call(["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True),
                 call(["pactl", "unload-module", "123"], check=True),
-                call(["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True),
                 call(["pactl", "unload-module", "456"], check=True),
             ]
         )
@@ -371,12 +433,9 @@ class TestRadioStation:
 
         radio_station.stop()
 
-        # Verify list checks were made for both modules
-        mock_subprocess["run"].assert_has_calls(
-            [
-                call(["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True),
-                call(["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True),
-            ]
+        # Verify the modules were listed once and nothing was unloaded
+        mock_subprocess["run"].assert_called_once_with(
+            ["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True
         )
 
     def test_stop_unload_error(self, radio_station, mock_subprocess):
@@ -390,9 +449,8 @@ class TestRadioStation:
         error = subprocess.CalledProcessError(1, ["pactl", "unload-module", "123"])
 
         mock_subprocess["run"].side_effect = [
-            list_modules_response,  # First list modules check
+            list_modules_response,  # List modules check
             error,  # First unload attempt fails
-            list_modules_response,  # Second list modules check
             None,  # Second unload succeeds
         ]
 
@@ -403,7 +461,6 @@ class TestRadioStation:
             [
                 call(["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True),
                 call(["pactl", "unload-module", "123"], check=True),
-                call(["pactl", "list", "short", "modules"], capture_output=True, text=True, check=True),
                 call(["pactl", "unload-module", "456"], check=True),
             ]
         )
@@ -0,0 +1,125 @@
+from unittest.mock import Mock, patch
+import psutil
+import pytest
+from radiostations.browser_watchdog import MB, BrowserMemoryWatchdog
+
+
+class TestBrowserMemoryWatchdog:
+    def watchdog(self, **kwargs):
+        options = dict(max_rss_mb=1000, critical_rss_mb=2000, max_leak_mb_per_hour=300, leak_window_seconds=600)
+        options.update(kwargs)
+        return BrowserMemoryWatchdog(lambda: 123, **options)
+
+    def process(self, rss_mb):
+        process = Mock()
+        process.memory_info.return_value.rss = rss_mb * MB
+        return process
+
+    def test_get_rss_mb_sums_the_process_tree(self):
+        root = self.process(100)
+        exited = Mock()
+        exited.memory_info.side_effect = psutil.NoSuchProcess(456)
+        root.children.return_value = [self.process(300), self.process(200), exited]
+
+        with patch("psutil.Process", return_value=root) as mock_process:
+            assert self.watchdog().get_rss_mb() == 600
+
+        mock_process.assert_called_once_with(123)
+        root.children.assert_called_once_with(recursive=True)
+
+    def test_get_rss_mb_without_browser(self):
+        watchdog = BrowserMemoryWatchdog(lambda: None)
+        assert watchdog.get_rss_mb() is None
+        watchdog.check()
+        assert watchdog.samples == []
+
+    def test_get_rss_mb_browser_gone(self):
+        with patch("psutil.Process", side_effect=psutil.NoSuchProcess(123)):
+            assert self.watchdog().get_rss_mb() is None
+
+    def test_no_reason_without_samples(self):
+        assert self.watchdog().get_recycle_reason() is None
+
+    def test_reason_above_max_rss(self):
+        watchdog = self.watchdog()
+        with patch.object(watchdog, "get_rss_mb", return_value=1100):
+            watchdog.check()
+
+        assert "1100 MB is above 1000 MB" in watchdog.get_recycle_reason()
+        # Not critical yet, the running capture may finish
+        assert watchdog.get_recycle_reason(urgent=True) is None
+
+    def test_reason_above_critical_rss(self):
+        watchdog = self.watchdog()
+        with patch.object(watchdog, "get_rss_mb", return_value=2100):
+            watchdog.check()
+
+        assert "above the critical 2000 MB" in watchdog.get_recycle_reason(urgent=True)
+        assert "above the critical 2000 MB" in watchdog.get_recycle_reason()
+
+    def test_reason_for_leak(self):
+        watchdog = self.watchdog()
+        # 10 MB per minute is 600 MB/hour, while the RSS stays well below the maximum
+        with patch("time.monotonic", side_effect=[0, 60, 120, 180, 240, 300]), \
+             patch.object(watchdog, "get_rss_mb", side_effect=[400, 410, 420, 430, 440, 450]):
+            for _ in range(6):
+                watchdog.check()
+
+        assert watchdog.get_leak_mb_per_hour() == pytest.approx(600)
+        assert "grows by 600 MB/hour" in watchdog.get_recycle_reason()
+        assert watchdog.get_recycle_reason(urgent=True) is None
+
+    def test_leak_needs_half_the_window(self):
+        watchdog = self.watchdog()
+        with patch("time.monotonic", side_effect=[0, 60, 120]), \
+             patch.object(watchdog, "get_rss_mb", side_effect=[400, 500, 600]):
+            for _ in range(3):
+                watchdog.check()
+
+        assert watchdog.get_leak_mb_per_hour() is None
+        assert watchdog.get_recycle_reason() is None
+
+    def test_stable_memory_is_not_a_leak(self):
+        watchdog = self.watchdog()
+        with patch("time.monotonic", side_effect=[0, 100, 200, 300, 400]), \
+             patch.object(watchdog, "get_rss_mb", side_effect=[500, 520, 490, 510, 500]):
+            for _ in range(5):
+                watchdog.check()
+
+        assert abs(watchdog.get_leak_mb_per_hour()) < 300
+        assert watchdog.get_recycle_reason() is None
+
+    def test_old_samples_leave_the_window(self):
+        watchdog = self.watchdog()
+        with patch("time.monotonic", side_effect=[0, 300, 700]), \
+             patch.object(watchdog, "get_rss_mb", return_value=500):
+            for _ in range(3):
+                watchdog.check()
+
+        assert [sample[0] for sample in watchdog.samples] == [300, 700]
+
+    def test_reset_forgets_the_previous_browser(self):
+        watchdog = self.watchdog()
+        with patch.object(watchdog, "get_rss_mb", return_value=2100):
+            watchdog.check()
+
+        watchdog.reset()
+
+        assert watchdog.get_recycle_reason(urgent=True) is None
+
+    def test_start_and_stop(self):
+        watchdog = self.watchdog(interval_seconds=0.01)
+        with patch.object(watchdog, "get_rss_mb", return_value=500):
+            watchdog.start()
+            watchdog.start()
+            thread = watchdog.thread
+            for _ in range(100):
+                if watchdog.samples:
+                    break
+                thread.join(0.01)
+            watchdog.stop()
+
+        assert watchdog.samples
+        assert not thread.is_alive()
+        assert watchdog.thread is None
+
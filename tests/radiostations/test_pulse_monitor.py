@@ -0,0 +1,148 @@
+import io
+import queue
+import subprocess
+import time
+from unittest.mock import Mock, patch
+import numpy as np
+from radiostations.pulse_monitor import PulseAudioMonitor
+
+SINKS = "1\tauto_null\tmodule-null-sink.c\ts16le 2ch 44100Hz\tSUSPENDED\n" \
+        "3\ttest_sink\tmodule-null-sink.c\ts16le 2ch 44100Hz\tRUNNING\n"
+SINK_INPUTS = "7\t3\t12\tprotocol-native.c\ts16le 2ch 44100Hz\n"
+
+
+class TestPulseAudioMonitor:
+    def pactl(self, sinks=SINKS, sink_inputs=SINK_INPUTS):
+        def run(command, **kwargs):
+            return Mock(stdout=sinks if command[-1] == "sinks" else sink_inputs)
+        return run
+
+    def test_refresh(self):
+        """Test reading the sink state and its sink inputs"""
+        monitor = PulseAudioMonitor("test_sink")
+        with patch("subprocess.run", side_effect=self.pactl()):
+            monitor.refresh()
+
+        assert monitor.sink_index == "3"
+        assert monitor.sink_input_indices == {"7"}
+        assert monitor.get_status() == {"sink_state": "RUNNING", "sink_inputs": 1, "level_dbfs": None}
+        assert monitor.is_playing() is True
+
+    def test_not_playing_without_sink_inputs(self):
+        """Test that a running sink without a stream playing into it is not playing"""
+        monitor = PulseAudioMonitor("test_sink")
+        with patch("subprocess.run", side_effect=self.pactl(sink_inputs="7\t1\t12\tprotocol-native.c\n")):
+            monitor.refresh()
+
+        assert monitor.is_playing() is False
+
+    def test_missing_sink(self):
+        """Test that a missing sink is not playing"""
+        monitor = PulseAudioMonitor("other_sink")
+        with patch("subprocess.run", side_effect=self.pactl()):
+            monitor.refresh()
+
+        assert monitor.sink_state is None
+        assert monitor.is_playing() is False
+
+    def test_handle_event_only_refreshes_on_relevant_events(self):
+        """Test that events of other sinks and of other stations' sink inputs don't shell out"""
+        monitor = PulseAudioMonitor("test_sink")
+        monitor.sink_index = "3"
+        monitor.sink_input_indices = {"7"}
+        with patch.object(monitor, "refresh") as mock_refresh:
+            monitor.handle_event("Event 'change' on source #2\n")
+            monitor.handle_event("Event 'change' on sink #1\n")
+            monitor.handle_event("Event 'new' on client #9\n")
+            monitor.handle_event("Event 'change' on sink-input #8\n")
+            monitor.handle_event("Event 'remove' on sink-input #8\n")
+            mock_refresh.assert_not_called()
+
+            monitor.handle_event("Event 'change' on sink #3\n")
+            monitor.handle_event("Event 'change' on sink-input #7\n")
+            monitor.handle_event("Event 'remove' on sink-input #7\n")
+            # A new sink input may be playing into our sink
+            monitor.handle_event("Event 'new' on sink-input #9\n")
+            assert mock_refresh.call_count == 4
+
+    def test_silence_detection(self):
+        """Test that a sink carrying only silence is reported after the timeout"""
+        monitor = PulseAudioMonitor("test_sink", silence_threshold_dbfs=-60, silence_timeout_seconds=30)
+        monitor.level_process = Mock()
+        monitor.level_process.poll.return_value = None
+        monitor.last_signal_at = time.monotonic() - 60
+
+        monitor.handle_levels(np.array([-100.0, -90.0]))
+        assert monitor.is_silent() is True
+        assert monitor.get_status()["level_dbfs"] == -90.0
+
+        monitor.handle_levels(np.array([-100.0, -20.0]))
+        assert monitor.is_silent() is False
+
+    def test_silence_is_unknown_without_level_meter(self):
+        """Test that silence is not reported when parec is not running"""
+        monitor = PulseAudioMonitor("test_sink")
+        monitor.last_signal_at = time.monotonic() - 3600
+
+        assert monitor.is_silent() is False
+
+    def test_failed_refresh_keeps_reading_events(self):
+        """Test that a failing pactl call doesn't stop the monitor"""
+        subscribe_process = Mock(stdout=io.StringIO("Event 'change' on sink #3\nEvent 'change' on sink #3\n"))
+        subscribe_process.poll.return_value = None
+        level_process = Mock(stdout=io.BytesIO(b""))
+        failure = subprocess.CalledProcessError(1, ["pactl", "list", "short", "sinks"])
+
+        monitor = PulseAudioMonitor("test_sink")
+        # The first refresh is the one of start()
+        with patch.object(monitor, "refresh", side_effect=[None, failure, None]) as mock_refresh, \
+             patch("subprocess.Popen", side_effect=[subscribe_process, level_process]):
+            monitor.start()
+            monitor.events_thread.join(timeout=5)
+
+        assert mock_refresh.call_count == 3
+
+    def test_is_running_follows_the_event_reader(self):
+        """Test that the monitor stops reporting itself as running once events are no longer read"""
+        subscribe_process = Mock(stdout=io.StringIO(""))
+        subscribe_process.poll.return_value = None
+        level_process = Mock(stdout=io.BytesIO(b""))
+
+        monitor = PulseAudioMonitor("test_sink")
+        with patch("subprocess.run", side_effect=self.pactl()), \
+             patch("subprocess.Popen", side_effect=[subscribe_process, level_process]):
+            monitor.start()
+        monitor.events_thread.join(timeout=5)
+
+        # pactl subscribe is still alive but nothing reads its events
+        assert not monitor.is_running()
+
+    def test_start_and_stop(self):
+        """Test that the monitor follows events and measures levels from its processes"""
+        events = queue.Queue()
+        events.put("Event 'change' on sink #3\n")
+        subscribe_process = Mock(stdout=iter(events.get, None))
+        subscribe_process.poll.return_value = None
+        level_process = Mock(stdout=io.BytesIO(np.full(8000, 10000, dtype=np.int16).tobytes()))
+        level_process.poll.return_value = None
+
+        monitor = PulseAudioMonitor("test_sink")
+        with patch("subprocess.run", side_effect=self.pactl()) as mock_run, \
+             patch("subprocess.Popen", side_effect=[subscribe_process, level_process]) as mock_popen:
+            monitor.start()
+
+            assert monitor.is_running()
+            deadline = time.monotonic() + 5
+            while monitor.level_dbfs is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        assert mock_popen.call_args_list[0].args[0] == ["pactl", "subscribe"]
+        assert mock_popen.call_args_list[1].args[0][0] == "parec"
+        assert mock_run.call_count >= 2
+        assert monitor.level_dbfs > -20
+
+        monitor.stop()
+        events.put(None)
+        subscribe_process.terminate.assert_called_once()
+        level_process.terminate.assert_called_once()
+        assert not monitor.is_running()
@@ -0,0 +1,109 @@
+from unittest.mock import Mock, patch
+import pytest
+import requests
+from radiostations.stream_resolver import StreamResolver
+
+PAGE_URL = "https://www.iheart.com/live/que-buena-1059-fm-5207/"
+API_STREAMS = {
+    "hits": [
+        {
+            "id": 5207,
+            "streams": {
+                "secure_hls_stream": "https://stream.revma.ihrhls.com/zc5207/hls.m3u8?token=abc",
+                "shoutcast_stream": "http://stream.revma.ihrhls.com/zc5207",
+                "pls_stream": "http://playerservices.streamtheworld.com/pls/KHOTFM.pls",
+            },
+        }
+    ]
+}
+PAGE_HTML = (
+    '<script>window.__PRELOADED_STATE__ = {"stream": "https:\\/\\/cdn.example.com\\/live\\/khot.aac?a=1\\u0026b=2"}'
+    '</script><audio src="https://cdn.example.com/live/khot.m3u8"></audio>'
+)
+
+
+class TestStreamResolver:
+    def response(self, json=None, text=""):
+        response = Mock(text=text)
+        response.json.return_value = json
+        return response
+
+    def requests_get(self, api_json=API_STREAMS, page_html=PAGE_HTML):
+        def get(url, **kwargs):
+            if "api.iheart.com" in url:
+                return self.response(json=api_json)
+            return self.response(text=page_html)
+
+        return get
+
+    def test_get_candidates(self):
+        resolver = StreamResolver(PAGE_URL)
+
+        with patch("requests.get", side_effect=self.requests_get()) as mock_get:
+            candidates = resolver.get_candidates()
+
+        assert candidates == [
+            "https://stream.revma.ihrhls.com/zc5207/hls.m3u8?token=abc",
+            "http://stream.revma.ihrhls.com/zc5207",
+            "https://stream.revma.ihrhls.com/zc5207/hls.m3u8",
+            "https://cdn.example.com/live/khot.m3u8",
+            "https://cdn.example.com/live/khot.aac?a=1&b=2",
+        ]
+        assert mock_get.call_args_list[0][0][0] == "https://api.iheart.com/api/v2/content/liveStations/5207"
+
+    def test_get_candidates_api_failure(self):
+        resolver = StreamResolver(PAGE_URL)
+
+        def get(url, **kwargs):
+            if "api.iheart.com" in url:
+                raise requests.ConnectionError("unreachable")
+            return self.response(text="")
+
+        with patch("requests.get", side_effect=get):
+            assert resolver.get_candidates() == ["https://stream.revma.ihrhls.com/zc5207/hls.m3u8"]
+
+    def test_get_candidates_other_page(self):
+        resolver = StreamResolver("https://radio.example.com/listen")
+
+        with patch("requests.get", side_effect=self.requests_get()) as mock_get:
+            candidates = resolver.get_candidates()
+
+        mock_get.assert_called_once()
+        assert candidates == ["https://cdn.example.com/live/khot.m3u8", "https://cdn.example.com/live/khot.aac?a=1&b=2"]
+
+    def test_resolve_uses_the_first_answering_candidate(self):
+        probe = Mock(side_effect=[False, True])
+        resolver = StreamResolver(PAGE_URL, probe=probe)
+
+        with patch("requests.get", side_effect=self.requests_get()):
+            assert resolver.resolve() == "http://stream.revma.ihrhls.com/zc5207"
+
+        assert probe.call_count == 2
+
+    def test_resolve_failure(self):
+        resolver = StreamResolver(PAGE_URL, probe=Mock(return_value=False))
+
+        with patch("requests.get", side_effect=self.requests_get()), pytest.raises(ValueError):
+            resolver.resolve()
+
+    def test_get_stream_url_is_cached_until_stale(self):
+        resolver = StreamResolver(PAGE_URL, refresh_seconds=3600)
+
+        with patch.object(resolver, "resolve", side_effect=["https://a/hls.m3u8", "https://b/hls.m3u8"]), \
+             patch("time.monotonic", side_effect=[0, 100, 3700, 3700]):
+            assert resolver.get_stream_url() == "https://a/hls.m3u8"
+            assert resolver.get_stream_url() == "https://a/hls.m3u8"
+            assert resolver.get_stream_url() == "https://b/hls.m3u8"
+
+    def test_get_stream_url_force_refresh(self):
+        resolver = StreamResolver(PAGE_URL)
+
+        with patch.object(resolver, "resolve", side_effect=["https://a/hls.m3u8", "https://b/hls.m3u8"]):
+            assert resolver.get_stream_url() == "https://a/hls.m3u8"
+            assert resolver.get_stream_url(force_refresh=True) == "https://b/hls.m3u8"
+
+    def test_get_stream_url_failure(self):
+        resolver = StreamResolver(PAGE_URL)
+
+        with patch.object(resolver, "resolve", side_effect=ValueError("nothing answered")):
+            assert resolver.get_stream_url() is None
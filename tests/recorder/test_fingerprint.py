@@ -0,0 +1,161 @@
+from unittest.mock import Mock, patch
+import numpy as np
+import pytest
+from recorder.fingerprint import (
+    compute_fingerprint,
+    detect_simulcast,
+    find_simulcasts,
+    fingerprint_recording,
+    is_simulcast,
+    match_fingerprints,
+)
+
+SAMPLE_RATE = 8000
+
+
+def program(seconds, seed):
+    """Changing chords every quarter second, a stand-in for music or speech"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(SAMPLE_RATE // 4) / SAMPLE_RATE
+    chords = []
+    for _ in range(int(seconds * 4)):
+        frequencies = rng.uniform(300, 3400, 3)
+        chords.append(sum(np.sin(2 * np.pi * f * t) for f in frequencies) / 3 * rng.uniform(0.2, 0.9))
+    return np.concatenate(chords)
+
+
+def to_pcm(signal, gain=1.0, noise=0.0, seed=0):
+    noisy = signal * gain + np.random.default_rng(seed).normal(0, noise, len(signal))
+    return (np.clip(noisy, -1, 1) * 32767).astype(np.int16)
+
+
+def fingerprint(samples):
+    hashes, offsets = compute_fingerprint(samples)
+    return {"duration_seconds": len(samples) / SAMPLE_RATE, "hashes": hashes.tolist(), "offsets": offsets.tolist()}
+
+
+class TestFingerprint:
+    @pytest.fixture(scope="class")
+    def broadcast(self):
+        return program(120, seed=1)
+
+    def test_compute_fingerprint(self, broadcast):
+        """Test that hashes come with their offsets, in order"""
+        hashes, offsets = compute_fingerprint(to_pcm(broadcast))
+
+        assert len(hashes) == len(offsets) > 100
+        assert hashes.dtype == np.int64
+        assert np.all(np.diff(offsets) >= 0)
+        assert 0 <= offsets[0] and offsets[-1] <= 120
+
+    def test_compute_fingerprint_keeps_hashes_of_all_kinds(self, broadcast):
+        """Test that the sampled hashes span many time deltas and frequency bins"""
+        hashes, _ = compute_fingerprint(to_pcm(broadcast))
+
+        assert len(np.unique(hashes & 0x7F)) >= 8
+        assert len(np.unique(hashes >> 16)) >= 20
+        assert len(np.unique((hashes >> 7) & 0x1FF)) >= 20
+
+    def test_compute_fingerprint_short_recording(self):
+        """Test that a recording too short for a single peak has an empty fingerprint"""
+        hashes, offsets = compute_fingerprint(np.zeros(1000, dtype=np.int16))
+        assert len(hashes) == 0 and len(offsets) == 0
+
+    def test_match_simulcast(self, broadcast):
+        """Test that the same program, recorded later and at a different level, matches at the right delay"""
+        original = fingerprint(to_pcm(broadcast[: SAMPLE_RATE * 100]))
+        # The copy starts 10 seconds into the program and its recording started 12 seconds later
+        copy = fingerprint(to_pcm(broadcast[SAMPLE_RATE * 10 :], gain=0.5, noise=0.02))
+
+        match = match_fingerprints(copy, 1012, original, 1000)
+
+        assert is_simulcast(match)
+        assert match["delay_seconds"] == pytest.approx(2, abs=0.5)
+
+    def test_no_match_for_other_programs(self, broadcast):
+        """Test that different programs at the same time don't match"""
+        original = fingerprint(to_pcm(broadcast))
+        other = fingerprint(to_pcm(program(120, seed=2)))
+
+        match = match_fingerprints(other, 1000, original, 1000)
+
+        assert not is_simulcast(match)
+
+    def test_no_match_without_overlap(self, broadcast):
+        """Test that the same program aired hours apart is not a simulcast"""
+        original = fingerprint(to_pcm(broadcast))
+
+        match = match_fingerprints(original, 1000 + 3 * 3600, original, 1000)
+
+        assert match == {"matching_hashes": 0, "match_ratio": 0.0, "delay_seconds": None}
+
+    def test_fingerprint_recording(self, broadcast):
+        """Test fingerprinting a recording file"""
+        with patch("recorder.fingerprint.decode_pcm", return_value=to_pcm(broadcast[: SAMPLE_RATE * 60])) as mock_decode:
+            result = fingerprint_recording("test.mp3")
+
+        mock_decode.assert_called_once_with("test.mp3")
+        assert result["duration_seconds"] == 60
+        assert len(result["hashes"]) == len(result["offsets"]) > 0
+
+    def test_find_simulcasts_puts_the_best_match_first(self, broadcast):
+        """Test that every matching candidate is returned, the one with the most aligned hashes first"""
+        copy = fingerprint(to_pcm(broadcast))
+        exact = {"audio_file_id": "a", "recorded_at": "2024-01-01T00:00:00+00:00", **fingerprint(to_pcm(broadcast))}
+        noisy = {
+            "audio_file_id": "b",
+            "recorded_at": "2024-01-01T00:00:00+00:00",
+            **fingerprint(to_pcm(broadcast, noise=0.05)),
+        }
+        unrelated = {
+            "audio_file_id": "c",
+            "recorded_at": "2024-01-01T00:00:00+00:00",
+            **fingerprint(to_pcm(program(120, seed=3))),
+        }
+
+        simulcasts = find_simulcasts(copy, "2024-01-01T00:00:00+00:00", [unrelated, noisy, exact])
+
+        assert [candidate["audio_file_id"] for candidate, _ in simulcasts] == ["a", "b"]
+        assert all(is_simulcast(match) for _, match in simulcasts)
+        assert find_simulcasts(copy, "2024-01-01T00:00:00+00:00", [unrelated]) == []
+
+    def test_detect_simulcast(self, broadcast):
+        """Test that the matching recordings are handed to link_simulcast, which decides the original"""
+        audio_file = {"id": "new", "radio_station_code": "KRMC", "recorded_at": "2024-01-01T00:00:00+00:00"}
+        copy = fingerprint(to_pcm(broadcast))
+        supabase_client = Mock()
+        supabase_client.link_simulcast.return_value = "original"
+        supabase_client.get_concurrent_audio_fingerprints.return_value = [
+            {
+                "audio_file_id": "copy",
+                "radio_station_code": "KNOG",
+                "recorded_at": "2024-01-01T00:00:00+00:00",
+                **fingerprint(to_pcm(broadcast)),
+            }
+        ]
+
+        assert detect_simulcast(supabase_client, audio_file, copy) == "original"
+
+        supabase_client.insert_audio_fingerprint.assert_called_once_with(
+            audio_file_id="new",
+            radio_station_code="KRMC",
+            recorded_at="2024-01-01T00:00:00+00:00",
+            duration_seconds=120,
+            hashes=copy["hashes"],
+            offsets=copy["offsets"],
+        )
+        supabase_client.get_concurrent_audio_fingerprints.assert_called_once_with(
+            "KRMC", "2023-12-31T23:00:00+00:00", "2024-01-01T00:02:00+00:00"
+        )
+        supabase_client.link_simulcast.assert_called_once_with("new", ["copy"])
+
+    def test_detect_simulcast_without_match(self):
+        """Test that a recording without concurrent copies is still checked off, so Stage 1 picks it up"""
+        supabase_client = Mock()
+        supabase_client.link_simulcast.return_value = None
+        supabase_client.get_concurrent_audio_fingerprints.return_value = []
+        audio_file = {"id": "new", "radio_station_code": "KRMC", "recorded_at": "2024-01-01T00:00:00+00:00"}
+
+        silence = {"duration_seconds": 60, "hashes": [], "offsets": []}
+        assert detect_simulcast(supabase_client, audio_file, silence) is None
+        supabase_client.link_simulcast.assert_called_once_with("new", [])
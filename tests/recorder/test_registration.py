@@ -0,0 +1,129 @@
+from unittest.mock import Mock, patch
+import pytest
+from recorder.registration import RecordingRegistrar, get_url_hash
+from recorder.spool import RecordingSpool
+from recorder.write_behind import AudioFileBatchWriter
+
+
+def inserted_rows(rows):
+    return [{"id": f"audio-{i}", **row} for i, row in enumerate(rows)]
+
+
+@pytest.fixture
+def metadata():
+    return {
+        "file_name": "test.mp3",
+        "radio_station_name": "Test Radio",
+        "radio_station_code": "TEST-FM",
+        "location_state": "Test State",
+        "recorded_at": "2024-01-01T00:00:00",
+        "recording_day_of_week": "Monday",
+        "file_size": 1000,
+    }
+
+
+def create_registrar(upload, insert_batch=None):
+    writer = AudioFileBatchWriter(insert_batch or Mock(side_effect=inserted_rows), flush_interval_seconds=60)
+    return RecordingRegistrar(Mock(), Mock(), writer, upload=upload)
+
+
+class TestRecordingRegistrar:
+    def test_upload_and_register(self, metadata):
+        """Test that an uploaded recording is queued for the batch insert"""
+        insert_batch = Mock(side_effect=inserted_rows)
+        registrar = create_registrar(Mock(return_value="radio_a/test.mp3"), insert_batch)
+
+        with patch("recorder.registration.detect_dead_air", side_effect=Exception("ffmpeg not found")):
+            registrar.upload_and_register("https://test.radio/stream", metadata)
+        registrar.audio_file_writer.flush()
+
+        assert insert_batch.call_args.args[0][0]["file_path"] == "radio_a/test.mp3"
+        registrar.spool.add.assert_not_called()
+
+    def test_upload_and_register_without_uploaded_path(self, metadata):
+        """Test that a recording that can't be uploaded at all (e.g. no credentials) is not registered"""
+        insert_batch = Mock(side_effect=inserted_rows)
+        registrar = create_registrar(Mock(return_value=None), insert_batch)
+
+        with patch("recorder.registration.detect_dead_air", side_effect=Exception("ffmpeg not found")):
+            registrar.upload_and_register("https://test.radio/stream", metadata)
+        registrar.audio_file_writer.flush()
+
+        insert_batch.assert_not_called()
+
+    def test_upload_and_register_decodes_once(self, metadata):
+        """Test that the dead air check and the fingerprint share one decode of the recording"""
+        levels = {"silence_ratio": 0.1, "is_mostly_silent": False, "is_silent": False}
+        registrar = create_registrar(Mock(return_value="radio_a/test.mp3"))
+
+        with patch("recorder.registration.decode_pcm") as mock_decode, \
+             patch("recorder.registration.detect_dead_air", return_value=levels) as mock_detect_dead_air, \
+             patch("recorder.registration.fingerprint_recording", return_value=None) as mock_fingerprint:
+            registrar.upload_and_register("https://test.radio/stream", metadata)
+
+        mock_decode.assert_called_once_with("test.mp3")
+        assert mock_detect_dead_air.call_args.kwargs["samples"] is mock_decode.return_value
+        assert mock_fingerprint.call_args.kwargs["samples"] is mock_decode.return_value
+
+    def test_upload_and_register_when_decoding_fails(self, metadata):
+        """Test that a recording that can't be decoded is uploaded and registered without the checks"""
+        insert_batch = Mock(side_effect=inserted_rows)
+        registrar = create_registrar(Mock(return_value="radio_a/test.mp3"), insert_batch)
+
+        with patch("recorder.registration.decode_pcm", side_effect=Exception("ffmpeg not found")), \
+             patch("recorder.registration.detect_dead_air") as mock_detect_dead_air, \
+             patch("recorder.registration.fingerprint_recording") as mock_fingerprint:
+            registrar.upload_and_register("https://test.radio/stream", metadata)
+        registrar.audio_file_writer.flush()
+
+        mock_detect_dead_air.assert_not_called()
+        mock_fingerprint.assert_not_called()
+        assert "simulcast_check_pending" not in insert_batch.call_args.args[0][0]
+
+    def test_spool_orphaned_recordings(self, tmp_path, monkeypatch):
+        """Test that only non-empty recordings of the given URL are spooled, with their recording time"""
+        monkeypatch.chdir(tmp_path)
+        url = "https://test.radio/stream"
+        url_hash = get_url_hash(url)
+        (tmp_path / f"radio_{url_hash}_20240101_100000.mp3").write_bytes(b"audio")
+        (tmp_path / f"radio_{url_hash}_20240101_103000.mp3").write_bytes(b"")
+        (tmp_path / "radio_other_20240101_100000.mp3").write_bytes(b"audio")
+        registrar = create_registrar(Mock())
+
+        registrar.spool_orphaned_recordings(url, lambda file_name, start_time: {"file_name": file_name})
+
+        registrar.spool.add.assert_called_once_with(url, {"file_name": f"radio_{url_hash}_20240101_100000.mp3"})
+        assert not (tmp_path / f"radio_{url_hash}_20240101_103000.mp3").exists()
+
+    def test_spool_drainer_registers_like_live_recordings(self, metadata, tmp_path):
+        """Test that a spooled recording is fingerprinted before its upload and registered through the queue"""
+        recording = tmp_path / "test.mp3"
+        recording.write_bytes(b"audio")
+        insert_batch = Mock(side_effect=inserted_rows)
+        registrar = create_registrar(Mock(return_value="radio_a/test.mp3"), insert_batch)
+        registrar.spool = RecordingSpool(str(tmp_path / "spool"))
+        registrar.spool.add("https://test.radio/stream", {**metadata, "file_name": str(recording)})
+        fingerprint = {"duration_seconds": 1800, "hashes": [1, 2], "offsets": [0.0, 1.0]}
+
+        with patch("recorder.registration.fingerprint_recording", return_value=fingerprint), \
+             patch("recorder.registration.detect_simulcast") as mock_detect_simulcast, \
+             patch("recorder.spool.SpoolDrainer.start"):
+            drainer = registrar.start_spool_drainer(["https://test.radio/stream"])
+            assert drainer.drain() == 1
+            registrar.audio_file_writer.flush()
+
+        assert insert_batch.call_args.args[0][0]["file_path"] == "radio_a/test.mp3"
+        assert mock_detect_simulcast.call_args.args[2] == fingerprint
+
+    def test_spool_failed(self, metadata, tmp_path):
+        """Test that a recording whose handling failed is spooled while its file is still there"""
+        registrar = create_registrar(Mock())
+        recording = tmp_path / "test.mp3"
+        recording.write_bytes(b"audio")
+
+        registrar.spool_failed("https://test.radio/stream", {**metadata, "file_name": str(recording)})
+        registrar.spool_failed("https://test.radio/stream", {**metadata, "file_name": str(tmp_path / "gone.mp3")})
+
+        registrar.spool.add.assert_called_once_with(
+            "https://test.radio/stream", {**metadata, "file_name": str(recording)}
+        )
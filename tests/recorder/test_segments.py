@@ -0,0 +1,64 @@
+import time
+from unittest.mock import Mock, patch
+import pytest
+from recorder.segments import (
+    SegmentTracker,
+    get_segment_output_options,
+    get_segment_start_time,
+)
+
+
+class TestSegments:
+    def test_get_segment_output_options(self):
+        """Test segment muxer options"""
+        options = get_segment_output_options(300)
+
+        assert options["f"] == "segment"
+        assert options["segment_time"] == 300
+        assert options["strftime"] == 1
+
+    def test_get_segment_start_time(self):
+        """Test parsing the start time embedded by ffmpeg into the segment name"""
+        start_time = get_segment_start_time("radio_abc123_20240101_103000.mp3")
+
+        assert time.strftime("%Y%m%d_%H%M%S", time.localtime(start_time)) == "20240101_103000"
+
+    def test_get_segment_start_time_invalid_name(self):
+        """Test file names without a timestamp"""
+        with pytest.raises(ValueError, match="No segment timestamp found"):
+            get_segment_start_time("radio_abc123.mp3")
+
+    def test_tracker_reports_previous_segment_when_next_opens(self):
+        """Test that opening segment N+1 closes segment N"""
+        on_segment_closed = Mock()
+        tracker = SegmentTracker(on_segment_closed)
+
+        tracker.handle_log_line("[segment @ 0x1] Opening 'radio_a_20240101_100000.mp3' for writing")
+        on_segment_closed.assert_not_called()
+
+        tracker.handle_log_line("size=N/A time=00:05:00.00 bitrate=N/A speed=1x")
+        tracker.handle_log_line("[segment @ 0x1] Opening 'radio_a_20240101_100500.mp3' for writing")
+        on_segment_closed.assert_called_once_with("radio_a_20240101_100000.mp3")
+
+    def test_tracker_finish_reports_last_segment(self):
+        """Test that the last segment is reported once ffmpeg exits"""
+        on_segment_closed = Mock()
+        tracker = SegmentTracker(on_segment_closed)
+        tracker.handle_log_line("[segment @ 0x1] Opening 'radio_a_20240101_100000.mp3' for writing")
+
+        with patch("os.path.exists", return_value=True), patch("os.path.getsize", return_value=1000):
+            tracker.finish()
+
+        on_segment_closed.assert_called_once_with("radio_a_20240101_100000.mp3")
+        assert tracker.closed_segments == 1
+
+    def test_tracker_finish_skips_empty_segment(self):
+        """Test that an empty trailing segment is not uploaded"""
+        on_segment_closed = Mock()
+        tracker = SegmentTracker(on_segment_closed)
+        tracker.handle_log_line("[segment @ 0x1] Opening 'radio_a_20240101_100000.mp3' for writing")
+
+        with patch("os.path.exists", return_value=True), patch("os.path.getsize", return_value=0):
+            tracker.finish()
+
+        on_segment_closed.assert_not_called()
@@ -0,0 +1,71 @@
+import pytest
+from recorder.sharding import ConsistentHashRing, parse_recorder_nodes
+
+
+class TestSharding:
+    def test_parse_recorder_nodes(self):
+        """Test parsing node names with optional weights"""
+        assert parse_recorder_nodes("max_recorder:3, lite_recorder") == {"max_recorder": 3, "lite_recorder": 1}
+
+    def test_parse_recorder_nodes_empty(self):
+        """Test that an empty node list is rejected"""
+        with pytest.raises(ValueError, match="No recorder nodes found"):
+            parse_recorder_nodes(" , ")
+
+    def test_get_node_is_deterministic(self):
+        """Test that the same key always maps to the same node"""
+        ring = ConsistentHashRing({"a": 1, "b": 1, "c": 1})
+        other_ring = ConsistentHashRing({"c": 1, "a": 1, "b": 1})
+
+        for key in [f"key-{i}" for i in range(100)]:
+            assert ring.get_node(key) == other_ring.get_node(key)
+
+    def test_adding_a_node_only_moves_keys_to_the_new_node(self):
+        """Test minimal reassignment when a node joins"""
+        keys = [f"station-{i}" for i in range(500)]
+        ring = ConsistentHashRing({"a": 1, "b": 1})
+        before = {key: ring.get_node(key) for key in keys}
+
+        ring.add_node("c")
+        after = {key: ring.get_node(key) for key in keys}
+
+        moved = [key for key in keys if before[key] != after[key]]
+        assert moved
+        assert all(after[key] == "c" for key in moved)
+        # Roughly a third of the keys should move to the new node
+        assert len(moved) < len(keys) / 2
+
+    def test_removing_a_node_only_moves_its_keys(self):
+        """Test minimal reassignment when a node leaves"""
+        keys = [f"station-{i}" for i in range(500)]
+        ring = ConsistentHashRing({"a": 1, "b": 1, "c": 1})
+        before = {key: ring.get_node(key) for key in keys}
+
+        ring.remove_node("c")
+        after = {key: ring.get_node(key) for key in keys}
+
+        for key in keys:
+            if before[key] != "c":
+                assert after[key] == before[key]
+            else:
+                assert after[key] in ("a", "b")
+
+    def test_weights_skew_the_assignment(self):
+        """Test that a heavier node receives proportionally more keys"""
+        ring = ConsistentHashRing({"big": 3, "small": 1})
+        assignment = ring.assign([f"station-{i}" for i in range(1000)], lambda key: key)
+
+        assert len(assignment["big"]) + len(assignment["small"]) == 1000
+        assert len(assignment["big"]) > 2 * len(assignment["small"])
+
+    def test_invalid_operations(self):
+        """Test errors for duplicate, unknown and missing nodes"""
+        ring = ConsistentHashRing()
+        with pytest.raises(ValueError, match="no nodes"):
+            ring.get_node("key")
+
+        ring.add_node("a")
+        with pytest.raises(ValueError, match="already exists"):
+            ring.add_node("a")
+        with pytest.raises(ValueError, match="does not exist"):
+            ring.remove_node("b")
@@ -0,0 +1,40 @@
+from unittest.mock import patch
+from recorder.silence import detect_dead_air, quarantine_recording
+
+
+class TestSilence:
+    def test_detect_dead_air(self):
+        """Test the flags derived from the silence ratio"""
+        with patch('recorder.silence.analyze_audio_levels', return_value={"silence_ratio": 0.6}) as mock_analyze:
+            levels = detect_dead_air("test.mp3", silence_threshold_dbfs=-45)
+
+        mock_analyze.assert_called_once_with("test.mp3", silence_threshold_dbfs=-45, samples=None)
+        assert levels["is_mostly_silent"]
+        assert not levels["is_silent"]
+
+    def test_detect_fully_silent_recording(self):
+        """Test that a recording of pure dead air is marked as silent"""
+        with patch('recorder.silence.analyze_audio_levels', return_value={"silence_ratio": 1.0}):
+            levels = detect_dead_air("test.mp3")
+
+        assert levels["is_mostly_silent"]
+        assert levels["is_silent"]
+
+    def test_quarantine_recording_without_directory(self, tmp_path):
+        """Test that silent recordings are deleted when no quarantine directory is set"""
+        file_name = tmp_path / "silent.mp3"
+        file_name.write_bytes(b"silence")
+
+        assert quarantine_recording(str(file_name)) is None
+        assert not file_name.exists()
+
+    def test_quarantine_recording(self, tmp_path):
+        """Test that silent recordings are moved to the quarantine directory"""
+        file_name = tmp_path / "silent.mp3"
+        file_name.write_bytes(b"silence")
+
+        quarantined = quarantine_recording(str(file_name), str(tmp_path / "quarantine"))
+
+        assert quarantined == str(tmp_path / "quarantine" / "silent.mp3")
+        assert not file_name.exists()
+        assert (tmp_path / "quarantine" / "silent.mp3").exists()
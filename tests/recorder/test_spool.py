@@ -0,0 +1,117 @@
+import os
+import threading
+from unittest.mock import Mock
+import pytest
+from recorder.spool import RecordingSpool, SpoolDrainer
+
+
+class TestSpool:
+    @pytest.fixture
+    def spool(self, tmp_path):
+        return RecordingSpool(str(tmp_path / "spool"))
+
+    @pytest.fixture
+    def recording(self, tmp_path):
+        file_name = tmp_path / "radio_abc123_20240101_100000.mp3"
+        file_name.write_bytes(b"audio")
+        return {"file_name": str(file_name), "radio_station_code": "TEST-FM", "file_size": 5}
+
+    def test_add_moves_the_file_into_the_spool(self, spool, recording):
+        """Test that spooled files are moved out of the working directory"""
+        spool.add("https://test.radio/stream", recording)
+
+        entries = spool.claim_due(["https://test.radio/stream"])
+        assert len(entries) == 1
+        assert not os.path.exists(recording["file_name"])
+        assert os.path.dirname(entries[0]["metadata"]["file_name"]) == spool.spool_dir
+        assert os.path.exists(entries[0]["metadata"]["file_name"])
+        assert entries[0]["uploaded_path"] is None
+
+    def test_claim_due_filters_by_station(self, spool, recording):
+        """Test that a drainer only sees the entries of its own stations"""
+        spool.add("https://other.radio/stream", recording)
+
+        assert spool.claim_due(["https://test.radio/stream"]) == []
+        assert len(spool.claim_due(["https://other.radio/stream"])) == 1
+        # Claimed entries are not handed out twice
+        assert spool.claim_due(["https://other.radio/stream"]) == []
+
+    def test_journal_survives_a_restart(self, spool, recording):
+        """Test that entries in flight during a crash are retried by the next run"""
+        spool.add("https://test.radio/stream", recording)
+        spool.claim_due(["https://test.radio/stream"])
+
+        restarted_spool = RecordingSpool(spool.spool_dir)
+        restarted_spool.release_in_flight(["https://test.radio/stream"])
+
+        assert len(restarted_spool.claim_due(["https://test.radio/stream"])) == 1
+
+    def test_drain_uploads_and_registers(self, spool, recording):
+        """Test a successful retry removes the entry from the journal"""
+        spool.add("https://test.radio/stream", recording)
+        upload = Mock(return_value="radio_abc123/file.mp3")
+        register = Mock()
+
+        drainer = SpoolDrainer(spool, ["https://test.radio/stream"], upload, register)
+        assert drainer.drain() == 1
+
+        upload.assert_called_once()
+        assert register.call_args.args[0] == "https://test.radio/stream"
+        assert register.call_args.args[2] == "radio_abc123/file.mp3"
+        assert spool.pending_count(["https://test.radio/stream"]) == 0
+
+    def test_drain_does_not_upload_twice(self, spool, recording):
+        """Test that a failed database insert is retried without uploading again"""
+        spool.add("https://test.radio/stream", recording)
+        upload = Mock(return_value="radio_abc123/file.mp3")
+        register = Mock(side_effect=[Exception("Supabase is down"), None])
+
+        drainer = SpoolDrainer(spool, ["https://test.radio/stream"], upload, register, min_backoff_seconds=0)
+        assert drainer.drain() == 0
+        assert drainer.drain() == 1
+
+        upload.assert_called_once()
+        assert register.call_count == 2
+
+    def test_drain_backs_off_after_failure(self, spool, recording):
+        """Test that failed entries are not retried before their backoff expires"""
+        spool.add("https://test.radio/stream", recording)
+        upload = Mock(side_effect=Exception("R2 is down"))
+
+        drainer = SpoolDrainer(spool, ["https://test.radio/stream"], upload, Mock(), min_backoff_seconds=60)
+        drainer.drain()
+        drainer.drain()
+
+        upload.assert_called_once()
+        assert spool.pending_count(["https://test.radio/stream"]) == 1
+
+    def test_drain_drops_missing_files(self, spool, recording):
+        """Test that entries whose file was deleted are dropped"""
+        spool.add("https://test.radio/stream", recording)
+        os.remove(os.path.join(spool.spool_dir, os.path.basename(recording["file_name"])))
+        upload = Mock()
+
+        drainer = SpoolDrainer(spool, ["https://test.radio/stream"], upload, Mock())
+        assert drainer.drain() == 0
+
+        upload.assert_not_called()
+        assert spool.pending_count(["https://test.radio/stream"]) == 0
+
+    def test_get_backoff_seconds(self, spool):
+        """Test exponential backoff is capped"""
+        drainer = SpoolDrainer(spool, [], Mock(), Mock(), min_backoff_seconds=60, max_backoff_seconds=300)
+        assert [drainer.get_backoff_seconds(attempts) for attempts in range(1, 6)] == [60, 120, 240, 300, 300]
+
+    def test_start_and_stop(self, spool, recording):
+        """Test the background thread drains the spool and stops promptly"""
+        spool.add("https://test.radio/stream", recording)
+        registered = threading.Event()
+        register = Mock(side_effect=lambda url, metadata, uploaded_path, fingerprint: registered.set())
+
+        drainer = SpoolDrainer(spool, ["https://test.radio/stream"], Mock(return_value="path"), register, poll_seconds=60)
+        drainer.start()
+        assert registered.wait(timeout=5)
+        drainer.stop(timeout=5)
+
+        assert drainer.thread is None
+        register.assert_called_once()
@@ -0,0 +1,122 @@
+from unittest.mock import MagicMock, Mock, patch
+import requests
+from recorder.stream_health import CLOSED, HALF_OPEN, OPEN, StreamHealth, probe_stream
+
+
+class TestStreamHealth:
+    def mock_response(self, status_code=200, chunks=(b"ID3",)):
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.status_code = status_code
+        response.iter_content.return_value = iter(chunks)
+        return response
+
+    def test_probe_stream_success(self):
+        """Test that a stream sending data is healthy"""
+        with patch('requests.get', return_value=self.mock_response()) as mock_get:
+            assert probe_stream("https://test.radio/stream") is True
+
+        assert mock_get.call_args.kwargs["stream"] is True
+
+    def test_probe_stream_http_error(self):
+        """Test that an HTTP error status is unhealthy"""
+        with patch('requests.get', return_value=self.mock_response(status_code=404)):
+            assert probe_stream("https://test.radio/stream") is False
+
+    def test_probe_stream_without_data(self):
+        """Test that a stream that doesn't send anything is unhealthy"""
+        with patch('requests.get', return_value=self.mock_response(chunks=(b"",))):
+            assert probe_stream("https://test.radio/stream") is False
+
+    def test_probe_stream_connection_error(self):
+        """Test that connection errors are unhealthy"""
+        with patch('requests.get', side_effect=requests.ConnectionError("Connection refused")):
+            assert probe_stream("https://test.radio/stream") is False
+
+    def test_backoff_grows_exponentially(self):
+        """Test the backoff doubles with every failure and is capped"""
+        health = StreamHealth("https://test.radio/stream", min_backoff_seconds=5, max_backoff_seconds=60, failure_threshold=10)
+
+        backoffs = []
+        for _ in range(6):
+            health.record_failure()
+            with patch('random.uniform', side_effect=lambda low, high: high):
+                backoffs.append(health.get_backoff_seconds())
+
+        assert backoffs == [5, 10, 20, 40, 60, 60]
+
+    def test_backoff_is_jittered(self):
+        """Test the backoff is picked between half and the full value"""
+        health = StreamHealth("https://test.radio/stream", min_backoff_seconds=8)
+        health.record_failure()
+
+        for _ in range(20):
+            assert 4 <= health.get_backoff_seconds() <= 8
+
+    def test_circuit_opens_after_threshold(self):
+        """Test the circuit opens after consecutive failures and closes on success"""
+        health = StreamHealth("https://test.radio/stream", failure_threshold=3)
+
+        health.record_failure()
+        health.record_failure()
+        assert health.state == CLOSED
+        health.record_failure()
+        assert health.state == OPEN
+
+        health.record_success()
+        assert health.state == CLOSED
+        assert health.consecutive_failures == 0
+
+    def test_wait_until_healthy_probes_until_the_stream_is_back(self):
+        """Test waiting returns as soon as a probe succeeds"""
+        probe = Mock(side_effect=[False, False, True])
+        health = StreamHealth("https://test.radio/stream", probe=probe, failure_threshold=10)
+        health.record_failure()
+
+        with patch('time.sleep') as mock_sleep:
+            health.wait_until_healthy()
+
+        assert probe.call_count == 3
+        assert mock_sleep.call_count == 3
+        assert health.consecutive_failures == 3
+
+    def test_half_open_circuit_reopens_on_failure(self):
+        """Test that a capture failing right after a successful probe opens the circuit again"""
+        health = StreamHealth("https://test.radio/stream", probe=Mock(return_value=True), failure_threshold=2)
+        health.record_failure()
+        health.record_failure()
+        assert health.state == OPEN
+
+        with patch('time.sleep'):
+            health.wait_until_healthy()
+        assert health.state == HALF_OPEN
+
+        health.record_failure()
+        assert health.state == OPEN
+
+    def test_allow_next_capture(self):
+        """Test that an open circuit lets one capture through once its backoff passed without a probe"""
+        health = StreamHealth("https://test.radio/stream", probe=None, failure_threshold=1)
+        health.allow_next_capture()
+        assert health.state == CLOSED
+
+        health.record_failure()
+        health.allow_next_capture()
+        assert health.state == HALF_OPEN
+
+    def test_open_circuit_probes_at_maximum_backoff(self):
+        """Test that an open circuit only probes every max_backoff_seconds"""
+        health = StreamHealth("https://test.radio/stream", max_backoff_seconds=300, failure_threshold=1)
+        health.record_failure()
+
+        assert 150 <= health.get_backoff_seconds() <= 300
+
+    def test_wait_until_healthy_without_probe(self):
+        """Test that without a probe, waiting is a plain backoff"""
+        health = StreamHealth("https://test.radio/stream", probe=None)
+        health.record_failure()
+
+        with patch('time.sleep') as mock_sleep:
+            health.wait_until_healthy()
+
+        mock_sleep.assert_called_once()
@@ -0,0 +1,106 @@
+import asyncio
+from unittest.mock import Mock
+import pytest
+from recorder.supervisor import RecorderSupervisor
+
+
+class FakeAsyncFFmpeg:
+    """Stands in for ffmpeg.asyncio.FFmpeg: emits segment log lines, then exits or keeps running"""
+
+    def __init__(self, segment_names, error=None, keep_running=False):
+        self.segment_names = segment_names
+        self.error = error
+        self.keep_running = keep_running
+        self.handlers = {}
+        self.terminated = asyncio.Event()
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    async def execute(self):
+        for name in self.segment_names:
+            self.handlers["stderr"](f"[segment @ 0x1] Opening '{name}' for writing")
+        if self.keep_running:
+            await self.terminated.wait()
+            return b""
+        if self.error:
+            raise self.error
+        return b""
+
+    def terminate(self):
+        self.terminated.set()
+
+
+@pytest.fixture
+def stations():
+    return [
+        {"code": "TEST-FM", "url": "https://test.radio/stream", "state": "Test State", "name": "Test Radio"},
+        {"code": "TEST-AM", "url": "https://test.radio/am", "state": "Test State", "name": "Test AM"},
+    ]
+
+
+class TestRecorderSupervisor:
+    def test_backoff_is_kept_by_stream_health(self, stations):
+        """Test that every station gets its own StreamHealth with the supervisor's backoff bounds"""
+        supervisor = RecorderSupervisor(stations, Mock(), Mock(), min_backoff_seconds=5, max_backoff_seconds=60)
+
+        health = supervisor.states[0].health
+        assert (health.url, health.probe) == ("https://test.radio/stream", None)
+        assert (health.min_backoff_seconds, health.max_backoff_seconds) == (5, 60)
+        assert supervisor.states[1].health is not health
+
+    def test_runs_all_stations_and_hands_over_segments(self, stations, monkeypatch):
+        """Test that every station's segments reach on_segment and the last one is flushed on stop"""
+        monkeypatch.setattr("os.path.exists", lambda path: True)
+        monkeypatch.setattr("os.path.getsize", lambda path: 1000)
+        on_segment = Mock()
+
+        def create_ffmpeg(station):
+            code = station["code"]
+            return FakeAsyncFFmpeg([f"{code}_1.mp3", f"{code}_2.mp3"], keep_running=True)
+
+        async def run():
+            supervisor = RecorderSupervisor(stations, create_ffmpeg, on_segment, heartbeat_seconds=3600)
+            task = asyncio.create_task(supervisor.run())
+            await asyncio.sleep(0.05)
+            assert supervisor.get_heartbeat()["statuses"] == {"recording": 2}
+            supervisor.stop()
+            await task
+            return supervisor
+
+        supervisor = asyncio.run(run())
+
+        handed_over = sorted(c.args[1] for c in on_segment.call_args_list)
+        assert handed_over == ["TEST-AM_1.mp3", "TEST-AM_2.mp3", "TEST-FM_1.mp3", "TEST-FM_2.mp3"]
+        assert supervisor.get_heartbeat()["segments_captured"] == 4
+        assert supervisor.get_heartbeat()["statuses"] == {"stopped": 2}
+
+    def test_restarts_failed_station_with_backoff(self, stations):
+        """Test that a crashing station is restarted and its failures are tracked"""
+        attempts = {"TEST-FM": 0}
+
+        def create_ffmpeg(station):
+            if station["code"] == "TEST-FM":
+                attempts["TEST-FM"] += 1
+                return FakeAsyncFFmpeg([], error=Exception("Connection refused"))
+            return FakeAsyncFFmpeg([], keep_running=True)
+
+        async def run():
+            supervisor = RecorderSupervisor(
+                stations, create_ffmpeg, Mock(), min_backoff_seconds=0.01, max_backoff_seconds=0.01
+            )
+            task = asyncio.create_task(supervisor.run())
+            await asyncio.sleep(0.1)
+            heartbeat = supervisor.get_heartbeat()
+            supervisor.stop()
+            await task
+            return heartbeat
+
+        heartbeat = asyncio.run(run())
+
+        assert attempts["TEST-FM"] > 1
+        assert heartbeat["restarts"] >= 1
+        failing = heartbeat["failing_stations"]
+        assert [station["code"] for station in failing] == ["TEST-FM"]
+        assert failing[0]["last_error"] == "Connection refused"
+        assert failing[0]["consecutive_failures"] >= 1
@@ -0,0 +1,97 @@
+import threading
+from unittest.mock import Mock
+import pytest
+from recorder.upload_worker import UploadWorker
+
+
+class TestUploadWorker:
+    def test_handles_submitted_items_in_order(self):
+        """Test that submitted recordings are handled in submission order"""
+        handled = []
+        worker = UploadWorker(lambda url, metadata: handled.append((url, metadata["file_name"])))
+        worker.start()
+
+        worker.submit("https://test.radio/stream", {"file_name": "a.mp3"})
+        worker.submit("https://test.radio/stream", {"file_name": "b.mp3"})
+        worker.stop()
+
+        assert handled == [
+            ("https://test.radio/stream", "a.mp3"),
+            ("https://test.radio/stream", "b.mp3"),
+        ]
+
+    def test_handler_failure_does_not_stop_worker(self):
+        """Test that a failing upload does not kill the worker thread"""
+        handler = Mock(side_effect=[Exception("Upload failed"), None])
+        worker = UploadWorker(handler)
+        worker.start()
+
+        worker.submit("url", {"file_name": "a.mp3"})
+        worker.submit("url", {"file_name": "b.mp3"})
+        worker.stop()
+
+        assert handler.call_count == 2
+
+    def test_failed_items_are_handed_back(self):
+        """Test that a recording whose handler failed reaches on_failed instead of being dropped"""
+        error = Exception("Upload failed")
+        on_failed = Mock(side_effect=[Exception("Spool is full"), None])
+        worker = UploadWorker(Mock(side_effect=[error, error]), on_failed=on_failed)
+        worker.start()
+
+        worker.submit("url", {"file_name": "a.mp3"})
+        worker.submit("url", {"file_name": "b.mp3"})
+        worker.stop()
+
+        # A failing on_failed doesn't stop the worker either
+        assert [c.args for c in on_failed.call_args_list] == [
+            (error, "url", {"file_name": "a.mp3"}),
+            (error, "url", {"file_name": "b.mp3"}),
+        ]
+
+    def test_submit_blocks_when_queue_is_full(self):
+        """Test that the bounded queue applies backpressure to the capture loop"""
+        release = threading.Event()
+        worker = UploadWorker(lambda *args: release.wait(), max_queue_size=1)
+        worker.start()
+
+        worker.submit("url", {"file_name": "a.mp3"})  # picked up by the worker
+        worker.submit("url", {"file_name": "b.mp3"})  # fills the queue
+
+        blocked = threading.Thread(target=worker.submit, args=("url", {"file_name": "c.mp3"}))
+        blocked.start()
+        blocked.join(timeout=0.2)
+        assert blocked.is_alive()
+
+        release.set()
+        blocked.join(timeout=1)
+        assert not blocked.is_alive()
+        worker.stop()
+
+    def test_submit_nowait_hands_back_when_queue_is_full(self):
+        """Test that a segment that doesn't fit in the queue goes to on_failed without blocking ffmpeg"""
+        release = threading.Event()
+        handler = Mock(side_effect=lambda *args: release.wait())
+        on_failed = Mock()
+        worker = UploadWorker(handler, max_queue_size=1, on_failed=on_failed)
+        worker.start()
+
+        worker.submit_nowait("url", {"file_name": "a.mp3"})
+        while not handler.called:  # wait for the worker to pick it up
+            release.wait(0.01)
+        worker.submit_nowait("url", {"file_name": "b.mp3"})  # fills the queue
+        worker.submit_nowait("url", {"file_name": "c.mp3"})  # returns right away
+
+        on_failed.assert_called_once()
+        assert on_failed.call_args.args[1:] == ("url", {"file_name": "c.mp3"})
+
+        release.set()
+        worker.stop()
+        assert [c.args[1]["file_name"] for c in handler.call_args_list] == ["a.mp3", "b.mp3"]
+
+    def test_submit_without_start_raises(self):
+        """Test that submitting to a stopped worker fails loudly"""
+        worker = UploadWorker(Mock())
+
+        with pytest.raises(RuntimeError, match="is not running"):
+            worker.submit("url", {"file_name": "a.mp3"})
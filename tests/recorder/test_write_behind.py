@@ -0,0 +1,99 @@
+import time
+from unittest.mock import Mock
+from recorder.write_behind import AudioFileBatchWriter
+
+
+def inserted_rows(rows):
+    return [{"id": i, **row} for i, row in enumerate(rows)]
+
+
+class TestAudioFileBatchWriter:
+    def test_flush_inserts_in_batches(self):
+        """Test that pending rows are inserted in batches of at most max_batch_size"""
+        insert_batch = Mock(side_effect=inserted_rows)
+        writer = AudioFileBatchWriter(insert_batch, max_batch_size=2)
+
+        for name in ["a", "b", "c"]:
+            writer.submit({"file_path": f"{name}.mp3"})
+
+        assert writer.flush() == 3
+        assert [len(call.args[0]) for call in insert_batch.call_args_list] == [2, 1]
+        assert writer.pending_count() == 0
+
+    def test_inserts_when_batch_is_full(self):
+        """Test that the thread doesn't wait for the interval once a batch is full"""
+        insert_batch = Mock(side_effect=inserted_rows)
+        writer = AudioFileBatchWriter(insert_batch, max_batch_size=2, flush_interval_seconds=60)
+        writer.start()
+
+        writer.submit({"file_path": "a.mp3"})
+        writer.submit({"file_path": "b.mp3"})
+        deadline = time.monotonic() + 2
+        while not insert_batch.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        writer.stop()
+
+        insert_batch.assert_called_once_with([{"file_path": "a.mp3"}, {"file_path": "b.mp3"}])
+
+    def test_inserts_after_interval(self):
+        """Test that a partial batch is inserted once the flush interval passed"""
+        insert_batch = Mock(side_effect=inserted_rows)
+        writer = AudioFileBatchWriter(insert_batch, max_batch_size=50, flush_interval_seconds=0.05)
+        writer.start()
+
+        writer.submit({"file_path": "a.mp3"})
+        deadline = time.monotonic() + 2
+        while not insert_batch.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        insert_batch.assert_called_once_with([{"file_path": "a.mp3"}])
+        writer.stop()
+
+    def test_stop_flushes_pending_rows(self):
+        """Test that nothing submitted is left behind when the writer stops"""
+        insert_batch = Mock(side_effect=inserted_rows)
+        writer = AudioFileBatchWriter(insert_batch, flush_interval_seconds=60)
+        writer.start()
+
+        writer.submit({"file_path": "a.mp3"})
+        writer.stop()
+
+        insert_batch.assert_called_once_with([{"file_path": "a.mp3"}])
+
+    def test_on_inserted_receives_its_own_row(self):
+        """Test that inserted rows are matched back to their submissions by file path"""
+        insert_batch = Mock(return_value=[{"id": 2, "file_path": "b.mp3"}, {"id": 1, "file_path": "a.mp3"}])
+        writer = AudioFileBatchWriter(insert_batch)
+        on_inserted_a, on_inserted_b = Mock(), Mock()
+
+        writer.submit({"file_path": "a.mp3"}, on_inserted=on_inserted_a)
+        writer.submit({"file_path": "b.mp3"}, on_inserted=on_inserted_b)
+        writer.flush()
+
+        on_inserted_a.assert_called_once_with({"id": 1, "file_path": "a.mp3"})
+        on_inserted_b.assert_called_once_with({"id": 2, "file_path": "b.mp3"})
+
+    def test_failed_batch_calls_on_failed(self):
+        """Test that every row of a failed batch is handed back, so it can be spooled"""
+        error = Exception("Supabase is down")
+        writer = AudioFileBatchWriter(Mock(side_effect=error))
+        on_inserted, on_failed = Mock(), Mock()
+
+        writer.submit({"file_path": "a.mp3"}, on_inserted=on_inserted, on_failed=on_failed)
+        writer.submit({"file_path": "b.mp3"}, on_inserted=on_inserted, on_failed=on_failed)
+
+        assert writer.flush() == 0
+        on_inserted.assert_not_called()
+        assert on_failed.call_count == 2
+        on_failed.assert_called_with(error)
+
+    def test_callback_failure_does_not_stop_writer(self):
+        """Test that a failing callback neither loses the other callbacks nor the writer"""
+        writer = AudioFileBatchWriter(Mock(side_effect=inserted_rows))
+        on_inserted = Mock()
+
+        writer.submit({"file_path": "a.mp3"}, on_inserted=Mock(side_effect=Exception("Fingerprint failed")))
+        writer.submit({"file_path": "b.mp3"}, on_inserted=on_inserted)
+        writer.flush()
+
+        on_inserted.assert_called_once_with({"id": 1, "file_path": "b.mp3"})
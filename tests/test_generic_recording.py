@@ -1,11 +1,14 @@
+import hashlib
 import os
+import threading
 from unittest.mock import Mock, call, patch
 import pytest
+from processing_pipeline.r2_utils import UploadVerificationError
 from generic_recording import (
     capture_audio_stream,
+    capture_audio_stream_in_segments,
     upload_to_r2_and_clean_up,
     get_metadata,
-    insert_recorded_audio_file_into_database,
     generic_audio_processing_pipeline,
     get_url_hash
 )
@@ -20,6 +23,13 @@ class TestGenericRecording:
             mock.return_value.option.return_value.input.return_value.output.return_value = ffmpeg_instance
             yield mock, ffmpeg_instance
 
+    @pytest.fixture(autouse=True)
+    def mock_stream_resolver(self):
+        """Record through the browser unless a test resolves a direct stream"""
+        with patch('generic_recording.StreamResolver') as mock:
+            mock.return_value.get_stream_url.return_value = None
+            yield mock
+
     @pytest.fixture
     def mock_radio_station(self):
         """Setup mock radio station"""
@@ -30,6 +40,9 @@ class TestGenericRecording:
         station.url = "https://test.radio/stream"
         station.sink_name = "virtual_speaker_test"
         station.source_name = "virtual_mic_test"
+        station.is_playing_silence.return_value = False
+        station.is_monitored.return_value = False
+        station.get_browser_recycle_reason.return_value = None
         return station
 
 
@@ -91,6 +104,89 @@ class TestGenericRecording:
 
         assert result is None
 
+    def test_capture_audio_stream_in_segments(self, mock_ffmpeg, mock_radio_station):
+        """Test segmented capture from the PulseAudio source"""
+        mock_ffmpeg_class, mock_ffmpeg_instance = mock_ffmpeg
+        mock_radio_station.is_audio_playing.return_value = True
+        on_segment = Mock()
+
+        def execute():
+            stderr_handler = mock_ffmpeg_instance.on.call_args[0][1]
+            stderr_handler("[segment @ 0x1] Opening 'radio_a_20240101_100000.mp3' for writing")
+
+        mock_ffmpeg_instance.execute.side_effect = execute
+
+        with patch('os.path.exists', return_value=True), patch('os.path.getsize', return_value=1000):
+            result = capture_audio_stream_in_segments(mock_radio_station, 1800, 300, 64000, 1, on_segment)
+
+        assert result is True
+        mock_ffmpeg_class.return_value.option.return_value.input.assert_called_once_with(
+            mock_radio_station.source_name, f="pulse", t=1800
+        )
+        on_segment.assert_called_once_with("radio_a_20240101_100000.mp3")
+
+    def test_capture_audio_stream_in_segments_not_playing(self, mock_ffmpeg, mock_radio_station):
+        """Test segmented capture when the sink is not running"""
+        mock_ffmpeg_class, mock_ffmpeg_instance = mock_ffmpeg
+        mock_radio_station.is_audio_playing.return_value = False
+        on_segment = Mock()
+
+        result = capture_audio_stream_in_segments(mock_radio_station, 1800, 300, 64000, 1, on_segment)
+
+        assert result is False
+        mock_ffmpeg_instance.execute.assert_not_called()
+        on_segment.assert_not_called()
+
+    def test_capture_audio_stream_stops_on_dropout(self, mock_ffmpeg, mock_radio_station):
+        """Test that a monitored station stops the capture as soon as playback drops out"""
+        mock_ffmpeg_class, mock_ffmpeg_instance = mock_ffmpeg
+        mock_radio_station.is_monitored.return_value = True
+        mock_radio_station.is_audio_playing.side_effect = [True, False]
+        terminated = threading.Event()
+        mock_ffmpeg_instance.terminate.side_effect = terminated.set
+        mock_ffmpeg_instance.execute.side_effect = lambda: terminated.wait(timeout=5)
+
+        with patch('generic_recording.DROPOUT_CHECK_INTERVAL_SECONDS', 0.01), \
+             patch('os.path.getsize', return_value=1000):
+            result = capture_audio_stream(mock_radio_station, 1800, 64000, 1)
+
+        mock_ffmpeg_instance.terminate.assert_called_once()
+        # The partial recording is kept
+        assert result["file_size"] == 1000
+
+    def test_capture_audio_stream_stops_on_critical_browser_memory(self, mock_ffmpeg, mock_radio_station):
+        """Test that a browser above the critical RSS cuts the capture short, even without playback monitoring"""
+        mock_ffmpeg_class, mock_ffmpeg_instance = mock_ffmpeg
+        mock_radio_station.is_audio_playing.return_value = True
+        mock_radio_station.get_browser_recycle_reason.side_effect = [None, "RSS of 2100 MB is above the critical 2000 MB"]
+        terminated = threading.Event()
+        mock_ffmpeg_instance.terminate.side_effect = terminated.set
+        mock_ffmpeg_instance.execute.side_effect = lambda: terminated.wait(timeout=5)
+
+        with patch('generic_recording.DROPOUT_CHECK_INTERVAL_SECONDS', 0.01), \
+             patch('os.path.getsize', return_value=1000):
+            result = capture_audio_stream(mock_radio_station, 1800, 64000, 1)
+
+        mock_ffmpeg_instance.terminate.assert_called_once()
+        mock_radio_station.get_browser_recycle_reason.assert_called_with(urgent=True)
+        assert result["file_size"] == 1000
+
+    def test_capture_audio_stream_direct(self, mock_ffmpeg, mock_radio_station):
+        """Test that a resolved stream is captured by ffmpeg without checking the browser playback"""
+        mock_ffmpeg_class, mock_ffmpeg_instance = mock_ffmpeg
+        stream_url = "https://stream.revma.ihrhls.com/zc5207/hls.m3u8"
+
+        with patch('os.path.getsize', return_value=1000), \
+             patch('generic_recording.start_dropout_watcher') as mock_watcher:
+            result = capture_audio_stream(mock_radio_station, 1800, 64000, 1, stream_url=stream_url)
+
+        mock_ffmpeg_class.return_value.option.return_value.input.assert_called_once_with(
+            stream_url, rw_timeout=30_000_000, t=1800
+        )
+        mock_radio_station.is_audio_playing.assert_not_called()
+        mock_watcher.assert_not_called()
+        assert result["file_size"] == 1000
+
     def test_get_metadata(self, mock_radio_station):
         """Test metadata generation"""
         file_name = "test.mp3"
@@ -115,52 +211,42 @@ class TestGenericRecording:
         assert metadata["recorded_at"] == "2024-01-01T00:00:00"
         assert metadata["recording_day_of_week"] == "Monday"
 
-    def test_upload_to_r2_success(self, mock_s3_client):
+    def test_upload_to_r2_success(self, mock_s3_client, tmp_path):
         """Test successful file upload to R2"""
         url = "https://test.radio/stream"
-        file_path = "test.mp3"
+        file_path = tmp_path / "test.mp3"
+        file_path.write_bytes(b"audio")
         url_hash = get_url_hash(url)
         expected_destination = f"radio_{url_hash}/test.mp3"
+        mock_s3_client.head_object.return_value = {"ETag": f'"{hashlib.md5(b"audio").hexdigest()}"', "ContentLength": 5}
 
-        with patch('os.remove') as mock_remove:
-            result = upload_to_r2_and_clean_up(url, file_path)
+        result = upload_to_r2_and_clean_up(url, str(file_path))
 
         assert result == expected_destination
         mock_s3_client.upload_file.assert_called_once()
-        mock_remove.assert_called_once_with(file_path)
+        assert not file_path.exists()
+
+    def test_upload_to_r2_verification_failure(self, mock_s3_client, tmp_path):
+        """Test that the file is kept when R2 stores different content"""
+        file_path = tmp_path / "test.mp3"
+        file_path.write_bytes(b"audio")
+        mock_s3_client.head_object.return_value = {"ETag": '"corrupted"', "ContentLength": 5}
+
+        with pytest.raises(UploadVerificationError):
+            upload_to_r2_and_clean_up("https://test.radio/stream", str(file_path))
+
+        assert file_path.exists()
 
-    def test_upload_to_r2_failure(self, mock_s3_client):
+    def test_upload_to_r2_failure(self, mock_s3_client, tmp_path):
         """Test file upload failure"""
+        file_path = tmp_path / "test.mp3"
+        file_path.write_bytes(b"audio")
         with patch('generic_recording.R2_BUCKET_NAME', 'test-bucket'):
             mock_s3_client.upload_file.side_effect = Exception("Upload failed")
 
             # Expect the exception to be raised
             with pytest.raises(Exception, match="Upload failed"):
-                upload_to_r2_and_clean_up("https://test.radio/stream", "test.mp3")
-
-    def test_insert_recorded_audio_file_success(self, mock_supabase_client):
-        """Test successful database insertion"""
-        metadata = {
-            "radio_station_name": "Test Radio",
-            "radio_station_code": "TEST-FM",
-            "location_state": "Test State",
-            "recorded_at": "2024-01-01T00:00:00",
-            "recording_day_of_week": "Monday",
-            "file_size": 1000
-        }
-        uploaded_path = "radio_123456/test.mp3"
-
-        insert_recorded_audio_file_into_database(metadata, uploaded_path)
-
-        mock_supabase_client.insert_audio_file.assert_called_once_with(
-            radio_station_name=metadata["radio_station_name"],
-            radio_station_code=metadata["radio_station_code"],
-            location_state=metadata["location_state"],
-            recorded_at=metadata["recorded_at"],
-            recording_day_of_week=metadata["recording_day_of_week"],
-            file_path=uploaded_path,
-            file_size=metadata["file_size"]
-        )
+                upload_to_r2_and_clean_up("https://test.radio/stream", str(file_path))
 
     def test_get_url_hash(self):
         """Test URL hash generation"""
@@ -182,7 +268,7 @@ class TestGenericRecording:
             patch('generic_recording.Waqi'), \
             patch('generic_recording.capture_audio_stream') as mock_capture, \
             patch('generic_recording.upload_to_r2_and_clean_up') as mock_upload, \
-            patch('generic_recording.insert_recorded_audio_file_into_database') as mock_insert, \
+            patch('generic_recording.insert_recorded_audio_files_into_database') as mock_insert, \
             patch('psutil.virtual_memory') as mock_memory, \
             patch('time.sleep') as mock_sleep:
 
@@ -224,7 +310,7 @@ class TestGenericRecording:
         # Setup mock Supabase response
         mock_response = Mock()
         mock_response.data = [{"id": 1}]  # Simulate Supabase response structure
-        mock_supabase_client.insert_audio_file.return_value = {"id": 1}  # Set return value for insert_audio_file
+        mock_supabase_client.insert_audio_files.return_value = [{"id": 1, "file_path": "radio_123456/test.mp3"}]
 
         with patch('generic_recording.Khot', return_value=mock_radio_station) as mock_khot_class, \
             patch('generic_recording.Kisf'), \
@@ -234,6 +320,9 @@ class TestGenericRecording:
             patch('generic_recording.Waqi'), \
             patch('generic_recording.capture_audio_stream') as mock_capture, \
             patch('generic_recording.upload_to_r2_and_clean_up') as mock_upload, \
+            patch('recorder.registration.decode_pcm'), \
+            patch('recorder.registration.fingerprint_recording', return_value=None), \
+            patch('recorder.registration.detect_dead_air', return_value={"silence_ratio": 0.1, "is_mostly_silent": False, "is_silent": False}), \
             patch('psutil.virtual_memory') as mock_memory, \
             patch('time.sleep') as mock_sleep:
 
@@ -278,16 +367,18 @@ class TestGenericRecording:
                 call()   # After browser restart
             ])
 
-            # Verify Supabase interaction
-            mock_supabase_client.insert_audio_file.assert_called_once_with(
-                radio_station_name="Test Radio",
-                radio_station_code=station_code,
-                location_state="Test State",
-                recorded_at="2024-01-01T00:00:00",
-                recording_day_of_week="Monday",
-                file_path="radio_123456/test.mp3",
-                file_size=1000
-            )
+            # Verify Supabase interaction, the flow flushes the queued row before returning
+            mock_supabase_client.insert_audio_files.assert_called_once_with([{
+                "radio_station_name": "Test Radio",
+                "radio_station_code": station_code,
+                "location_state": "Test State",
+                "recorded_at": "2024-01-01T00:00:00",
+                "recording_day_of_week": "Monday",
+                "file_path": "radio_123456/test.mp3",
+                "file_size": 1000,
+                "silence_ratio": 0.1,
+                "is_mostly_silent": False
+            }])
 
     def test_generic_audio_processing_pipeline_playback_stopped(self, mock_radio_station, mock_supabase_client):
         """Test pipeline when playback stops"""
@@ -345,6 +436,129 @@ class TestGenericRecording:
                 call()   # After browser restart
             ])
 
+    def test_generic_audio_processing_pipeline_recycles_leaking_browser(self, mock_radio_station, mock_supabase_client):
+        """Test that the browser is recycled between captures when the watchdog asks for it"""
+        station_code = "KHOT - 105.9 FM"
+
+        with patch('generic_recording.Khot', return_value=mock_radio_station) as mock_khot_class, \
+            patch('generic_recording.Kisf'), \
+            patch('generic_recording.Krgt'), \
+            patch('generic_recording.Wkaq'), \
+            patch('generic_recording.Wado'), \
+            patch('generic_recording.Waqi'), \
+            patch('generic_recording.capture_audio_stream') as mock_capture, \
+            patch('generic_recording.upload_and_register_recording'), \
+            patch('psutil.virtual_memory') as mock_memory, \
+            patch('time.sleep'):
+
+            mock_khot_class.code = station_code
+            mock_memory.return_value.percent = 50
+            mock_radio_station.is_audio_playing.return_value = True
+            mock_radio_station.get_browser_recycle_reason.return_value = "RSS grows by 400 MB/hour (at 900 MB)"
+            mock_capture.return_value = {"file_name": "test.mp3", "file_size": 1000}
+
+            generic_audio_processing_pipeline(
+                station_code=station_code,
+                duration_seconds=1800,
+                audio_birate=64000,
+                audio_channels=1,
+                repeat=False
+            )
+
+            mock_radio_station.get_browser_recycle_reason.assert_called_once_with()
+            mock_radio_station.stop.assert_has_calls([call(unload_modules=False), call()])
+            assert mock_radio_station.start_browser.call_count == 2
+
+    def test_generic_audio_processing_pipeline_direct_stream(self, mock_radio_station, mock_stream_resolver):
+        """Test that a resolvable station is recorded without a browser, falling back to it once resolution fails"""
+        station_code = "KHOT - 105.9 FM"
+        stream_url = "https://stream.revma.ihrhls.com/zc5207/hls.m3u8"
+        mock_stream_resolver.return_value.get_stream_url.side_effect = [stream_url, stream_url, None]
+
+        with patch('generic_recording.Khot', return_value=mock_radio_station) as mock_khot_class, \
+            patch('generic_recording.Kisf'), \
+            patch('generic_recording.Krgt'), \
+            patch('generic_recording.Wkaq'), \
+            patch('generic_recording.Wado'), \
+            patch('generic_recording.Waqi'), \
+            patch('generic_recording.capture_audio_stream') as mock_capture, \
+            patch('generic_recording.upload_and_register_recording') as mock_upload, \
+            patch('psutil.virtual_memory') as mock_memory, \
+            patch('time.sleep'):
+
+            mock_khot_class.code = station_code
+            mock_memory.return_value.percent = 50
+            mock_radio_station.is_audio_playing.return_value = True
+            output = {"file_name": "test.mp3", "file_size": 1000}
+            # Two direct captures (the second one fails), then one through the browser
+            mock_capture.side_effect = [output, None, output, KeyboardInterrupt()]
+
+            with pytest.raises(KeyboardInterrupt):
+                generic_audio_processing_pipeline(
+                    station_code=station_code,
+                    duration_seconds=1800,
+                    audio_birate=64000,
+                    audio_channels=1,
+                    repeat=True
+                )
+
+            mock_stream_resolver.assert_called_once_with(mock_radio_station.url)
+            assert mock_stream_resolver.return_value.get_stream_url.call_args_list == [
+                call(), call(force_refresh=False), call(force_refresh=True)
+            ]
+            assert mock_capture.call_args_list[:3] == [
+                call(mock_radio_station, 1800, 64000, 1, stream_url=stream_url),
+                call(mock_radio_station, 1800, 64000, 1, stream_url=stream_url),
+                call(mock_radio_station, 1800, 64000, 1, stream_url=None),
+            ]
+            # The browser is only started for the fallback
+            mock_radio_station.setup_virtual_audio.assert_called_once()
+            mock_radio_station.start_browser.assert_called_once()
+            assert mock_upload.call_count == 2
+
+    def test_generic_audio_processing_pipeline_retries_direct_stream(self, mock_radio_station, mock_stream_resolver):
+        """Test that a station recorded through the browser goes back to its direct stream once it resolves again"""
+        station_code = "KHOT - 105.9 FM"
+        stream_url = "https://stream.revma.ihrhls.com/zc5207/hls.m3u8"
+        mock_stream_resolver.return_value.get_stream_url.side_effect = [None, None, stream_url, stream_url]
+
+        with patch('generic_recording.Khot', return_value=mock_radio_station) as mock_khot_class, \
+            patch('generic_recording.Kisf'), \
+            patch('generic_recording.Krgt'), \
+            patch('generic_recording.Wkaq'), \
+            patch('generic_recording.Wado'), \
+            patch('generic_recording.Waqi'), \
+            patch('generic_recording.DIRECT_STREAM_RETRY_CAPTURES', 2), \
+            patch('generic_recording.capture_audio_stream') as mock_capture, \
+            patch('generic_recording.upload_and_register_recording'), \
+            patch('psutil.virtual_memory') as mock_memory, \
+            patch('time.sleep'):
+
+            mock_khot_class.code = station_code
+            mock_memory.return_value.percent = 50
+            mock_radio_station.is_audio_playing.return_value = True
+            mock_radio_station.is_playing_silence.return_value = False
+            mock_radio_station.get_browser_recycle_reason.return_value = None
+            output = {"file_name": "test.mp3", "file_size": 1000}
+            # Four browser captures, the first retry doesn't resolve, the second one does
+            mock_capture.side_effect = [output, output, output, output, output, KeyboardInterrupt()]
+
+            with pytest.raises(KeyboardInterrupt):
+                generic_audio_processing_pipeline(
+                    station_code=station_code,
+                    duration_seconds=1800,
+                    audio_birate=64000,
+                    audio_channels=1,
+                    repeat=True
+                )
+
+            assert mock_stream_resolver.return_value.get_stream_url.call_args_list == [
+                call(), call(force_refresh=True), call(force_refresh=True), call(force_refresh=False)
+            ]
+            assert [c.kwargs["stream_url"] for c in mock_capture.call_args_list] == [None] * 4 + [stream_url] * 2
+            # The browser and its virtual audio are released while recording directly, and at the end
+            assert mock_radio_station.stop.call_args_list == [call(), call()]
+
     def test_generic_audio_processing_pipeline_cleanup(self, mock_radio_station, mock_supabase_client):
         """Test pipeline cleanup"""
         station_code = "KHOT - 105.9 FM"
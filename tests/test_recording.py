@@ -1,17 +1,28 @@
+import asyncio
+import hashlib
 import os
 import time
 from unittest.mock import Mock, patch
 import pytest
+import recording
+from processing_pipeline.audio_utils import ENCODING_PROFILES
+from processing_pipeline.r2_utils import UploadVerificationError
+from recorder import AudioFileBatchWriter
 from recording import (
     capture_audio_stream,
+    capture_audio_stream_in_segments,
     serve_deployments,
     upload_to_r2_and_clean_up,
     get_metadata,
-    insert_recorded_audio_file_into_database,
     audio_processing_pipeline_max_recorder,
     audio_processing_pipeline_lite_recorder,
     get_url_hash,
-    reconstruct_radio_station
+    reconstruct_radio_station,
+    audio_recording_supervisor,
+    serve_supervisor_deployment,
+    get_stations_for_recorder_node,
+    upload_and_register_recording,
+    spool_orphaned_recordings
 )
 
 class TestRecording:
@@ -31,11 +42,32 @@ class TestRecording:
             "name": "Test Radio"
         }
 
+    @pytest.fixture
+    def sample_metadata(self):
+        return {
+            "file_name": "test.mp3",
+            "radio_station_name": "Test Radio",
+            "radio_station_code": "TEST-FM",
+            "location_state": "Test State",
+            "recorded_at": "2024-01-01T00:00:00",
+            "recording_day_of_week": "Monday",
+            "file_size": 1000
+        }
+
     @pytest.fixture
     def mock_supabase_client(self):
         with patch('recording.supabase_client') as mock:
             yield mock
 
+    @pytest.fixture(autouse=True)
+    def mock_insert(self):
+        """The batch insert behind the write-behind queue, the flows flush it before returning"""
+        insert_batch = Mock(side_effect=lambda rows: [{"id": f"audio-{i}", **row} for i, row in enumerate(rows)])
+        writer = AudioFileBatchWriter(insert_batch, flush_interval_seconds=60)
+        with patch.object(recording.registrar, 'audio_file_writer', writer):
+            yield insert_batch
+            writer.stop()
+
     @pytest.fixture
     def mock_s3_client(self):
         with patch('recording.s3_client') as mock:
@@ -61,6 +93,20 @@ class TestRecording:
         assert "recorded_at" in result
         assert "recording_day_of_week" in result
 
+    def test_capture_audio_stream_opus_speech_profile(self, mock_ffmpeg, sample_station):
+        """Test that the speech profile records low-bitrate mono Opus into .ogg files"""
+        mock_ffmpeg_class, mock_ffmpeg_instance = mock_ffmpeg
+
+        with patch('recording.ENCODING_PROFILE', ENCODING_PROFILES["opus_speech"]), \
+             patch('os.path.getsize', return_value=1000):
+            result = capture_audio_stream(sample_station, 1800, 64000, 1)
+
+        output = mock_ffmpeg_class.return_value.option.return_value.input.return_value.output
+        output_file = output.call_args.args[0]
+        assert output_file.endswith(".ogg")
+        assert output.call_args.kwargs == {"ab": 24000, "ac": 1, "acodec": "libopus", "ar": 16000, "application": "voip"}
+        assert result["file_name"] == output_file
+
     def test_capture_audio_stream_failure(self, mock_ffmpeg, sample_station):
         """Test audio capture failure"""
         mock_ffmpeg_class, mock_ffmpeg_instance = mock_ffmpeg
@@ -71,6 +117,50 @@ class TestRecording:
 
         assert result is None
 
+    def test_capture_audio_stream_in_segments(self, mock_ffmpeg, sample_station):
+        """Test segmented capture reports every closed segment"""
+        mock_ffmpeg_class, mock_ffmpeg_instance = mock_ffmpeg
+        on_segment = Mock()
+
+        def execute():
+            stderr_handler = mock_ffmpeg_instance.on.call_args[0][1]
+            stderr_handler("[segment @ 0x1] Opening 'radio_a_20240101_100000.mp3' for writing")
+            stderr_handler("[segment @ 0x1] Opening 'radio_a_20240101_100500.mp3' for writing")
+
+        mock_ffmpeg_instance.execute.side_effect = execute
+
+        with patch('os.path.exists', return_value=True), patch('os.path.getsize', return_value=1000):
+            result = capture_audio_stream_in_segments(sample_station, None, 300, 64000, 1, on_segment)
+
+        assert result is True
+        output_kwargs = mock_ffmpeg_class.return_value.option.return_value.input.return_value.output.call_args[1]
+        assert output_kwargs["f"] == "segment"
+        assert output_kwargs["segment_time"] == 300
+        assert [c.args[0] for c in on_segment.call_args_list] == [
+            "radio_a_20240101_100000.mp3",
+            "radio_a_20240101_100500.mp3",
+        ]
+
+    def test_capture_audio_stream_in_segments_failure(self, mock_ffmpeg, sample_station):
+        """Test segmented capture keeps the partial segment when ffmpeg fails"""
+        mock_ffmpeg_class, mock_ffmpeg_instance = mock_ffmpeg
+        on_segment = Mock()
+
+        def execute():
+            stderr_handler = mock_ffmpeg_instance.on.call_args[0][1]
+            stderr_handler("[segment @ 0x1] Opening 'radio_a_20240101_100000.mp3' for writing")
+            raise Exception("FFmpeg error")
+
+        mock_ffmpeg_instance.execute.side_effect = execute
+
+        with patch('os.path.exists', return_value=True), \
+             patch('os.path.getsize', return_value=1000), \
+             patch('time.sleep'):
+            result = capture_audio_stream_in_segments(sample_station, None, 300, 64000, 1, on_segment)
+
+        assert result is False
+        on_segment.assert_called_once_with("radio_a_20240101_100000.mp3")
+
     def test_get_metadata(self, sample_station):
         """Test metadata generation"""
         file_name = "test.mp3"
@@ -87,22 +177,36 @@ class TestRecording:
         assert isinstance(metadata["recorded_at"], str)
         assert isinstance(metadata["recording_day_of_week"], str)
 
-    def test_upload_to_r2_success(self, mock_s3_client):
+    def test_upload_to_r2_success(self, mock_s3_client, tmp_path):
         """Test successful file upload to R2"""
         url = "https://test.radio/stream"
-        file_path = "test.mp3"
+        file_path = tmp_path / "test.mp3"
+        file_path.write_bytes(b"audio")
         url_hash = get_url_hash(url)
         expected_destination = f"radio_{url_hash}/test.mp3"
+        mock_s3_client.head_object.return_value = {"ETag": f'"{hashlib.md5(b"audio").hexdigest()}"', "ContentLength": 5}
 
-        with patch('os.remove') as mock_remove:
-            result = upload_to_r2_and_clean_up(url, file_path)
+        result = upload_to_r2_and_clean_up(url, str(file_path))
 
         assert result == expected_destination
         mock_s3_client.upload_file.assert_called_once()
-        mock_remove.assert_called_once_with(file_path)
+        assert not file_path.exists()
+
+    def test_upload_to_r2_verification_failure(self, mock_s3_client, tmp_path):
+        """Test that the file is kept when R2 stores different content"""
+        file_path = tmp_path / "test.mp3"
+        file_path.write_bytes(b"audio")
+        mock_s3_client.head_object.return_value = {"ETag": '"corrupted"', "ContentLength": 5}
 
-    def test_upload_to_r2_failure(self, mock_s3_client):
+        with pytest.raises(UploadVerificationError):
+            upload_to_r2_and_clean_up("https://test.radio/stream", str(file_path))
+
+        assert file_path.exists()
+
+    def test_upload_to_r2_failure(self, mock_s3_client, tmp_path):
         """Test file upload failure"""
+        file_path = tmp_path / "test.mp3"
+        file_path.write_bytes(b"audio")
         # Mock both the environment variable and the s3_client in the recording module
         with patch('recording.R2_BUCKET_NAME', 'test-bucket'), \
             patch('recording.s3_client', mock_s3_client):
@@ -111,34 +215,138 @@ class TestRecording:
 
             # Expect the exception to be raised
             with pytest.raises(Exception, match="Upload failed"):
-                upload_to_r2_and_clean_up("https://test.radio/stream", "test.mp3")
+                upload_to_r2_and_clean_up("https://test.radio/stream", str(file_path))
 
             # Verify upload was attempted
             mock_s3_client.upload_file.assert_called_once()
 
-    def test_insert_recorded_audio_file_success(self, mock_supabase_client):
-        """Test successful database insertion"""
-        metadata = {
-            "radio_station_name": "Test Radio",
-            "radio_station_code": "TEST-FM",
-            "location_state": "Test State",
-            "recorded_at": "2024-01-01T00:00:00",
-            "recording_day_of_week": "Monday",
-            "file_size": 1000
-        }
-        uploaded_path = "radio_123456/test.mp3"
-
-        insert_recorded_audio_file_into_database(metadata, uploaded_path)
-
-        mock_supabase_client.insert_audio_file.assert_called_once_with(
-            radio_station_name=metadata["radio_station_name"],
-            radio_station_code=metadata["radio_station_code"],
-            location_state=metadata["location_state"],
-            recorded_at=metadata["recorded_at"],
-            recording_day_of_week=metadata["recording_day_of_week"],
-            file_path=uploaded_path,
-            file_size=metadata["file_size"]
-        )
+    def test_upload_and_register_recording_spools_on_failure(self, sample_station, sample_metadata, mock_insert):
+        """Test that a recording is spooled instead of lost when the upload fails"""
+        with patch('recording.upload_to_r2_and_clean_up', side_effect=Exception("R2 is down")), \
+             patch.object(recording.registrar, 'spool') as mock_spool:
+            upload_and_register_recording(sample_station["url"], sample_metadata)
+
+        mock_insert.assert_not_called()
+        mock_spool.add.assert_called_once_with(sample_station["url"], sample_metadata)
+
+    def test_upload_and_register_recording_queues_the_insert(self, sample_station, sample_metadata, mock_insert):
+        """Test that registering a recording doesn't wait for the database"""
+        with patch('recording.upload_to_r2_and_clean_up', return_value="radio_123456/test.mp3"):
+            upload_and_register_recording(sample_station["url"], sample_metadata)
+
+        mock_insert.assert_not_called()
+        assert recording.registrar.audio_file_writer.pending_count() == 1
+
+        recording.registrar.audio_file_writer.flush()
+        row = mock_insert.call_args.args[0][0]
+        assert row["file_path"] == "radio_123456/test.mp3"
+        assert row["radio_station_code"] == "TEST-FM"
+
+    def test_upload_and_register_recording_spools_uploaded_path(self, sample_station, sample_metadata, mock_insert):
+        """Test that a failed database insert keeps the R2 path so the file is not uploaded again"""
+        mock_insert.side_effect = Exception("Supabase is down")
+        with patch('recording.upload_to_r2_and_clean_up', return_value="radio_123456/test.mp3"), \
+             patch.object(recording.registrar, 'spool') as mock_spool:
+            upload_and_register_recording(sample_station["url"], sample_metadata)
+            recording.registrar.audio_file_writer.flush()
+
+        mock_spool.add.assert_called_once_with(sample_station["url"], sample_metadata, "radio_123456/test.mp3")
+
+    def test_upload_and_register_recording_skips_silent_recordings(self, sample_station, sample_metadata, mock_insert):
+        """Test that fully silent recordings are neither uploaded nor registered"""
+        levels = {"silence_ratio": 1.0, "is_mostly_silent": True, "is_silent": True}
+        with patch('recorder.registration.decode_pcm'), \
+             patch('recorder.registration.detect_dead_air', return_value=levels), \
+             patch('recorder.registration.quarantine_recording') as mock_quarantine, \
+             patch('recording.upload_to_r2_and_clean_up') as mock_upload:
+            upload_and_register_recording(sample_station["url"], sample_metadata)
+            recording.registrar.audio_file_writer.flush()
+
+        mock_quarantine.assert_called_once_with("test.mp3", None)
+        mock_upload.assert_not_called()
+        mock_insert.assert_not_called()
+
+    def test_upload_and_register_recording_flags_mostly_silent_recordings(
+        self, sample_station, sample_metadata, mock_insert
+    ):
+        """Test that the silence ratio reaches the audio_files insert"""
+        levels = {"silence_ratio": 0.7, "is_mostly_silent": True, "is_silent": False}
+        with patch('recorder.registration.decode_pcm'), \
+             patch('recorder.registration.detect_dead_air', return_value=levels), \
+             patch('recording.upload_to_r2_and_clean_up', return_value="radio_123456/test.mp3"):
+            upload_and_register_recording(sample_station["url"], sample_metadata)
+            recording.registrar.audio_file_writer.flush()
+
+        row = mock_insert.call_args.args[0][0]
+        assert row["silence_ratio"] == 0.7
+        assert row["is_mostly_silent"] is True
+
+    def test_upload_and_register_recording_when_analysis_fails(self, sample_station, sample_metadata, mock_insert):
+        """Test that a failed level analysis doesn't block the upload"""
+        with patch('recorder.registration.detect_dead_air', side_effect=Exception("ffmpeg not found")), \
+             patch('recording.upload_to_r2_and_clean_up', return_value="radio_123456/test.mp3") as mock_upload:
+            upload_and_register_recording(sample_station["url"], sample_metadata)
+            recording.registrar.audio_file_writer.flush()
+
+        mock_upload.assert_called_once()
+        row = mock_insert.call_args.args[0][0]
+        assert row["file_path"] == "radio_123456/test.mp3"
+        assert "silence_ratio" not in row
+
+    def test_upload_and_register_recording_registers_fingerprint(self, sample_station, sample_metadata, mock_insert):
+        """Test that the fingerprint is computed before the upload deletes the file, and registered after the insert"""
+        fingerprint = {"duration_seconds": 1800, "hashes": [1, 2], "offsets": [0.0, 1.0]}
+        with patch('recorder.registration.decode_pcm') as mock_decode, \
+             patch('recorder.registration.detect_dead_air', side_effect=Exception("ffmpeg not found")), \
+             patch('recorder.registration.fingerprint_recording', return_value=fingerprint) as mock_fingerprint, \
+             patch('recording.upload_to_r2_and_clean_up', return_value="radio_123456/test.mp3"), \
+             patch('recorder.registration.detect_simulcast') as mock_detect_simulcast:
+            upload_and_register_recording(sample_station["url"], sample_metadata)
+            mock_detect_simulcast.assert_not_called()
+            recording.registrar.audio_file_writer.flush()
+
+        mock_fingerprint.assert_called_once_with("test.mp3", samples=mock_decode.return_value)
+        # Stage 1 waits for the simulcast check
+        assert mock_insert.call_args.args[0][0]["simulcast_check_pending"] is True
+        mock_detect_simulcast.assert_called_once()
+        audio_file, registered_fingerprint = mock_detect_simulcast.call_args.args[1:]
+        assert audio_file["id"] == "audio-0"
+        assert registered_fingerprint == fingerprint
+
+    def test_upload_and_register_recording_when_simulcast_detection_fails(self, sample_station, sample_metadata):
+        """Test that simulcast detection is best effort"""
+        with patch('recorder.registration.decode_pcm'), \
+             patch('recorder.registration.detect_dead_air', side_effect=Exception("ffmpeg not found")), \
+             patch('recorder.registration.fingerprint_recording', return_value={"hashes": []}), \
+             patch('recording.upload_to_r2_and_clean_up', return_value="radio_123456/test.mp3"), \
+             patch('recorder.registration.detect_simulcast', side_effect=Exception("Supabase is down")), \
+             patch.object(recording.registrar, 'spool') as mock_spool:
+            upload_and_register_recording(sample_station["url"], sample_metadata)
+            recording.registrar.audio_file_writer.flush()
+
+        mock_spool.add.assert_not_called()
+
+    def test_spool_orphaned_recordings(self, sample_station, tmp_path, monkeypatch):
+        """Test that recordings left behind by a crashed run are spooled on start"""
+        monkeypatch.chdir(tmp_path)
+        url_hash = get_url_hash(sample_station["url"])
+        (tmp_path / f"radio_{url_hash}_20240101_100000.mp3").write_bytes(b"audio")
+        (tmp_path / f"radio_{url_hash}_20240101_103000.mp3").write_bytes(b"")
+        (tmp_path / f"radio_{url_hash}_20240101_110000.ogg").write_bytes(b"audio")
+        (tmp_path / "radio_other_20240101_100000.mp3").write_bytes(b"audio")
+
+        with patch.object(recording.registrar, 'spool') as mock_spool:
+            spool_orphaned_recordings(sample_station)
+
+        # Recordings of every encoding profile are picked up
+        assert mock_spool.add.call_count == 2
+        url, metadata = mock_spool.add.call_args_list[0].args
+        assert url == sample_station["url"]
+        assert metadata["file_name"] == f"radio_{url_hash}_20240101_100000.mp3"
+        assert mock_spool.add.call_args_list[1].args[1]["file_name"] == f"radio_{url_hash}_20240101_110000.ogg"
+        assert metadata["recorded_at"] == "2024-01-01T10:00:00"
+        # Empty recordings are discarded
+        assert not (tmp_path / f"radio_{url_hash}_20240101_103000.mp3").exists()
 
     def test_get_url_hash(self):
         """Test URL hash generation"""
@@ -170,11 +378,10 @@ class TestRecording:
 
         assert result is None
 
-    def test_audio_processing_pipeline_max_recorder(self, sample_station):
+    def test_audio_processing_pipeline_max_recorder(self, sample_station, mock_insert):
         """Test max recorder pipeline"""
         with patch('recording.capture_audio_stream') as mock_capture, \
              patch('recording.upload_to_r2_and_clean_up') as mock_upload, \
-             patch('recording.insert_recorded_audio_file_into_database') as mock_insert, \
              patch('recording.reconstruct_radio_station', return_value=sample_station):
 
             # Setup mock returns
@@ -206,16 +413,16 @@ class TestRecording:
                 sample_station["url"],
                 mock_capture.return_value["file_name"]
             )
-            mock_insert.assert_called_once_with(
-                mock_capture.return_value,
-                mock_upload.return_value
-            )
+            # The flow flushes the queued audio_files rows before returning
+            mock_insert.assert_called_once()
+            row = mock_insert.call_args.args[0][0]
+            assert row["file_path"] == mock_upload.return_value
+            assert row["recorded_at"] == mock_capture.return_value["recorded_at"]
 
-    def test_audio_processing_pipeline_lite_recorder(self, sample_station):
+    def test_audio_processing_pipeline_lite_recorder(self, sample_station, mock_insert):
         """Test lite recorder pipeline"""
         with patch('recording.capture_audio_stream') as mock_capture, \
              patch('recording.upload_to_r2_and_clean_up') as mock_upload, \
-             patch('recording.insert_recorded_audio_file_into_database') as mock_insert, \
              patch('recording.reconstruct_radio_station', return_value=sample_station):
 
             # Setup mock returns
@@ -247,11 +454,90 @@ class TestRecording:
                 sample_station["url"],
                 mock_capture.return_value["file_name"]
             )
-            mock_insert.assert_called_once_with(
-                mock_capture.return_value,
-                mock_upload.return_value
+            # The flow flushes the queued audio_files rows before returning
+            mock_insert.assert_called_once()
+            row = mock_insert.call_args.args[0][0]
+            assert row["file_path"] == mock_upload.return_value
+            assert row["recorded_at"] == mock_capture.return_value["recorded_at"]
+
+    def test_audio_processing_pipeline_pipelined(self, sample_station, mock_insert):
+        """Test pipelined mode hands uploads to the background worker"""
+        with patch('recording.capture_audio_stream') as mock_capture, \
+             patch('recording.upload_to_r2_and_clean_up') as mock_upload, \
+             patch('recording.reconstruct_radio_station', return_value=sample_station):
+
+            mock_capture.return_value = {
+                "file_name": "test.mp3",
+                "radio_station_name": "Test Radio",
+                "radio_station_code": "TEST-FM",
+                "location_state": "Test State",
+                "recorded_at": "2024-01-01T00:00:00",
+                "recording_day_of_week": "Monday",
+                "file_size": 1000
+            }
+            mock_upload.return_value = "radio_123456/test.mp3"
+
+            audio_processing_pipeline_max_recorder(
+                url=sample_station["url"],
+                duration_seconds=1800,
+                audio_birate=64000,
+                audio_channels=1,
+                repeat=False,
+                pipelined=True
+            )
+
+            # The flow waits for the worker to drain before returning
+            mock_upload.assert_called_once_with(sample_station["url"], "test.mp3")
+            mock_insert.assert_called_once()
+            assert mock_insert.call_args.args[0][0]["file_path"] == mock_upload.return_value
+
+    def test_audio_processing_pipeline_pipelined_spools_failed_recordings(self, sample_station, sample_metadata):
+        """Test that a recording whose background upload fails unexpectedly is spooled instead of lost"""
+        with patch('recording.capture_audio_stream', return_value=sample_metadata), \
+             patch('recording.upload_and_register_recording', side_effect=Exception("Quarantine is full")), \
+             patch('recording.reconstruct_radio_station', return_value=sample_station), \
+             patch('os.path.exists', return_value=True), \
+             patch.object(recording.registrar, 'spool') as mock_spool:
+            audio_processing_pipeline_max_recorder(
+                url=sample_station["url"],
+                duration_seconds=1800,
+                audio_birate=64000,
+                audio_channels=1,
+                repeat=False,
+                pipelined=True
+            )
+
+        mock_spool.add.assert_called_once_with(sample_station["url"], sample_metadata)
+
+    def test_audio_processing_pipeline_segmented(self, sample_station, mock_insert):
+        """Test segmented mode uploads and registers each segment"""
+        def capture(station, duration_seconds, segment_seconds, audio_birate, audio_channels, on_segment):
+            on_segment("radio_a_20240101_100000.mp3")
+            on_segment("radio_a_20240101_100500.mp3")
+            return True
+
+        with patch('recording.capture_audio_stream_in_segments', side_effect=capture) as mock_capture, \
+             patch('recording.upload_to_r2_and_clean_up', return_value="radio_a/segment.mp3") as mock_upload, \
+             patch('recording.reconstruct_radio_station', return_value=sample_station), \
+             patch('os.path.getsize', return_value=1000):
+
+            audio_processing_pipeline_max_recorder(
+                url=sample_station["url"],
+                duration_seconds=None,
+                audio_birate=64000,
+                audio_channels=1,
+                repeat=False,
+                segment_seconds=300
             )
 
+            mock_capture.assert_called_once()
+            assert mock_upload.call_count == 2
+            # Both segments are registered with one insert
+            mock_insert.assert_called_once()
+            rows = mock_insert.call_args.args[0]
+            assert len(rows) == 2
+            assert rows[0]["recorded_at"] == "2024-01-01T10:00:00"
+
     def test_serve_deployments(self):
         """Test serve_deployments function"""
         test_stations = [
@@ -272,11 +558,46 @@ class TestRecording:
             serve_deployments(test_stations, mock_flow)
             mock_serve.assert_called_once()
 
-    def test_audio_processing_pipeline_with_repeat(self, sample_station):
+    def test_serve_supervisor_deployment(self, sample_station):
+        """Test that the supervisor is served as a single deployment for all stations"""
+        with patch('recording.audio_recording_supervisor', new=Mock()) as mock_flow, \
+             patch('recording.serve') as mock_serve:
+            serve_supervisor_deployment("max_recorder", [sample_station])
+
+            parameters = mock_flow.to_deployment.call_args[1]["parameters"]
+            assert parameters["urls"] == [sample_station["url"]]
+            assert parameters["segment_seconds"] == 300
+            mock_serve.assert_called_once_with(mock_flow.to_deployment.return_value)
+
+    def test_audio_recording_supervisor(self, sample_station, mock_insert):
+        """Test the supervisor flow uploads and registers segments handed over by the supervisor"""
+        class FakeSupervisor:
+            def __init__(self, stations, create_ffmpeg, on_segment, heartbeat_seconds):
+                self.stations = stations
+                self.on_segment = on_segment
+
+            async def run(self):
+                self.on_segment(self.stations[0], "radio_a_20240101_100000.mp3")
+
+        with patch('recording.RecorderSupervisor', FakeSupervisor), \
+             patch('recording.upload_to_r2_and_clean_up', return_value="radio_a/segment.mp3") as mock_upload, \
+             patch('recording.reconstruct_radio_station', return_value=sample_station), \
+             patch('os.path.getsize', return_value=1000):
+            asyncio.run(audio_recording_supervisor([sample_station["url"]], 300, 64000, 1))
+
+        mock_upload.assert_called_once_with(sample_station["url"], "radio_a_20240101_100000.mp3")
+        mock_insert.assert_called_once()
+
+    def test_audio_recording_supervisor_invalid_station(self):
+        """Test the supervisor flow with an unknown station URL"""
+        with patch('recording.reconstruct_radio_station', return_value=None):
+            with pytest.raises(ValueError, match="Radio station not found for URL:"):
+                asyncio.run(audio_recording_supervisor(["https://invalid.radio/stream"], 300, 64000, 1))
+
+    def test_audio_processing_pipeline_with_repeat(self, sample_station, mock_insert):
         """Test pipeline with repeat enabled"""
         with patch('recording.capture_audio_stream') as mock_capture, \
             patch('recording.upload_to_r2_and_clean_up') as mock_upload, \
-            patch('recording.insert_recorded_audio_file_into_database') as mock_insert, \
             patch('recording.reconstruct_radio_station', return_value=sample_station), \
             patch('time.sleep') as mock_sleep:  # Mock sleep to speed up test
 
@@ -349,6 +670,27 @@ class TestRecording:
                 audio_processing_pipeline_max_recorder
             )
 
+    def test_get_stations_for_recorder_node(self):
+        """Test that every station is owned by exactly one recorder node"""
+        stations = [
+            {"code": f"TEST-{i}", "url": f"https://test.radio/stream/{i}", "state": "Test State", "name": "Test"}
+            for i in range(40)
+        ]
+
+        with patch('recording.RECORDER_NODES', 'max_recorder:3,lite_recorder:1'):
+            max_stations = get_stations_for_recorder_node(stations, "max_recorder")
+            lite_stations = get_stations_for_recorder_node(stations, "lite_recorder")
+
+        assert len(max_stations) + len(lite_stations) == len(stations)
+        assert not {s["code"] for s in max_stations} & {s["code"] for s in lite_stations}
+        assert len(max_stations) > len(lite_stations)
+
+    def test_get_stations_for_unknown_recorder_node(self):
+        """Test that a node missing from RECORDER_NODES is rejected"""
+        with patch('recording.RECORDER_NODES', 'max_recorder,lite_recorder'):
+            with pytest.raises(ValueError, match="is not in RECORDER_NODES"):
+                get_stations_for_recorder_node([], "third_recorder")
+
     def test_invalid_process_group(self):
         """Test handling of invalid process group"""
         with patch.dict('os.environ', {'FLY_PROCESS_GROUP': 'invalid_group'}):
@@ -362,8 +704,8 @@ class TestRecording:
                     case _:
                         raise ValueError(f"Invalid process group: {process_group}")
 
-    def test_capture_audio_stream_with_sleep(self, mock_ffmpeg, sample_station):
-        """Test audio capture with sleep on failure"""
+    def test_capture_audio_stream_does_not_sleep_on_failure(self, mock_ffmpeg, sample_station):
+        """Test that a failed capture returns right away, backing off is up to the flow"""
         mock_ffmpeg_class, mock_ffmpeg_instance = mock_ffmpeg
         mock_ffmpeg_instance.execute.side_effect = Exception("FFmpeg error")
 
@@ -371,4 +713,29 @@ class TestRecording:
             result = capture_audio_stream(sample_station, 1800, 64000, 1)
 
             assert result is None
-            mock_sleep.assert_called_once_with(300)  # Verify sleep duration
+            mock_sleep.assert_not_called()
+
+    def test_audio_processing_pipeline_backs_off_after_failure(self, sample_station):
+        """Test that the flow waits for the stream to be healthy before capturing again"""
+        output = {"file_name": "test.mp3"}
+        with patch('recording.capture_audio_stream', side_effect=[None, output, KeyboardInterrupt]) as mock_capture, \
+             patch('recording.upload_and_register_recording') as mock_upload_and_register, \
+             patch('recording.StreamHealth') as mock_stream_health_class, \
+             patch('recording.reconstruct_radio_station', return_value=sample_station):
+            stream_health = mock_stream_health_class.return_value
+
+            with pytest.raises(KeyboardInterrupt):
+                audio_processing_pipeline_max_recorder(
+                    url=sample_station["url"],
+                    duration_seconds=1800,
+                    audio_birate=64000,
+                    audio_channels=1,
+                    repeat=True
+                )
+
+        assert mock_capture.call_count == 3
+        mock_stream_health_class.assert_called_once_with(sample_station["url"])
+        stream_health.record_failure.assert_called_once()
+        stream_health.wait_until_healthy.assert_called_once()
+        stream_health.record_success.assert_called_once()
+        mock_upload_and_register.assert_called_once_with(sample_station["url"], output)
@@ -1,8 +1,13 @@
+import glob
+import os
+import re
 from unittest.mock import ANY, Mock, patch
 import pytest
 from processing_pipeline.supabase_utils import SupabaseClient
 from processing_pipeline.constants import GeminiModel
 
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
 class TestSupabaseClient:
     @pytest.fixture
@@ -33,6 +38,32 @@ class TestSupabaseClient:
         mock_supabase.rpc.assert_called_once_with("fetch_a_new_audio_file_and_reserve_it")
         assert response == expected_response
 
+    @pytest.mark.parametrize(
+        "method, function_name",
+        [
+            ("get_new_audio_files_and_reserve_them", "fetch_new_audio_files_and_reserve_them"),
+            ("get_new_stage_1_llm_responses_and_reserve_them", "fetch_new_stage_1_llm_responses_and_reserve_them"),
+            ("get_new_snippets_and_reserve_them", "fetch_new_snippets_and_reserve_them"),
+            ("get_ready_for_review_snippets_and_reserve_them", "fetch_ready_for_review_snippets_and_reserve_them"),
+            ("get_snippets_that_have_no_embedding", "fetch_snippets_that_have_no_embedding"),
+        ],
+    )
+    def test_bulk_reservation(self, supabase_client, mock_supabase, method, function_name):
+        """Test reserving several rows with one round-trip"""
+        expected_response = [{"id": 1}, {"id": 2}]
+        mock_supabase.rpc.return_value.execute.return_value.data = expected_response
+
+        response = getattr(supabase_client, method)(2)
+
+        mock_supabase.rpc.assert_called_once_with(function_name, {"max_count": 2})
+        assert response == expected_response
+
+    def test_bulk_reservation_without_rows(self, supabase_client, mock_supabase):
+        """Test that an empty queue is an empty list"""
+        mock_supabase.rpc.return_value.execute.return_value.data = None
+
+        assert supabase_client.get_new_audio_files_and_reserve_them(5) == []
+
     def test_get_a_new_stage_1_llm_response_and_reserve_it(self, supabase_client, mock_supabase):
         """Test fetching and reserving a new stage 1 LLM response"""
         expected_response = {"id": 1, "status": "New"}
@@ -191,6 +222,187 @@ class TestSupabaseClient:
         )
         assert response == expected_response[0]
 
+    def test_insert_audio_file_with_silence_ratio(self, supabase_client, mock_supabase):
+        """Test inserting an audio file whose audio levels were analyzed"""
+        mock_supabase.table.return_value.insert.return_value.execute.return_value.data = [{"id": 1}]
+
+        supabase_client.insert_audio_file(
+            radio_station_name="Test Station",
+            radio_station_code="TEST-FM",
+            location_state="Test State",
+            recorded_at="2024-01-01T00:00:00",
+            recording_day_of_week="Monday",
+            file_path="test/path.mp3",
+            file_size=1000,
+            silence_ratio=0.75,
+            is_mostly_silent=True,
+        )
+
+        inserted = mock_supabase.table.return_value.insert.call_args.args[0]
+        assert inserted["silence_ratio"] == 0.75
+        assert inserted["is_mostly_silent"] is True
+
+    def test_insert_audio_files(self, supabase_client, mock_supabase):
+        """Test inserting several audio files with one request"""
+        expected_response = [{"id": 1}, {"id": 2}]
+        mock_supabase.table.return_value.insert.return_value.execute.return_value.data = expected_response
+        analyzed = {"file_path": "test/a.mp3", "silence_ratio": 0.75, "is_mostly_silent": True}
+        not_analyzed = {"file_path": "test/b.mp3"}
+
+        response = supabase_client.insert_audio_files([analyzed, not_analyzed])
+
+        mock_supabase.table.assert_called_once_with("audio_files")
+        mock_supabase.table.return_value.insert.assert_called_once_with(
+            [
+                {
+                    "file_path": "test/a.mp3",
+                    "silence_ratio": 0.75,
+                    "is_mostly_silent": True,
+                    "simulcast_check_pending": False,
+                },
+                {
+                    "file_path": "test/b.mp3",
+                    "silence_ratio": None,
+                    "is_mostly_silent": False,
+                    "simulcast_check_pending": False,
+                },
+            ]
+        )
+        assert response == expected_response
+
+    def test_insert_audio_files_without_rows(self, supabase_client, mock_supabase):
+        """Test that an empty batch doesn't reach Supabase"""
+        assert supabase_client.insert_audio_files([]) == []
+        mock_supabase.table.assert_not_called()
+
+    def test_insert_audio_fingerprint(self, supabase_client, mock_supabase):
+        """Test storing the fingerprint of a recording"""
+        mock_supabase.table.return_value.insert.return_value.execute.return_value.data = [{"audio_file_id": 1}]
+
+        response = supabase_client.insert_audio_fingerprint(
+            audio_file_id=1,
+            radio_station_code="TEST-FM",
+            recorded_at="2024-01-01T00:00:00+00:00",
+            duration_seconds=1800,
+            hashes=[1, 2],
+            offsets=[0.0, 0.5],
+        )
+
+        mock_supabase.table.assert_called_once_with("audio_fingerprints")
+        mock_supabase.table.return_value.insert.assert_called_once_with(
+            {
+                "audio_file_id": 1,
+                "radio_station_code": "TEST-FM",
+                "recorded_at": "2024-01-01T00:00:00+00:00",
+                "duration_seconds": 1800,
+                "hashes": [1, 2],
+                "offsets": [0.0, 0.5],
+            }
+        )
+        assert response == {"audio_file_id": 1}
+
+    def test_get_concurrent_audio_fingerprints(self, supabase_client, mock_supabase):
+        """Test looking up the fingerprints of other stations in a time window"""
+        query = mock_supabase.table.return_value.select.return_value
+        query.neq.return_value.gte.return_value.lte.return_value.execute.return_value.data = [{"audio_file_id": 2}]
+
+        response = supabase_client.get_concurrent_audio_fingerprints(
+            "TEST-FM", "2024-01-01T00:00:00", "2024-01-01T01:00:00"
+        )
+
+        mock_supabase.table.assert_called_once_with("audio_fingerprints")
+        mock_supabase.table.return_value.select.assert_called_once_with("*")
+        query.neq.assert_called_once_with("radio_station_code", "TEST-FM")
+        query.neq.return_value.gte.assert_called_once_with("recorded_at", "2024-01-01T00:00:00")
+        query.neq.return_value.gte.return_value.lte.assert_called_once_with("recorded_at", "2024-01-01T01:00:00")
+        assert response == [{"audio_file_id": 2}]
+
+    def test_link_simulcast(self, supabase_client, mock_supabase):
+        """Test linking a recording to the original of the recordings it matches"""
+        mock_supabase.rpc.return_value.execute.return_value.data = 2
+
+        assert supabase_client.link_simulcast(1, [2, 3]) == 2
+
+        mock_supabase.rpc.assert_called_once_with(
+            "link_simulcast", {"audio_file_id": 1, "matching_audio_file_ids": [2, 3]}
+        )
+
+    def test_link_simulcast_takes_linked_copies_out_of_the_queue(self):
+        """Test that the deployed link_simulcast marks a linked copy as Processed, with its original as reason"""
+        migrations = sorted(glob.glob(os.path.join(REPO_ROOT, "supabase", "migrations", "*.sql")))
+        latest = [m for m in migrations if "FUNCTION link_simulcast" in open(m).read()][-1]
+        with open(latest) as f:
+            sql = " ".join(f.read().split())
+
+        link_update = re.search(
+            r"UPDATE public\.audio_files af SET (.*?) WHERE af\.id = link_simulcast\.audio_file_id", sql
+        )
+        assert link_update
+        assert "WHEN original_id IS NOT NULL AND af.status = 'New' THEN 'Processed'" in link_update.group(1)
+        assert "THEN 'Simulcast of ' || original_id" in link_update.group(1)
+        assert "SET status = 'Processed', error_message = 'Simulcast of ' || simulcast_of" in sql
+
+    def test_get_timestamped_transcription_checkpoints(self, supabase_client, mock_supabase):
+        """Test loading the checkpoints of an audio file for a prompt version and segment length"""
+        query = mock_supabase.table.return_value.select.return_value
+        query.eq.return_value.eq.return_value.eq.return_value.execute.return_value.data = [{"segment_start": 0}]
+
+        response = supabase_client.get_timestamped_transcription_checkpoints(1, "prompt-1", 20)
+
+        mock_supabase.table.assert_called_once_with("timestamped_transcription_checkpoints")
+        query.eq.assert_called_once_with("audio_file", 1)
+        query.eq.return_value.eq.assert_called_once_with("prompt_version", "prompt-1")
+        query.eq.return_value.eq.return_value.eq.assert_called_once_with("segment_length", 20)
+        assert response == [{"segment_start": 0}]
+
+    def test_upsert_timestamped_transcription_checkpoint(self, supabase_client, mock_supabase):
+        """Test saving the transcripts of a batch"""
+        mock_supabase.table.return_value.upsert.return_value.execute.return_value.data = [{"segment_start": 30}]
+
+        response = supabase_client.upsert_timestamped_transcription_checkpoint(1, "prompt-1", 20, 30, ["a", "b"])
+
+        mock_supabase.table.return_value.upsert.assert_called_once_with(
+            {
+                "audio_file": 1,
+                "prompt_version": "prompt-1",
+                "segment_length": 20,
+                "segment_start": 30,
+                "segment_count": 2,
+                "transcripts": ["a", "b"],
+            }
+        )
+        assert response == {"segment_start": 30}
+
+    def test_delete_timestamped_transcription_checkpoints(self, supabase_client, mock_supabase):
+        """Test deleting the checkpoints of an audio file"""
+        supabase_client.delete_timestamped_transcription_checkpoints(1)
+
+        mock_supabase.table.assert_called_once_with("timestamped_transcription_checkpoints")
+        mock_supabase.table.return_value.delete.return_value.eq.assert_called_once_with("audio_file", 1)
+
+    def test_search_kb_entries_batch(self, supabase_client, mock_supabase):
+        """Test searching the KB for several query embeddings in one RPC"""
+        expected_response = [{"id": "kb-1", "similarity": 0.9}, {"id": "kb-2", "similarity": 0.8}]
+        mock_supabase.rpc.return_value.execute.return_value.data = expected_response
+
+        response = supabase_client.search_kb_entries_batch([[0.1, 0.2], [0.3, 0.4]], match_threshold=0.5, match_count=3)
+
+        mock_supabase.rpc.assert_called_once_with(
+            "search_kb_entries_batch",
+            {
+                "query_embeddings": [[0.1, 0.2], [0.3, 0.4]],
+                "match_threshold": 0.5,
+                "match_count": 3,
+                "candidate_multiplier": 8,
+            },
+        )
+        assert response == expected_response
+
+    def test_search_kb_entries_batch_without_queries(self, supabase_client, mock_supabase):
+        """Test that no query embeddings make no RPC"""
+        assert supabase_client.search_kb_entries_batch([]) == []
+        mock_supabase.rpc.assert_not_called()
+
     def test_insert_stage_1_llm_response(self, supabase_client, mock_supabase):
         """Test inserting stage 1 LLM response"""
         expected_response = [{"id": 1}]